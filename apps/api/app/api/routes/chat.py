@@ -3,7 +3,7 @@
 import asyncio
 import json
 import logging
-from typing import List, Optional
+from typing import List, Optional, Set
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException
@@ -25,12 +25,16 @@ from app.models.user import User
 from app.persistence import TurnRepository
 from app.processor import EventType
 from app.services.excel import get_files_by_ids_from_db, load_tables_from_files
-from app.services.thread import generate_thread_title
+from app.services.file_profile import build_preview_info, get_file_profiles, wait_for_profile_jobs
+from app.services.thread import get_cached_thread_title, provisional_thread_title, update_thread_title
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# 进行中的标题生成任务（保持引用，客户端断开后仍会完成并写入数据库）
+_title_tasks: Set[asyncio.Task] = set()
+
 
 # ============ SSE 事件辅助函数（chat.py 特有）============
 
@@ -62,6 +66,11 @@ def sse_session(
     )
 
 
+def sse_session_update(thread_id: str, title: str) -> ServerSentEvent:
+    """创建 session_update 事件（LLM 生成的标题）"""
+    return sse({"thread_id": thread_id, "title": title}, event="session_update")
+
+
 def sse_session_error(code: str, message: str) -> ServerSentEvent:
     """创建会话级错误事件"""
     return sse({"code": code, "message": message}, event="error")
@@ -95,7 +104,8 @@ async def process_excel_chat(
     使用 LLM 智能处理 Excel 数据（SSE 流式响应）
 
     SSE 事件协议:
-    - event: session  - 会话元数据（thread/turn 创建完成）
+    - event: session  - 会话元数据（thread/turn 创建完成，新线程使用临时标题）
+    - event: session_update - 新线程的 LLM 生成标题 { thread_id, title }
     - event: error    - 会话级/系统级错误
     - (default)       - 业务流程步骤 { step, status, delta/output/error }
 
@@ -148,6 +158,11 @@ async def process_excel_chat(
                 turn_id = UUID(session_result["turn_id"])
                 actual_thread_id = UUID(session_result["thread_id"])
 
+                # 标题与处理流程同时生成
+                title_task = None
+                if session_result["title_pending"]:
+                    title_task = _start_title_task(actual_thread_id, params.query)
+
             except Exception as e:
                 logger.exception(f"Session init error: {e}")
                 yield sse_session_error(ErrorCode.INTERNAL_ERROR, f"初始化会话失败: {e}")
@@ -172,7 +187,16 @@ async def process_excel_chat(
             # 加载文件的函数
             async def load_tables():
                 files = await get_files_by_ids_from_db(db, file_ids, current_user.id)
-                return await asyncio.to_thread(load_tables_from_files, files)
+                # 上传后的后台解析仍在进行时等待其完成（解析结果和画像随后直接复用）
+                await wait_for_profile_jobs([f.id for f in files])
+                profiles = await get_file_profiles(db, [f.id for f in files])
+                return await asyncio.to_thread(load_tables_from_files, files, profiles)
+
+            # 加载前的文件预览（上传时读取的元数据或已完成的画像）
+            async def preview_tables():
+                files = await get_files_by_ids_from_db(db, file_ids, current_user.id)
+                profiles = await get_file_profiles(db, [f.id for f in files])
+                return build_preview_info(files, profiles)
 
             process_with_errors = False
             process_errors = []
@@ -195,11 +219,19 @@ async def process_excel_chat(
                 query=params.query,
                 stream_llm=True,
                 export_path_prefix=f"users/{current_user.id}/outputs",
+                result_id=str(turn_id),
+                owner_id=str(current_user.id),
                 on_event=on_event,
                 on_failure=on_failure,
                 on_load_tables=on_load_tables,
+                preview_tables_fn=preview_tables,
             ):
                 yield sse_event
+                if title_task is not None and title_task.done():
+                    title_event = _title_update(title_task, session_result["thread_id"])
+                    title_task = None
+                    if title_event is not None:
+                        yield title_event
 
             # === 完成 ===
             await repo.mark_completed(turn_id, actual_thread_id, tracker)
@@ -217,12 +249,35 @@ async def process_excel_chat(
                 )
                 await db.commit()
 
+            # 处理流程结束时标题仍在生成：等待完成后推送（shield：客户端断开时任务继续）
+            if title_task is not None:
+                await asyncio.shield(title_task)
+                title_event = _title_update(title_task, session_result["thread_id"])
+                if title_event is not None:
+                    yield title_event
+
     return EventSourceResponse(stream())
 
 
 # ============ Helper Functions ============
 
 
+def _start_title_task(thread_id: UUID, query: str) -> asyncio.Task:
+    """在后台生成标题并更新到数据库"""
+    task = asyncio.create_task(update_thread_title(thread_id, query, get_llm_client()))
+    _title_tasks.add(task)
+    task.add_done_callback(_title_tasks.discard)
+    return task
+
+
+def _title_update(task: asyncio.Task, thread_id: str) -> Optional[ServerSentEvent]:
+    """已完成的标题任务对应的 session_update 事件（生成失败时为 None，保留临时标题）"""
+    if task.cancelled() or task.exception() is not None:
+        return None
+    title = task.result()
+    return sse_session_update(thread_id, title) if title else None
+
+
 async def _init_session(
     repo: TurnRepository,
     user_id: UUID,
@@ -234,6 +289,7 @@ async def _init_session(
     初始化会话
 
     创建或获取 Thread，创建 Turn，关联文件。
+    新线程不等待 LLM 生成标题：相同查询生成过标题时直接使用，否则使用查询截取的临时标题。
 
     Returns:
         {
@@ -241,10 +297,12 @@ async def _init_session(
             "turn_id": str,
             "title": str,
             "is_new_thread": bool,
+            "title_pending": bool,  # 使用临时标题，需要生成标题
             "error": Optional[{"code": str, "message": str}]
         }
     """
     is_new_thread = False
+    title_pending = False
     title = ""
 
     # 获取或创建线程
@@ -260,8 +318,10 @@ async def _init_session(
         title = thread.title or ""
     else:
         # 创建新线程
-        llm_client = get_llm_client()
-        title = await asyncio.to_thread(generate_thread_title, query, llm_client)
+        title = get_cached_thread_title(query)
+        if title is None:
+            title = provisional_thread_title(query)
+            title_pending = bool(title)
         thread = await repo.create_thread(user_id, title)
         thread_id = thread.id
         is_new_thread = True
@@ -283,4 +343,5 @@ async def _init_session(
         "turn_id": str(turn.id),
         "title": title,
         "is_new_thread": is_new_thread,
+        "title_pending": title_pending,
     }
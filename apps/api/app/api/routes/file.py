@@ -1,17 +1,21 @@
 """通用文件上传到 MinIO 的接口"""
+import hashlib
 from typing import List
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, UploadFile, status
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.deps import get_current_user
 from app.core.database import get_db
-from app.models import File
+from app.engine.workbook_cache import hash_content
+from app.models import File, FileProfile
 from app.models.user import User
 from app.schemas.response import ApiResponse
-from app.services.oss import upload_user_file, OSSError
+from app.services.excel import get_file_by_id_from_db
+from app.services.file_profile import is_parseable, probe_upload, register_profile_job, run_profile_job
+from app.services.oss import upload_user_file_async, OSSError
 
 router = APIRouter(prefix="/file", tags=["文件"])
 
@@ -21,23 +25,59 @@ class FileItem(BaseModel):
     filename: str
     path: str
     content_type: str | None = None
+    # 后台解析状态：pending / processing / ready / failed（非表格文件为空）
+    status: str | None = None
+
+
+class FileSheetSummary(BaseModel):
+    name: str
+    row_count: int | None = None
+    column_count: int
+
+
+class FileStatus(BaseModel):
+    id: str
+    status: str
+    error: str | None = None
+    parse_ms: int | None = None
+    sheets: List[FileSheetSummary] | None = None
+
 
 @router.post("/upload", response_model=ApiResponse[List[FileItem]], summary="文件上传")
-async def upload_file(files: List[UploadFile], current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
-    """文件上传接口：将文件存储到 MinIO"""
+async def upload_file(
+    files: List[UploadFile],
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """文件上传接口：将文件存储到 MinIO，表格文件在后台解析并保存画像"""
     if not files or len(files) == 0:
         return ApiResponse(code=400, data=None, msg="请上传文件")
 
     items: List[FileItem] = []
+    jobs = []
 
+    # 读取文件内容到内存（如果后续有大文件需求可以改成流式上传），
+    # 表格文件先读取元数据校验，任一文件不合格时整批拒绝，不上传任何文件
+    contents = []
     for file in files:
-        # 读取文件内容到内存（如果后续有大文件需求可以改成流式上传）
         content = await file.read()
+        probe = None
+        if is_parseable(file.filename):
+            try:
+                probe = probe_upload(file.filename, content)
+            except ValueError as e:
+                return ApiResponse(code=400, data=None, msg=str(e))
+        contents.append((content, probe))
+
+    for file, (content, probe) in zip(files, contents):
         size = len(content)
+        md5 = hashlib.md5(content).hexdigest()
+        sha256 = hash_content(content)
 
         try:
             # 使用公共 OSS 服务上传文件
-            file_id, object_name, public_url = upload_user_file(
+            file_id, object_name, public_url = await upload_user_file_async(
                 data=content,
                 user_id=str(current_user.id),
                 filename=file.filename,
@@ -51,19 +91,27 @@ async def upload_file(files: List[UploadFile], current_user: User = Depends(get_
                 user_id=current_user.id,
                 filename=file.filename,
                 file_path=public_url,
-                file_size=file.size,
-                md5="",
+                file_size=size,
+                md5=md5,
+                sha256=sha256,
                 mime_type=file.content_type,
             )
 
             db.add(file_record)
 
+            profile_status = None
+            if probe is not None:
+                profile_status = "pending"
+                db.add(FileProfile(file_id=file_record.id, status=profile_status, md5=md5, probe=probe))
+                jobs.append((file_record.id, content))
+
             items.append(
                 FileItem(
                     id=file_record.id.hex,
                     path=public_url,
                     filename=file.filename,
                     content_type=file.content_type,
+                    status=profile_status,
                 )
             )
         except OSSError as e:
@@ -72,8 +120,47 @@ async def upload_file(files: List[UploadFile], current_user: User = Depends(get_
                 detail=str(e),
             )
 
+    # 先提交文件和画像记录，后台任务使用独立会话读取画像记录
+    await db.commit()
+    for file_id, content in jobs:
+        register_profile_job(file_id)
+        background_tasks.add_task(run_profile_job, file_id, content)
+
     return ApiResponse(
         code=0,
         data=items,
         msg="上传成功",
     )
+
+
+@router.get("/{file_id}/status", response_model=ApiResponse[FileStatus], summary="文件解析状态")
+async def get_file_status(file_id: UUID, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """查询上传后后台解析的状态和各 sheet 概况（status 为 none 表示没有解析任务）"""
+    await get_file_by_id_from_db(db, file_id, current_user.id)
+    profile = await db.get(FileProfile, file_id)
+    if profile is None:
+        return ApiResponse(code=0, data=FileStatus(id=file_id.hex, status="none"), msg="获取成功")
+
+    sheets = None
+    if profile.sheets:
+        sheets = [
+            FileSheetSummary(name=sheet["name"], row_count=sheet["row_count"], column_count=len(sheet["columns"]))
+            for sheet in profile.sheets
+        ]
+    elif profile.probe:
+        # 解析完成前返回上传时读取的元数据（行数为估算值）
+        sheets = [
+            FileSheetSummary(name=sheet["name"], row_count=sheet["row_count"], column_count=sheet["column_count"])
+            for sheet in profile.probe
+        ]
+    return ApiResponse(
+        code=0,
+        data=FileStatus(
+            id=file_id.hex,
+            status=profile.status,
+            error=profile.error,
+            parse_ms=profile.parse_ms,
+            sheets=sheets,
+        ),
+        msg="获取成功",
+    )
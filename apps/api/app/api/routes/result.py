@@ -0,0 +1,86 @@
+import asyncio
+from typing import Optional
+from urllib.parse import quote
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import RedirectResponse, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.deps import get_current_user
+from app.core.database import get_db
+from app.models.thread import Thread, ThreadTurn
+from app.models.user import User
+from app.services.processor_stream import XLSX_CONTENT_TYPE
+from app.services.result_store import get_result_store, stream_workbook
+
+router = APIRouter(prefix="/results", tags=["results"])
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 是否与 ETag 匹配（弱比较）"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    value = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == value for tag in if_none_match.split(","))
+
+
+async def _find_exported_url(db: AsyncSession, result_id: str, file_id: str, user_id: UUID) -> Optional[str]:
+    """暂存结果已过期时，查找对话轮次中已上传到 OSS 的文件地址（result_id 为 turn_id）"""
+    try:
+        turn_id = UUID(result_id)
+    except ValueError:
+        return None
+
+    stmt = (
+        select(ThreadTurn)
+        .join(Thread, Thread.id == ThreadTurn.thread_id)
+        .where(ThreadTurn.id == turn_id)
+        .where(Thread.user_id == user_id)
+    )
+    turn = (await db.execute(stmt)).scalar_one_or_none()
+    if turn is None:
+        return None
+
+    for step in reversed(turn.steps or []):
+        if step.get("step") != "export":
+            continue
+        for output_file in (step.get("output") or {}).get("output_files") or []:
+            if output_file.get("file_id") == file_id and output_file.get("url"):
+                return output_file["url"]
+    return None
+
+
+@router.get("/{result_id}/files/{file_id}", summary="下载处理结果", description="流式生成并下载处理后的文件（支持 If-None-Match）")
+async def download_result_file(
+    result_id: str,
+    file_id: str,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """下载处理结果中的文件：暂存期内边生成边发送，过期后跳转到 OSS 上的文件"""
+    entry = get_result_store().get(result_id)
+
+    if entry is None or not entry.has_file(file_id) or entry.owner_id not in (None, str(current_user.id)):
+        url = await _find_exported_url(db, result_id, file_id, current_user.id)
+        if url is None:
+            raise HTTPException(status_code=404, detail="结果不存在或已过期")
+        return RedirectResponse(url, status_code=307)
+
+    etag = await asyncio.to_thread(entry.etag, file_id)
+    headers = {
+        "ETag": etag,
+        # 每次使用前向服务端确认（相同的结果返回 304）
+        "Cache-Control": "private, no-cache",
+    }
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    headers["Content-Disposition"] = f"attachment; filename*=UTF-8''{quote(entry.filename(file_id))}"
+    # 生成一部分发送一部分，代理不缓冲
+    headers["X-Accel-Buffering"] = "no"
+    return StreamingResponse(stream_workbook(entry.tables, file_id), media_type=XLSX_CONTENT_TYPE, headers=headers)
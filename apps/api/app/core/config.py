@@ -35,6 +35,8 @@ class Settings(BaseSettings):
     MINIO_SECRET_KEY: str = ""
     MINIO_BUCKET: str = ""
     MINIO_PUBLIC_BASE: str = ""
+    OSS_UPLOAD_PART_SIZE_MB: int = 16  # 超过该大小的文件分片上传（最小 5）
+    OSS_UPLOAD_PARALLEL_PARTS: int = 3  # 单个文件同时上传的分片数
 
     DEFAULT_AVATAR: str = "/storage/llm-excel/__SYS__/default_avatar.png"
 
@@ -61,6 +63,32 @@ class Settings(BaseSettings):
     OPENAI_BASE_URL: Optional[str] = None  # 兼容 .env 中的旧变量名
     OPENAI_MODEL: Optional[str] = None
 
+    # LLM 连接池（按 base_url + API Key 在进程内共享客户端，连接在请求之间保持）
+    LLM_MAX_CONNECTIONS: int = 100  # 每个连接池的最大连接数（同时进行的 LLM 请求数）
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 20  # 保持的空闲连接数
+    LLM_KEEPALIVE_EXPIRY: float = 60.0  # 空闲连接保持时间（秒）
+    LLM_CONNECT_TIMEOUT: float = 10.0  # 建立连接超时（秒）
+    LLM_TIMEOUT: float = 600.0  # 读写超时（秒，流式响应为相邻两次数据之间的间隔）
+    LLM_POOL_TIMEOUT: float = 30.0  # 连接数达到上限时等待空闲连接的超时（秒）
+
+    # 执行引擎配置
+    OPERATION_CACHE_MAX_MB: int = 256  # 操作结果缓存内存上限（跨请求复用相同操作的结果）
+    WORKBOOK_CACHE_DIR: str = ""  # 解析结果磁盘缓存目录（为空时使用 ~/.cache/selgetabel/workbooks；须属于服务用户）
+    WORKBOOK_CACHE_MAX_MB: int = 2048  # 解析结果磁盘缓存上限（0 表示禁用）
+    EXCEL_DOWNLOAD_CONCURRENCY: int = 4  # 同时从 MinIO 下载的文件数
+    EXCEL_READER: str = "stream"  # Excel 读取后端：stream（流式解析 XML）/ openpyxl（pd.read_excel）
+    EXCEL_PARSE_PROCESSES: int = 4  # 解析 Excel 的进程数（0 表示在当前进程内逐个解析）
+    EXCEL_UPLOAD_MAX_CELLS: int = 20_000_000  # 上传时按元数据估算的单元格数上限（0 表示不限制）
+    EXCEL_LAZY_LOAD: bool = True  # 已有解析画像的文件延迟加载（只解析执行时用到的 sheet 和列）
+    EXCEL_EXPORT_CONCURRENCY: int = 4  # 处理完成后同时导出和上传的文件数
+    EXCEL_EXPORT_PATCH: bool = True  # 导出时在原工作簿上修补（保留原格式，只写入变化的列和新增的 sheet）
+    EXCEL_EXPORT_UPLOAD: bool = True  # 处理完成后是否把修改后的文件上传到 MinIO（否则只能从暂存结果下载）
+    RESULT_STORE_MAX_MB: int = 512  # 暂存处理结果的内存上限（下载时直接流式生成，0 表示禁用）
+    RESULT_STORE_TTL_SECONDS: int = 3600  # 暂存处理结果的保留时间（秒）
+    EXECUTION_TIMEOUT_SECONDS: float = 120.0  # 单次执行的时间预算（秒，0 表示不限制）
+    EXECUTION_MAX_MEMORY_MB: int = 2048  # 单次执行创建的数据（新增列、新建 Sheet）占用内存的上限（0 表示不限制）
+    EXECUTION_MAX_ROW_EVALUATIONS: int = 1_000_000_000  # 单次执行的行 × 表达式求值次数上限（0 表示不限制）
+
 
 settings = Settings()
 
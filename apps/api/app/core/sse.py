@@ -30,11 +30,12 @@ def sse_step_running(step: str, stage_id: str) -> ServerSentEvent:
     return sse({"step": step, "status": StepStatus.RUNNING, "stage_id": stage_id})
 
 
-def sse_step_streaming(step: str, delta: str, stage_id: str) -> ServerSentEvent:
-    """创建步骤流式输出事件"""
-    return sse(
-        {"step": step, "status": StepStatus.STREAMING, "delta": delta, "stage_id": stage_id}
-    )
+def sse_step_streaming(step: str, delta: str, stage_id: str, output: Any = None) -> ServerSentEvent:
+    """创建步骤流式输出事件（output 为可选的阶段性结构化结果）"""
+    data = {"step": step, "status": StepStatus.STREAMING, "delta": delta, "stage_id": stage_id}
+    if output is not None:
+        data["output"] = output
+    return sse(data)
 
 
 def sse_step_done(step: str, output: Any, stage_id: Optional[str] = None) -> ServerSentEvent:
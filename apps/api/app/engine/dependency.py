@@ -0,0 +1,304 @@
+"""操作依赖分析 - 根据每个操作读写的 Sheet 和变量构建依赖图
+
+Executor 用依赖图调度操作：互不依赖的操作可以并发执行。
+
+读写粒度为 Sheet（file_id, sheet_name）：新增 / 更新列会修改 DataFrame 的列结构，
+pandas 不支持在修改 DataFrame 的同时并发读取其他列，因此同一 Sheet 上的写操作
+与该 Sheet 上的任何读写都视为冲突；只读操作（如多个 aggregate）之间可以并发。
+
+无法静态确定读写范围的操作（未知操作类型、非字面量的 VLOOKUP 表引用等）
+作为屏障：与之前和之后的所有操作都存在依赖。
+
+analyze_columns 进一步细化到列，用于延迟加载的表只加载操作用到的列。
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.engine.models import (
+    AddColumnOperation,
+    AggregateOperation,
+    ComputeOperation,
+    CreateSheetOperation,
+    DropColumnsOperation,
+    FilterOperation,
+    GroupByOperation,
+    Operation,
+    SelectColumnsOperation,
+    SortOperation,
+    TakeOperation,
+    UpdateColumnOperation,
+)
+
+SheetKey = Tuple[str, str]
+
+# 操作读取的列：Sheet -> 列名集合（None 表示需要整个 Sheet）
+ColumnReads = Dict[SheetKey, Optional[Set[str]]]
+
+
+@dataclass
+class OperationAccess:
+    """单个操作的读写集合"""
+
+    reads: Set[SheetKey] = field(default_factory=set)
+    writes: Set[SheetKey] = field(default_factory=set)
+    var_reads: Set[str] = field(default_factory=set)
+    var_writes: Set[str] = field(default_factory=set)
+    # 无法确定读写范围，需要串行执行
+    barrier: bool = False
+
+    def conflicts_with(self, later: "OperationAccess") -> bool:
+        """检查后续操作 later 是否依赖本操作（写后读、写后写、读后写）"""
+        if self.barrier or later.barrier:
+            return True
+        if self.writes & (later.reads | later.writes) or self.reads & later.writes:
+            return True
+        if self.var_writes & (later.var_reads | later.var_writes) or self.var_reads & later.var_writes:
+            return True
+        return False
+
+
+# ==================== 表达式分析 ====================
+
+
+def _collect_expression(expr: Any, access: OperationAccess):
+    """收集表达式引用的变量和跨表 Sheet"""
+    if isinstance(expr, list):
+        for item in expr:
+            _collect_expression(item, access)
+        return
+    if not isinstance(expr, dict):
+        return
+
+    if "var" in expr:
+        if isinstance(expr["var"], str):
+            access.var_reads.add(expr["var"])
+        else:
+            access.barrier = True
+
+    if "ref" in expr:
+        ref = expr["ref"]
+        parts = ref.split(".") if isinstance(ref, str) else []
+        if len(parts) == 3:
+            access.reads.add((parts[0], parts[1]))
+        else:
+            access.barrier = True
+
+    func_name = expr.get("func")
+    if isinstance(func_name, str) and func_name.upper() == "VLOOKUP":
+        args = expr.get("args")
+        table_ref = _literal(args[1]) if isinstance(args, list) and len(args) == 4 else None
+        parts = table_ref.split(".") if isinstance(table_ref, str) else []
+        if len(parts) == 2:
+            access.reads.add((parts[0], parts[1]))
+        else:
+            access.barrier = True
+
+    for value in expr.values():
+        if isinstance(value, (dict, list)):
+            _collect_expression(value, access)
+
+
+def _literal(expr: Any) -> Any:
+    """取字面量表达式的值（{"value": ...} 或原始值），否则返回 None"""
+    if isinstance(expr, dict):
+        return expr.get("value") if set(expr) == {"value"} else None
+    return expr
+
+
+def _output_sheet(op: Operation, default_type: str) -> Optional[str]:
+    """计算 filter/sort/take/select/drop 的输出 Sheet（与 Executor 的规则一致）"""
+    output = op.output or {}
+    output_type = output.get("type", default_type)
+    if output_type == "new_sheet":
+        name = output.get("name")
+        return name if isinstance(name, str) else None
+    return op.table
+
+
+# ==================== 操作分析 ====================
+
+
+def analyze_operation(op: Operation) -> OperationAccess:
+    """
+    分析单个操作的读写集合
+
+    Args:
+        op: 操作
+
+    Returns:
+        OperationAccess
+    """
+    access = OperationAccess()
+
+    if isinstance(op, AggregateOperation):
+        access.reads.add((op.file_id, op.table))
+        access.var_writes.add(op.as_var)
+
+    elif isinstance(op, ComputeOperation):
+        _collect_expression(op.expression, access)
+        access.var_writes.add(op.as_var)
+
+    elif isinstance(op, (AddColumnOperation, UpdateColumnOperation)):
+        access.reads.add((op.file_id, op.table))
+        access.writes.add((op.file_id, op.table))
+        _collect_expression(op.formula, access)
+
+    elif isinstance(op, (FilterOperation, SortOperation, TakeOperation, SelectColumnsOperation, DropColumnsOperation)):
+        access.reads.add((op.file_id, op.table))
+        if isinstance(op, FilterOperation):
+            for cond in op.conditions:
+                _collect_expression(cond.get("value") if isinstance(cond, dict) else None, access)
+        default_type = "new_sheet" if isinstance(op, FilterOperation) else "in_place"
+        output_sheet = _output_sheet(op, default_type)
+        if output_sheet is None:
+            access.barrier = True
+        else:
+            access.writes.add((op.file_id, output_sheet))
+
+    elif isinstance(op, GroupByOperation):
+        access.reads.add((op.file_id, op.table))
+        output_sheet = (op.output or {}).get("name")
+        if isinstance(output_sheet, str):
+            access.writes.add((op.file_id, output_sheet))
+        else:
+            access.barrier = True
+
+    elif isinstance(op, CreateSheetOperation):
+        source = op.source or {}
+        if source.get("type", "empty") in {"copy", "reference"}:
+            source_table = source.get("table")
+            if isinstance(source_table, str):
+                access.reads.add((op.file_id, source_table))
+        access.writes.add((op.file_id, op.name))
+
+    else:
+        access.barrier = True
+
+    return access
+
+
+def build_dependencies(operations: List[Operation]) -> List[Set[int]]:
+    """
+    构建操作依赖图
+
+    Args:
+        operations: 按计划顺序排列的操作列表
+
+    Returns:
+        每个操作直接依赖的（更早的）操作下标集合
+    """
+    accesses = [analyze_operation(op) for op in operations]
+    dependencies: List[Set[int]] = []
+    for i, access in enumerate(accesses):
+        dependencies.append({
+            j for j in range(i)
+            if accesses[j].conflicts_with(access)
+        })
+    return dependencies
+
+
+# ==================== 列读取分析 ====================
+
+
+def analyze_columns(operations: List[Operation]) -> ColumnReads:
+    """
+    分析操作读取的列（用于只加载用到的列）
+
+    输出整表的操作（filter、sort、take、drop_columns、create_sheet 复制）需要整个 Sheet；
+    无法静态确定的引用（非字面量的 VLOOKUP 参数等）不计入，执行时按需加载。
+
+    Args:
+        operations: 操作列表
+
+    Returns:
+        Sheet -> 列名集合（None 表示整个 Sheet）
+    """
+    reads: ColumnReads = {}
+
+    def add(sheet_key: SheetKey, columns: Optional[Set[str]]):
+        if sheet_key in reads and reads[sheet_key] is None:
+            return
+        if columns is None:
+            reads[sheet_key] = None
+        else:
+            reads.setdefault(sheet_key, set()).update(columns)
+
+    for op in operations:
+        sheet_key = (getattr(op, "file_id", None), getattr(op, "table", None))
+
+        if isinstance(op, AggregateOperation):
+            add(sheet_key, {name for name in (op.column, op.condition_column) if name})
+
+        elif isinstance(op, ComputeOperation):
+            _collect_columns(op.expression, None, add)
+
+        elif isinstance(op, (AddColumnOperation, UpdateColumnOperation)):
+            add(sheet_key, set())
+            _collect_columns(op.formula, sheet_key, add)
+
+        elif isinstance(op, SelectColumnsOperation):
+            add(sheet_key, set(op.columns))
+
+        elif isinstance(op, GroupByOperation):
+            add(sheet_key, set(op.group_columns) | {agg.get("column") for agg in op.aggregations})
+
+        elif isinstance(op, (FilterOperation, SortOperation, TakeOperation, DropColumnsOperation)):
+            add(sheet_key, None)
+            if isinstance(op, FilterOperation):
+                for cond in op.conditions:
+                    _collect_columns(cond.get("value") if isinstance(cond, dict) else None, None, add)
+
+        elif isinstance(op, CreateSheetOperation):
+            source = op.source or {}
+            if source.get("type") == "copy" and isinstance(source.get("table"), str):
+                add((op.file_id, source["table"]), None)
+
+    return reads
+
+
+def expression_columns(expr: Any) -> Set[str]:
+    """表达式引用的当前表的列（{"col": ...}）"""
+    if isinstance(expr, list):
+        return set().union(*(expression_columns(item) for item in expr))
+    if not isinstance(expr, dict):
+        return set()
+    columns = {expr["col"]} if isinstance(expr.get("col"), str) else set()
+    for value in expr.values():
+        if isinstance(value, (dict, list)):
+            columns |= expression_columns(value)
+    return columns
+
+
+def _collect_columns(expr: Any, sheet_key: Optional[SheetKey], add):
+    """收集表达式引用的列：{"col"} 为当前表的列，{"ref"} 和字面量的 VLOOKUP 参数为其他表的列"""
+    if isinstance(expr, list):
+        for item in expr:
+            _collect_columns(item, sheet_key, add)
+        return
+    if not isinstance(expr, dict):
+        return
+
+    if "col" in expr and sheet_key is not None and isinstance(expr["col"], str):
+        add(sheet_key, {expr["col"]})
+
+    if "ref" in expr:
+        parts = expr["ref"].split(".") if isinstance(expr["ref"], str) else []
+        if len(parts) == 3:
+            add((parts[0], parts[1]), {parts[2]})
+
+    func_name = expr.get("func")
+    if isinstance(func_name, str) and func_name.upper() == "VLOOKUP":
+        args = expr.get("args")
+        if isinstance(args, list) and len(args) == 4:
+            table_ref, key_col, value_col = (_literal(arg) for arg in args[1:])
+            parts = table_ref.split(".") if isinstance(table_ref, str) else []
+            if len(parts) == 2:
+                if isinstance(key_col, str) and isinstance(value_col, str):
+                    add((parts[0], parts[1]), {key_col, value_col})
+                else:
+                    add((parts[0], parts[1]), None)
+
+    for value in expr.values():
+        if isinstance(value, (dict, list)):
+            _collect_columns(value, sheet_key, add)
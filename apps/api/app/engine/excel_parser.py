@@ -1,15 +1,29 @@
 """Excel 解析器 - 负责读取 Excel 文件并转换为系统内部数据结构"""
 
 import io
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import Union, List, Dict
+from typing import Any, Callable, Union, List, Dict, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 from minio import Minio
 from minio.error import S3Error
 
 from app.core.config import settings
-from app.engine.models import Table, ExcelFile, FileCollection
+from app.engine.models import Table, ExcelFile, FileCollection, normalize_column_dtype
+from app.engine.workbook_cache import get_workbook_cache, hash_content
+from app.engine.workbook_probe import ProbeError, list_sheet_sizes, probe_workbook
+from app.engine.xlsx_reader import READER_BACKENDS, read_sheet_columns, read_workbook
+
+logger = logging.getLogger(__name__)
 
 
 class ExcelParser:
@@ -114,6 +128,7 @@ class ExcelParser:
             table = Table(name=sheet_name, data=df)
             excel_file.add_sheet(table)
 
+        excel_file.set_source(WorkbookSource(filename=file_path.name, content_hash=None, fetch=file_path.read_bytes))
         collection.add_file(excel_file)
         return collection
 
@@ -150,72 +165,315 @@ class ExcelParser:
         return clean_path
 
     @staticmethod
-    def load_tables_from_minio_paths(file_records: List[tuple[str, str, str]]) -> FileCollection:
+    def parse_workbook_bytes(
+        data: bytes,
+        parallel: bool = True,
+        reader: Optional[str] = None,
+    ) -> List[Tuple[str, pd.DataFrame]]:
+        """
+        解析 Excel 内容的所有 sheet
+
+        Args:
+            data: 文件内容
+            parallel: 是否在解析进程池中并行解析各个 sheet（进程池未启用时逐个解析）
+            reader: 读取后端（"openpyxl" / "stream"，None 表示使用 EXCEL_READER 配置），
+                两个后端的解析结果一致，见 app.engine.xlsx_reader
+
+        Returns:
+            按顺序排列的 (Sheet 名称, DataFrame)
+        """
+        reader = ExcelParser._resolve_reader(reader)
+        pool = get_parse_pool() if parallel else None
+        if pool is None:
+            return [
+                (sheet_name, ExcelParser._clean_dataframe(df))
+                for sheet_name, df in _read_sheets(data, None, reader)
+            ]
+
+        try:
+            sheet_sizes = list_sheet_sizes(data)
+        except ProbeError:
+            # 文件结构不标准时由 pandas 读取 sheet 名称（无法估计大小，平均分配）
+            sheet_sizes = [(name, 0) for name in pd.ExcelFile(io.BytesIO(data), engine="openpyxl").sheet_names]
+        sheet_names = [name for name, _ in sheet_sizes]
+        batches = _split_sheets(sheet_sizes, settings.EXCEL_PARSE_PROCESSES)
+
+        # 文件内容只写入一次临时文件，解析进程按路径读取：
+        # 避免每个任务都把整个文件序列化传给解析进程，每个进程对分到的一批 sheet 只打开一次工作簿
+        path = _spill(data)
+        try:
+            futures = [pool.submit(_parse_sheets, path, batch, reader) for batch in batches]
+            parsed = {}
+            for batch, future in zip(batches, futures):
+                parsed.update(zip(batch, future.result()))
+            return [(sheet_name, parsed[sheet_name]) for sheet_name in sheet_names]
+        except BrokenProcessPool as e:
+            # 解析进程异常退出（如内存不足），重建进程池供后续请求使用
+            shutdown_parse_pool()
+            raise RuntimeError(f"解析进程异常退出: {e}") from e
+        finally:
+            os.unlink(path)
+
+    @staticmethod
+    def parse_sheet_bytes(
+        data: bytes,
+        sheet_name: str,
+        columns: Optional[List[str]] = None,
+        parallel: bool = True,
+        reader: Optional[str] = None,
+    ) -> pd.DataFrame:
+        """
+        解析 Excel 内容中的单个 sheet（延迟加载时使用）
+
+        Args:
+            data: 文件内容
+            sheet_name: Sheet 名称
+            columns: 只需要这些列（None 表示全部）；结果与完整解析后再取这些列一致
+            parallel: 是否在解析进程池中解析
+            reader: 读取后端（None 表示使用 EXCEL_READER 配置）
+
+        Returns:
+            清洗后的 DataFrame
+        """
+        if not parallel or get_parse_pool() is None:
+            return _parse_sheet(data, sheet_name, ExcelParser._resolve_reader(reader), columns)
+
+        # 与 parse_workbook_bytes 一样写入临时文件，解析进程按路径读取，不序列化整个文件
+        path = _spill(data)
+        try:
+            return ExcelParser.parse_sheet_file(path, sheet_name, columns, reader=reader)
+        finally:
+            os.unlink(path)
+
+    @staticmethod
+    def parse_sheet_file(
+        path: str,
+        sheet_name: str,
+        columns: Optional[List[str]] = None,
+        parallel: bool = True,
+        reader: Optional[str] = None,
+    ) -> pd.DataFrame:
+        """
+        解析 Excel 文件中的单个 sheet（参数同 parse_sheet_bytes；解析进程按路径读取文件）
+
+        Returns:
+            清洗后的 DataFrame
+        """
+        reader = ExcelParser._resolve_reader(reader)
+        pool = get_parse_pool() if parallel else None
+        if pool is None:
+            return _parse_sheet(path, sheet_name, reader, columns)
+        try:
+            return pool.submit(_parse_sheet, path, sheet_name, reader, columns).result()
+        except BrokenProcessPool as e:
+            shutdown_parse_pool()
+            raise RuntimeError(f"解析进程异常退出: {e}") from e
+
+    @staticmethod
+    def _resolve_reader(reader: Optional[str]) -> str:
+        """确定读取后端"""
+        reader = reader or settings.EXCEL_READER
+        if reader not in READER_BACKENDS:
+            raise ValueError(f"未知的 Excel 读取后端: {reader}（可选: {', '.join(READER_BACKENDS)}）")
+        return reader
+
+    @staticmethod
+    def load_tables_from_minio_paths(file_records: List[tuple]) -> FileCollection:
         """
         从 MinIO 中的文件路径加载表集合
 
+        多个文件同时下载（EXCEL_DOWNLOAD_CONCURRENCY），下载完成的文件立即在解析进程池中
+        按 sheet 并行解析（EXCEL_PARSE_PROCESSES），总耗时取决于最大的文件而不是所有文件之和。
+        解析结果按文件内容哈希缓存在本地磁盘（见 app.engine.workbook_cache），
+        同一文件再次加载时不再下载和解析。
+
+        提供了 Sheet 画像的文件不在加载时下载和解析：各 sheet 先以画像（列名、行数、类型、样本）
+        作为占位，执行时只加载操作用到的 sheet 和列（见 WorkbookSource 和 Table.materialize）。
+
         Args:
             file_records: 文件记录列表，每个元组包含：
-                (file_id, file_path, filename)
+                (file_id, file_path, filename[, sha256[, sheets]])
                 - file_id: 文件 UUID 字符串
                 - file_path: MinIO 公共访问路径
                 - filename: 原始文件名
+                - sha256: 可选，文件内容的 SHA-256（解析缓存的键，缺失时下载后计算）
+                - sheets: 可选，上传时计算的 Sheet 画像（格式见 app.services.file_profile），
+                  提供且 sha256 不为空时延迟加载
+
+        Raises:
+            FileNotFoundError / RuntimeError / ValueError: 任一文件下载或解析失败（信息中包含文件名）
         """
         collection = FileCollection()
+        if not file_records:
+            return collection
 
         try:
             client = ExcelParser._get_minio_client()
         except RuntimeError as e:
             raise RuntimeError(f"初始化 MinIO 客户端失败: {e}") from e
 
-        bucket_name = settings.MINIO_BUCKET
+        lazy_files: Dict[int, ExcelFile] = {}
+        for index, record in enumerate(file_records):
+            if len(record) > 4 and record[3] and record[4]:
+                excel_file = ExcelParser._build_lazy_file(client, record)
+                if excel_file is not None:
+                    lazy_files[index] = excel_file
+
+        eager_records = [
+            (index, record) for index, record in enumerate(file_records) if index not in lazy_files
+        ]
+        futures = {}
+        if eager_records:
+            workers = max(1, min(len(eager_records), settings.EXCEL_DOWNLOAD_CONCURRENCY))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="excel-load") as executor:
+                futures = {
+                    index: executor.submit(ExcelParser._load_minio_file, client, record)
+                    for index, record in eager_records
+                }
+                wait(futures.values())
 
-        for file_id, file_path, filename in file_records:
-            # 提取 MinIO object_name
-            object_name = ExcelParser._extract_minio_object_name(file_path)
+        # 按文件顺序加入集合；多个文件失败时抛出第一个，其余记录日志
+        errors = [future.exception() for future in futures.values() if future.exception() is not None]
+        for error in errors[1:]:
+            logger.warning(f"加载文件失败: {error}")
+        if errors:
+            raise errors[0]
 
-            # 从 MinIO 读取对象
-            try:
-                response = client.get_object(bucket_name, object_name)
-                try:
-                    data = response.read()
-                finally:
-                    response.close()
-                    response.release_conn()
-            except S3Error as e:
-                raise FileNotFoundError(
-                    f"文件不存在或无法从 MinIO 读取: {e}"
-                ) from e
-            except Exception as e:
-                raise RuntimeError(f"从 MinIO 读取文件失败: {e}") from e
-
-            # 使用 pandas 解析 Excel 内容
+        for index in range(len(file_records)):
+            collection.add_file(lazy_files[index] if index in lazy_files else futures[index].result())
+        return collection
+
+    @staticmethod
+    def _load_minio_file(client: Minio, record: tuple) -> ExcelFile:
+        """下载并解析单个文件（在下载线程中执行，命中解析缓存时直接使用）"""
+        file_id, file_path, filename = record[:3]
+        content_hash = record[3] if len(record) > 3 else None
+        cache = get_workbook_cache()
+
+        # 提取 MinIO object_name
+        object_name = ExcelParser._extract_minio_object_name(file_path)
+
+        data: Optional[bytes] = None
+        if not content_hash:
+            # 没有记录内容哈希的文件：下载后计算（命中解析缓存时仍可省去解析）
+            data = ExcelParser._download(client, object_name, filename)
+            content_hash = hash_content(data)
+
+        # 命中解析缓存时直接使用（已知内容哈希时文件内容在导出时才下载）
+        sheets = cache.get(content_hash) if cache is not None else None
+        if sheets is not None:
+            logger.info(f"解析缓存命中: {filename} ({len(sheets)} 个 sheet)")
+            source = WorkbookSource(
+                filename=filename,
+                content_hash=content_hash,
+                fetch=lambda: ExcelParser._download(client, object_name, filename),
+                data=data,
+            )
+            return ExcelParser._build_excel_file(file_id, filename, sheets, source)
+
+        if data is None:
+            data = ExcelParser._download(client, object_name, filename)
+
+        # 使用 pandas 解析 Excel 内容
+        try:
+            sheets = ExcelParser.parse_workbook_bytes(data)
+        except Exception as e:
+            raise ValueError(f"解析 Excel 文件失败 ({filename}): {e}") from e
+
+        if cache is not None:
+            cache.put(content_hash, sheets)
+
+        source = WorkbookSource(filename=filename, content_hash=content_hash, fetch=lambda: data, data=data)
+        return ExcelParser._build_excel_file(file_id, filename, sheets, source)
+
+    @staticmethod
+    def _download(client: Minio, object_name: str, filename: str) -> bytes:
+        """从 MinIO 读取对象内容"""
+        try:
+            response = client.get_object(settings.MINIO_BUCKET, object_name)
             try:
-                excel_bytes = io.BytesIO(data)
-                excel_file_data = pd.ExcelFile(excel_bytes, engine="openpyxl")
-                sheet_names = excel_file_data.sheet_names
-
-                # 创建 ExcelFile 对象
-                excel_file = ExcelFile(file_id=file_id, filename=filename)
-
-                # 解析所有 sheets
-                for sheet_name in sheet_names:
-                    df = pd.read_excel(
-                        excel_file_data,
-                        sheet_name=sheet_name,
-                        engine="openpyxl",
-                    )
-                    df = ExcelParser._clean_dataframe(df)
-                    table = Table(name=sheet_name, data=df)
-                    excel_file.add_sheet(table)
-
-                # 添加到集合
-                collection.add_file(excel_file)
+                return response.read()
+            finally:
+                response.close()
+                response.release_conn()
+        except S3Error as e:
+            raise FileNotFoundError(
+                f"文件不存在或无法从 MinIO 读取 ({filename}): {e}"
+            ) from e
+        except Exception as e:
+            raise RuntimeError(f"从 MinIO 读取文件失败 ({filename}): {e}") from e
+
+    @staticmethod
+    def _build_lazy_file(client: Minio, record: tuple) -> Optional[ExcelFile]:
+        """由 Sheet 画像创建延迟加载的 ExcelFile（文件内容在首次需要时才下载）"""
+        file_id, file_path, filename, content_hash, sheets = record[:5]
+        object_name = ExcelParser._extract_minio_object_name(file_path)
+        source = WorkbookSource(
+            filename=filename,
+            content_hash=content_hash,
+            fetch=lambda: ExcelParser._download(client, object_name, filename),
+        )
+        return ExcelParser.build_lazy_file(file_id, filename, sheets, source)
 
-            except Exception as e:
-                raise ValueError(f"解析 Excel 文件失败 ({filename}): {e}") from e
+    @staticmethod
+    def build_lazy_file(
+        file_id: str,
+        filename: str,
+        sheets: List[Dict[str, Any]],
+        source: "WorkbookSource",
+    ) -> Optional[ExcelFile]:
+        """
+        由 Sheet 画像创建延迟加载的 ExcelFile
 
-        return collection
+        Args:
+            file_id: 文件 ID
+            filename: 原始文件名
+            sheets: Sheet 画像 [{"name", "row_count", "columns": [{"name", "dtype", ...}]}, ...]
+            source: 工作簿来源（按需加载 sheet 的数据）
+
+        Returns:
+            ExcelFile；画像中有重复列名时返回 None（由调用方完整解析）
+        """
+        excel_file = ExcelFile(file_id=file_id, filename=filename)
+        for sheet in sheets:
+            columns = [column["name"] for column in sheet["columns"]]
+            if len(set(columns)) != len(columns):
+                return None
+            sheet_name = sheet["name"]
+            excel_file.add_sheet(Table.lazy(
+                name=sheet_name,
+                columns=columns,
+                row_count=sheet["row_count"],
+                loader=lambda names, sheet_name=sheet_name: source.load_sheet(sheet_name, names),
+                dtypes={column["name"]: column.get("dtype") for column in sheet["columns"]},
+                source_key=f"{source.content_hash}/{sheet_name}",
+            ))
+        excel_file.set_source(source)
+        return excel_file
+
+    @staticmethod
+    def _build_excel_file(
+        file_id: str,
+        filename: str,
+        sheets: List[Tuple[str, pd.DataFrame]],
+        source: Optional["WorkbookSource"] = None,
+    ) -> ExcelFile:
+        """
+        由已解析的 sheet 创建 ExcelFile 对象（source 为解析的原始工作簿）
+
+        source 有内容哈希时，各 Sheet 与延迟加载时一样使用 "内容哈希/Sheet 名称" 作为数据来源标识，
+        操作结果缓存不需要对整张表计算指纹（见 operation_cache._initial_sheet_version）。
+        """
+        excel_file = ExcelFile(file_id=file_id, filename=filename)
+        content_hash = source.content_hash if source is not None else None
+        for sheet_name, df in sheets:
+            table = Table(name=sheet_name, data=df)
+            if content_hash:
+                table.source_key = f"{content_hash}/{sheet_name}"
+            excel_file.add_sheet(table)
+        if source is not None:
+            excel_file.set_source(source)
+        return excel_file
 
     @staticmethod
     def parse_multiple_files(file_paths: Dict[str, Union[str, Path]]) -> FileCollection:
@@ -243,38 +501,47 @@ class ExcelParser:
         return collection
 
     @staticmethod
-    def _clean_dataframe(df: pd.DataFrame) -> pd.DataFrame:
+    def _clean_dataframe(df: pd.DataFrame, non_empty: Optional[np.ndarray] = None) -> pd.DataFrame:
         """
         清洗 DataFrame 数据
 
         - 处理空值
         - 标准化列名
         - 处理数据类型
+
+        Args:
+            df: 读取的 DataFrame
+            non_empty: 只读取了部分列时传入，完整数据中不全为空的行（代替按当前列判断空行）
         """
         # 标准化列名（去除空格，转为小写）
         df.columns = [str(col).strip() for col in df.columns]
 
         # 删除完全空的行
-        df = df.dropna(how='all')
+        if non_empty is None:
+            df = df.dropna(how='all')
+        else:
+            df = df[non_empty]
 
         # 重置索引
         df = df.reset_index(drop=True)
 
-        # 处理 NaN 值（保留为 None）
-        df = df.where(pd.notna(df), None)
+        # 保留原生列类型（含空值的整数列转为可空 Int64 等），
+        # 空值在 Table 读取边界统一转换为 None
+        for i in range(df.shape[1]):
+            df.isetitem(i, normalize_column_dtype(df.iloc[:, i]))
 
         return df
 
     @staticmethod
     def get_file_info(file_path: Union[str, Path]) -> Dict:
         """
-        获取 Excel 文件信息
+        获取 Excel 文件信息（只读取元数据，不解析数据，见 app.engine.workbook_probe）
 
         Args:
             file_path: Excel 文件路径
 
         Returns:
-            文件信息字典
+            文件信息字典（rows 为按 dimension 估算的数据行数，无法估算时为 None）
         """
         file_path = Path(file_path)
 
@@ -282,15 +549,15 @@ class ExcelParser:
             raise FileNotFoundError(f"文件不存在: {file_path}")
 
         try:
-            excel_file = pd.ExcelFile(file_path, engine='openpyxl')
+            with open(file_path, "rb") as f:
+                probes = probe_workbook(f)
 
             sheets_info = {}
-            for sheet_name in excel_file.sheet_names:
-                df = pd.read_excel(file_path, sheet_name=sheet_name, engine='openpyxl')
-                sheets_info[sheet_name] = {
-                    "rows": len(df),
-                    "columns": len(df.columns),
-                    "column_names": list(df.columns)
+            for probe in probes:
+                sheets_info[probe.name] = {
+                    "rows": probe.row_count,
+                    "columns": probe.column_count,
+                    "column_names": probe.columns
                 }
 
             return {
@@ -300,3 +567,194 @@ class ExcelParser:
             }
         except Exception as e:
             raise ValueError(f"读取文件信息失败: {str(e)}") from e
+
+
+# ==================== 并行解析 ====================
+
+_parse_pool: Optional[ProcessPoolExecutor] = None
+_parse_pool_lock = threading.Lock()
+
+
+def _read_sheets(
+    data: Union[bytes, str],
+    sheet_names: Optional[List[str]],
+    reader: str,
+) -> List[Tuple[str, pd.DataFrame]]:
+    """用指定后端读取工作表（未清洗），data 为文件内容或文件路径，sheet_names 为 None 时读取全部"""
+    if reader == "stream":
+        return read_workbook(data, sheet_names)
+
+    excel_file_data = pd.ExcelFile(io.BytesIO(data) if isinstance(data, bytes) else data, engine="openpyxl")
+    return [
+        (sheet_name, pd.read_excel(excel_file_data, sheet_name=sheet_name, engine="openpyxl"))
+        for sheet_name in (excel_file_data.sheet_names if sheet_names is None else sheet_names)
+    ]
+
+
+def _parse_sheet(
+    data: Union[bytes, str],
+    sheet_name: str,
+    reader: str,
+    columns: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """
+    解析单个 sheet（在解析进程中执行；data 为文件内容或文件路径，两个后端都只会读取该 sheet 的 XML）
+
+    columns 不为 None 时只返回这些列：stream 后端只转换这些列，openpyxl 后端完整解析后再选取。
+    """
+    if columns is not None and reader == "stream":
+        df, non_empty = read_sheet_columns(data, sheet_name, columns)
+        return ExcelParser._clean_dataframe(df, non_empty)
+
+    [(_, df)] = _read_sheets(data, [sheet_name], reader)
+    df = ExcelParser._clean_dataframe(df)
+    if columns is not None:
+        df = df.loc[:, df.columns.isin(columns)]
+    return df
+
+
+def _parse_sheets(path: str, sheet_names: List[str], reader: str) -> List[pd.DataFrame]:
+    """解析文件中的一批 sheet（在解析进程中执行，工作簿只打开一次）"""
+    return [ExcelParser._clean_dataframe(df) for _, df in _read_sheets(path, sheet_names, reader)]
+
+
+def _spill(data: bytes) -> str:
+    """把文件内容写入临时文件（交给解析进程按路径读取），返回路径；由调用方删除"""
+    with tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False) as spill:
+        spill.write(data)
+    return spill.name
+
+
+def _remove_spill(path: str):
+    """删除临时文件（已不存在时忽略）"""
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def _split_sheets(sheet_sizes: List[Tuple[str, int]], workers: int) -> List[List[str]]:
+    """
+    把 sheet 分成不超过 workers 批，使各批 XML 的总大小接近
+
+    依次把最大的 sheet 分给当前总大小最小的一批；每批内保持工作簿中的顺序。
+    """
+    count = max(1, min(workers, len(sheet_sizes)))
+    loads = [0] * count
+    assigned: List[List[int]] = [[] for _ in range(count)]
+    order = sorted(range(len(sheet_sizes)), key=lambda i: sheet_sizes[i][1], reverse=True)
+    for index in order:
+        # 大小相同（如无法估计）时分给 sheet 数最少的一批
+        target = min(range(count), key=lambda b: (loads[b], len(assigned[b])))
+        loads[target] += sheet_sizes[index][1]
+        assigned[target].append(index)
+    return [[sheet_sizes[i][0] for i in sorted(indexes)] for indexes in assigned if indexes]
+
+
+def get_parse_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    获取进程内共享的解析进程池
+
+    openpyxl 解析 XML 是纯 Python 代码，受 GIL 限制，多线程无法利用多核，因此使用进程池。
+    进程数由 EXCEL_PARSE_PROCESSES 配置（为 0 时返回 None，在当前进程内解析）。
+    """
+    global _parse_pool
+    if _parse_pool is None and settings.EXCEL_PARSE_PROCESSES > 0:
+        with _parse_pool_lock:
+            if _parse_pool is None:
+                # 服务进程中已有其他线程（事件循环、线程池），使用 spawn 避免 fork 后死锁
+                _parse_pool = ProcessPoolExecutor(
+                    max_workers=settings.EXCEL_PARSE_PROCESSES,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _parse_pool
+
+
+def shutdown_parse_pool():
+    """关闭解析进程池（应用关闭或进程池损坏时调用）"""
+    global _parse_pool
+    with _parse_pool_lock:
+        pool, _parse_pool = _parse_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+# ==================== 延迟加载 ====================
+
+
+class WorkbookSource:
+    """
+    延迟加载的工作簿来源
+
+    sheet 的数据在首次需要时才加载：优先读取解析结果缓存中的单个 sheet，
+    未命中时获取文件内容（只获取一次）并只解析这个 sheet 需要的列。
+    在解析进程中解析时，文件内容只写入一次临时文件，之后每个 sheet 都按路径交给解析进程
+    （不再每次序列化整个文件）；临时文件在来源被回收时删除。
+    导出时作为原始工作簿使用（见 ExcelFile.set_source）。
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        content_hash: Optional[str],
+        fetch: Callable[[], bytes],
+        data: Optional[bytes] = None,
+    ):
+        """
+        Args:
+            filename: 原始文件名（用于错误信息）
+            content_hash: 文件内容哈希（解析缓存的键，未知时为 None）
+            fetch: 获取文件内容的函数（如从 MinIO 下载）
+            data: 已经获取的文件内容（提供时不再调用 fetch）
+        """
+        self.filename = filename
+        self.content_hash = content_hash
+        self._fetch = fetch
+        self._data: Optional[bytes] = data
+        self._path: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def load_sheet(self, sheet_name: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        加载一个 sheet 的部分或全部列
+
+        Args:
+            sheet_name: Sheet 名称
+            columns: 需要的列（None 表示全部）
+
+        Returns:
+            清洗后的 DataFrame（与完整解析后再取这些列的结果一致）
+        """
+        cache = get_workbook_cache()
+        df = cache.get_sheet(self.content_hash, sheet_name) if cache is not None and self.content_hash else None
+        if df is not None:
+            return df if columns is None else df.loc[:, df.columns.isin(columns)]
+
+        try:
+            if get_parse_pool() is None:
+                return ExcelParser.parse_sheet_bytes(self.content(), sheet_name, columns, parallel=False)
+            return ExcelParser.parse_sheet_file(self.spill_path(), sheet_name, columns)
+        except (FileNotFoundError, RuntimeError):
+            raise
+        except Exception as e:
+            raise ValueError(f"解析 Excel 文件失败 ({self.filename}): {e}") from e
+
+    def loaded_size(self) -> int:
+        """已获取的文件内容大小（尚未获取时为 0）"""
+        return len(self._data) if self._data is not None else 0
+
+    def content(self) -> bytes:
+        """获取文件内容（多个 sheet 和导出共用，只获取一次）"""
+        with self._lock:
+            if self._data is None:
+                self._data = self._fetch()
+            return self._data
+
+    def spill_path(self) -> str:
+        """文件内容写入的临时文件路径（交给解析进程按路径读取，只写入一次）"""
+        data = self.content()
+        with self._lock:
+            if self._path is None:
+                self._path = _spill(data)
+                weakref.finalize(self, _remove_spill, self._path)
+            return self._path
@@ -1,6 +1,12 @@
 """执行引擎 - 执行操作并计算结果"""
 
-from typing import Any, Dict, List, Optional, Union
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import repeat
+from typing import Any, Dict, List, Optional, Tuple, Union
+import numpy as np
 import pandas as pd
 from app.engine.models import (
     FileCollection,
@@ -25,7 +31,16 @@ from app.engine.functions import (
     AGGREGATE_FUNC_MAP,
     ROW_FUNC_MAP,
     SCALAR_FUNC_MAP,
+    VECTOR_AGGREGATE_FUNC_MAP,
 )
+from app.engine.dependency import analyze_columns, build_dependencies, expression_columns
+from app.engine.governor import CHECK_ROWS, ExecutionAborted, ResourceGovernor, data_bytes, formula_size
+from app.engine.operation_cache import OperationCache, plan_keys
+from app.engine.optimizer import PlanOptimizer, Rewrite, SharedSubexpression, describe, fold_formula
+from app.engine.operators import binary_op
+from app.engine.row_compiler import CompiledFormula
+from app.engine.table_index import TableIndexCache, countifs_refs
+from app.engine.vectorizer import VectorizedFormula
 
 
 class FormulaEvaluator:
@@ -37,6 +52,8 @@ class FormulaEvaluator:
         functions: Dict[str, callable],
         row_context: Optional[Dict[str, Any]] = None,
         variables: Optional[Dict[str, Any]] = None,
+        index_cache: Optional[TableIndexCache] = None,
+        governor: Optional[ResourceGovernor] = None,
     ):
         """
         初始化求值器
@@ -46,11 +63,15 @@ class FormulaEvaluator:
             functions: 可用函数
             row_context: 当前行的数据 {"列名": 值, ...}
             variables: 变量上下文 {"变量名": 值, ...}
+            index_cache: 表索引缓存（由 Executor 共享；None 时自建）
+            governor: 资源控制（由 Executor 共享，逐行扫描时计入求值次数；None 时不限制）
         """
         self.tables = tables
         self.functions = functions
         self.row_context = row_context or {}
         self.variables = variables or {}
+        self.index_cache = index_cache or TableIndexCache(tables)
+        self.governor = governor or ResourceGovernor()
 
     def set_row_context(self, row_context: Dict[str, Any]):
         """设置当前行上下文（用于复用 evaluator）"""
@@ -106,9 +127,22 @@ class FormulaEvaluator:
 
         raise ValueError(f"未知的表达式类型: {expr}")
 
+    def compile(self, expr: Any, columns: List[str]) -> CompiledFormula:
+        """
+        将公式编译为逐行求值的闭包（整列计算时使用，结果与 evaluate 一致）
+
+        Args:
+            expr: 表达式
+            columns: 表中存在的列名
+
+        Returns:
+            CompiledFormula，按其 columns 顺序传入行元组求值
+        """
+        return CompiledFormula(expr, self, columns)
+
     def _get_table_column(self, ref: str) -> List[Any]:
         """
-        获取跨表列引用
+        获取跨表列引用（列数据由 TableIndexCache 缓存，每行不再复制整列）
 
         Args:
             ref: "file_id.sheet_name.column_name" 格式（三段式）
@@ -116,19 +150,7 @@ class FormulaEvaluator:
         Returns:
             列数据
         """
-        parts = ref.split(".")
-        if len(parts) != 3:
-            raise ValueError(
-                f"无效的跨表引用格式: {ref}，应为 'file_id.sheet_name.column_name'"
-            )
-
-        file_id, sheet_name, col_name = parts
-
-        try:
-            table = self.tables.get_table(file_id, sheet_name)
-            return table.get_column(col_name)
-        except Exception as e:
-            raise ValueError(f"无法访问 {ref}: {e}")
+        return self.index_cache.get_ref_column(ref)
 
     def _eval_function(self, func_name: str, args: List) -> Any:
         """求值函数调用"""
@@ -191,6 +213,9 @@ class FormulaEvaluator:
 
         args 格式: [范围1, 条件1, 范围2, 条件2, ...]
         范围是 {"ref": "表.列"}，条件是 {"col": "列名"} 或 {"value": ...}
+
+        范围均为跨表引用时，计数来自按范围组合预聚合的计数表（见 TableIndexCache），
+        每行只需一次哈希查找。
         """
         if len(args) % 2 != 0 or len(args) < 2:
             raise ValueError("COUNTIFS 参数必须成对出现")
@@ -219,7 +244,12 @@ class FormulaEvaluator:
             if len(r) != first_len:
                 raise ValueError("COUNTIFS 所有范围长度必须一致")
 
-        # 统计满足所有条件的行数
+        refs = countifs_refs(args)
+        if refs is not None:
+            return self.index_cache.count_matches(refs, criteria)
+
+        # 统计满足所有条件的行数（每行线性扫描一次范围）
+        self.governor.charge(first_len)
         count = 0
         for row_idx in range(first_len):
             all_match = True
@@ -234,7 +264,7 @@ class FormulaEvaluator:
 
     def _eval_vlookup(self, args: List) -> Any:
         """
-        求值 VLOOKUP 函数
+        求值 VLOOKUP 函数（精确匹配，使用哈希索引，见 TableIndexCache）
 
         args: [查找值, 表引用, 键列名, 值列名]
         - 表引用格式: "file_id.sheet_name"
@@ -247,250 +277,300 @@ class FormulaEvaluator:
         key_col = self.evaluate(args[2])
         value_col = self.evaluate(args[3])
 
-        try:
-            # 解析表引用
-            parts = table_ref.split(".")
-            if len(parts) != 2:
-                raise ValueError(
-                    f"无效的表引用格式: {table_ref}，应为 'file_id.sheet_name'"
-                )
-            file_id, sheet_name = parts
-
-            # 获取表并查找
-            table = self.tables.get_table(file_id, sheet_name)
-            key_data = table.get_column(key_col)
-            value_data = table.get_column(value_col)
-
-            for i, key in enumerate(key_data):
-                if key == lookup_value:
-                    return value_data[i]
-
-            return ExcelError("#N/A")
-        except Exception:
-            return ExcelError("#N/A")
+        return self.index_cache.vlookup(lookup_value, table_ref, key_col, value_col)
 
     def _eval_binary_op(self, op: str, left_expr, right_expr) -> Any:
-        """求值二元运算"""
-        import pandas as pd
-        from datetime import datetime, date
-
+        """求值二元运算（运算语义见 app.engine.operators）"""
         left = self.evaluate(left_expr)
         right = self.evaluate(right_expr)
+        return binary_op(op, left, right)
 
-        # 处理空值（None 或 pandas NaT/NaN）
-        def is_null(val):
-            if val is None:
-                return True
-            if pd.isna(val):
-                return True
-            return False
-
-        def is_numeric(val):
-            """检查是否为数值类型（排除 bool）"""
-            return isinstance(val, (int, float)) and not isinstance(val, bool)
-
-        def is_datetime(val):
-            return isinstance(val, (datetime, date, pd.Timestamp))
-
-        def try_convert_to_number(val):
-            """尝试将值转换为数值，返回 (成功, 结果)"""
-            if is_numeric(val):
-                return True, val
-            if isinstance(val, str):
-                try:
-                    return True, float(val)
-                except (ValueError, TypeError):
-                    return False, val
-            return False, val
-
-        def safe_compare(a, b, compare_func) -> bool:
-            """
-            安全比较两个值，处理类型不匹配的情况
-
-            比较策略（模拟 Excel 行为）：
-            1. 空值：空值参与比较时返回 False
-            2. 同类型：直接比较
-            3. 数值 vs 字符串：尝试将字符串转为数值
-            4. 无法比较：返回 False（而不是报错）
-            """
-            # 空值处理
-            if is_null(a) or is_null(b):
-                return False
-
-            # 尝试将两边都转换为数值进行比较
-            a_is_num, a_num = try_convert_to_number(a)
-            b_is_num, b_num = try_convert_to_number(b)
-
-            if a_is_num and b_is_num:
-                # 两边都能转换为数值，用数值比较
-                try:
-                    return compare_func(a_num, b_num)
-                except TypeError:
-                    return False
-
-            # 如果有一边是数值另一边是无法转换的字符串
-            # Excel 行为：数值永远 < 文本
-            if a_is_num and not b_is_num:
-                # a 是数值，b 是文本：数值 < 文本
-                if compare_func == (lambda x, y: x < y):
-                    return True
-                elif compare_func == (lambda x, y: x > y):
-                    return False
-                elif compare_func == (lambda x, y: x <= y):
-                    return True
-                elif compare_func == (lambda x, y: x >= y):
-                    return False
-                return False
-
-            if not a_is_num and b_is_num:
-                # a 是文本，b 是数值：文本 > 数值
-                if compare_func == (lambda x, y: x < y):
-                    return False
-                elif compare_func == (lambda x, y: x > y):
-                    return True
-                elif compare_func == (lambda x, y: x <= y):
-                    return False
-                elif compare_func == (lambda x, y: x >= y):
-                    return True
-                return False
-
-            # 两边都是字符串，用字符串比较
-            try:
-                return compare_func(str(a), str(b))
-            except TypeError:
-                return False
 
-        # 错误传播：如果任一操作数是 ExcelError，直接返回该错误
-        if isinstance(left, ExcelError):
-            return left
-        if isinstance(right, ExcelError):
-            return right
-
-        # 对于算术运算，检查空值和类型
-        arithmetic_ops = {"+", "-", "*", "/"}
-        if op in arithmetic_ops:
-            # 检查空值
-            if is_null(left) or is_null(right):
-                return ExcelError("#VALUE!")
-
-            if is_datetime(left) or is_datetime(right):
-                return ExcelError("#VALUE!")
-
-            if not is_numeric(left) or not is_numeric(right):
-                # 尝试转换字符串为数字
-                try:
-                    if isinstance(left, str):
-                        left = float(left)
-                    if isinstance(right, str):
-                        right = float(right)
-                except (ValueError, TypeError):
-                    return ExcelError("#VALUE!")
-
-        # 比较运算符需要特殊处理类型不匹配
-        comparison_ops = {">", "<", ">=", "<="}
-        if op in comparison_ops:
-            compare_funcs = {
-                ">": lambda x, y: x > y,
-                "<": lambda x, y: x < y,
-                ">=": lambda x, y: x >= y,
-                "<=": lambda x, y: x <= y,
-            }
-            return safe_compare(left, right, compare_funcs[op])
-
-        ops = {
-            "+": lambda a, b: a + b,
-            "-": lambda a, b: a - b,
-            "*": lambda a, b: a * b,
-            "/": lambda a, b: a / b if b != 0 else ExcelError("#DIV/0!"),
-            "=": lambda a, b: a == b,   # Excel 风格的等于运算符
-            "<>": lambda a, b: a != b,  # Excel 风格的不等于运算符
-            "&": lambda a, b: str(a if not is_null(a) else "") + str(b if not is_null(b) else ""),  # 文本拼接运算符
-        }
+# 生成新 Sheet（或原地替换 Sheet）的操作
+SHEET_OUTPUT_OPERATIONS = (
+    FilterOperation,
+    SortOperation,
+    GroupByOperation,
+    CreateSheetOperation,
+    TakeOperation,
+    SelectColumnsOperation,
+    DropColumnsOperation,
+)
 
-        if op not in ops:
-            raise ValueError(f"未知的运算符: {op}")
+# 默认并发线程数
+DEFAULT_MAX_WORKERS = 4
 
-        return ops[op](left, right)
+logger = logging.getLogger(__name__)
 
 
 class Executor:
     """操作执行引擎"""
 
-    def __init__(self, tables: FileCollection):
+    def __init__(
+        self,
+        tables: FileCollection,
+        vectorize: bool = True,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        cache: Optional[OperationCache] = None,
+        optimize: bool = True,
+        governor: Optional[ResourceGovernor] = None,
+    ):
+        """
+        Args:
+            tables: 文件集合
+            vectorize: 是否对 add_column / update_column 公式使用向量化求值
+            max_workers: 并发执行互不依赖操作的最大线程数（1 表示串行）
+            cache: 操作结果缓存（None 表示不缓存）
+            optimize: 是否在求值前优化公式（常量折叠、不变量外提、公共子表达式消除）
+            governor: 资源控制（时间、内存、求值次数预算和取消，见 app.engine.governor；None 时不限制）
+        """
         self.tables = tables
+        self.vectorize = vectorize
+        self.max_workers = max_workers
+        self.cache = cache
+        self.optimize = optimize
+        self.governor = governor or ResourceGovernor()
         self.variables: Dict[str, Any] = {}
+        # 跨表查找索引（表数据变化时按表失效）
+        self.index_cache = TableIndexCache(tables)
+
+        # 公式优化状态（每次 execute 重置）
+        self._plan: Optional[PlanOptimizer] = None
+        self._rewrites: List[Rewrite] = []
+        # 隐藏列名 -> 公共子表达式的整列结果（None 表示有行级错误，不可复用）
+        self._shared_columns: Dict[str, Optional[pd.Series]] = {}
+        self._optimizer_lock = threading.Lock()
+
+    def execute(self, operations: List[Operation], keys: Optional[List[Optional[str]]] = None) -> ExecutionResult:
+        """
+        执行操作列表
+
+        按依赖图调度（见 app.engine.dependency）：互不依赖的操作在线程池中并发执行，
+        每个操作完成后立即把结果应用到 tables / variables，依赖它的操作随后才会开始。
+        ExecutionResult 中的结果、错误、变量和新增数据始终按计划顺序记录，
+        与串行执行完全一致。
+
+        启用操作结果缓存时，缓存键相同（操作相同且输入 Sheet / 变量相同）的操作
+        直接复用缓存的结果（见 app.engine.operation_cache）。
 
-    def execute(self, operations: List[Operation]) -> ExecutionResult:
-        """执行操作列表"""
+        执行前先加载操作用到的 Sheet 和列（延迟加载的表，见 Table.lazy），
+        未用到的 Sheet 和列不会被解析。
+
+        每个操作前后和求值过程中检查资源预算（见 ResourceGovernor）：超出预算或被取消时，
+        正在执行的操作尽快结束，之后的操作不再执行，均记录为失败（ExecutionResult.aborted 记录原因）。
+
+        Args:
+            operations: 操作列表
+            keys: 预先计算的缓存键（分批执行同一计划时传入，见 PlanKeyBuilder；None 时按 operations 计算）
+        """
         result = ExecutionResult()
+        started = time.perf_counter()
+        self.governor.start()
+
+        self._plan = PlanOptimizer(operations) if self.optimize else None
+        self._rewrites = []
+        self._shared_columns = {}
+
+        if self.cache is None:
+            keys = [None] * len(operations)
+        elif keys is None:
+            keys = plan_keys(operations, self.tables, self.variables)
+
+        self._materialize_inputs(operations, keys)
+
+        if self.max_workers > 1 and len(operations) > 1:
+            op_results = self._execute_parallel(operations, keys)
+        else:
+            op_results = [self._run_operation(op, key) for op, key in zip(operations, keys)]
+
+        for i, (op, op_result) in enumerate(zip(operations, op_results)):
+            self._record_result(result, i, op, op_result)
+
+        result.optimizations = [
+            str(rewrite) for rewrite in sorted(self._rewrites, key=lambda rewrite: rewrite.operation)
+        ]
+        self._plan = None
+        self._shared_columns = {}
+
+        result.cache_hits = sum(1 for op_result in op_results if op_result.cached)
+        result.cache_misses = sum(
+            1 for key, op_result in zip(keys, op_results) if key is not None and not op_result.cached
+        )
+
+        result.duration_ms = (time.perf_counter() - started) * 1000
+        result.resource_usage = self.governor.usage()
+        return result
+
+    def _materialize_inputs(self, operations: List[Operation], keys: List[Optional[str]]):
+        """
+        加载计划读取的列（见 app.engine.dependency.analyze_columns）
+
+        每个 Sheet 只加载一次（多个 Sheet 并发加载）；结果可从缓存取得的操作不需要输入。
+        加载失败时只记录日志，执行到相应操作时会再次加载并报告错误。
+        """
+        pending = [
+            op for op, key in zip(operations, keys)
+            if key is None or self.cache is None or key not in self.cache
+        ]
+        targets = []
+        for (file_id, sheet_name), columns in analyze_columns(pending).items():
+            if not self.tables.has_file(file_id) or not self.tables.get_file(file_id).has_sheet(sheet_name):
+                continue
+            table = self.tables.get_table(file_id, sheet_name)
+            if not table.is_loaded():
+                targets.append((table, columns))
+        if not targets:
+            return
 
-        for i, op in enumerate(operations):
+        def load(target):
+            table, columns = target
             try:
+                table.materialize(columns)
+            except Exception as e:
+                logger.warning(f"加载表 '{table.name}' 失败: {e}")
+
+        if len(targets) == 1 or self.max_workers <= 1:
+            for target in targets:
+                load(target)
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(targets))) as pool:
+                list(pool.map(load, targets))
+
+    def _execute_parallel(self, operations: List[Operation], keys: List[Optional[str]]) -> List[OperationResult]:
+        """按依赖图在有界线程池中并发执行，返回按计划顺序排列的结果"""
+        dependencies = build_dependencies(operations)
+        dependents: List[List[int]] = [[] for _ in operations]
+        for i, deps in enumerate(dependencies):
+            for j in deps:
+                dependents[j].append(i)
+        remaining = [len(deps) for deps in dependencies]
+        op_results: List[Optional[OperationResult]] = [None] * len(operations)
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(operations))) as pool:
+            running = {
+                pool.submit(self._run_operation, operations[i], keys[i]): i
+                for i, count in enumerate(remaining) if count == 0
+            }
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i = running.pop(future)
+                    op_results[i] = future.result()
+                    for j in dependents[i]:
+                        remaining[j] -= 1
+                        if remaining[j] == 0:
+                            running[pool.submit(self._run_operation, operations[j], keys[j])] = j
+
+        return op_results
+
+    def _run_operation(self, op: Operation, key: Optional[str] = None) -> OperationResult:
+        """
+        执行单个操作并立即应用其结果（供后续操作引用），记录耗时
+
+        Args:
+            op: 操作
+            key: 缓存键（None 表示不使用缓存）
+        """
+        started = time.perf_counter()
+        try:
+            self.governor.check()
+            cached = self.cache.get(key) if key is not None else None
+            if cached is not None:
+                op_result = cached.to_result(op)
+            else:
                 op_result = self._execute_operation(op)
-                result.operation_results.append(op_result)
-
-                # 记录错误（如果有）
-                if op_result.error:
-                    result.add_error(f"操作 #{i + 1}: {op_result.error}")
-
-                # 处理操作结果 - 注意：对于 add_column/update_column，即使有部分行错误，
-                # 只要有值就应该继续处理，因为错误行已经用 ExcelError 填充
-                has_value = op_result.value is not None
-
-                if isinstance(op, (AggregateOperation, ComputeOperation)):
-                    if has_value and not op_result.error:
-                        var_name = op.as_var
-                        self.variables[var_name] = op_result.value
-                        result.add_variable(var_name, op_result.value)
-
-                # 对于 add_column，即使有部分行错误也应该创建列
-                # （错误行已经用 ExcelError("#ERROR") 或 ExcelError("#VALUE!") 填充）
-                if isinstance(op, AddColumnOperation):
-                    if has_value:
-                        # 三层结构：file_id -> sheet_name -> column_name -> values
-                        result.add_column(op.file_id, op.table, op.name, op_result.value)
-                        # 立即将新列应用到表中，以便后续操作可以引用
-                        self._apply_new_column(op.file_id, op.table, op.name, op_result.value)
-
-                # 对于 update_column，同样即使有部分行错误也应该更新列
-                if isinstance(op, UpdateColumnOperation):
-                    if has_value:
-                        # 三层结构：file_id -> sheet_name -> column_name -> values
-                        result.add_updated_column(op.file_id, op.table, op.column, op_result.value)
-                        # 立即将更新后的列应用到表中，以便后续操作可以引用
-                        self._apply_updated_column(op.file_id, op.table, op.column, op_result.value)
-
-                # 处理新创建的 Sheet（filter, sort, group_by, create_sheet, take, select/drop）
-                if isinstance(op, (FilterOperation, SortOperation, GroupByOperation, CreateSheetOperation, TakeOperation, SelectColumnsOperation, DropColumnsOperation)):
-                    if has_value and isinstance(op_result.value, dict):
-                        sheet_data = op_result.value
-                        if "sheet_name" in sheet_data and "data" in sheet_data:
-                            result.add_new_sheet(
-                                sheet_data["file_id"],
-                                sheet_data["sheet_name"],
-                                sheet_data["data"]
-                            )
-                            # 同时将新 Sheet 应用到 tables，以便后续操作可以引用
-                            self._apply_new_sheet(
-                                sheet_data["file_id"],
-                                sheet_data["sheet_name"],
-                                sheet_data["data"]
-                            )
+                # 操作内部把中止当作普通错误处理时，结果不完整，不缓存也不应用
+                self.governor.raise_if_aborted()
+                if key is not None:
+                    self.cache.put(key, op_result)
+            # 应用前计入结果占用的内存，超出预算时不应用
+            self.governor.charge_memory(self._result_bytes(op, op_result))
+            self._apply_result(op, op_result)
+            self.governor.check()
+        except ExecutionAborted as e:
+            op_result = OperationResult(operation=op, error=str(e), error_detail=e.to_dict())
+        except Exception as e:
+            op_result = OperationResult(operation=op, error=f"执行错误: {str(e)}")
+        op_result.duration_ms = (time.perf_counter() - started) * 1000
+        return op_result
 
-            except Exception as e:
-                error_msg = f"执行错误: {str(e)}"
-                result.add_error(f"操作 #{i + 1}: {error_msg}")
-                result.operation_results.append(
-                    OperationResult(operation=op, error=error_msg)
-                )
+    def _apply_result(self, op: Operation, op_result: OperationResult):
+        """
+        将操作结果应用到执行状态（variables / tables）
 
-        return result
+        注意：对于 add_column/update_column，即使有部分行错误，
+        只要有值就应该继续处理，因为错误行已经用 ExcelError 填充
+        """
+        has_value = op_result.value is not None
+
+        if isinstance(op, (AggregateOperation, ComputeOperation)):
+            if has_value and not op_result.error:
+                self.variables[op.as_var] = op_result.value
+
+        # 立即将新列 / 更新后的列应用到表中，以便后续操作可以引用
+        if isinstance(op, AddColumnOperation) and has_value:
+            self._apply_new_column(op.file_id, op.table, op.name, op_result.value)
+
+        if isinstance(op, UpdateColumnOperation) and has_value:
+            self._apply_updated_column(op.file_id, op.table, op.column, op_result.value)
+
+        # 新创建的 Sheet（filter, sort, group_by, create_sheet, take, select/drop）
+        sheet_data = self._new_sheet_data(op, op_result)
+        if sheet_data is not None:
+            self._apply_new_sheet(sheet_data["file_id"], sheet_data["sheet_name"], sheet_data["data"])
+
+    def _result_bytes(self, op: Operation, op_result: OperationResult) -> int:
+        """操作结果应用到表后新增的数据占用的内存（新增 / 更新的列、新建的 Sheet）"""
+        if isinstance(op, (AddColumnOperation, UpdateColumnOperation)):
+            return data_bytes(op_result.value)
+        sheet_data = self._new_sheet_data(op, op_result)
+        if sheet_data is not None:
+            return data_bytes(sheet_data["data"])
+        return 0
+
+    def _record_result(self, result: ExecutionResult, index: int, op: Operation, op_result: OperationResult):
+        """按计划顺序把单个操作的结果记录到 ExecutionResult"""
+        result.operation_results.append(op_result)
+
+        # 记录错误（如果有）
+        if op_result.error:
+            result.add_error(f"操作 #{index + 1}: {op_result.error}")
+        if op_result.error_detail is not None and result.aborted is None:
+            result.aborted = {**op_result.error_detail, "operation": index + 1}
+
+        has_value = op_result.value is not None
+
+        if isinstance(op, (AggregateOperation, ComputeOperation)):
+            if has_value and not op_result.error:
+                result.add_variable(op.as_var, op_result.value)
+
+        # 三层结构：file_id -> sheet_name -> column_name -> values
+        if isinstance(op, AddColumnOperation) and has_value:
+            result.add_column(op.file_id, op.table, op.name, op_result.value)
+
+        if isinstance(op, UpdateColumnOperation) and has_value:
+            result.add_updated_column(op.file_id, op.table, op.column, op_result.value)
+
+        sheet_data = self._new_sheet_data(op, op_result)
+        if sheet_data is not None:
+            result.add_new_sheet(sheet_data["file_id"], sheet_data["sheet_name"], sheet_data["data"])
+
+    @staticmethod
+    def _new_sheet_data(op: Operation, op_result: OperationResult) -> Optional[Dict[str, Any]]:
+        """提取生成新 Sheet 的操作结果（无则返回 None）"""
+        if not isinstance(op, SHEET_OUTPUT_OPERATIONS):
+            return None
+        sheet_data = op_result.value
+        if isinstance(sheet_data, dict) and "sheet_name" in sheet_data and "data" in sheet_data:
+            return sheet_data
+        return None
 
     def _apply_new_sheet(self, file_id: str, sheet_name: str, data: pd.DataFrame):
         """将新创建的 Sheet 立即应用到 tables，以便后续操作可以引用"""
         if self.tables.has_file(file_id):
             excel_file = self.tables.get_file(file_id)
             table = Table(name=sheet_name, data=data)
+            self.index_cache.invalidate(file_id, sheet_name)
             if excel_file.has_sheet(sheet_name):
                 # 替换现有 sheet
                 excel_file._sheets[sheet_name] = table
@@ -500,6 +580,7 @@ class Executor:
     def _apply_new_column(self, file_id: str, table_name: str, column_name: str, values: List[Any]):
         """将新列立即应用到表中，以便后续操作可以引用"""
         table = self.tables.get_table(file_id, table_name)
+        self.index_cache.invalidate(file_id, table_name)
         # 如果列已存在则更新，否则添加（处理重复执行的情况）
         if column_name in table.get_columns():
             table.update_column(column_name, values)
@@ -509,6 +590,7 @@ class Executor:
     def _apply_updated_column(self, file_id: str, table_name: str, column_name: str, values: List[Any]):
         """将更新后的列立即应用到表中，以便后续操作可以引用"""
         table = self.tables.get_table(file_id, table_name)
+        self.index_cache.invalidate(file_id, table_name)
         table.update_column(column_name, values)
 
     def _execute_operation(self, op: Operation) -> OperationResult:
@@ -546,30 +628,32 @@ class Executor:
         try:
             # 使用 file_id 和 table（sheet_name）获取表
             table = self.tables.get_table(op.file_id, op.table)
-            func = AGGREGATE_FUNC_MAP.get(op.function)
-
-            if not func:
+            if op.function not in AGGREGATE_FUNC_MAP:
                 return OperationResult(
                     operation=op,
                     error=f"未知聚合函数: {op.function}"
                 )
 
+            # 向量化实现：直接在列数组上计算，条件只解析一次
+            func = VECTOR_AGGREGATE_FUNC_MAP.get(op.function)
+            self.governor.charge(table.row_count())
+
             if op.function in {"SUM", "COUNT", "COUNTA", "AVERAGE", "MIN", "MAX", "MEDIAN"}:
-                column_data = table.get_column(op.column)
+                column_data = table.get_column_masked(op.column)
                 value = func(column_data)
 
             elif op.function == "SUMIF":
-                sum_range = table.get_column(op.column)
-                criteria_range = table.get_column(op.condition_column)
+                sum_range = table.get_column_masked(op.column)
+                criteria_range = table.get_column_masked(op.condition_column)
                 value = func(sum_range, criteria_range, op.condition)
 
             elif op.function == "COUNTIF":
-                criteria_range = table.get_column(op.condition_column)
+                criteria_range = table.get_column_masked(op.condition_column)
                 value = func(criteria_range, op.condition)
 
             elif op.function == "AVERAGEIF":
-                avg_range = table.get_column(op.column)
-                criteria_range = table.get_column(op.condition_column)
+                avg_range = table.get_column_masked(op.column)
+                criteria_range = table.get_column_masked(op.condition_column)
                 value = func(avg_range, criteria_range, op.condition)
 
             else:
@@ -588,67 +672,19 @@ class Executor:
         执行新增列操作
 
         优化点：
-        1. 预先缓存所有列数据，避免每行重复获取
-        2. 复用 FormulaEvaluator 实例
-        3. 支持变量引用
-        4. 详细的行级错误报告
-        5. 不直接修改 Table（由调用方统一应用）
+        1. 公式编译为整列向量运算（见 _evaluate_formula_column）
+        2. 支持变量引用
+        3. 详细的行级错误报告
+        4. 不直接修改 Table（由调用方统一应用）
         """
         try:
             # 使用 file_id 和 table（sheet_name）获取表
             table = self.tables.get_table(op.file_id, op.table)
-            row_count = table.row_count()
-            columns = table.get_columns()
-
-            # ✅ 优化 1: 预先缓存所有列数据
-            column_cache: Dict[str, List[Any]] = {
-                col_name: table.get_column(col_name)
-                for col_name in columns
-            }
-
-            # ✅ 优化 2: 复用 FormulaEvaluator 实例
-            evaluator = FormulaEvaluator(
-                tables=self.tables,
-                functions=ROW_FUNC_MAP,
-                variables=self.variables,  # ✅ 支持变量引用
-            )
-
-            column_values = []
-            row_errors = []  # ✅ 优化 4: 记录行级错误
-
-            # 为每一行计算值
-            for row_idx in range(row_count):
-                # 构建行上下文（直接从缓存获取，避免重复调用 get_column）
-                row_context = {
-                    col_name: column_cache[col_name][row_idx]
-                    for col_name in columns
-                }
-
-                # 设置行上下文（复用 evaluator）
-                evaluator.set_row_context(row_context)
-
-                try:
-                    value = evaluator.evaluate(op.formula)
-                    column_values.append(value)
-                except Exception as e:
-                    column_values.append(ExcelError("#ERROR"))
-                    row_errors.append(f"行 {row_idx + 2}: {str(e)}")
-
-            # ✅ 优化 5: 不直接修改 Table，由调用方统一应用
-            # （移除了 table.add_column(op.name, column_values)）
-
-            # 构建结果
-            result = OperationResult(operation=op, value=column_values)
 
-            # 如果有行级错误，记录到 error 字段
-            if row_errors:
-                max_display = 5
-                error_summary = "; ".join(row_errors[:max_display])
-                if len(row_errors) > max_display:
-                    error_summary += f" (共 {len(row_errors)} 个错误)"
-                result.error = f"部分行计算失败: {error_summary}"
+            column_values, row_errors = self._evaluate_operation_formula(op, table)
 
-            return result
+            # 不直接修改 Table，由调用方统一应用
+            return self._build_column_result(op, column_values, row_errors)
 
         except Exception as e:
             return OperationResult(operation=op, error=str(e))
@@ -662,65 +698,181 @@ class Executor:
         try:
             # 使用 file_id 和 table（sheet_name）获取表
             table = self.tables.get_table(op.file_id, op.table)
-            row_count = table.row_count()
-            columns = table.get_columns()
 
             # 检查目标列是否存在
-            if op.column not in columns:
+            if op.column not in table.get_columns():
                 return OperationResult(
                     operation=op,
                     error=f"列 '{op.column}' 不存在，无法更新"
                 )
 
-            # 预先缓存所有列数据
-            column_cache: Dict[str, List[Any]] = {
-                col_name: table.get_column(col_name)
-                for col_name in columns
-            }
+            column_values, row_errors = self._evaluate_operation_formula(op, table)
 
-            # 复用 FormulaEvaluator 实例
-            evaluator = FormulaEvaluator(
-                tables=self.tables,
-                functions=ROW_FUNC_MAP,
-                variables=self.variables,
-            )
+            return self._build_column_result(op, column_values, row_errors)
 
-            column_values = []
-            row_errors = []
+        except Exception as e:
+            return OperationResult(operation=op, error=str(e))
 
-            # 为每一行计算值
-            for row_idx in range(row_count):
-                # 构建行上下文
-                row_context = {
-                    col_name: column_cache[col_name][row_idx]
-                    for col_name in columns
-                }
+    def _evaluate_operation_formula(
+        self,
+        op: Union[AddColumnOperation, UpdateColumnOperation],
+        table: Table,
+    ) -> Tuple[List[Any], List[str]]:
+        """
+        计算 add_column / update_column 的公式列
 
-                # 设置行上下文
-                evaluator.set_row_context(row_context)
+        启用优化时，公式中的公共子表达式替换为隐藏列（整列只计算一次，见 app.engine.optimizer）；
+        公共子表达式有行级错误时按原公式计算。
+        """
+        if self._plan is None:
+            return self._evaluate_formula_column(table, op.formula)
+
+        position = self._plan.position(op)
+        formula, shared = self._plan.formula_for(op)
+        if shared:
+            shared_table = self._with_shared_columns(table, formula, shared)
+            if shared_table is None:
+                formula = op.formula
+            else:
+                table = shared_table
 
-                try:
-                    value = evaluator.evaluate(op.formula)
-                    column_values.append(value)
-                except Exception as e:
-                    column_values.append(ExcelError("#ERROR"))
-                    row_errors.append(f"行 {row_idx + 2}: {str(e)}")
+        try:
+            return self._evaluate_formula_column(table, formula, position)
+        finally:
+            # 最后一次使用后释放公共子表达式的结果
+            with self._optimizer_lock:
+                for item in shared:
+                    if item.last_use <= position:
+                        self._shared_columns.pop(item.name, None)
+
+    def _with_shared_columns(
+        self,
+        table: Table,
+        formula: Any,
+        shared: List[SharedSubexpression],
+    ) -> Optional[Table]:
+        """
+        返回附加了公共子表达式隐藏列的表视图（不修改原表）
 
-            # 构建结果
-            result = OperationResult(operation=op, value=column_values)
+        视图只包含公式引用的列和隐藏列。
+        首次使用时整列计算公共子表达式；任一公共子表达式有行级错误时返回 None。
+        """
+        columns = expression_columns(formula)
+        for item in shared:
+            columns |= expression_columns(item.expr)
+        data = table.get_data(columns=columns)
+        for item in shared:
+            with self._optimizer_lock:
+                computed = item.name in self._shared_columns
+                column = self._shared_columns.get(item.name)
+            if not computed:
+                values, row_errors = self._evaluate_formula_column(table, item.expr, item.first_use)
+                column = None if row_errors else _shared_column(values, data.index)
+                with self._optimizer_lock:
+                    self._shared_columns[item.name] = column
+                    if column is not None:
+                        self._rewrites.append(
+                            Rewrite("cse", item.first_use, describe(item.expr), item.occurrences)
+                        )
+            if column is None:
+                return None
+            data[item.name] = column
+        return Table(name=table.name, data=data)
+
+    def _evaluate_formula_column(
+        self,
+        table: Table,
+        formula: Any,
+        position: Optional[int] = None,
+    ) -> Tuple[List[Any], List[str]]:
+        """
+        对表的每一行计算公式
 
-            # 如果有行级错误，记录到 error 字段
-            if row_errors:
-                max_display = 5
-                error_summary = "; ".join(row_errors[:max_display])
-                if len(row_errors) > max_display:
-                    error_summary += f" (共 {len(row_errors)} 个错误)"
-                result.error = f"部分行计算失败: {error_summary}"
+        默认使用向量化编译器整列求值；vectorize=False 时使用逐行解释。
+        两种方式的结果和行级错误完全一致。
+        启用优化时先折叠与当前行无关的子树（见 app.engine.optimizer.fold_formula）。
 
-            return result
+        Args:
+            table: 公式所在的表
+            formula: 公式
+            position: 操作序号（用于记录改写报告）
 
-        except Exception as e:
-            return OperationResult(operation=op, error=str(e))
+        Returns:
+            (每行的值, 行级错误列表)
+        """
+        evaluator = FormulaEvaluator(
+            tables=self.tables,
+            functions=ROW_FUNC_MAP,
+            variables=self.variables,
+            index_cache=self.index_cache,
+            governor=self.governor,
+        )
+
+        if self.optimize:
+            formula, folded = fold_formula(formula, evaluator)
+            if folded and position is not None:
+                with self._optimizer_lock:
+                    self._rewrites.extend(
+                        Rewrite(kind, position, describe(expr)) for kind, expr in folded
+                    )
+
+        if self.vectorize:
+            return VectorizedFormula(formula, table, evaluator).evaluate()
+
+        return self._evaluate_formula_rows(table, formula, evaluator)
+
+    @staticmethod
+    def _evaluate_formula_rows(
+        table: Table,
+        formula: Any,
+        evaluator: FormulaEvaluator,
+    ) -> Tuple[List[Any], List[str]]:
+        """
+        逐行计算公式（向量化编译器的参照实现）
+
+        公式先编译为闭包树（见 app.engine.row_compiler），每行只取公式引用的列。
+        每 CHECK_ROWS 行按公式节点数计入求值次数（见 ResourceGovernor.charge）。
+        """
+        row_count = table.row_count()
+        compiled = evaluator.compile(formula, table.get_columns())
+        governor = evaluator.governor
+        size = formula_size(formula)
+
+        # 只取公式引用的列
+        column_data = [table.get_column(col_name) for col_name in compiled.columns]
+        rows = zip(*column_data) if column_data else repeat((), row_count)
+        fn = compiled.fn
+
+        column_values = []
+        row_errors = []
+
+        # 为每一行计算值
+        for row_idx, row in enumerate(rows):
+            if not row_idx % CHECK_ROWS:
+                governor.charge(min(CHECK_ROWS, row_count - row_idx) * size)
+            try:
+                column_values.append(fn(row))
+            except ExecutionAborted:
+                raise
+            except Exception as e:
+                column_values.append(ExcelError("#ERROR"))
+                row_errors.append(f"行 {row_idx + 2}: {str(e)}")
+
+        return column_values, row_errors
+
+    @staticmethod
+    def _build_column_result(op: Operation, column_values: List[Any], row_errors: List[str]) -> OperationResult:
+        """构建列计算结果，有行级错误时记录到 error 字段"""
+        result = OperationResult(operation=op, value=column_values)
+
+        if row_errors:
+            max_display = 5
+            error_summary = "; ".join(row_errors[:max_display])
+            if len(row_errors) > max_display:
+                error_summary += f" (共 {len(row_errors)} 个错误)"
+            result.error = f"部分行计算失败: {error_summary}"
+
+        return result
 
     def _execute_compute(self, op: ComputeOperation) -> OperationResult:
         """
@@ -743,6 +895,8 @@ class Executor:
                 tables=self.tables,
                 functions=SCALAR_FUNC_MAP,
                 variables=self.variables,  # 支持变量引用
+                index_cache=self.index_cache,
+                governor=self.governor,
             )
             value = evaluator.evaluate(op.expression)
 
@@ -762,6 +916,7 @@ class Executor:
         try:
             table = self.tables.get_table(op.file_id, op.table)
             df = table.get_data()
+            self.governor.charge(len(df) * max(1, len(op.conditions)))
 
             # 构建筛选条件
             conditions = []
@@ -775,7 +930,9 @@ class Executor:
                     evaluator = FormulaEvaluator(
                         tables=self.tables,
                         functions=ROW_FUNC_MAP,
-                        variables=self.variables  # 传入变量上下文
+                        variables=self.variables,  # 传入变量上下文
+                        index_cache=self.index_cache,
+                        governor=self.governor,
                     )
                     value = evaluator.evaluate(raw_value)
                 else:
@@ -806,16 +963,18 @@ class Executor:
                             conditions.append(col_numeric <= value)
                     else:
                         # value 是字符串，进行字符串比较
+                        # 空值（None / NaN / pd.NA）转为字符串后是 "None" / "nan" / "<NA>"，不参与比较
+                        present = col_data.notna()
                         col_str = col_data.astype(str)
                         value_str = str(value)
                         if operator == ">":
-                            conditions.append(col_str > value_str)
+                            conditions.append(present & (col_str > value_str))
                         elif operator == "<":
-                            conditions.append(col_str < value_str)
+                            conditions.append(present & (col_str < value_str))
                         elif operator == ">=":
-                            conditions.append(col_str >= value_str)
+                            conditions.append(present & (col_str >= value_str))
                         elif operator == "<=":
-                            conditions.append(col_str <= value_str)
+                            conditions.append(present & (col_str <= value_str))
                 elif operator == "=":
                     # 等于比较：尝试类型转换后比较
                     if isinstance(value, (int, float)):
@@ -826,9 +985,13 @@ class Executor:
                     else:
                         conditions.append(col_data == value)
                 elif operator == "<>":
-                    conditions.append(col_data != value)
+                    # 可空类型列的空值比较结果为 NA，视为不等于（与 NaN 行为一致）
+                    conditions.append((col_data != value).fillna(True))
                 elif operator == "contains":
-                    conditions.append(col_data.astype(str).str.contains(str(value), na=False))
+                    # 空值不包含任何文本（转为字符串后的 "None" / "<NA>" 不应被匹配）
+                    conditions.append(
+                        col_data.notna() & col_data.astype(str).str.contains(str(value), na=False)
+                    )
                 else:
                     return OperationResult(
                         operation=op,
@@ -848,7 +1011,8 @@ class Executor:
                 for c in conditions[1:]:
                     combined = combined | c
 
-            # 应用筛选
+            # 应用筛选（可空类型列的比较结果可能含 NA，视为不满足条件）
+            combined = combined.fillna(False).astype(bool)
             filtered_df = df[combined].reset_index(drop=True)
 
             # 确定输出
@@ -879,7 +1043,8 @@ class Executor:
         """
         try:
             table = self.tables.get_table(op.file_id, op.table)
-            df = table.get_data().copy()  # 复制一份，避免修改原数据
+            df = table.get_data()  # Copy-on-Write 快照，添加辅助列不会修改原数据
+            self.governor.charge(len(df) * max(1, len(op.by)))
 
             # 构建排序参数
             sort_columns = []
@@ -921,11 +1086,13 @@ class Executor:
                     ascending=sort_ascending
                 ).reset_index(drop=True)
             except TypeError as e:
-                # 如果还是报类型错误，回退到字符串排序
-                for col in sort_columns:
+                # 如果还是报类型错误，回退到按字符串排序
+                # 使用辅助列，原列的值不变；空值保持为空，排在最后（而不是按 "None" / "nan" 参与排序）
+                for i, col in enumerate(sort_columns):
                     if col.startswith("_sort_"):
                         continue
-                    df[col] = df[col].astype(str)
+                    df[f"_sort_{col}"] = df[col].astype(str).where(df[col].notna())
+                    sort_columns[i] = f"_sort_{col}"
                 sorted_df = df.sort_values(
                     by=sort_columns,
                     ascending=sort_ascending
@@ -964,7 +1131,10 @@ class Executor:
         """
         try:
             table = self.tables.get_table(op.file_id, op.table)
-            df = table.get_data()
+            df = table.get_data(
+                columns=[*op.group_columns, *(agg.get("column") for agg in op.aggregations)]
+            )
+            self.governor.charge(len(df) * (len(op.group_columns) + len(op.aggregations)))
 
             # 验证分组列
             for col in op.group_columns:
@@ -1146,7 +1316,7 @@ class Executor:
         """
         try:
             table = self.tables.get_table(op.file_id, op.table)
-            df = table.get_data()
+            df = table.get_data(columns=op.columns)
 
             missing = [col for col in op.columns if col not in df.columns]
             if missing:
@@ -1155,7 +1325,7 @@ class Executor:
                     error=f"列不存在: {', '.join(missing)}"
                 )
 
-            result_df = df.loc[:, op.columns].copy().reset_index(drop=True)
+            result_df = df.loc[:, op.columns].reset_index(drop=True)
 
             output_type = op.output.get("type", "in_place") if op.output else "in_place"
             if output_type == "new_sheet":
@@ -1200,7 +1370,7 @@ class Executor:
                     error="删除列后表为空，请调整 columns"
                 )
 
-            result_df = df.loc[:, keep_columns].copy().reset_index(drop=True)
+            result_df = df.loc[:, keep_columns].reset_index(drop=True)
 
             output_type = op.output.get("type", "in_place") if op.output else "in_place"
             if output_type == "new_sheet":
@@ -1222,7 +1392,35 @@ class Executor:
             return OperationResult(operation=op, error=str(e))
 
 
-def execute_operations(operations: List[Operation], tables: FileCollection) -> ExecutionResult:
+def _shared_column(values: List[Any], index: pd.Index) -> pd.Series:
+    """
+    公共子表达式结果转为隐藏列
+
+    读取时需要得到与计算结果完全相同的 Python 值：同类型且无空值的数值 / 布尔结果
+    使用原生类型，其他情况使用 object（保留 None 与 NaN 的区别、int 与 float 的区别）。
+    """
+    value_types = {type(value) for value in values}
+    dtype: Any = object
+    if value_types == {float} and not any(value != value for value in values):
+        dtype = np.float64
+    elif value_types == {int} and all(-(2 ** 63) <= value < 2 ** 63 for value in values):
+        dtype = np.int64
+    elif value_types == {bool}:
+        dtype = bool
+    return pd.Series(values, index=index, dtype=dtype)
+
+
+def execute_operations(
+    operations: List[Operation],
+    tables: FileCollection,
+    vectorize: bool = True,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    cache: Optional[OperationCache] = None,
+    optimize: bool = True,
+    governor: Optional[ResourceGovernor] = None,
+) -> ExecutionResult:
     """执行操作的便捷函数"""
-    executor = Executor(tables)
+    executor = Executor(
+        tables, vectorize=vectorize, max_workers=max_workers, cache=cache, optimize=optimize, governor=governor
+    )
     return executor.execute(operations)
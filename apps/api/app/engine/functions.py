@@ -1,8 +1,16 @@
-"""函数库 - 实现聚合函数和行级函数"""
+"""函数库 - 实现聚合函数和行级函数
+
+聚合函数有两套实现：标量实现（参数为 Python 值列表，作为参照实现）和
+向量化实现（参数为列数组，执行引擎使用），两者结果一致。
+"""
 
 import math
-from typing import Any, Union
-from app.engine.models import Range, ExcelError
+import operator
+from typing import Any, Callable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from app.engine.models import ColumnArray, Range, ExcelError
 
 
 # ==================== 辅助函数 ====================
@@ -250,6 +258,305 @@ def AVERAGEIF(
     return total / count
 
 
+# ==================== 向量化聚合函数 ====================
+#
+# 与上面的标量实现（参照实现）结果一致，但直接在列数组上运算：
+# - 列数据来自 Table.get_column_masked()：原生类型数组 + 空值掩码，
+#   float 列的 NaN、可空整数 / 布尔列的空值都由掩码标记
+# - 条件字符串只解析一次（compile_criteria），数值列上按整列比较
+# - object 列（混合类型）逐元素处理，规则与标量实现相同
+
+# float64 可精确表示的整数范围，超出时比较回退到逐元素
+_EXACT_INT = 2 ** 53
+
+# 比较条件前缀（顺序与 _match_condition 一致：先匹配两字符前缀）
+_CRITERIA_PREFIXES = (">=", "<=", "<>", ">", "<")
+
+# 数值比较（同时用于 Python 值和整列数组）
+_COMPARE_OPERATORS = {
+    ">=": operator.ge,
+    "<=": operator.le,
+    ">": operator.gt,
+    "<": operator.lt,
+}
+
+
+def _as_objects(column: ColumnArray) -> List[Any]:
+    """列数组还原为 Python 值列表（与 Table.get_column() 一致，空值为 None）"""
+    values, blank = column
+    items = values.tolist()
+    if blank is not None:
+        for i in np.flatnonzero(blank).tolist():
+            items[i] = None
+    return items
+
+
+def _select(column: ColumnArray, mask: np.ndarray) -> ColumnArray:
+    """按布尔掩码取出部分行"""
+    values, blank = column
+    return values[mask], (None if blank is None else blank[mask])
+
+
+def _valid_numbers(column: ColumnArray) -> Optional[np.ndarray]:
+    """
+    原生类型列中的有效数值（排除空值、NaN、bool，与 _is_valid_number 一致）
+
+    Returns:
+        有效数值数组；object 列返回 None（由调用方使用标量实现）
+    """
+    values, blank = column
+    kind = values.dtype.kind
+    if kind == "O":
+        return None
+    if kind == "b":
+        return np.empty(0, dtype=np.float64)
+    valid = ~np.isnan(values) if kind == "f" else None
+    if blank is not None:
+        valid = ~blank if valid is None else valid & ~blank
+    return values if valid is None else values[valid]
+
+
+def _sum_numbers(nums: np.ndarray) -> float:
+    """
+    有效数值求和
+
+    整数的部分和都在 float64 精确范围内时按整数求和（与逐个累加的结果相同），
+    超出时按标量实现逐个累加。
+    """
+    if nums.dtype.kind in "iu" and len(nums):
+        if max(-int(nums.min()), int(nums.max())) * len(nums) > _EXACT_INT:
+            return SUM(nums.tolist())
+        return float(nums.sum())
+    return float(nums.sum(dtype=np.float64))
+
+
+def vector_sum(column: ColumnArray) -> float:
+    """求和（SUM 的向量化实现）"""
+    nums = _valid_numbers(column)
+    if nums is None:
+        return SUM(column[0].tolist())
+    return _sum_numbers(nums)
+
+
+def vector_count(column: ColumnArray) -> int:
+    """计数（COUNT 的向量化实现）"""
+    nums = _valid_numbers(column)
+    if nums is None:
+        return COUNT(column[0].tolist())
+    return len(nums)
+
+
+def vector_counta(column: ColumnArray) -> int:
+    """非空计数（COUNTA 的向量化实现）"""
+    values, blank = column
+    if values.dtype.kind == "O":
+        return COUNTA(values.tolist())
+    empty = np.isnan(values) if values.dtype.kind == "f" else None
+    if blank is not None:
+        empty = blank if empty is None else empty | blank
+    return len(values) - (0 if empty is None else int(np.count_nonzero(empty)))
+
+
+def vector_average(column: ColumnArray) -> Union[float, ExcelError]:
+    """平均值（AVERAGE 的向量化实现）"""
+    nums = _valid_numbers(column)
+    if nums is None:
+        return AVERAGE(column[0].tolist())
+    if len(nums) == 0:
+        return ExcelError("#DIV/0!")
+    return _sum_numbers(nums) / len(nums)
+
+
+def vector_min(column: ColumnArray) -> Union[float, ExcelError]:
+    """最小值（MIN 的向量化实现）"""
+    nums = _valid_numbers(column)
+    if nums is None:
+        return MIN(column[0].tolist())
+    if len(nums) == 0:
+        return ExcelError("#VALUE!")
+    return nums.min().item()
+
+
+def vector_max(column: ColumnArray) -> Union[float, ExcelError]:
+    """最大值（MAX 的向量化实现）"""
+    nums = _valid_numbers(column)
+    if nums is None:
+        return MAX(column[0].tolist())
+    if len(nums) == 0:
+        return ExcelError("#VALUE!")
+    return nums.max().item()
+
+
+def vector_median(column: ColumnArray) -> Union[float, ExcelError]:
+    """中位数（MEDIAN 的向量化实现，部分排序取中间值）"""
+    nums = _valid_numbers(column)
+    if nums is None:
+        return MEDIAN(column[0].tolist())
+    n = len(nums)
+    if n == 0:
+        return ExcelError("#VALUE!")
+    mid = n // 2
+    if n % 2 == 0:
+        lower, upper = np.partition(nums, (mid - 1, mid))[mid - 1:mid + 1].tolist()
+        return (lower + upper) / 2
+    return np.partition(nums, mid)[mid].item()
+
+
+def _parse_criteria(condition: Any) -> Tuple[str, Any]:
+    """
+    解析条件（规则与 _match_condition 一致）
+
+    Returns:
+        (类型, 操作数)，类型为：
+        - "eq": 数值精确匹配
+        - ">=" / "<=" / ">" / "<": 数值比较（仅数值参与）
+        - "<>": 与数值不相等（任意类型参与）
+        - "ne_text" / "text": 文本不相等 / 相等（比较 str(value)）
+        - "never": 不匹配任何值
+    """
+    if isinstance(condition, (int, float)):
+        return "eq", condition
+    if not isinstance(condition, str):
+        return "never", None
+
+    condition = condition.strip()
+    for prefix in _CRITERIA_PREFIXES:
+        if condition.startswith(prefix):
+            operand = condition[len(prefix):]
+            try:
+                return prefix, float(operand)
+            except ValueError:
+                return ("ne_text", operand) if prefix == "<>" else ("never", None)
+    return "text", condition
+
+
+def _criteria_matcher(kind: str, operand: Any) -> Callable[[Any], bool]:
+    """已解析条件的逐元素匹配函数（用于 object 列）"""
+    if kind == "eq":
+        return lambda value: bool(value == operand)
+    if kind in _COMPARE_OPERATORS:
+        compare = _COMPARE_OPERATORS[kind]
+        return lambda value: isinstance(value, (int, float)) and compare(value, operand)
+    if kind == "<>":
+        return lambda value: bool(value != operand)
+    if kind == "ne_text":
+        return lambda value: str(value) != operand
+    if kind == "text":
+        return lambda value: str(value) == operand
+    return lambda value: False
+
+
+def _text_equals(values: np.ndarray, text: str) -> np.ndarray:
+    """原生类型数组中 str(value) == text 的位置（不含空值处理）"""
+    if values.dtype.kind == "b":
+        if text == "True":
+            return values.copy()
+        if text == "False":
+            return ~values
+        return np.zeros(len(values), dtype=bool)
+
+    # 数值的 str() 总能被 float() 解析：先按数值筛出候选，再核对文本表示
+    try:
+        num = float(text)
+    except ValueError:
+        return np.zeros(len(values), dtype=bool)
+    if values.dtype.kind == "f" and num != num:
+        candidates = np.isnan(values)
+    else:
+        candidates = values == num
+    if not candidates.any():
+        return candidates
+    if values.dtype.kind == "f" and num == 0:
+        # 0.0 与 -0.0 相等但文本不同
+        return candidates & np.where(np.signbit(values), str(-0.0) == text, str(0.0) == text)
+    representative = values[np.argmax(candidates)].item()
+    return candidates if str(representative) == text else np.zeros(len(values), dtype=bool)
+
+
+def compile_criteria(condition: Union[str, int, float]) -> Callable[[ColumnArray], np.ndarray]:
+    """
+    将条件编译为向量化谓词（条件只解析一次，匹配规则与 _match_condition 一致）
+
+    Args:
+        condition: 条件，如 "已完成"、100、">=100"、"<>0"
+
+    Returns:
+        接收列数组、返回布尔掩码（每行是否匹配）的函数
+    """
+    kind, operand = _parse_criteria(condition)
+    matcher = _criteria_matcher(kind, operand)
+    blank_matches = matcher(None)
+
+    def predicate(column: ColumnArray) -> np.ndarray:
+        values, blank = column
+        n = len(values)
+        if kind == "never":
+            return np.zeros(n, dtype=bool)
+        if not _is_exact_native(values, kind, operand):
+            return np.fromiter(map(matcher, _as_objects(column)), dtype=bool, count=n)
+
+        if kind == "eq":
+            matched = values == operand
+        elif kind in _COMPARE_OPERATORS:
+            matched = _COMPARE_OPERATORS[kind](values, operand)
+        elif kind == "<>":
+            matched = values != operand
+        elif kind == "text":
+            matched = _text_equals(values, operand)
+        else:
+            matched = ~_text_equals(values, operand)
+
+        if blank is not None:
+            matched = np.where(blank, blank_matches, matched)
+        return matched
+
+    return predicate
+
+
+def _is_exact_native(values: np.ndarray, kind: str, operand: Any) -> bool:
+    """能否在原生类型数组上整列比较（结果与逐元素的 Python 比较完全一致）"""
+    if values.dtype.kind == "O":
+        return False
+    if kind == "eq" and isinstance(operand, int) and not -_EXACT_INT <= operand <= _EXACT_INT:
+        return False
+    if values.dtype.kind in "iu" and len(values):
+        # 整数转 float64 比较时超出精确范围会丢失精度
+        return -_EXACT_INT <= int(values.min()) and int(values.max()) <= _EXACT_INT
+    return True
+
+
+def vector_sumif(
+    sum_column: ColumnArray,
+    criteria_column: ColumnArray,
+    criteria: Union[str, int, float]
+) -> float:
+    """条件求和（SUMIF 的向量化实现）"""
+    if len(sum_column[0]) != len(criteria_column[0]):
+        raise ValueError("sum_range 和 criteria_range 长度不匹配")
+    matched = compile_criteria(criteria)(criteria_column)
+    return vector_sum(_select(sum_column, matched))
+
+
+def vector_countif(
+    criteria_column: ColumnArray,
+    criteria: Union[str, int, float]
+) -> int:
+    """条件计数（COUNTIF 的向量化实现）"""
+    return int(np.count_nonzero(compile_criteria(criteria)(criteria_column)))
+
+
+def vector_averageif(
+    avg_column: ColumnArray,
+    criteria_column: ColumnArray,
+    criteria: Union[str, int, float]
+) -> Union[float, ExcelError]:
+    """条件平均（AVERAGEIF 的向量化实现）"""
+    if len(avg_column[0]) != len(criteria_column[0]):
+        raise ValueError("avg_range 和 criteria_range 长度不匹配")
+    matched = compile_criteria(criteria)(criteria_column)
+    return vector_average(_select(avg_column, matched))
+
+
 # ==================== 行级函数 ====================
 
 
@@ -632,6 +939,20 @@ AGGREGATE_FUNC_MAP = {
     "AVERAGEIF": AVERAGEIF,
 }
 
+# 向量化实现（参数为 Table.get_column_masked() 返回的列数组）
+VECTOR_AGGREGATE_FUNC_MAP = {
+    "SUM": vector_sum,
+    "COUNT": vector_count,
+    "COUNTA": vector_counta,
+    "AVERAGE": vector_average,
+    "MIN": vector_min,
+    "MAX": vector_max,
+    "MEDIAN": vector_median,
+    "SUMIF": vector_sumif,
+    "COUNTIF": vector_countif,
+    "AVERAGEIF": vector_averageif,
+}
+
 # ==================== 行级函数字典 ====================
 
 ROW_FUNC_MAP = {
@@ -0,0 +1,261 @@
+"""执行资源控制 - 单次请求的时间、内存和计算量预算，以及取消
+
+一个低效的计划（如对 10 万行逐行做线性扫描的 COUNTIFS）可能让工作线程持续计算几分钟，
+Executor 本身没有办法中途停止。ResourceGovernor 为一次执行设置预算，由执行过程协作检查：
+
+- 时间：从开始执行起的墙上时间
+- 内存：本次执行创建的数据（新增 / 更新的列、新建的 Sheet）占用的内存，在操作结果应用到表之前计入；
+  不使用进程常驻内存，同一进程中并发的请求和内存映射的缓存页不会计入本次执行
+- 计算量：行 × 表达式的求值次数（整列求值时每个节点按行数计，线性扫描按扫描的行数计）
+
+操作之间、整列求值的每个节点和逐行循环中定期检查（见 Executor、VectorizedFormula），
+超出预算或被取消（如客户端断开）后抛出 ExecutionAborted，之后的所有检查都会立即抛出同样的错误，
+正在执行的操作和尚未开始的操作都会尽快结束。
+"""
+
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+from app.core.config import settings
+
+# 逐行循环中每隔多少行检查一次（时间、取消）
+CHECK_ROWS = 4096
+
+
+class ExecutionAborted(Exception):
+    """执行被中止（超出预算或被取消）"""
+
+    code = "aborted"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """结构化的错误信息（记录在 ExecutionResult.aborted 中，供重新生成计划时参考）"""
+        return {"code": self.code, "message": str(self)}
+
+
+class ExecutionCancelled(ExecutionAborted):
+    """执行被取消（如客户端已断开）"""
+
+    code = "cancelled"
+
+    def __init__(self):
+        super().__init__("执行已取消")
+
+
+class BudgetExceeded(ExecutionAborted):
+    """
+    执行超出资源预算
+
+    Attributes:
+        resource: 超出的资源（time / memory / row_evaluations）
+        limit: 预算
+        used: 超出时的用量
+    """
+
+    code = "budget_exceeded"
+
+    def __init__(self, resource: str, limit: float, used: float):
+        self.resource = resource
+        self.limit = limit
+        self.used = used
+        super().__init__(self._describe())
+
+    def _describe(self) -> str:
+        if self.resource == "time":
+            reason = f"执行超时：超过 {self.limit:g} 秒的时间预算"
+        elif self.resource == "memory":
+            reason = f"内存超限：执行创建的数据超过 {self.limit / 1024 ** 2:.0f}MB"
+        else:
+            reason = f"计算量超限：逐行求值次数超过 {int(self.limit):,}"
+        return (
+            f"{reason}。请改用更高效的操作，如用 group_by 或聚合代替逐行 COUNTIFS / 线性查找，"
+            "先 filter 缩小数据范围再计算"
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**super().to_dict(), "resource": self.resource, "limit": self.limit, "used": self.used}
+
+
+@dataclass
+class ExecutionBudget:
+    """
+    单次执行的资源预算（None 表示不限制）
+
+    Attributes:
+        max_seconds: 墙上时间（秒）
+        max_memory_bytes: 执行创建的数据占用的内存
+        max_row_evaluations: 行 × 表达式的求值次数
+    """
+
+    max_seconds: Optional[float] = None
+    max_memory_bytes: Optional[int] = None
+    max_row_evaluations: Optional[int] = None
+
+    @classmethod
+    def from_settings(cls) -> "ExecutionBudget":
+        """按配置（EXECUTION_TIMEOUT_SECONDS / EXECUTION_MAX_MEMORY_MB / EXECUTION_MAX_ROW_EVALUATIONS）创建"""
+        return cls(
+            max_seconds=settings.EXECUTION_TIMEOUT_SECONDS or None,
+            max_memory_bytes=settings.EXECUTION_MAX_MEMORY_MB * 1024 * 1024 or None,
+            max_row_evaluations=settings.EXECUTION_MAX_ROW_EVALUATIONS or None,
+        )
+
+
+class ResourceGovernor:
+    """
+    单次执行的资源控制（线程安全，并发执行的操作共用）
+
+    用法：
+        governor = ResourceGovernor(ExecutionBudget.from_settings())
+        executor = Executor(tables, governor=governor)
+        # 另一个线程中（如客户端断开时）
+        governor.cancel()
+
+    Args:
+        budget: 资源预算（None 表示不限制，只响应取消）
+        cancel_event: 取消信号（设置后下一次检查时中止；None 时自建，用 cancel() 设置）
+    """
+
+    def __init__(self, budget: Optional[ExecutionBudget] = None, cancel_event: Optional[threading.Event] = None):
+        self.budget = budget or ExecutionBudget()
+        self._cancel_event = cancel_event or threading.Event()
+        self._lock = threading.Lock()
+        self._started: Optional[float] = None
+        self._next_check = CHECK_ROWS
+        self._aborted: Optional[Dict[str, Any]] = None
+
+        # 用量统计
+        self.row_evaluations = 0
+        self.memory_bytes = 0
+
+    def start(self):
+        """开始计时（多次调用时以第一次为准）"""
+        with self._lock:
+            if self._started is None:
+                self._started = time.monotonic()
+
+    def cancel(self):
+        """取消执行（正在进行的计算在下一次检查时中止）"""
+        self._cancel_event.set()
+
+    @property
+    def aborted(self) -> Optional[Dict[str, Any]]:
+        """中止原因（结构化，见 ExecutionAborted.to_dict），未中止时为 None"""
+        return self._aborted
+
+    def check(self):
+        """
+        检查取消和时间
+
+        Raises:
+            ExecutionAborted: 已被取消或超出预算
+        """
+        if self._aborted is not None:
+            raise self._error()
+        if self._cancel_event.is_set():
+            self._abort(ExecutionCancelled())
+        if self._started is None:
+            return
+
+        now = time.monotonic()
+        budget = self.budget
+        if budget.max_seconds is not None and now - self._started > budget.max_seconds:
+            self._abort(BudgetExceeded("time", budget.max_seconds, round(now - self._started, 3)))
+
+    def charge(self, evaluations: int):
+        """
+        计入求值次数（每累计 CHECK_ROWS 次同时检查时间和取消）
+
+        Raises:
+            ExecutionAborted: 已被取消或超出预算
+        """
+        with self._lock:
+            self.row_evaluations += evaluations
+            used = self.row_evaluations
+            due = used >= self._next_check
+            if due:
+                self._next_check = used + CHECK_ROWS
+
+        limit = self.budget.max_row_evaluations
+        if limit is not None and used > limit:
+            self._abort(BudgetExceeded("row_evaluations", limit, used))
+        if due or self._aborted is not None:
+            self.check()
+
+    def charge_memory(self, nbytes: int):
+        """
+        计入本次执行创建的数据占用的内存（操作结果应用到表之前调用，见 data_bytes）
+
+        Raises:
+            ExecutionAborted: 已被取消或超出预算
+        """
+        with self._lock:
+            self.memory_bytes += nbytes
+            used = self.memory_bytes
+
+        limit = self.budget.max_memory_bytes
+        if limit is not None and used > limit:
+            self._abort(BudgetExceeded("memory", limit, used))
+        self.check()
+
+    def raise_if_aborted(self):
+        """已中止时抛出（操作内部把异常当作普通错误处理时，由调用方在操作结束后调用）"""
+        if self._aborted is not None:
+            raise self._error()
+
+    def usage(self) -> Dict[str, Any]:
+        """
+        资源用量
+
+        Returns:
+            {"elapsed_ms", "row_evaluations", "memory_mb"}
+        """
+        elapsed = time.monotonic() - self._started if self._started is not None else 0.0
+        return {
+            "elapsed_ms": round(elapsed * 1000, 1),
+            "row_evaluations": self.row_evaluations,
+            "memory_mb": round(self.memory_bytes / 1024 ** 2, 1),
+        }
+
+    def _abort(self, error: ExecutionAborted):
+        """记录第一个中止原因并抛出"""
+        with self._lock:
+            if self._aborted is None:
+                self._aborted = error.to_dict()
+        raise self._error()
+
+    def _error(self) -> ExecutionAborted:
+        """按记录的中止原因创建异常（每次抛出新的实例，多个线程互不影响）"""
+        aborted = self._aborted
+        if aborted["code"] == BudgetExceeded.code:
+            return BudgetExceeded(aborted["resource"], aborted["limit"], aborted["used"])
+        return ExecutionCancelled()
+
+
+def formula_size(expr: Any) -> int:
+    """公式的节点数（逐行求值时每行按节点数计入求值次数）"""
+    if isinstance(expr, dict):
+        return 1 + sum(formula_size(value) for value in expr.values() if isinstance(value, (dict, list)))
+    if isinstance(expr, list):
+        return sum(formula_size(item) for item in expr)
+    return 0
+
+
+def data_bytes(data: Any) -> int:
+    """
+    操作结果占用的内存
+
+    DataFrame / Series 按 memory_usage(deep=True) 计算；列值列表按应用到表后的列估算
+    （每行 8 字节，文本另加字符串本身的大小）。
+    """
+    if isinstance(data, pd.DataFrame):
+        return int(data.memory_usage(deep=True).sum())
+    if isinstance(data, pd.Series):
+        return int(data.memory_usage(deep=True))
+    if isinstance(data, (list, tuple)):
+        return 8 * len(data) + sum(sys.getsizeof(value) for value in data if type(value) is str)
+    return 0
@@ -1,10 +1,15 @@
-"""LLM 客户端模块 - 负责与 OpenAI API 交互，支持两步流程"""
+"""LLM 客户端模块 - 负责与 OpenAI API 交互，支持两步流程
+
+需求分析和生成操作都有同步和异步两个版本：同步版本使用 OpenAI 客户端（在线程中调用），
+异步版本使用 AsyncOpenAI 客户端，直接在事件循环上读取流式响应，不占用线程。
+"""
 
 import logging
 import os
-import asyncio
+from contextlib import aclosing
 from typing import Optional, Dict, List, Generator, Tuple, AsyncGenerator
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
+from app.engine.llm_pool import get_llm_pool
 from app.engine.prompt import (
     get_analysis_prompt_with_schema,
     get_generation_prompt_with_context,
@@ -41,11 +46,15 @@ class LLMClient:
         if not self.api_key:
             raise ValueError("未设置 OPENAI_API_KEY 环境变量")
 
-        client_kwargs = {"api_key": self.api_key}
-        if self.base_url:
-            client_kwargs["base_url"] = self.base_url
+    @property
+    def client(self) -> OpenAI:
+        """同步客户端（进程内按 base_url + API Key 共享连接池）"""
+        return get_llm_pool().get_sync(self.base_url, self.api_key)
 
-        self.client = OpenAI(**client_kwargs)
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        """异步客户端（当前事件循环上按 base_url + API Key 共享连接池，需在协程中使用）"""
+        return get_llm_pool().get_async(self.base_url, self.api_key)
 
     def _call_llm(self, system_prompt: str, user_message: str) -> str:
         """
@@ -58,25 +67,38 @@ class LLMClient:
         Returns:
             LLM 响应内容
         """
+        messages = self._build_messages(system_prompt, user_message)
+        self._log_request("非流式", messages)
 
-        log_msg = (
-            "\n"
-            "[LLM 调用] 非流式\n"
-            f"[模型] {self.model}\n"
-            "[System Prompt]\n"
-            f"{system_prompt}\n"
-            "[User Message]\n"
-            f"{user_message}\n"
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=0,
+            extra_body={
+                "enable_thinking": False
+            }
         )
+        result = response.choices[0].message.content.strip()
 
-        logger.info(log_msg)
+        logger.info(f"\n[LLM 响应内容]\n{result}")
 
-        messages = [
-            { "role": "system", "content": system_prompt },
-            { "role": "user", "content": user_message }
-        ]
+        return result
 
-        response = self.client.chat.completions.create(
+    async def _call_llm_async(self, system_prompt: str, user_message: str) -> str:
+        """
+        调用 LLM（异步版本）
+
+        Args:
+            system_prompt: 系统提示词
+            user_message: 用户消息
+
+        Returns:
+            LLM 响应内容
+        """
+        messages = self._build_messages(system_prompt, user_message)
+        self._log_request("非流式", messages)
+
+        response = await self.async_client.chat.completions.create(
             model=self.model,
             messages=messages,
             temperature=0,
@@ -107,30 +129,8 @@ class LLMClient:
         Yields:
             Tuple[str, str]: (delta, full_content) - 增量内容和累积的完整内容
         """
-        # 构建消息列表
-        if messages:
-            # 多轮对话模式：使用传入的消息列表
-            full_messages = [{"role": "system", "content": system_prompt}] + messages
-        else:
-            # 简单模式：单条用户消息
-            full_messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message}
-            ]
-
-        # 打印提示词日志
-        log_msg = (
-            "\n"
-            "[LLM 调用] 流式\n"
-            f"[模型] {self.model}\n"
-            f"[消息数] {len(full_messages)}\n"
-            "[System Prompt]\n"
-            f"{system_prompt}\n"
-        )
-        for i, msg in enumerate(full_messages[1:], 1):
-            log_msg += f"[{msg['role'].upper()} #{i}]\n{msg['content']}\n"
-
-        logger.info(log_msg)
+        full_messages = self._build_messages(system_prompt, user_message, messages)
+        self._log_request("流式", full_messages)
 
         response = self.client.chat.completions.create(
             model=self.model,
@@ -151,44 +151,79 @@ class LLMClient:
 
         logger.info(f"\n[LLM 响应内容]\n{full_content}")
 
-    async def _call_llm_stream_async(self, system_prompt: str, user_message: str) -> AsyncGenerator[Tuple[str, str], None]:
+    async def _call_llm_stream_async(
+        self,
+        system_prompt: str,
+        user_message: Optional[str] = None,
+        messages: Optional[List[Dict[str, str]]] = None
+    ) -> AsyncGenerator[Tuple[str, str], None]:
         """
         流式调用 LLM（异步版本）
 
-        使用队列在后台线程和协程之间传递流式数据，避免阻塞事件循环。
+        使用 AsyncOpenAI 在事件循环上读取流式响应，每个增量直接交给调用方，
+        不经过线程和队列。调用方提前停止迭代时关闭响应连接。
 
         Args:
             system_prompt: 系统提示词
-            user_message: 用户消息
+            user_message: 用户消息（简单场景使用）
+            messages: 完整消息列表（多轮对话场景使用，不含 system）
 
         Yields:
             Tuple[str, str]: (delta, full_content) - 增量内容和累积的完整内容
         """
-        queue: asyncio.Queue[Tuple[str, str] | None | Exception] = asyncio.Queue()
-        loop = asyncio.get_running_loop()
-
-        def stream_in_thread():
-            """在后台线程中执行流式调用"""
-            try:
-                for item in self._call_llm_stream(system_prompt, user_message):
-                    # 使用 call_soon_threadsafe 安全地放入队列
-                    loop.call_soon_threadsafe(queue.put_nowait, item)
-                # 发送结束信号
-                loop.call_soon_threadsafe(queue.put_nowait, None)
-            except Exception as e:
-                loop.call_soon_threadsafe(queue.put_nowait, e)
-
-        # 在后台线程中启动流式调用
-        loop.run_in_executor(None, stream_in_thread)
-
-        # 从队列中读取数据
-        while True:
-            item = await queue.get()
-            if item is None:
-                break
-            if isinstance(item, Exception):
-                raise item
-            yield item
+        full_messages = self._build_messages(system_prompt, user_message, messages)
+        self._log_request("流式", full_messages)
+
+        response = await self.async_client.chat.completions.create(
+            model=self.model,
+            messages=full_messages,
+            temperature=0,
+            stream=True,
+            extra_body={
+                "enable_thinking": False
+            }
+        )
+
+        full_content = ""
+        try:
+            async for chunk in response:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    delta = chunk.choices[0].delta.content
+                    full_content += delta
+                    yield delta, full_content
+        finally:
+            await response.close()
+
+        logger.info(f"\n[LLM 响应内容]\n{full_content}")
+
+    def _build_messages(
+        self,
+        system_prompt: str,
+        user_message: Optional[str] = None,
+        messages: Optional[List[Dict[str, str]]] = None
+    ) -> List[Dict[str, str]]:
+        """构建完整消息列表（多轮对话时使用传入的消息列表，否则为单条用户消息）"""
+        if messages:
+            return [{"role": "system", "content": system_prompt}] + messages
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_message}
+        ]
+
+    def _log_request(self, mode: str, messages: List[Dict[str, str]]):
+        """打印提示词日志"""
+        log_msg = (
+            "\n"
+            f"[LLM 调用] {mode}\n"
+            f"[模型] {self.model}\n"
+            f"[消息数] {len(messages)}\n"
+            "[System Prompt]\n"
+            f"{messages[0]['content']}\n"
+        )
+        for i, msg in enumerate(messages[1:], 1):
+            log_msg += f"[{msg['role'].upper()} #{i}]\n{msg['content']}\n"
+
+        logger.info(log_msg)
 
     # ==================== 第一步：需求分析 ====================
 
@@ -211,6 +246,24 @@ class LLMClient:
         except Exception as e:
             raise RuntimeError(f"需求分析失败: {str(e)}") from e
 
+    async def analyze_requirement_async(self, user_requirement: str, table_schemas: Optional[Dict[str, Dict[str, str]]] = None) -> str:
+        """
+        第一步：分析用户需求（异步版本）
+
+        Args:
+            user_requirement: 用户的数据处理需求描述
+            table_schemas: 表结构信息
+
+        Returns:
+            需求分析结果（自然语言）
+        """
+        system_prompt = get_analysis_prompt_with_schema(table_schemas)
+
+        try:
+            return await self._call_llm_async(system_prompt, user_requirement)
+        except Exception as e:
+            raise RuntimeError(f"需求分析失败: {str(e)}") from e
+
     def analyze_requirement_stream(self, user_requirement: str, table_schemas: Optional[Dict[str, Dict[str, str]]] = None) -> Generator[Tuple[str, str], None, None]:
         """
         第一步：分析用户需求（流式输出，同步版本）
@@ -243,8 +296,9 @@ class LLMClient:
         system_prompt = get_analysis_prompt_with_schema(table_schemas)
 
         try:
-            async for item in self._call_llm_stream_async(system_prompt, user_requirement):
-                yield item
+            async with aclosing(self._call_llm_stream_async(system_prompt, user_requirement)) as stream:
+                async for item in stream:
+                    yield item
         except Exception as e:
             raise RuntimeError(f"需求分析失败: {str(e)}") from e
 
@@ -274,22 +328,42 @@ class LLMClient:
         system_prompt = get_generation_prompt_with_context(
             table_schemas, analysis_result
         )
+        user_message = self._build_generation_user_message(user_requirement, previous_errors, previous_json)
 
-        # 构建用户消息，包含原始需求
-        user_message = f"原始需求：{user_requirement}\n\n请根据上面的需求分析结果，生成 JSON 格式的操作描述。"
+        try:
+            result = self._call_llm(system_prompt, user_message)
+            return self._clean_json_response(result)
+        except Exception as e:
+            raise RuntimeError(f"生成操作描述失败: {str(e)}") from e
 
-        # 如果有之前的错误，添加到用户消息中
-        if previous_errors and previous_json:
-            user_message += "\n\n---\n\n"
-            user_message += "⚠️ 之前生成的 JSON 验证失败，请修正以下错误：\n\n"
-            user_message += f"之前的 JSON：\n```json\n{previous_json}\n```\n\n"
-            user_message += "验证错误：\n"
-            for error in previous_errors:
-                user_message += f"- {error}\n"
-            user_message += "\n请根据错误信息修正 JSON，确保所有字段名、表名、列名都正确。"
+    async def generate_operations_async(
+        self,
+        user_requirement: str,
+        analysis_result: str,
+        table_schemas: Optional[Dict[str, Dict[str, str]]] = None,
+        previous_errors: Optional[List[str]] = None,
+        previous_json: Optional[str] = None,
+    ) -> str:
+        """
+        第二步：根据需求分析生成操作描述（异步版本）
+
+        Args:
+            user_requirement: 原始用户需求
+            analysis_result: 第一步的分析结果
+            table_schemas: 表结构信息
+            previous_errors: 之前验证失败的错误列表（用于重试时提供上下文）
+            previous_json: 之前生成的 JSON（用于重试时提供上下文）
+
+        Returns:
+            JSON 格式的操作描述
+        """
+        system_prompt = get_generation_prompt_with_context(
+            table_schemas, analysis_result
+        )
+        user_message = self._build_generation_user_message(user_requirement, previous_errors, previous_json)
 
         try:
-            result = self._call_llm(system_prompt, user_message)
+            result = await self._call_llm_async(system_prompt, user_message)
             return self._clean_json_response(result)
         except Exception as e:
             raise RuntimeError(f"生成操作描述失败: {str(e)}") from e
@@ -314,105 +388,39 @@ class LLMClient:
 
         Yields:
             Tuple[str, str]: (delta, full_content) - 增量内容和累积的完整内容
-            最后一次 yield 的 full_content 会经过 _clean_json_response 清理
+            注意：调用方需要在最后对 full_content 调用 _clean_json_response
         """
         system_prompt = get_generation_prompt_with_context(
             table_schemas, analysis_result
         )
+        messages = self._build_generation_messages(
+            user_requirement, table_schemas, previous_errors, previous_json
+        )
 
-        def build_initial_user_message(
-            query: str,
-            table_schemas: Dict[str, Dict[str, str]],
-        ) -> str:
-            """
-            构建初始用户消息（包含表结构信息）
-
-            支持两种 schema 格式：
-            1. 简单格式（旧）: {file_id: {sheet_name: {col_letter: col_name}}}
-            2. 增强格式（新）: {file_id: {sheet_name: [{name, type, samples}, ...]}}
-            """
-            schema_text = "## 当前Excel文件以及表结构信息\n\n"
-
-            # 两层结构：文件 -> sheets
-            for file_id, file_sheets in table_schemas.items():
-                schema_text += f"### 文件: {file_id}\n\n"
-                for sheet_name, fields in file_sheets.items():
-                    schema_text += f"#### Sheet: {sheet_name}\n"
-
-                    # 检测 schema 格式
-                    if isinstance(fields, list):
-                        # 增强格式：包含类型和样本
-                        schema_text += "| 列名 | 类型 | 样本数据 |\n"
-                        schema_text += "|------|------|----------|\n"
-                        for col_info in fields:
-                            name = col_info.get("name", "")
-                            col_type = col_info.get("type", "text")
-                            samples = col_info.get("samples", [])
-                            # 格式化样本数据
-                            if samples:
-                                samples_str = ", ".join(
-                                    f'"{s}"' if isinstance(s, str) else str(s)
-                                    for s in samples[:3]
-                                )
-                            else:
-                                samples_str = "(空)"
-                            schema_text += f"| {name} | {col_type} | {samples_str} |\n"
-                    else:
-                        # 简单格式（兼容旧代码）
-                        field_list = ", ".join(fields.values())
-                        schema_text += f"- columns: {field_list}\n"
-
-                    schema_text += "\n"
-
-            schema_text += "## 需求描述\n\n"
-            schema_text += query
-
-            return schema_text
-
-        def build_error_feedback_message(errors: List[str]) -> str:
-            """构建错误反馈消息"""
-            feedback = "⚠️ 你生成的 JSON 验证失败，请修正以下错误：\n\n"
-            for error in errors:
-                feedback += f"- {error}\n"
-            feedback += "\n请根据错误信息修正 JSON，确保所有字段名、表名、列名都正确。只输出修正后的 JSON。"
-            return feedback
-
-        # 构建消息列表
-        initial_message = build_initial_user_message(user_requirement, table_schemas or {})
-
-        if previous_errors and previous_json:
-            # 重试场景：使用多轮对话形式
-            messages = [
-                {"role": "user", "content": initial_message},
-                {"role": "assistant", "content": previous_json},
-                {"role": "user", "content": build_error_feedback_message(previous_errors)}
-            ]
-            try:
-                for delta, full_content in self._call_llm_stream(system_prompt, messages=messages):
-                    yield delta, full_content
-            except Exception as e:
-                raise RuntimeError(f"生成操作描述失败: {str(e)}") from e
-        else:
-            # 首次生成：单条用户消息
-            try:
-                for delta, full_content in self._call_llm_stream(system_prompt, user_message=initial_message):
-                    yield delta, full_content
-            except Exception as e:
-                raise RuntimeError(f"生成操作描述失败: {str(e)}") from e
+        try:
+            yield from self._call_llm_stream(system_prompt, messages=messages)
+        except Exception as e:
+            raise RuntimeError(f"生成操作描述失败: {str(e)}") from e
 
     async def generate_operations_stream_async(
         self,
         user_requirement: str,
         analysis_result: str,
-        table_schemas: Optional[Dict[str, Dict[str, str]]] = None
+        table_schemas: Optional[Dict[str, Dict[str, str]]] = None,
+        previous_errors: Optional[List[str]] = None,
+        previous_json: Optional[str] = None,
     ) -> AsyncGenerator[Tuple[str, str], None]:
         """
         第二步：根据需求分析生成操作描述（流式输出，异步版本）
 
+        消息内容与 generate_operations_stream 相同。
+
         Args:
             user_requirement: 原始用户需求
             analysis_result: 第一步的分析结果
             table_schemas: 表结构信息
+            previous_errors: 之前验证失败的错误列表（用于重试时提供上下文）
+            previous_json: 之前生成的 JSON（用于重试时提供上下文）
 
         Yields:
             Tuple[str, str]: (delta, full_content) - 增量内容和累积的完整内容
@@ -421,17 +429,117 @@ class LLMClient:
         system_prompt = get_generation_prompt_with_context(
             table_schemas, analysis_result
         )
-
-        # 构建用户消息，包含原始需求
-        user_message = f"原始需求：{user_requirement}\n\n请根据上面的需求分析结果，生成 JSON 格式的操作描述。"
+        messages = self._build_generation_messages(
+            user_requirement, table_schemas, previous_errors, previous_json
+        )
 
         try:
-            async for item in self._call_llm_stream_async(system_prompt, user_message):
-                yield item
-            # 注意：调用方需要在最后对 full_content 调用 _clean_json_response
+            async with aclosing(self._call_llm_stream_async(system_prompt, messages=messages)) as stream:
+                async for item in stream:
+                    yield item
         except Exception as e:
             raise RuntimeError(f"生成操作描述失败: {str(e)}") from e
 
+    def _build_generation_user_message(
+        self,
+        user_requirement: str,
+        previous_errors: Optional[List[str]] = None,
+        previous_json: Optional[str] = None,
+    ) -> str:
+        """构建生成操作的用户消息（非流式），重试时附带之前的 JSON 和验证错误"""
+        # 构建用户消息，包含原始需求
+        user_message = f"原始需求：{user_requirement}\n\n请根据上面的需求分析结果，生成 JSON 格式的操作描述。"
+
+        # 如果有之前的错误，添加到用户消息中
+        if previous_errors and previous_json:
+            user_message += "\n\n---\n\n"
+            user_message += "⚠️ 之前生成的 JSON 验证失败，请修正以下错误：\n\n"
+            user_message += f"之前的 JSON：\n```json\n{previous_json}\n```\n\n"
+            user_message += "验证错误：\n"
+            for error in previous_errors:
+                user_message += f"- {error}\n"
+            user_message += "\n请根据错误信息修正 JSON，确保所有字段名、表名、列名都正确。"
+
+        return user_message
+
+    def _build_generation_messages(
+        self,
+        user_requirement: str,
+        table_schemas: Optional[Dict[str, Dict[str, str]]] = None,
+        previous_errors: Optional[List[str]] = None,
+        previous_json: Optional[str] = None,
+    ) -> List[Dict[str, str]]:
+        """
+        构建生成操作的消息列表（流式，不含 system）
+
+        首次生成为单条用户消息（表结构 + 需求描述）；重试时使用多轮对话形式，
+        附带之前生成的 JSON 和验证错误。
+        """
+        initial_message = self._build_initial_user_message(user_requirement, table_schemas or {})
+        messages = [{"role": "user", "content": initial_message}]
+
+        if previous_errors and previous_json:
+            feedback = "⚠️ 你生成的 JSON 验证失败，请修正以下错误：\n\n"
+            for error in previous_errors:
+                feedback += f"- {error}\n"
+            feedback += "\n请根据错误信息修正 JSON，确保所有字段名、表名、列名都正确。只输出修正后的 JSON。"
+            messages += [
+                {"role": "assistant", "content": previous_json},
+                {"role": "user", "content": feedback}
+            ]
+
+        return messages
+
+    def _build_initial_user_message(
+        self,
+        query: str,
+        table_schemas: Dict[str, Dict[str, str]],
+    ) -> str:
+        """
+        构建初始用户消息（包含表结构信息）
+
+        支持两种 schema 格式：
+        1. 简单格式（旧）: {file_id: {sheet_name: {col_letter: col_name}}}
+        2. 增强格式（新）: {file_id: {sheet_name: [{name, type, samples}, ...]}}
+        """
+        schema_text = "## 当前Excel文件以及表结构信息\n\n"
+
+        # 两层结构：文件 -> sheets
+        for file_id, file_sheets in table_schemas.items():
+            schema_text += f"### 文件: {file_id}\n\n"
+            for sheet_name, fields in file_sheets.items():
+                schema_text += f"#### Sheet: {sheet_name}\n"
+
+                # 检测 schema 格式
+                if isinstance(fields, list):
+                    # 增强格式：包含类型和样本
+                    schema_text += "| 列名 | 类型 | 样本数据 |\n"
+                    schema_text += "|------|------|----------|\n"
+                    for col_info in fields:
+                        name = col_info.get("name", "")
+                        col_type = col_info.get("type", "text")
+                        samples = col_info.get("samples", [])
+                        # 格式化样本数据
+                        if samples:
+                            samples_str = ", ".join(
+                                f'"{s}"' if isinstance(s, str) else str(s)
+                                for s in samples[:3]
+                            )
+                        else:
+                            samples_str = "(空)"
+                        schema_text += f"| {name} | {col_type} | {samples_str} |\n"
+                else:
+                    # 简单格式（兼容旧代码）
+                    field_list = ", ".join(fields.values())
+                    schema_text += f"- columns: {field_list}\n"
+
+                schema_text += "\n"
+
+        schema_text += "## 需求描述\n\n"
+        schema_text += query
+
+        return schema_text
+
     # ==================== 完整两步流程 ====================
 
     def process_requirement(
@@ -0,0 +1,322 @@
+"""LLM 连接池 - 进程内共享 OpenAI 客户端
+
+每次新建 OpenAI 客户端都要重新创建 SSL 上下文（数十毫秒），每次请求还要重新建立 TCP / TLS 连接。
+这里按 (base_url, api_key) 共享同步和异步客户端，连接在请求之间保持（keep-alive）：
+
+- 最大连接数、保持的空闲连接数和各项超时由 LLM_* 配置
+- 异步客户端的连接属于创建它的事件循环，每个事件循环各自持有一组客户端
+- stats() 返回每个连接池的请求数、进行中的请求数（流式响应读完之前都算进行中）、峰值和连接数
+- 应用关闭时调用 close_llm_pool() 关闭所有连接
+"""
+
+import asyncio
+import logging
+import threading
+import weakref
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 连接池键：(base_url, api_key)
+PoolKey = Tuple[Optional[str], str]
+
+
+# ==================== 请求计数 ====================
+
+
+@dataclass
+class PoolCounters:
+    """一个连接池的请求计数"""
+
+    requests: int = 0
+    errors: int = 0
+    active: int = 0
+    peak_active: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def start(self):
+        with self._lock:
+            self.requests += 1
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+
+    def finish(self, failed: bool):
+        with self._lock:
+            self.active -= 1
+            if failed:
+                self.errors += 1
+
+
+class _CountingStream(httpx.SyncByteStream):
+    """响应体读完或关闭时结束计数"""
+
+    def __init__(self, stream: httpx.SyncByteStream, counters: PoolCounters, failed: bool):
+        self._stream = stream
+        self._counters = counters
+        self._failed = failed
+        self._closed = False
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            try:
+                self._stream.close()
+            finally:
+                self._counters.finish(self._failed)
+
+
+class _CountingAsyncStream(httpx.AsyncByteStream):
+    """响应体读完或关闭时结束计数（异步版本）"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, counters: PoolCounters, failed: bool):
+        self._stream = stream
+        self._counters = counters
+        self._failed = failed
+        self._closed = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        if not self._closed:
+            self._closed = True
+            try:
+                await self._stream.aclose()
+            finally:
+                self._counters.finish(self._failed)
+
+
+class _CountingTransport(httpx.BaseTransport):
+    """在 httpx 连接池外层统计请求"""
+
+    def __init__(self, transport: httpx.HTTPTransport, counters: PoolCounters):
+        self.transport = transport
+        self._counters = counters
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self._counters.start()
+        try:
+            response = self.transport.handle_request(request)
+        except BaseException:
+            self._counters.finish(failed=True)
+            raise
+        response.stream = _CountingStream(response.stream, self._counters, response.status_code >= 400)
+        return response
+
+    def close(self):
+        self.transport.close()
+
+
+class _CountingAsyncTransport(httpx.AsyncBaseTransport):
+    """在 httpx 连接池外层统计请求（异步版本）"""
+
+    def __init__(self, transport: httpx.AsyncHTTPTransport, counters: PoolCounters):
+        self.transport = transport
+        self._counters = counters
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self._counters.start()
+        try:
+            response = await self.transport.handle_async_request(request)
+        except BaseException:
+            self._counters.finish(failed=True)
+            raise
+        response.stream = _CountingAsyncStream(response.stream, self._counters, response.status_code >= 400)
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+# ==================== 连接池 ====================
+
+
+@dataclass
+class _PooledClient:
+    """共享的客户端及其统计"""
+
+    client: Union[OpenAI, AsyncOpenAI]
+    transport: Union[_CountingTransport, _CountingAsyncTransport]
+    counters: PoolCounters
+
+
+class LLMClientPool:
+    """
+    按 (base_url, api_key) 共享的 OpenAI 客户端
+
+    Args:
+        max_connections: 每个连接池的最大连接数（超过时请求等待空闲连接）
+        max_keepalive_connections: 保持的空闲连接数
+        keepalive_expiry: 空闲连接保持时间（秒）
+        timeout: 读写超时（秒）
+        connect_timeout: 建立连接超时（秒）
+        pool_timeout: 等待空闲连接的超时（秒）
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 60.0,
+        timeout: float = 600.0,
+        connect_timeout: float = 10.0,
+        pool_timeout: float = 30.0,
+    ):
+        self.max_connections = max_connections
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._timeout = httpx.Timeout(timeout, connect=connect_timeout, pool=pool_timeout)
+        self._sync_clients: Dict[PoolKey, _PooledClient] = {}
+        # 事件循环 -> 该循环上的异步客户端（事件循环结束后自动释放）
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[PoolKey, _PooledClient]]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._lock = threading.Lock()
+
+    def get_sync(self, base_url: Optional[str], api_key: str) -> OpenAI:
+        """获取共享的同步客户端"""
+        key = (base_url, api_key)
+        with self._lock:
+            pooled = self._sync_clients.get(key)
+            if pooled is None:
+                counters = PoolCounters()
+                transport = _CountingTransport(httpx.HTTPTransport(limits=self._limits), counters)
+                client = OpenAI(
+                    **self._client_kwargs(base_url, api_key),
+                    http_client=DefaultHttpxClient(transport=transport, timeout=self._timeout),
+                )
+                pooled = self._sync_clients[key] = _PooledClient(client, transport, counters)
+            return pooled.client
+
+    def get_async(self, base_url: Optional[str], api_key: str) -> AsyncOpenAI:
+        """获取当前事件循环上共享的异步客户端（需在协程中调用）"""
+        loop = asyncio.get_running_loop()
+        key = (base_url, api_key)
+        with self._lock:
+            clients = self._async_clients.setdefault(loop, {})
+            pooled = clients.get(key)
+            if pooled is None:
+                counters = PoolCounters()
+                transport = _CountingAsyncTransport(httpx.AsyncHTTPTransport(limits=self._limits), counters)
+                client = AsyncOpenAI(
+                    **self._client_kwargs(base_url, api_key),
+                    http_client=DefaultAsyncHttpxClient(transport=transport, timeout=self._timeout),
+                )
+                pooled = clients[key] = _PooledClient(client, transport, counters)
+            return pooled.client
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """
+        各连接池的统计信息
+
+        Returns:
+            [{"base_url", "kind"（sync / async）, "requests", "errors", "active",
+              "peak_active", "max_connections", "utilization", "connections", "idle_connections"}, ...]
+        """
+        with self._lock:
+            pools = [("sync", key, pooled) for key, pooled in self._sync_clients.items()]
+            pools += [
+                ("async", key, pooled)
+                for clients in self._async_clients.values()
+                for key, pooled in clients.items()
+            ]
+
+        result = []
+        for kind, (base_url, _), pooled in pools:
+            counters = pooled.counters
+            with counters._lock:
+                item = {
+                    "base_url": base_url,
+                    "kind": kind,
+                    "requests": counters.requests,
+                    "errors": counters.errors,
+                    "active": counters.active,
+                    "peak_active": counters.peak_active,
+                    "max_connections": self.max_connections,
+                    "utilization": round(counters.active / self.max_connections, 3) if self.max_connections else None,
+                }
+            item.update(_connection_counts(pooled.transport.transport))
+            result.append(item)
+        return result
+
+    def close(self):
+        """关闭同步客户端"""
+        with self._lock:
+            clients, self._sync_clients = list(self._sync_clients.values()), {}
+        for pooled in clients:
+            pooled.client.close()
+
+    async def aclose(self):
+        """关闭所有客户端（异步客户端只能在所属的事件循环上关闭，其余的随事件循环释放）"""
+        self.close()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = self._async_clients.pop(loop, {})
+        for pooled in clients.values():
+            await pooled.client.close()
+
+    def _client_kwargs(self, base_url: Optional[str], api_key: str) -> Dict[str, Any]:
+        # OpenAI 客户端对每个请求单独设置超时，不设置时使用它自己的默认值
+        kwargs: Dict[str, Any] = {"api_key": api_key, "timeout": self._timeout}
+        if base_url:
+            kwargs["base_url"] = base_url
+        return kwargs
+
+
+def _connection_counts(transport: Union[httpx.HTTPTransport, httpx.AsyncHTTPTransport]) -> Dict[str, int]:
+    """httpx 连接池中的连接数和空闲连接数（读取不到时为空）"""
+    connections = getattr(getattr(transport, "_pool", None), "connections", None)
+    if connections is None:
+        return {}
+    return {
+        "connections": len(connections),
+        "idle_connections": sum(1 for connection in connections if connection.is_idle()),
+    }
+
+
+# ==================== 全局连接池 ====================
+
+_shared_pool: Optional[LLMClientPool] = None
+_shared_lock = threading.Lock()
+
+
+def get_llm_pool() -> LLMClientPool:
+    """获取进程内共享的 LLM 连接池"""
+    global _shared_pool
+    if _shared_pool is None:
+        with _shared_lock:
+            if _shared_pool is None:
+                _shared_pool = LLMClientPool(
+                    max_connections=settings.LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+                    timeout=settings.LLM_TIMEOUT,
+                    connect_timeout=settings.LLM_CONNECT_TIMEOUT,
+                    pool_timeout=settings.LLM_POOL_TIMEOUT,
+                )
+    return _shared_pool
+
+
+async def close_llm_pool():
+    """关闭共享连接池（应用关闭时调用）"""
+    global _shared_pool
+    with _shared_lock:
+        pool, _shared_pool = _shared_pool, None
+    if pool is not None:
+        try:
+            await pool.aclose()
+        except Exception as e:
+            logger.warning(f"关闭 LLM 连接池失败: {e}")
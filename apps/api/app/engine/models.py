@@ -1,13 +1,31 @@
 """数据模型 - 定义系统中的基础数据类型"""
 
-from typing import Union, List, Dict, Any, Optional
+import math
+import threading
+from typing import BinaryIO, Callable, Iterable, Union, List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass, field
+import numpy as np
 import pandas as pd
 
 
 # ==================== 辅助函数 ====================
 
 
+def enable_copy_on_write():
+    """
+    为当前进程启用 pandas Copy-on-Write（pandas 3.0 起为默认行为）
+
+    启用后表的快照和副本（Table.get_data / Table.fork）是与表共享列数据的浅拷贝，只有真正被修改的列才会复制；
+    未启用时退回到深拷贝，结果相同但内存占用更高。是全局设置，由服务入口（app.main）和脚本在启动时调用。
+    """
+    pd.set_option("mode.copy_on_write", True)
+
+
+def _snapshot(df: pd.DataFrame) -> pd.DataFrame:
+    """DataFrame 的快照，之后任一方的修改都不影响另一方（启用 Copy-on-Write 时为浅拷贝，否则深拷贝）"""
+    return df.copy(deep=pd.get_option("mode.copy_on_write") is not True)
+
+
 def column_index_to_letter(index: int) -> str:
     """
     将列索引转换为 Excel 列标识
@@ -65,6 +83,8 @@ Number = Union[int, float]
 Text = str
 Cell = Union[Number, Text, None, ExcelError]
 Range = List[Cell]
+# 向量化聚合的列输入：(原生类型数组, 空值掩码)，见 column_to_masked_array()
+ColumnArray = Tuple[np.ndarray, Optional[np.ndarray]]
 
 
 # ==================== 操作定义 ====================
@@ -322,6 +342,12 @@ class OperationResult:
     value: Any = None
     excel_formula: str = ""
     error: Optional[str] = None
+    # 执行耗时（毫秒，含结果应用）
+    duration_ms: float = 0.0
+    # 是否直接取自操作结果缓存
+    cached: bool = False
+    # 结构化的错误信息（执行被中止时，见 app.engine.governor.ExecutionAborted.to_dict）
+    error_detail: Optional[Dict[str, Any]] = None
 
 
 @dataclass
@@ -349,6 +375,22 @@ class ExecutionResult:
     # 错误信息
     errors: List[str] = field(default_factory=list)
 
+    # 整个计划的执行耗时（毫秒，墙上时间；并发执行时小于各操作耗时之和）
+    duration_ms: float = 0.0
+
+    # 公式优化报告（生效的常量折叠、不变量外提、公共子表达式消除）
+    optimizations: List[str] = field(default_factory=list)
+
+    # 操作结果缓存统计（未启用缓存时均为 0）
+    cache_hits: int = 0
+    cache_misses: int = 0
+
+    # 执行被中止的原因（超出资源预算或被取消，见 app.engine.governor；含中止时的操作序号），未中止时为 None
+    aborted: Optional[Dict[str, Any]] = None
+
+    # 资源用量（耗时、求值次数、内存增长峰值，见 ResourceGovernor.usage）
+    resource_usage: Dict[str, Any] = field(default_factory=dict)
+
     def add_variable(self, name: str, value: Any):
         """添加变量"""
         self.variables[name] = value
@@ -388,16 +430,365 @@ class ExecutionResult:
         return len(self.errors) > 0
 
 
+# ==================== 列存储类型 ====================
+#
+# Table 内部按列保留原生类型（int64 / float64 / datetime64 / 可空 Int64 / boolean），
+# 只有文本和混合类型列使用 object。空值在存储中是 NaN / NaT / pd.NA，
+# 在读取边界（get_column / get_column_array）统一转换为 None，
+# 公式求值和序列化看到的语义与以往一致：空单元格为 None。
+
+
+def _is_integral_float(series: pd.Series) -> bool:
+    """检查 float 列的非空值是否全部为 int64 范围内的整数"""
+    values = series.to_numpy()
+    valid = values[~np.isnan(values)]
+    if len(valid) == 0:
+        return False
+    return bool(
+        np.all(np.isfinite(valid))
+        and np.all(valid == np.floor(valid))
+        and np.all(np.abs(valid) < 2 ** 53)
+    )
+
+
+def normalize_column_dtype(series: pd.Series) -> pd.Series:
+    """
+    将读取自 Excel 的列转换为紧凑的原生类型
+
+    - 含空值的整数列（pandas 读取为 float64）：转为可空 Int64，值保持为整数
+    - 只含布尔值和空值的 object 列：转为可空 boolean
+    - 文本 / 混合类型列：保持 object，空值统一为 None
+
+    Args:
+        series: 原始列
+
+    Returns:
+        转换后的列
+    """
+    dtype = series.dtype
+    if dtype.kind == "f" and series.hasnans and _is_integral_float(series):
+        return series.astype("Int64")
+
+    if dtype == object:
+        non_null = series.dropna()
+        if len(non_null) and len(non_null) < len(series) and all(isinstance(v, (bool, np.bool_)) for v in non_null):
+            return series.astype("boolean")
+        if len(non_null) < len(series):
+            return series.where(series.notna(), None)
+
+    return series
+
+
+def make_column(values: List[Any]) -> pd.Series:
+    """
+    将列值列表转换为类型化的列（新增列 / 更新列时使用）
+
+    整数 + 空值使用可空 Int64（避免整数被提升为 float），
+    布尔 + 空值使用可空 boolean，其他情况由 pandas 推断。
+    """
+    has_null = False
+    all_int = all_bool = True
+    for value in values:
+        if value is None or (isinstance(value, float) and value != value):
+            has_null = True
+            continue
+        value_type = type(value)
+        if value_type is not int:
+            all_int = False
+        if value_type is not bool:
+            all_bool = False
+        if not (all_int or all_bool):
+            break
+
+    if has_null and len(values):
+        try:
+            if all_int:
+                return pd.Series(values, dtype="Int64")
+            if all_bool:
+                return pd.Series(values, dtype="boolean")
+        except (TypeError, ValueError, OverflowError):
+            pass
+    series = pd.Series(values)
+    if series.dtype == object and has_null:
+        # 混合类型列中的 NaN 统一为 None
+        series = series.where(series.notna(), None)
+    return series
+
+
+def column_to_list(series: pd.Series) -> List[Any]:
+    """列转换为 Python 值列表（空值为 None）"""
+    if series.dtype != object and series.hasnans:
+        values = series.to_numpy(dtype=object)
+        if not values.flags.writeable:
+            values = values.copy()
+        values[series.isna().to_numpy()] = None
+        return values.tolist()
+    return series.tolist()
+
+
+def column_to_array(series: pd.Series) -> np.ndarray:
+    """
+    列转换为 NumPy 数组（用于整列向量化运算）
+
+    无空值的数值列（int / float / bool，含可空类型）返回原生类型数组；
+    其他列返回 object 数组，元素与 column_to_list() 一致。
+    """
+    dtype = series.dtype
+    if dtype.kind in "biuf" and not series.hasnans:
+        if isinstance(dtype, pd.api.extensions.ExtensionDtype):
+            return series.to_numpy(dtype=dtype.numpy_dtype)
+        return series.to_numpy()
+    return np.fromiter(column_to_list(series), dtype=object, count=len(series))
+
+
+def column_to_masked_array(series: pd.Series) -> ColumnArray:
+    """
+    列转换为 (数组, 空值掩码)（用于向量化聚合函数）
+
+    数值 / 布尔列（含可空类型）始终返回原生类型数组，空值位置在掩码中为 True
+    （这些位置的数组元素无意义）；无空值时掩码为 None。
+    其他列返回 object 数组（元素与 column_to_list() 一致）和 None。
+    """
+    dtype = series.dtype
+    if dtype.kind not in "biuf":
+        return np.fromiter(column_to_list(series), dtype=object, count=len(series)), None
+    blank = series.isna().to_numpy() if series.hasnans else None
+    if isinstance(dtype, pd.api.extensions.ExtensionDtype):
+        numpy_dtype = dtype.numpy_dtype
+        if blank is None:
+            return series.to_numpy(dtype=numpy_dtype), None
+        fill = False if numpy_dtype.kind == "b" else 0
+        return series.to_numpy(dtype=numpy_dtype, na_value=fill), blank
+    return series.to_numpy(), blank
+
+
+# ==================== 列画像 ====================
+
+
+def detect_column_type(series: pd.Series) -> str:
+    """检测列的实际类型"""
+    dtype = str(series.dtype).lower()
+
+    # 数值类型
+    if "int" in dtype or "float" in dtype:
+        return "number"
+
+    # 日期时间类型
+    if "datetime" in dtype or "date" in dtype:
+        return "date"
+
+    # 布尔类型
+    if "bool" in dtype:
+        return "boolean"
+
+    # object 类型需要进一步分析
+    if dtype == "object":
+        non_null = series.dropna()
+        if len(non_null) == 0:
+            return "text"
+
+        # 统计各类型的数量
+        numeric_count = 0
+        str_count = 0
+        date_count = 0
+
+        for v in non_null.head(100):  # 只检查前 100 个值
+            if isinstance(v, bool):
+                continue
+            elif isinstance(v, (int, float)):
+                if not (isinstance(v, float) and math.isnan(v)):
+                    numeric_count += 1
+            elif isinstance(v, str):
+                str_count += 1
+            elif hasattr(v, 'year'):  # datetime-like
+                date_count += 1
+
+        total = numeric_count + str_count + date_count
+        if total == 0:
+            return "text"
+
+        # 判断主要类型
+        if date_count / total > 0.5:
+            return "date"
+        if numeric_count / total > 0.8:
+            return "number"
+        if str_count / total > 0.8:
+            return "text"
+        if numeric_count > 0 and str_count > 0:
+            return "mixed"  # 混合类型，提醒 LLM 注意
+
+    return "text"
+
+
+def column_samples(series: pd.Series, count: int) -> List[Any]:
+    """获取列的样本数据（非空值）"""
+    non_null = series.dropna()
+    if len(non_null) == 0:
+        return []
+
+    # 取前 count 个非空值
+    samples = []
+    for v in column_to_list(non_null.head(count)):
+        # 转换为可 JSON 序列化的格式
+        if isinstance(v, (int, float)):
+            if isinstance(v, float) and math.isnan(v):
+                continue
+            samples.append(v)
+        elif hasattr(v, 'isoformat'):  # datetime
+            samples.append(v.isoformat()[:10])  # 只取日期部分
+        else:
+            samples.append(str(v)[:50])  # 限制字符串长度
+
+    return samples
+
+
 # ==================== 表数据结构 ====================
 
 
+# 延迟加载的表读取数据的函数：列名列表（None 表示全部）-> 清洗后的 DataFrame
+SheetLoader = Callable[[Optional[List[str]]], pd.DataFrame]
+
+
 class Table:
-    """表数据结构 - 封装 pandas DataFrame"""
+    """
+    表数据结构 - 封装 pandas DataFrame
+
+    延迟加载的表（见 Table.lazy）创建时只有列名和行数，列数据在首次使用时才加载：
+    执行前由 Executor 按操作引用的列加载（materialize），其余访问完整数据的方法
+    （get_data 等）会先加载所有剩余的列。
+    """
 
     def __init__(self, name: str, data: pd.DataFrame):
         self.name = name
-        self._data = data
+        # 快照（Copy-on-Write 时为浅拷贝）：之后对表的修改不会影响传入的 DataFrame
+        self._frame = _snapshot(data)
         self._columns = list(data.columns)
+        # 预先计算的列画像及其样本数（来自上传时的后台解析，表被修改后失效）
+        self._profile: Optional[List[Dict[str, Any]]] = None
+        self._profile_samples = 0
+        # 延迟加载：尚未加载的原始列、加载函数、画像中的列类型
+        self._pending: List[str] = []
+        self._loader: Optional[SheetLoader] = None
+        self._dtypes: Dict[str, Optional[str]] = {}
+        self._load_lock = threading.Lock()
+        # 数据来源标识（延迟加载且未修改时为 "内容哈希/Sheet 名称"，用作操作缓存的输入指纹）
+        self.source_key: Optional[str] = None
+        # 原始工作簿中该 sheet 的列（按位置对应，见 ExcelFile.set_source）及之后新增 / 更新的列
+        self.source_columns: Optional[List[str]] = None
+        self._changed_columns: List[str] = []
+
+    @classmethod
+    def lazy(
+        cls,
+        name: str,
+        columns: List[str],
+        row_count: int,
+        loader: SheetLoader,
+        dtypes: Optional[Dict[str, Optional[str]]] = None,
+        source_key: Optional[str] = None,
+    ) -> "Table":
+        """
+        创建延迟加载的表
+
+        Args:
+            name: 表名
+            columns: 列名（不能重复）
+            row_count: 行数
+            loader: 加载列数据的函数，返回的 DataFrame 行数须为 row_count
+            dtypes: 列名 -> 类型名称（用于在加载前描述列类型）
+            source_key: 数据来源标识
+
+        Returns:
+            Table 对象
+        """
+        table = cls(name, pd.DataFrame(index=pd.RangeIndex(row_count)))
+        table._columns = list(columns)
+        table._pending = list(columns)
+        table._loader = loader
+        table._dtypes = dict(dtypes or {})
+        table.source_key = source_key
+        return table
+
+    @property
+    def _data(self) -> pd.DataFrame:
+        """完整数据（延迟加载的表先加载所有剩余的列）"""
+        if self._pending:
+            self.materialize()
+        return self._frame
+
+    def is_loaded(self) -> bool:
+        """所有列是否都已加载"""
+        return not self._pending
+
+    def materialize(self, columns: Optional[Iterable[str]] = None):
+        """
+        加载延迟加载的表中尚未加载的列
+
+        Args:
+            columns: 需要的列（None 表示全部）；已加载或不属于原始数据的列忽略
+
+        Raises:
+            ValueError: 加载的数据与表结构不一致
+        """
+        if not self._pending:
+            return
+        requested = None if columns is None else set(columns)
+        with self._load_lock:
+            wanted = [name for name in self._pending if requested is None or name in requested]
+            if not wanted:
+                return
+            df = self._loader(list(wanted))
+
+            missing = [name for name in wanted if name not in df.columns]
+            if missing or len(df) != len(self._frame):
+                raise ValueError(
+                    f"表 '{self.name}' 加载的数据与表结构不一致"
+                    f"（缺少列: {missing}，行数: {len(df)} / {len(self._frame)}）"
+                )
+            # 生成新的 DataFrame 再替换：其他线程持有的旧 DataFrame 不受影响
+            loaded = df.loc[:, wanted].set_axis(self._frame.index)
+            frame = pd.concat([self._frame, loaded], axis=1)
+            loaded_names = set(wanted)
+            self._pending = [name for name in self._pending if name not in loaded_names]
+            if not self._pending and list(frame.columns) != self._columns:
+                frame = frame.loc[:, self._columns]
+            self._frame = frame
+
+    def fork(self) -> "Table":
+        """
+        写时复制的副本
+
+        与原表共享列数据（启用 pandas Copy-on-Write 时），副本上的修改只复制被修改的列，不影响原表。
+        延迟加载的列通过原表加载：副本用到的列在原表中同样只解析一次。
+
+        Returns:
+            Table 对象
+        """
+        copy = Table(self.name, self._frame)
+        copy._columns = list(self._columns)
+        copy._profile = self._profile
+        copy._profile_samples = self._profile_samples
+        copy._dtypes = dict(self._dtypes)
+        copy.source_key = self.source_key
+        copy.source_columns = self.source_columns
+        copy._changed_columns = list(self._changed_columns)
+        if self._pending:
+            copy._pending = list(self._pending)
+            copy._loader = self._load_from_origin
+        return copy
+
+    def _load_from_origin(self, columns: Optional[List[str]]) -> pd.DataFrame:
+        """副本的加载函数：加载本表的列后返回（本表中已被整列替换的列从原始数据加载，副本得到 fork 时的数据）"""
+        if self._loader is not None and any(name in self._changed_columns for name in columns or self._columns):
+            return self._loader(columns)
+        self.materialize(columns)
+        return self._frame.loc[:, columns if columns is not None else self._columns]
+
+    def _series(self, column_name: str) -> pd.Series:
+        """获取列（未加载时先加载所有剩余的列，只解析一次）"""
+        if column_name in self._pending:
+            self.materialize()
+        return self._frame[column_name]
 
     def __getattr__(self, column_name: str) -> Range:
         """通过属性访问列数据"""
@@ -406,16 +797,39 @@ class Table:
                 f"'{type(self).__name__}' object has no attribute '{column_name}'"
             )
 
-        if column_name in self._data.columns:
-            return self._data[column_name].tolist()
+        if column_name in self._columns:
+            return column_to_list(self._series(column_name))
 
         raise AttributeError(f"表 '{self.name}' 没有字段 '{column_name}'")
 
     def get_column(self, column_name: str) -> Range:
-        """获取列数据"""
-        if column_name not in self._data.columns:
+        """获取列数据（空值为 None）"""
+        if column_name not in self._columns:
+            raise ValueError(f"表 '{self.name}' 没有字段 '{column_name}'")
+        return column_to_list(self._series(column_name))
+
+    def get_column_array(self, column_name: str) -> np.ndarray:
+        """
+        获取列数据的 NumPy 数组（用于整列向量化运算）
+
+        无空值的数值列直接返回原生类型数组；其他列返回 object 数组，
+        元素与 get_column() 返回的 Python 值一致。
+        """
+        if column_name not in self._columns:
+            raise ValueError(f"表 '{self.name}' 没有字段 '{column_name}'")
+        return column_to_array(self._series(column_name))
+
+    def get_column_masked(self, column_name: str) -> ColumnArray:
+        """获取列的原生类型数组和空值掩码（用于向量化聚合函数）"""
+        if column_name not in self._columns:
             raise ValueError(f"表 '{self.name}' 没有字段 '{column_name}'")
-        return self._data[column_name].tolist()
+        return column_to_masked_array(self._series(column_name))
+
+    def get_column_dtype(self, column_name: str) -> str:
+        """获取列的 pandas 类型名称（延迟加载的表在加载前使用画像中记录的类型）"""
+        if column_name in self._pending and self._dtypes.get(column_name):
+            return self._dtypes[column_name]
+        return str(self._series(column_name).dtype)
 
     def get_columns(self) -> List[str]:
         """获取所有列名"""
@@ -432,13 +846,78 @@ class Table:
         index = self.get_column_index(column_name)
         return column_index_to_letter(index)
 
-    def get_data(self) -> pd.DataFrame:
-        """获取原始 DataFrame"""
-        return self._data.copy()
+    def get_changed_columns(self) -> List[str]:
+        """创建（或从文件加载）之后新增或更新过的列（按第一次修改的顺序）"""
+        return list(self._changed_columns)
+
+    def memory_usage(self) -> int:
+        """已加载数据占用的内存（字节，延迟加载的表只计算已加载的列）"""
+        return int(self._frame.memory_usage(index=True, deep=True).sum())
+
+    def get_data(self, columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """
+        获取 DataFrame 快照
+
+        启用 Copy-on-Write 时（见 enable_copy_on_write）返回浅拷贝：与表共享列数据，不复制整表；
+        调用方修改返回值时才按列复制，表本身不受影响。
+
+        Args:
+            columns: 只需要这些列时传入（不存在的列忽略）；延迟加载的表只加载这些列
+        """
+        if columns is None:
+            return _snapshot(self._data)
+        wanted = set(columns)
+        names = [name for name in self._columns if name in wanted]
+        self.materialize(names)
+        return self._frame.loc[:, names]
 
     def row_count(self) -> int:
         """获取行数"""
-        return len(self._data)
+        return len(self._frame)
+
+    def get_profile(self, sample_count: int = 3) -> List[Dict[str, Any]]:
+        """
+        获取列画像（类型和样本数据）
+
+        有预先计算的画像且样本数足够时直接使用，否则按当前数据计算。
+
+        Args:
+            sample_count: 每列采样的数据条数
+
+        Returns:
+            [{"name": "列1", "type": "number", "samples": [100, 200, 300]}, ...]
+        """
+        if self._profile is not None and sample_count <= self._profile_samples:
+            return [
+                {"name": column["name"], "type": column["type"], "samples": column["samples"][:sample_count]}
+                for column in self._profile
+            ]
+
+        return [
+            {
+                "name": col_name,
+                "type": detect_column_type(self._series(col_name)),
+                "samples": column_samples(self._series(col_name), sample_count),
+            }
+            for col_name in self._columns
+        ]
+
+    def set_profile(self, profile: List[Dict[str, Any]], sample_count: int) -> bool:
+        """
+        使用预先计算的列画像（列名与当前表不一致时忽略）
+
+        Args:
+            profile: 列画像，格式与 get_profile() 相同
+            sample_count: 计算画像时每列采样的数据条数
+
+        Returns:
+            是否已使用
+        """
+        if [column.get("name") for column in profile] != self._columns:
+            return False
+        self._profile = profile
+        self._profile_samples = sample_count
+        return True
 
     def add_column(self, column_name: str, values: List[Any]):
         """
@@ -455,12 +934,16 @@ class Table:
             raise ValueError(
                 f"列 '{column_name}' 已存在，请使用 update_column 更新现有列"
             )
-        if len(values) != len(self._data):
+        if len(values) != len(self._frame):
             raise ValueError(
-                f"新列数据长度 ({len(values)}) 与表行数 ({len(self._data)}) 不匹配"
+                f"新列数据长度 ({len(values)}) 与表行数 ({len(self._frame)}) 不匹配"
             )
-        self._data[column_name] = values
-        self._columns.append(column_name)
+        with self._load_lock:
+            self._frame[column_name] = make_column(values).set_axis(self._frame.index)
+            self._columns.append(column_name)
+            self._changed_columns.append(column_name)
+        self._profile = None
+        self.source_key = None
 
     def update_column(self, column_name: str, values: List[Any]):
         """
@@ -477,17 +960,27 @@ class Table:
             raise ValueError(
                 f"列 '{column_name}' 不存在，请使用 add_column 添加新列"
             )
-        if len(values) != len(self._data):
+        if len(values) != len(self._frame):
             raise ValueError(
-                f"新列数据长度 ({len(values)}) 与表行数 ({len(self._data)}) 不匹配"
+                f"新列数据长度 ({len(values)}) 与表行数 ({len(self._frame)}) 不匹配"
             )
-        self._data[column_name] = values
+        with self._load_lock:
+            # 尚未加载的列被整列替换后不再需要加载
+            self._frame[column_name] = make_column(values).set_axis(self._frame.index)
+            if column_name in self._pending:
+                self._pending.remove(column_name)
+                if not self._pending and list(self._frame.columns) != self._columns:
+                    self._frame = self._frame.loc[:, self._columns]
+            if column_name not in self._changed_columns:
+                self._changed_columns.append(column_name)
+        self._profile = None
+        self.source_key = None
 
     def __repr__(self):
-        return f"Table(name='{self.name}', columns={self._columns}, rows={len(self._data)})"
+        return f"Table(name='{self.name}', columns={self._columns}, rows={len(self._frame)})"
 
     def __len__(self):
-        return len(self._data)
+        return len(self._frame)
 
 
 # ==================== Excel 文件结构 ====================
@@ -507,6 +1000,21 @@ class ExcelFile:
         self.file_id = file_id
         self.filename = filename
         self._sheets: Dict[str, Table] = {}
+        # 原始工作簿（提供 content() 返回文件内容，如 WorkbookSource），导出时在原文件上修补
+        self.source = None
+
+    def set_source(self, source):
+        """
+        记录原始工作簿，当前所有 sheet 都从该工作簿按位置解析而来
+
+        导出时未修改的 sheet 原样保留，修改过的 sheet 只写入变化的列（见 app.engine.xlsx_patcher）。
+
+        Args:
+            source: 提供 content() 方法返回文件内容的对象
+        """
+        self.source = source
+        for table in self._sheets.values():
+            table.source_columns = table.get_columns()
 
     def add_sheet(self, sheet: Table):
         """添加一个 sheet"""
@@ -526,6 +1034,14 @@ class ExcelFile:
         """获取所有 sheet 名称"""
         return list(self._sheets.keys())
 
+    def fork(self) -> "ExcelFile":
+        """写时复制的副本（每个 sheet 见 Table.fork）"""
+        copy = ExcelFile(self.file_id, self.filename)
+        copy.source = self.source
+        for table in self._sheets.values():
+            copy.add_sheet(table.fork())
+        return copy
+
     def get_schema(self) -> Dict[str, Dict[str, str]]:
         """
         获取本文件所有 sheet 的结构
@@ -590,6 +1106,26 @@ class FileCollection:
         """获取所有文件 ID"""
         return list(self._files.keys())
 
+    def fork(self) -> "FileCollection":
+        """
+        写时复制的副本（用于预执行等不应影响原始表的执行）
+
+        副本与原集合共享列数据，在副本上新增 / 更新列、新增 / 替换 sheet 不影响原集合。
+        """
+        copy = FileCollection()
+        for excel_file in self._files.values():
+            copy.add_file(excel_file.fork())
+        return copy
+
+    def restore(self, snapshot: "FileCollection"):
+        """
+        恢复到 fork() 得到的快照（丢弃快照之后的所有修改，如执行被中止后重新执行）
+
+        Args:
+            snapshot: 之前 fork() 的副本（恢复后不应再修改）
+        """
+        self._files = dict(snapshot._files)
+
     def get_schemas(self) -> Dict[str, Dict[str, Dict[str, str]]]:
         """
         获取所有表的结构信息（两层）
@@ -636,103 +1172,12 @@ class FileCollection:
             - datetime64 -> "date"
             - bool -> "boolean"
         """
-        import math
-
-        def detect_column_type(series: pd.Series) -> str:
-            """检测列的实际类型"""
-            dtype = str(series.dtype).lower()
-
-            # 数值类型
-            if "int" in dtype or "float" in dtype:
-                return "number"
-
-            # 日期时间类型
-            if "datetime" in dtype or "date" in dtype:
-                return "date"
-
-            # 布尔类型
-            if "bool" in dtype:
-                return "boolean"
-
-            # object 类型需要进一步分析
-            if dtype == "object":
-                non_null = series.dropna()
-                if len(non_null) == 0:
-                    return "text"
-
-                # 统计各类型的数量
-                numeric_count = 0
-                str_count = 0
-                date_count = 0
-
-                for v in non_null.head(100):  # 只检查前 100 个值
-                    if isinstance(v, bool):
-                        continue
-                    elif isinstance(v, (int, float)):
-                        if not (isinstance(v, float) and math.isnan(v)):
-                            numeric_count += 1
-                    elif isinstance(v, str):
-                        str_count += 1
-                    elif hasattr(v, 'year'):  # datetime-like
-                        date_count += 1
-
-                total = numeric_count + str_count + date_count
-                if total == 0:
-                    return "text"
-
-                # 判断主要类型
-                if date_count / total > 0.5:
-                    return "date"
-                if numeric_count / total > 0.8:
-                    return "number"
-                if str_count / total > 0.8:
-                    return "text"
-                if numeric_count > 0 and str_count > 0:
-                    return "mixed"  # 混合类型，提醒 LLM 注意
-
-            return "text"
-
-        def get_samples(series: pd.Series, count: int) -> List[Any]:
-            """获取列的样本数据（非空值）"""
-            non_null = series.dropna()
-            if len(non_null) == 0:
-                return []
-
-            # 取前 count 个非空值
-            samples = []
-            for v in non_null.head(count):
-                # 转换为可 JSON 序列化的格式
-                if isinstance(v, (int, float)):
-                    if isinstance(v, float) and math.isnan(v):
-                        continue
-                    samples.append(v)
-                elif hasattr(v, 'isoformat'):  # datetime
-                    samples.append(v.isoformat()[:10])  # 只取日期部分
-                else:
-                    samples.append(str(v)[:50])  # 限制字符串长度
-
-            return samples
-
         schemas = {}
         for file_id, excel_file in self._files.items():
             schemas[file_id] = {}
             for sheet_name in excel_file.get_sheet_names():
                 table = excel_file.get_sheet(sheet_name)
-                df = table.get_data()
-
-                columns_info = []
-                for col_name in table.get_columns():
-                    series = df[col_name]
-                    col_type = detect_column_type(series)
-                    samples = get_samples(series, sample_count)
-
-                    columns_info.append({
-                        "name": col_name,
-                        "type": col_type,
-                        "samples": samples
-                    })
-
-                schemas[file_id][sheet_name] = columns_info
+                schemas[file_id][sheet_name] = table.get_profile(sample_count)
 
         return schemas
 
@@ -781,15 +1226,8 @@ class FileCollection:
         Args:
             output_path: 输出文件路径
         """
-        with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-            for file_id, excel_file in self._files.items():
-                for sheet_name in excel_file.get_sheet_names():
-                    table = excel_file.get_sheet(sheet_name)
-                    # 使用 "文件名_sheet名" 作为导出的 sheet 名
-                    # 去掉文件扩展名
-                    filename_stem = excel_file.filename.rsplit('.', 1)[0]
-                    export_sheet_name = f"{filename_stem}_{sheet_name}"[:31]
-                    table.get_data().to_excel(writer, sheet_name=export_sheet_name, index=False)
+        with open(output_path, "wb") as output:
+            self._export_all(output)
 
     def export_to_bytes(self) -> bytes:
         """
@@ -801,15 +1239,21 @@ class FileCollection:
         import io
 
         output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            for file_id, excel_file in self._files.items():
+        self._export_all(output)
+        return output.getvalue()
+
+    def _export_all(self, output: BinaryIO):
+        """导出所有文件的所有 sheet（"文件名_sheet名"）到文件对象"""
+        from app.engine.xlsx_writer import write_workbook
+
+        def sheets():
+            for excel_file in self._files.values():
+                # 去掉文件扩展名
+                filename_stem = excel_file.filename.rsplit('.', 1)[0]
                 for sheet_name in excel_file.get_sheet_names():
-                    table = excel_file.get_sheet(sheet_name)
-                    filename_stem = excel_file.filename.rsplit('.', 1)[0]
-                    export_sheet_name = f"{filename_stem}_{sheet_name}"[:31]
-                    table.get_data().to_excel(writer, sheet_name=export_sheet_name, index=False)
+                    yield f"{filename_stem}_{sheet_name}", excel_file.get_sheet(sheet_name).get_data()
 
-        return output.getvalue()
+        write_workbook(output, sheets())
 
     def export_file_to_bytes(self, file_id: str) -> bytes:
         """
@@ -826,19 +1270,43 @@ class FileCollection:
         """
         import io
 
+        output = io.BytesIO()
+        self.export_file(file_id, output)
+        return output.getvalue()
+
+    def export_file(self, file_id: str, output: BinaryIO) -> int:
+        """
+        导出单个文件的所有 sheet 到文件对象
+
+        从原始工作簿加载的文件在原文件上修补（见 app.engine.xlsx_patcher）：未修改的 sheet、样式、公式等原样保留，
+        只写入新增 / 更新的列和新增的 sheet。无法修补时使用流式写入（见 app.engine.xlsx_writer）重新生成，
+        写入临时文件或上传流时内存占用与行数无关。
+
+        Args:
+            file_id: 文件 ID
+            output: 可写的二进制文件对象（不要求可定位）
+
+        Returns:
+            写入的字节数
+
+        Raises:
+            ValueError: 如果文件不存在
+        """
+        from app.engine.xlsx_patcher import patch_workbook
+        from app.engine.xlsx_writer import write_workbook
+
         if file_id not in self._files:
             raise ValueError(f"文件不存在: {file_id}")
 
         excel_file = self._files[file_id]
-        output = io.BytesIO()
-
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            for sheet_name in excel_file.get_sheet_names():
-                table = excel_file.get_sheet(sheet_name)
-                # 直接使用 sheet 名称（不加文件名前缀）
-                table.get_data().to_excel(writer, sheet_name=sheet_name[:31], index=False)
-
-        return output.getvalue()
+        written = patch_workbook(output, excel_file)
+        if written is not None:
+            return written
+        return write_workbook(
+            output,
+            # 直接使用 sheet 名称（不加文件名前缀）
+            ((sheet_name, excel_file.get_sheet(sheet_name).get_data()) for sheet_name in excel_file.get_sheet_names()),
+        )
 
     def get_file_info(self, file_id: str) -> Dict[str, Any]:
         """
@@ -0,0 +1,313 @@
+"""操作结果缓存 - 跨执行复用相同输入上相同操作的结果
+
+LLM 重新生成操作、用户重复提交相近的问题时，计划的前几个操作往往完全相同，
+却要在同样的数据上重新执行一遍。这里按以下方式为每个操作计算缓存键：
+
+- 操作的规范哈希：操作类型 + 所有字段（不含 description）的规范 JSON
+- 输入指纹：操作读取的 Sheet 和变量的版本指纹（读集合见 app.engine.dependency）
+  - 初始 Sheet：表内容哈希（列名、类型、逐列数据）；延迟加载的表为文件内容哈希 + Sheet 名称
+  - 初始变量：值的哈希
+  - 被某个操作写入后：该操作的缓存键 + 名称的哈希
+
+因此，与之前执行过的计划共享前缀（或共享互不相关的操作）时，这些操作的缓存键
+与上次完全一致，直接取出缓存的结果并应用到表中，只有变化的部分会真正执行。
+
+缓存按估算的内存占用做 LRU 淘汰；只缓存有值的结果（纯错误结果不缓存，
+错误信息可能依赖于读集合以外的状态，例如可用的 Sheet 列表）。
+"""
+
+import hashlib
+import json
+import pickle
+import sys
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, is_dataclass
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from app.engine.dependency import analyze_operation
+from app.engine.models import FileCollection, Operation, OperationResult
+
+# 默认内存上限
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+@dataclass
+class CachedOperation:
+    """缓存的操作结果"""
+
+    value: Any
+    excel_formula: str
+    error: Optional[str]
+    size: int
+
+    def to_result(self, op: Operation) -> OperationResult:
+        """还原为当前操作的 OperationResult（列数据复制一份，避免调用方修改缓存）"""
+        value = list(self.value) if isinstance(self.value, list) else self.value
+        return OperationResult(
+            operation=op,
+            value=value,
+            excel_formula=self.excel_formula,
+            error=self.error,
+            cached=True,
+        )
+
+
+class OperationCache:
+    """
+    操作结果 LRU 缓存（线程安全，可在多次执行间共享）
+
+    Attributes:
+        max_bytes: 缓存结果的估算内存上限
+        hits / misses / evictions: 累计统计
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, CachedOperation]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[CachedOperation]:
+        """查找缓存（命中时移到 LRU 末尾）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def __contains__(self, key: str) -> bool:
+        """是否有缓存（不影响 LRU 顺序和统计）"""
+        with self._lock:
+            return key in self._entries
+
+    def put(self, key: str, op_result: OperationResult):
+        """
+        写入缓存
+
+        只缓存有值的结果；单个结果超过内存上限时不缓存。
+        """
+        if op_result.value is None:
+            return
+        size = _estimate_size(op_result.value)
+        if size > self.max_bytes:
+            return
+
+        entry = CachedOperation(
+            value=op_result.value,
+            excel_formula=op_result.excel_formula,
+            error=op_result.error,
+            size=size,
+        )
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous.size
+            self._entries[key] = entry
+            self._size += size
+            while self._size > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.size
+                self.evictions += 1
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, int]:
+        """获取统计信息"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# ==================== 缓存键 ====================
+
+
+class PlanKeyBuilder:
+    """
+    按计划顺序逐个计算操作的缓存键（增量版本的 plan_keys，计划可以边生成边计算）
+
+    Args:
+        tables: 执行前的文件集合（只读取初始 Sheet 的版本指纹）
+        variables: 执行前已有的变量
+    """
+
+    def __init__(self, tables: FileCollection, variables: Optional[Dict[str, Any]] = None):
+        self._tables = tables
+        self._variables = variables or {}
+        self._sheet_versions: Dict[tuple, str] = {}
+        self._var_versions: Dict[str, str] = {}
+        self._barrier = False
+
+    def add(self, op: Operation) -> Optional[str]:
+        """
+        计划中下一个操作的缓存键
+
+        Returns:
+            缓存键；无法确定读写范围的操作（屏障）及其之后的操作为 None
+        """
+        if self._barrier:
+            return None
+        access = analyze_operation(op)
+        if access.barrier:
+            # 屏障可能读写任意 Sheet，之后的状态无法再用读集合描述，不再缓存
+            self._barrier = True
+            return None
+
+        key = _digest(
+            operation_hash(op),
+            *(f"{file_id}.{sheet}={self._sheet_version((file_id, sheet))}" for file_id, sheet in sorted(access.reads)),
+            *(f"{name}={self._var_version(name)}" for name in sorted(access.var_reads)),
+        )
+        for sheet_key in access.writes:
+            self._sheet_versions[sheet_key] = _digest(key, *sheet_key)
+        for name in access.var_writes:
+            self._var_versions[name] = _digest(key, name)
+        return key
+
+    def _sheet_version(self, sheet_key: tuple) -> str:
+        if sheet_key not in self._sheet_versions:
+            self._sheet_versions[sheet_key] = _initial_sheet_version(self._tables, *sheet_key)
+        return self._sheet_versions[sheet_key]
+
+    def _var_version(self, name: str) -> str:
+        if name not in self._var_versions:
+            self._var_versions[name] = (
+                _digest("var", _value_fingerprint(self._variables[name])) if name in self._variables else "absent"
+            )
+        return self._var_versions[name]
+
+
+def plan_keys(
+    operations: List[Operation],
+    tables: FileCollection,
+    variables: Optional[Dict[str, Any]] = None,
+) -> List[Optional[str]]:
+    """
+    计算计划中每个操作的缓存键
+
+    Args:
+        operations: 按计划顺序排列的操作列表
+        tables: 执行前的文件集合
+        variables: 执行前已有的变量
+
+    Returns:
+        与 operations 一一对应的缓存键；无法确定读写范围的操作（屏障）及其之后的操作为 None
+    """
+    builder = PlanKeyBuilder(tables, variables)
+    return [builder.add(op) for op in operations]
+
+
+def operation_hash(op: Operation) -> str:
+    """操作的规范哈希（操作类型 + 字段，不含 description）"""
+    fields = asdict(op) if is_dataclass(op) else dict(vars(op))
+    fields.pop("description", None)
+    canonical = json.dumps(
+        {"type": type(op).__name__, "fields": fields},
+        sort_keys=True,
+        ensure_ascii=False,
+        default=repr,
+    )
+    return _digest(canonical)
+
+
+def table_fingerprint(df: pd.DataFrame) -> str:
+    """
+    表内容哈希
+
+    有原生类型的列用 pandas 的逐行哈希；object 列用 pickle，
+    以区分 1 / 1.0 / "1" 等值相等但类型不同的数据。
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(repr((list(df.columns), [str(dtype) for dtype in df.dtypes], len(df))).encode())
+    for i in range(df.shape[1]):
+        column = df.iloc[:, i]
+        if column.dtype == object:
+            hasher.update(pickle.dumps(column.tolist(), protocol=pickle.HIGHEST_PROTOCOL))
+        else:
+            hasher.update(pd.util.hash_pandas_object(column, index=False).to_numpy().tobytes())
+    return hasher.hexdigest()
+
+
+def _initial_sheet_version(tables: FileCollection, file_id: str, sheet_name: str) -> str:
+    """
+    执行前 Sheet 的版本指纹（不存在时为 absent；无法哈希时为唯一值，不会命中）
+
+    来自原始工作簿（延迟加载，或加载时已解析且有内容哈希）且未修改的表使用数据来源标识
+    （文件内容哈希 + Sheet 名称），不加载数据，也不对整张表计算指纹。
+    """
+    try:
+        table = tables.get_table(file_id, sheet_name)
+    except Exception:
+        return "absent"
+    if table.source_key:
+        return _digest("source", table.source_key)
+    try:
+        return _digest("table", table_fingerprint(table.get_data()))
+    except Exception:
+        return _digest("unhashable", uuid.uuid4().hex)
+
+
+def _value_fingerprint(value: Any) -> str:
+    """变量值的哈希"""
+    try:
+        return _digest(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL).hex())
+    except Exception:
+        return _digest(type(value).__name__, repr(value))
+
+
+def _digest(*parts: str) -> str:
+    hasher = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        hasher.update(part.encode("utf-8", "surrogatepass"))
+        hasher.update(b"\x00")
+    return hasher.hexdigest()
+
+
+def _estimate_size(value: Any) -> int:
+    """估算结果的内存占用（字节）"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_estimate_size(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(sys.getsizeof(item) for item in value)
+    return sys.getsizeof(value)
+
+
+# ==================== 共享实例 ====================
+
+_shared_cache: Optional[OperationCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_operation_cache() -> OperationCache:
+    """获取进程内共享的操作结果缓存（内存上限由 OPERATION_CACHE_MAX_MB 配置）"""
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_lock:
+            if _shared_cache is None:
+                from app.core.config import settings
+
+                _shared_cache = OperationCache(max_bytes=settings.OPERATION_CACHE_MAX_MB * 1024 * 1024)
+    return _shared_cache
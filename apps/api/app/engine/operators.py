@@ -0,0 +1,260 @@
+"""运算符语义 - 二元运算的 Excel 行为定义
+
+行级解释器（FormulaEvaluator）和向量化编译器（vectorizer）共用这里的标量实现，
+保证两条执行路径对空值、错误传播和类型比较的处理完全一致。
+"""
+
+import operator
+from datetime import datetime, date
+from typing import Any, Callable, Tuple
+
+import pandas as pd
+
+from app.engine.models import ExcelError
+
+
+# ==================== 运算符分类 ====================
+
+# 算术运算符
+ARITHMETIC_OPS = {"+", "-", "*", "/"}
+
+# 比较运算符（需要处理类型不匹配）
+COMPARISON_OPS = {">", "<", ">=", "<="}
+
+# 所有支持的运算符
+BINARY_OPS = ARITHMETIC_OPS | COMPARISON_OPS | {"=", "<>", "&"}
+
+
+# ==================== 类型判断 ====================
+
+
+def is_null(val: Any) -> bool:
+    """检查是否为空值（None 或 pandas NaT/NaN）"""
+    if val is None:
+        return True
+    # 常见类型快速路径（结果与 pd.isna 相同）
+    val_type = type(val)
+    if val_type is str or val_type is int or val_type is bool:
+        return False
+    if val_type is float:
+        return val != val
+    if pd.isna(val):
+        return True
+    return False
+
+
+def is_numeric(val: Any) -> bool:
+    """检查是否为数值类型（排除 bool）"""
+    return isinstance(val, (int, float)) and not isinstance(val, bool)
+
+
+def is_datetime(val: Any) -> bool:
+    """检查是否为日期时间类型"""
+    return isinstance(val, (datetime, date, pd.Timestamp))
+
+
+def try_convert_to_number(val: Any) -> Tuple[bool, Any]:
+    """尝试将值转换为数值，返回 (成功, 结果)"""
+    if is_numeric(val):
+        return True, val
+    if isinstance(val, str):
+        try:
+            return True, float(val)
+        except (ValueError, TypeError):
+            return False, val
+    return False, val
+
+
+# ==================== 比较运算 ====================
+
+
+def _compare_values(op: str, a: Any, b: Any) -> bool:
+    """按运算符比较两个同类值"""
+    if op == ">":
+        return a > b
+    if op == "<":
+        return a < b
+    if op == ">=":
+        return a >= b
+    return a <= b
+
+
+def safe_compare(op: str, a: Any, b: Any) -> bool:
+    """
+    安全比较两个值，处理类型不匹配的情况
+
+    比较策略（模拟 Excel 行为）：
+    1. 空值：空值参与比较时返回 False
+    2. 同类型：直接比较
+    3. 数值 vs 字符串：尝试将字符串转为数值
+    4. 数值 vs 文本：数值永远 < 文本
+    5. 无法比较：返回 False（而不是报错）
+    """
+    # 空值处理
+    if is_null(a) or is_null(b):
+        return False
+
+    # 尝试将两边都转换为数值进行比较
+    a_is_num, a_num = try_convert_to_number(a)
+    b_is_num, b_num = try_convert_to_number(b)
+
+    if a_is_num and b_is_num:
+        # 两边都能转换为数值，用数值比较
+        try:
+            return _compare_values(op, a_num, b_num)
+        except TypeError:
+            return False
+
+    # Excel 行为：数值永远 < 文本
+    if a_is_num and not b_is_num:
+        return op in {"<", "<="}
+    if not a_is_num and b_is_num:
+        return op in {">", ">="}
+
+    # 两边都是字符串，用字符串比较
+    try:
+        return _compare_values(op, str(a), str(b))
+    except TypeError:
+        return False
+
+
+# ==================== 二元运算 ====================
+
+
+def binary_op(op: str, left: Any, right: Any) -> Any:
+    """
+    对两个已求值的操作数执行二元运算
+
+    Args:
+        op: 运算符（+ - * / > < >= <= = <> &）
+        left: 左操作数
+        right: 右操作数
+
+    Returns:
+        运算结果（可能是 ExcelError）
+
+    Raises:
+        ValueError: 未知的运算符
+    """
+    # 错误传播：如果任一操作数是 ExcelError，直接返回该错误
+    if isinstance(left, ExcelError):
+        return left
+    if isinstance(right, ExcelError):
+        return right
+
+    # 对于算术运算，检查空值和类型
+    if op in ARITHMETIC_OPS:
+        # 检查空值
+        if is_null(left) or is_null(right):
+            return ExcelError("#VALUE!")
+
+        if is_datetime(left) or is_datetime(right):
+            return ExcelError("#VALUE!")
+
+        if not is_numeric(left) or not is_numeric(right):
+            # 尝试转换字符串为数字
+            try:
+                if isinstance(left, str):
+                    left = float(left)
+                if isinstance(right, str):
+                    right = float(right)
+            except (ValueError, TypeError):
+                return ExcelError("#VALUE!")
+
+        if op == "+":
+            return left + right
+        if op == "-":
+            return left - right
+        if op == "*":
+            return left * right
+        return left / right if right != 0 else ExcelError("#DIV/0!")
+
+    # 比较运算符需要特殊处理类型不匹配
+    if op in COMPARISON_OPS:
+        return safe_compare(op, left, right)
+
+    if op == "=":  # Excel 风格的等于运算符
+        return left == right
+    if op == "<>":  # Excel 风格的不等于运算符
+        return left != right
+    if op == "&":  # 文本拼接运算符
+        return str(left if not is_null(left) else "") + str(right if not is_null(right) else "")
+
+    raise ValueError(f"未知的运算符: {op}")
+
+
+# ==================== 预绑定运算内核 ====================
+
+# 两侧都是 int / float（非 NaN）时可以直接计算的运算
+_NUMBER_FAST_OPS = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    ">": operator.gt,
+    "<": operator.lt,
+    ">=": operator.ge,
+    "<=": operator.le,
+}
+
+
+def binary_kernel(op: str) -> Callable[[Any, Any], Any]:
+    """
+    获取绑定了运算符的二元运算函数（供编译后的公式逐行调用）
+
+    结果与 binary_op(op, left, right) 完全一致：常见的纯数值 / 纯文本情况
+    直接计算，其他情况交给 binary_op。
+
+    Raises:
+        TypeError: 运算符不可哈希
+    """
+    fast = _NUMBER_FAST_OPS.get(op)
+    if fast is not None:
+        def kernel(left: Any, right: Any) -> Any:
+            left_type = type(left)
+            right_type = type(right)
+            if (
+                (left_type is int or left_type is float)
+                and (right_type is int or right_type is float)
+                and left == left
+                and right == right
+            ):
+                return fast(left, right)
+            return binary_op(op, left, right)
+
+        return kernel
+
+    if op == "/":
+        def divide(left: Any, right: Any) -> Any:
+            left_type = type(left)
+            right_type = type(right)
+            if (
+                (left_type is int or left_type is float)
+                and (right_type is int or right_type is float)
+                and left == left
+                and right == right
+                and right != 0
+            ):
+                return left / right
+            return binary_op("/", left, right)
+
+        return divide
+
+    if op == "&":
+        def concat(left: Any, right: Any) -> Any:
+            if type(left) is str and type(right) is str:
+                return left + right
+            return binary_op("&", left, right)
+
+        return concat
+
+    if op == "=" or op == "<>":
+        def equality(left: Any, right: Any) -> Any:
+            if isinstance(left, ExcelError):
+                return left
+            if isinstance(right, ExcelError):
+                return right
+            return left == right if op == "=" else left != right
+
+        return equality
+
+    return lambda left, right: binary_op(op, left, right)
@@ -0,0 +1,366 @@
+"""公式优化 - add_column / update_column 公式求值前的改写
+
+LLM 生成的公式常见两类冗余：
+
+- 对整列不变的子树：{"var": ...} 参与的运算、纯字面量运算、条件为常量的 IF、
+  条件全为常量的 COUNTIFS 等，逐行求值时每行重复计算
+- 重复的子表达式：如 IF(ISERROR(VLOOKUP(...)), 0, VLOOKUP(...)) 中的两次 VLOOKUP，
+  或连续几个 add_column 中相同的 VLOOKUP
+
+本模块在 Executor 中、公式求值前做三种改写（只改写用于求值的公式副本，
+解析得到的操作本身保持不变，Excel 公式和步骤说明仍按原公式生成）：
+
+- 常量折叠（constant_fold）：只含字面量的子树求值一次，替换为 {"value": ...}；
+  条件为常量的 IF 直接替换为对应分支
+- 循环不变量外提（hoist）：引用变量 / 跨表数据但不引用当前行的子树求值一次，
+  替换为 {"value": ...}（{"ref": ...} 范围本身保留，COUNTIFS 仍走计数表）
+- 公共子表达式消除（cse）：同一张表上连续的列操作中出现两次及以上的
+  （引用当前行的）子树，整列单独求值一次，作为隐藏列供各处引用
+
+改写不改变结果：求值抛出异常的不变子树保持原样（异常仍按行抛出）；
+公共子表达式单独求值有行级错误时不做替换，仍按原公式求值。
+"""
+
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple, TYPE_CHECKING
+
+from app.engine.dependency import OperationAccess, _collect_expression
+from app.engine.models import AddColumnOperation, Operation, UpdateColumnOperation
+
+if TYPE_CHECKING:
+    from app.engine.executor import FormulaEvaluator
+
+
+# 改写类型说明
+REWRITE_LABELS = {
+    "constant_fold": "常量折叠",
+    "hoist": "循环不变量外提",
+    "cse": "公共子表达式消除",
+}
+
+# 报告中表达式的最大显示长度
+_MAX_EXPRESSION_LENGTH = 80
+
+# 隐藏列名前缀（Excel 列名不会包含 NUL 字符）
+_SHARED_COLUMN_PREFIX = "\x00cse"
+
+
+@dataclass
+class Rewrite:
+    """一次生效的改写"""
+
+    kind: str
+    operation: int  # 操作序号（从 1 开始，与错误信息一致）
+    expression: str
+    occurrences: int = 1
+
+    def __str__(self) -> str:
+        label = REWRITE_LABELS.get(self.kind, self.kind)
+        suffix = f"（出现 {self.occurrences} 次，只计算 1 次）" if self.kind == "cse" else ""
+        return f"操作 #{self.operation}: {label} {self.expression}{suffix}"
+
+
+@dataclass
+class SharedSubexpression:
+    """公共子表达式：隐藏列名、原始子树和出现次数"""
+
+    name: str
+    expr: Dict
+    occurrences: int
+    first_use: int
+    last_use: int
+
+
+# ==================== 表达式分析 ====================
+
+
+def canonical(expr: Any) -> str:
+    """表达式的规范 JSON（区分 1 / 1.0 / true）"""
+    return json.dumps(expr, sort_keys=True, ensure_ascii=False, default=repr)
+
+
+def describe(expr: Any) -> str:
+    """报告中展示的表达式（过长时截断）"""
+    text = canonical(expr)
+    if len(text) > _MAX_EXPRESSION_LENGTH:
+        text = text[: _MAX_EXPRESSION_LENGTH - 3] + "..."
+    return text
+
+
+def node_kind(expr: Any) -> Optional[str]:
+    """表达式节点类型（判断顺序与 FormulaEvaluator.evaluate 一致）"""
+    if not isinstance(expr, dict):
+        return "value"
+    for kind in ("value", "col", "var", "ref", "func", "op"):
+        if kind in expr:
+            return kind
+    return None
+
+
+def is_row_invariant(expr: Any) -> bool:
+    """子树是否与当前行无关（不引用任何列；结构不规范时保守地返回 False）"""
+    kind = node_kind(expr)
+    if kind in ("value", "var", "ref"):
+        return True
+    if kind == "func":
+        args = expr.get("args", [])
+        return isinstance(args, list) and all(is_row_invariant(arg) for arg in args)
+    if kind == "op":
+        return "left" in expr and "right" in expr and is_row_invariant(expr["left"]) and is_row_invariant(expr["right"])
+    return False
+
+
+def _is_literal_only(expr: Any) -> bool:
+    """子树是否只由字面量和运算 / 函数组成（不读变量和跨表数据）"""
+    kind = node_kind(expr)
+    if kind == "value":
+        return True
+    if kind == "func":
+        return all(_is_literal_only(arg) for arg in expr.get("args", []))
+    if kind == "op":
+        return _is_literal_only(expr["left"]) and _is_literal_only(expr["right"])
+    return False
+
+
+def _referenced_columns(expr: Any) -> Set[str]:
+    """子树引用的列名（按求值时实际会读到的节点收集）"""
+    kind = node_kind(expr)
+    if kind == "col":
+        return {expr["col"]} if isinstance(expr["col"], str) else set()
+    found: Set[str] = set()
+    if kind == "func" and isinstance(expr.get("args", []), list):
+        for arg in expr.get("args", []):
+            found |= _referenced_columns(arg)
+    elif kind == "op":
+        found |= _referenced_columns(expr.get("left")) | _referenced_columns(expr.get("right"))
+    return found
+
+
+def _children(expr: Any) -> List[Any]:
+    kind = node_kind(expr)
+    if kind == "func" and isinstance(expr.get("args", []), list):
+        return list(expr.get("args", []))
+    if kind == "op":
+        return [expr[key] for key in ("left", "right") if key in expr]
+    return []
+
+
+# ==================== 常量折叠 / 循环不变量外提 ====================
+
+
+def fold_formula(expr: Any, evaluator: "FormulaEvaluator") -> Tuple[Any, List[Tuple[str, Any]]]:
+    """
+    折叠公式中与当前行无关的子树
+
+    Args:
+        expr: 公式
+        evaluator: 求值器（提供变量和跨表数据）
+
+    Returns:
+        (改写后的公式, [(改写类型, 原子树), ...])
+    """
+    rewrites: List[Tuple[str, Any]] = []
+    saved_context = evaluator.row_context
+    evaluator.set_row_context({})
+    try:
+        folded = _fold(expr, evaluator, rewrites)
+    finally:
+        evaluator.set_row_context(saved_context)
+    return folded, rewrites
+
+
+def _fold(expr: Any, evaluator: "FormulaEvaluator", rewrites: List[Tuple[str, Any]]) -> Any:
+    kind = node_kind(expr)
+    if kind in ("value", "col", "ref", None):
+        return expr
+
+    if is_row_invariant(expr):
+        try:
+            value = evaluator.evaluate(expr)
+        except Exception:
+            # 求值出错的子树保持原样，异常仍按行抛出
+            value = _NOT_FOLDED
+        if value is not _NOT_FOLDED and not isinstance(value, list):
+            # 单独的变量引用直接替换为值，不计入报告
+            if kind != "var":
+                rewrites.append(("constant_fold" if _is_literal_only(expr) else "hoist", expr))
+            return {"value": value}
+
+    if kind == "func":
+        args = expr.get("args", [])
+        if not isinstance(args, list):
+            return expr
+        func_name = expr["func"]
+        if isinstance(func_name, str) and func_name.upper() == "IF" and len(args) == 3 and is_row_invariant(args[0]):
+            try:
+                truth = bool(evaluator.evaluate(args[0]))
+            except Exception:
+                truth = None
+            if truth is not None:
+                rewrites.append(("constant_fold", args[0]))
+                return _fold(args[1] if truth else args[2], evaluator, rewrites)
+        new_args = [_fold(arg, evaluator, rewrites) for arg in args]
+        if all(new is old for new, old in zip(new_args, args)):
+            return expr
+        return {**expr, "args": new_args}
+
+    if kind == "op" and "left" in expr and "right" in expr:
+        left = _fold(expr["left"], evaluator, rewrites)
+        right = _fold(expr["right"], evaluator, rewrites)
+        if left is expr["left"] and right is expr["right"]:
+            return expr
+        return {**expr, "left": left, "right": right}
+
+    return expr
+
+
+# 折叠失败的标记
+_NOT_FOLDED = object()
+
+
+# ==================== 公共子表达式 ====================
+
+
+class PlanOptimizer:
+    """
+    计划级公式优化
+
+    在执行开始时分析整个计划：把同一张表上连续的 add_column / update_column
+    划为一组，统计组内各子树的出现次数（子树引用的列在组内被更新后视为不同的子树），
+    出现两次及以上的子树替换为隐藏列。
+    """
+
+    def __init__(self, operations: List[Operation]):
+        # id(op) -> 操作序号（从 1 开始）
+        self._positions: Dict[int, int] = {id(op): i + 1 for i, op in enumerate(operations)}
+        # id(op) -> 替换了公共子表达式的公式
+        self._formulas: Dict[int, Any] = {}
+        # 隐藏列名 -> 公共子表达式
+        self.shared: Dict[str, SharedSubexpression] = {}
+
+        group: List[Operation] = []
+        for op in operations:
+            if isinstance(op, (AddColumnOperation, UpdateColumnOperation)):
+                if group and (group[0].file_id, group[0].table) != (op.file_id, op.table):
+                    self._analyze_group(group)
+                    group = []
+                group.append(op)
+            elif group:
+                self._analyze_group(group)
+                group = []
+        if group:
+            self._analyze_group(group)
+
+    def position(self, op: Operation) -> int:
+        """操作序号（从 1 开始）"""
+        return self._positions.get(id(op), 0)
+
+    def formula_for(self, op: Operation) -> Tuple[Any, List[SharedSubexpression]]:
+        """
+        获取操作用于求值的公式
+
+        Returns:
+            (公式, 公式引用的公共子表达式)
+        """
+        formula = self._formulas.get(id(op))
+        if formula is None:
+            return op.formula, []
+        names = _shared_names(formula)
+        return formula, [self.shared[name] for name in names]
+
+    def _analyze_group(self, group: List[Operation]):
+        """统计一组连续列操作中的公共子表达式并替换"""
+        if not group:
+            return
+        file_id, table = group[0].file_id, group[0].table
+        versions: Dict[str, int] = {}
+        occurrences: Dict[str, int] = {}
+        keys_by_op: List[Dict[int, str]] = []
+
+        for op in group:
+            keys: Dict[int, str] = {}
+            for node in _walk(op.formula):
+                if node_kind(node) not in ("func", "op") or is_row_invariant(node):
+                    continue
+                if _reads_own_table(node, file_id, table):
+                    continue
+                columns = sorted(_referenced_columns(node))
+                key = canonical(node) + "|" + ",".join(f"{col}@{versions.get(col, 0)}" for col in columns)
+                keys[id(node)] = key
+                occurrences[key] = occurrences.get(key, 0) + 1
+            keys_by_op.append(keys)
+
+            target = op.name if isinstance(op, AddColumnOperation) else op.column
+            versions[target] = versions.get(target, 0) + 1
+
+        shared_keys = {key for key, count in occurrences.items() if count >= 2}
+        if not shared_keys:
+            return
+
+        names: Dict[str, str] = {}
+        for op, keys in zip(group, keys_by_op):
+            rewritten = self._replace(op.formula, self.position(op), keys, shared_keys, names)
+            if rewritten is not op.formula:
+                self._formulas[id(op)] = rewritten
+
+    def _replace(
+        self,
+        expr: Any,
+        position: int,
+        keys: Dict[int, str],
+        shared_keys: Set[str],
+        names: Dict[str, str],
+    ) -> Any:
+        """自顶向下替换公共子树（只替换最外层）"""
+        key = keys.get(id(expr))
+        if key in shared_keys:
+            if key not in names:
+                name = f"{_SHARED_COLUMN_PREFIX}{len(self.shared)}"
+                names[key] = name
+                self.shared[name] = SharedSubexpression(
+                    name=name, expr=expr, occurrences=0, first_use=position, last_use=position
+                )
+            shared = self.shared[names[key]]
+            shared.occurrences += 1
+            shared.last_use = position
+            return {"col": shared.name}
+
+        kind = node_kind(expr)
+        if kind == "func" and isinstance(expr.get("args", []), list):
+            args = expr.get("args", [])
+            new_args = [self._replace(arg, position, keys, shared_keys, names) for arg in args]
+            if all(new is old for new, old in zip(new_args, args)):
+                return expr
+            return {**expr, "args": new_args}
+        if kind == "op" and "left" in expr and "right" in expr:
+            left = self._replace(expr["left"], position, keys, shared_keys, names)
+            right = self._replace(expr["right"], position, keys, shared_keys, names)
+            if left is expr["left"] and right is expr["right"]:
+                return expr
+            return {**expr, "left": left, "right": right}
+        return expr
+
+
+def _walk(expr: Any):
+    """按求值结构遍历子树（先父后子）"""
+    yield expr
+    for child in _children(expr):
+        yield from _walk(child)
+
+
+def _reads_own_table(expr: Any, file_id: str, table: str) -> bool:
+    """子树是否通过跨表引用 / VLOOKUP 读取所在表（组内会被修改，不参与消除）"""
+    access = OperationAccess()
+    _collect_expression(expr, access)
+    return access.barrier or (file_id, table) in access.reads
+
+
+def _shared_names(expr: Any) -> List[str]:
+    """公式中引用的隐藏列名"""
+    names: List[str] = []
+    for node in _walk(expr):
+        if node_kind(node) == "col" and isinstance(node["col"], str) and node["col"].startswith(_SHARED_COLUMN_PREFIX):
+            if node["col"] not in names:
+                names.append(node["col"])
+    return names
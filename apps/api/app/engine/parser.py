@@ -862,6 +862,118 @@ class OperationParser:
         return errors
 
 
+# ==================== 增量解析 ====================
+
+
+class OperationStreamParser:
+    """
+    流式输出的操作 JSON 增量解析器
+
+    逐段输入 LLM 的流式输出，顶层对象中 operations 数组的每个元素（对象）输出完整后立即返回，
+    不等待整个 JSON 结束。第一个 "{" 之前的内容（如 markdown 代码块标记）忽略。
+    只做括号和字符串的词法跟踪，整个 JSON 是否合法仍以最终的 OperationParser.parse 为准。
+
+    用法：
+        parser = OperationStreamParser()
+        for delta in stream:
+            for op_data in parser.feed(delta):
+                ...
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        # 顶层对象中最近的字符串和当前的键
+        self._last_string: Optional[str] = None
+        self._key: Optional[str] = None
+        self._in_operations = False
+        self._element_start: Optional[int] = None
+        # 顶层对象已结束，或元素无法解析（之后的元素位置不再可靠）
+        self.done = False
+        self.failed = False
+
+    def feed(self, delta: str) -> List[Dict[str, Any]]:
+        """
+        输入一段流式输出
+
+        Returns:
+            这段输出中完整结束的 operations 元素（按顺序）
+        """
+        if self.done or self.failed or not delta:
+            return []
+        self._text += delta
+        elements = []
+        text = self._text
+        for i in range(self._pos, len(text)):
+            c = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_string = self._decode_string(text[self._string_start:i + 1])
+                continue
+
+            if self._depth == 0:
+                # 顶层对象之前的内容忽略
+                if c == "{":
+                    self._depth = 1
+                continue
+
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+            elif c in "{[":
+                self._depth += 1
+                if self._depth == 2 and c == "[" and self._key == "operations":
+                    self._in_operations = True
+                elif self._depth == 3 and c == "{" and self._in_operations:
+                    self._element_start = i
+            elif c in "}]":
+                if self._depth == 3 and c == "}" and self._element_start is not None:
+                    element = self._decode_element(text[self._element_start:i + 1])
+                    self._element_start = None
+                    if element is None:
+                        self.failed = True
+                        break
+                    elements.append(element)
+                self._depth -= 1
+                if self._depth == 1:
+                    self._in_operations = False
+                elif self._depth == 0:
+                    self.done = True
+                    break
+            elif self._depth == 1:
+                if c == ":":
+                    self._key = self._last_string
+                elif c == ",":
+                    self._key = None
+        self._pos = len(text)
+        return elements
+
+    @staticmethod
+    def _decode_string(token: str) -> Optional[str]:
+        try:
+            return json.loads(token)
+        except json.JSONDecodeError:
+            return None
+
+    @staticmethod
+    def _decode_element(token: str) -> Optional[Dict[str, Any]]:
+        try:
+            element = json.loads(token)
+        except json.JSONDecodeError:
+            return None
+        return element if isinstance(element, dict) else None
+
+
 # ==================== 便捷函数 ====================
 
 
@@ -870,6 +982,31 @@ def parse_operations(json_str: str) -> Tuple[List[Operation], List[str]]:
     return OperationParser.parse(json_str)
 
 
+def parse_next_operation(
+    op_data: Dict[str, Any],
+    previous: List[Operation],
+    file_sheets: Dict[str, List[str]]
+) -> Tuple[Optional[Operation], List[str]]:
+    """
+    解析并验证计划中的下一个操作（逐个输出操作时使用，规则与 parse_and_validate 一致）
+
+    Args:
+        op_data: 操作的 JSON 对象
+        previous: 计划中已验证通过的前序操作
+        file_sheets: 文件和 sheet 映射 {file_id: [sheet_names]}
+
+    Returns:
+        (操作, 错误列表)
+    """
+    try:
+        op, errors = OperationParser._parse_operation(op_data, len(previous))
+    except Exception as e:
+        return None, [f"操作 #{len(previous) + 1}: {e}"]
+    if errors or op is None:
+        return op, errors
+    return op, OperationParser.validate_operations(previous + [op], file_sheets)
+
+
 def parse_and_validate(
     json_str: str,
     file_sheets: Dict[str, List[str]]
@@ -0,0 +1,330 @@
+"""行级公式编译器 - 将 JSON 公式编译为预绑定的 Python 闭包树
+
+FormulaEvaluator.evaluate 每行都要递归遍历 JSON AST：逐个探测字典键、
+func_name.upper()、查函数表、按运算符分派，并为每行构建包含所有列的行上下文字典。
+无法整列向量化时（vectorize=False 或向量化编译器回退的子表达式），这些开销
+在每行、每个节点上重复。
+
+本模块在每个操作开始时把公式编译一次：
+
+- 列引用解析为行元组中的下标，只取公式实际引用的列
+- 变量在编译时取值（列计算期间变量不会变化）
+- 函数名在编译时解析为 functions.py 中的实现
+- 二元运算在编译时绑定运算内核（见 operators.binary_kernel）
+- 结构不规范的子表达式（参数个数不对、非字符串的函数名等）回退到
+  FormulaEvaluator 逐行解释，保证异常与错误信息完全一致
+
+编译结果对每行的返回值和抛出的异常与 FormulaEvaluator.evaluate 完全一致。
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Sequence, TYPE_CHECKING
+
+from app.engine.operators import binary_kernel
+from app.engine.table_index import countifs_refs
+
+if TYPE_CHECKING:
+    from app.engine.executor import FormulaEvaluator
+
+
+# 编译后的节点：接收行元组（CompiledFormula.columns 顺序），返回该行的值
+RowFn = Callable[[Sequence[Any]], Any]
+
+
+class CompiledFormula:
+    """
+    编译后的行级公式
+
+    Attributes:
+        columns: 公式引用的列名（行元组中值的顺序）
+        fn: 求值函数，接收行元组返回结果（异常与 FormulaEvaluator 一致）
+        fallback_count: 回退到逐行解释的子表达式数量
+    """
+
+    def __init__(self, expr: Any, evaluator: "FormulaEvaluator", available_columns: Sequence[str]):
+        """
+        Args:
+            expr: JSON 公式
+            evaluator: 提供函数表、变量和表索引缓存的求值器
+            available_columns: 表中存在的列（引用其他列名时按行抛出“未知的列名”）
+        """
+        self.evaluator = evaluator
+        self.functions = evaluator.functions
+        self.variables = evaluator.variables
+        self.index_cache = evaluator.index_cache
+        self.columns: List[str] = []
+        self.fallback_count = 0
+        self._available = set(available_columns)
+        self._slots: Dict[str, int] = {}
+        self.fn: RowFn = self._compile(expr)
+
+    def __call__(self, row: Sequence[Any]) -> Any:
+        return self.fn(row)
+
+    # ==================== 编译 ====================
+
+    def _slot(self, col_name: str) -> int:
+        """为引用的列分配行元组中的下标"""
+        if col_name not in self._slots:
+            self._slots[col_name] = len(self.columns)
+            self.columns.append(col_name)
+        return self._slots[col_name]
+
+    def _compile(self, expr: Any) -> RowFn:
+        """编译表达式（分支顺序与 FormulaEvaluator.evaluate 一致）"""
+        if not isinstance(expr, dict):
+            return _const(expr)
+
+        if "value" in expr:
+            return _const(expr["value"])
+
+        if "col" in expr:
+            return self._compile_col(expr)
+
+        if "var" in expr:
+            return self._compile_var(expr)
+
+        if "ref" in expr:
+            ref = expr["ref"]
+            get_ref_column = self.index_cache.get_ref_column
+            return lambda row: get_ref_column(ref)
+
+        if "func" in expr:
+            return self._compile_func(expr)
+
+        if "op" in expr:
+            return self._compile_op(expr)
+
+        return _raiser(ValueError(f"未知的表达式类型: {expr}"))
+
+    def _compile_col(self, expr: Dict) -> RowFn:
+        col_name = expr["col"]
+        try:
+            exists = col_name in self._available
+        except TypeError:
+            return self._fallback(expr)
+        if not exists:
+            return _raiser(ValueError(f"未知的列名: {col_name}"))
+        slot = self._slot(col_name)
+        return lambda row: row[slot]
+
+    def _compile_var(self, expr: Dict) -> RowFn:
+        var_name = expr["var"]
+        try:
+            exists = var_name in self.variables
+        except TypeError:
+            return self._fallback(expr)
+        if not exists:
+            return _raiser(ValueError(f"未定义的变量: {var_name}"))
+        return _const(self.variables[var_name])
+
+    def _compile_op(self, expr: Dict) -> RowFn:
+        if "left" not in expr or "right" not in expr:
+            return self._fallback(expr)
+        try:
+            kernel = binary_kernel(expr["op"])
+        except TypeError:
+            return self._fallback(expr)
+
+        left = self._compile(expr["left"])
+        right = self._compile(expr["right"])
+        return lambda row: kernel(left(row), right(row))
+
+    def _compile_func(self, expr: Dict) -> RowFn:
+        func_name = expr["func"]
+        args = expr.get("args", [])
+        if not isinstance(func_name, str) or not isinstance(args, list):
+            return self._fallback(expr)
+
+        name = func_name.upper()
+
+        if name == "IF":
+            if len(args) != 3:
+                return self._fallback(expr)
+            condition, then_branch, else_branch = (self._compile(arg) for arg in args)
+            return lambda row: then_branch(row) if condition(row) else else_branch(row)
+
+        if name == "AND":
+            compiled = [self._compile(arg) for arg in args]
+            if len(compiled) == 2:
+                a, b = compiled
+                return lambda row: True if a(row) and b(row) else False
+            return lambda row: all(arg(row) for arg in compiled)
+
+        if name == "OR":
+            compiled = [self._compile(arg) for arg in args]
+            if len(compiled) == 2:
+                a, b = compiled
+                return lambda row: True if a(row) or b(row) else False
+            return lambda row: any(arg(row) for arg in compiled)
+
+        if name == "COUNTIFS":
+            if len(args) % 2 != 0 or len(args) < 2:
+                return self._fallback(expr)
+            return self._compile_countifs(args)
+
+        if name == "VLOOKUP":
+            if len(args) != 4:
+                return self._fallback(expr)
+            if all(_is_literal(arg) for arg in args[1:]):
+                # 表引用和列名为常量：索引和值列只解析一次
+                lookup = self._compile(args[0])
+                table_ref, key_col, value_col = (_literal_value(arg) for arg in args[1:])
+                lookup_function = self.index_cache.lookup_function(table_ref, key_col, value_col)
+                return lambda row: lookup_function(lookup(row))
+
+            lookup, table_ref, key_col, value_col = (self._compile(arg) for arg in args)
+            vlookup = self.index_cache.vlookup
+            return lambda row: vlookup(lookup(row), table_ref(row), key_col(row), value_col(row))
+
+        compiled = [self._compile(arg) for arg in args]
+        func = self.functions.get(name)
+        if func is None:
+            error = ValueError(f"未知的函数: {func_name}")
+
+            def unknown(row: Sequence[Any]) -> Any:
+                for arg in compiled:
+                    arg(row)
+                raise error.with_traceback(None)
+
+            return unknown
+
+        # 常见参数个数展开，避免每行构建参数列表
+        if len(compiled) == 1:
+            (a,) = compiled
+            return lambda row: func(a(row))
+        if len(compiled) == 2:
+            a, b = compiled
+            return lambda row: func(a(row), b(row))
+        if len(compiled) == 3:
+            a, b, c = compiled
+            return lambda row: func(a(row), b(row), c(row))
+        return lambda row: func(*[arg(row) for arg in compiled])
+
+    def _compile_countifs(self, args: List) -> RowFn:
+        """COUNTIFS：范围和条件按参数顺序求值，校验规则与 FormulaEvaluator._eval_countifs 一致"""
+        refs = countifs_refs(args)
+        if refs is not None:
+            counter = self._compile_counter(refs)
+            if counter is not None:
+                criteria_fns = [self._compile(args[i + 1]) for i in range(0, len(args), 2)]
+                return lambda row: counter([criteria_fn(row) for criteria_fn in criteria_fns])
+
+        pairs = [(self._compile(args[i]), self._compile(args[i + 1])) for i in range(0, len(args), 2)]
+        count_matches = self.index_cache.count_matches
+        charge = self.evaluator.governor.charge
+
+        def countifs(row: Sequence[Any]) -> int:
+            ranges = []
+            criteria = []
+            for range_fn, criteria_fn in pairs:
+                range_data = range_fn(row)
+                if not isinstance(range_data, list):
+                    raise ValueError("COUNTIFS 的范围参数必须是跨表引用 {\"ref\": \"表.列\"}")
+                ranges.append(range_data)
+                criteria.append(criteria_fn(row))
+
+            first_len = len(ranges[0])
+            for range_data in ranges:
+                if len(range_data) != first_len:
+                    raise ValueError("COUNTIFS 所有范围长度必须一致")
+
+            if refs is not None:
+                return count_matches(refs, criteria)
+            # 每行线性扫描一次范围：按范围行数计入求值次数（见 ResourceGovernor.charge）
+            charge(first_len)
+            return sum(
+                1 for values in zip(*ranges)
+                if all(value == criterion for value, criterion in zip(values, criteria))
+            )
+
+        return countifs
+
+    def _compile_counter(self, refs: List[str]) -> Optional[Callable[[List[Any]], int]]:
+        """
+        范围均为跨表引用时，预先取出范围和计数表，返回按条件列表计数的函数
+
+        范围无法访问时返回 None（由通用路径逐行抛出相同的异常）。
+        """
+        try:
+            ranges = [self.index_cache.get_ref_column(ref) for ref in refs]
+        except Exception:
+            return None
+
+        lengths_match = all(len(range_data) == len(ranges[0]) for range_data in ranges)
+        counts = self.index_cache.get_count_index(refs) if lengths_match else None
+        count_matches = self.index_cache.count_matches
+
+        def counter(criteria: List[Any]) -> int:
+            if not lengths_match:
+                raise ValueError("COUNTIFS 所有范围长度必须一致")
+            if counts is not None:
+                key = tuple(criteria)
+                try:
+                    if any(value != value for value in key if isinstance(value, float)):
+                        return 0
+                    return counts.get(key, 0)
+                except TypeError:
+                    pass
+            return count_matches(refs, criteria)
+
+        return counter
+
+    def _fallback(self, expr: Any) -> RowFn:
+        """结构不规范的子表达式：按行构建（仅含引用列的）行上下文，交给 FormulaEvaluator 解释"""
+        self.fallback_count += 1
+        slots = [
+            (col_name, self._slot(col_name))
+            for col_name in _referenced_columns(expr)
+            if col_name in self._available
+        ]
+        evaluator = self.evaluator
+
+        def fallback(row: Sequence[Any]) -> Any:
+            evaluator.set_row_context({col_name: row[slot] for col_name, slot in slots})
+            return evaluator.evaluate(expr)
+
+        return fallback
+
+
+# ==================== 辅助函数 ====================
+
+
+def _const(value: Any) -> RowFn:
+    return lambda row: value
+
+
+def _is_literal(expr: Any) -> bool:
+    """是否编译为常量（非字典，或带 value 键的字典）"""
+    return not isinstance(expr, dict) or "value" in expr
+
+
+def _literal_value(expr: Any) -> Any:
+    return expr["value"] if isinstance(expr, dict) else expr
+
+
+def _raiser(error: Exception) -> RowFn:
+    """每行都抛出同一异常的节点"""
+
+    def fn(row: Sequence[Any]) -> Any:
+        raise error.with_traceback(None)
+
+    return fn
+
+
+def _referenced_columns(expr: Any) -> List[str]:
+    """收集表达式中引用的所有（可哈希的字符串）列名"""
+    found: List[str] = []
+
+    def walk(node: Any):
+        if isinstance(node, dict):
+            col_name = node.get("col")
+            if isinstance(col_name, str) and col_name not in found:
+                found.append(col_name)
+            for child in node.values():
+                walk(child)
+        elif isinstance(node, list):
+            for child in node:
+                walk(child)
+
+    walk(expr)
+    return found
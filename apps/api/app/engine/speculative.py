@@ -0,0 +1,158 @@
+"""预执行 - LLM 流式输出操作 JSON 的同时执行已完整输出的操作
+
+生成阶段要等 LLM 输出完整个 JSON 才能验证和执行，长计划的执行时间完全排在生成之后。
+预执行在生成的同时进行：
+
+- 增量解析流式输出（OperationStreamParser），operations 数组的每个元素输出完整后立即解析并验证
+  （已输出的操作作为前缀，规则与最终验证一致）
+- 验证通过的操作在后台线程中按计划顺序执行，执行在表集合的写时复制副本上进行
+  （FileCollection.fork），不影响原始表
+- 结果写入操作结果缓存，缓存键与最终执行时按整个计划计算的一致（PlanKeyBuilder）：
+  - 最终计划验证通过后，正式执行时预执行过的操作直接命中缓存，只需把结果应用到表中
+  - 验证失败重新生成时副本直接丢弃，新计划中与之前相同的操作同样命中缓存
+- 遇到无法验证的操作或屏障操作（之后的缓存键无法确定）后停止预执行
+- 预执行与正式执行使用相同的资源预算（见 app.engine.governor），超出预算后停止预执行；
+  取消时正在执行的操作在下一次检查时中止
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from app.engine.executor import Executor
+from app.engine.governor import ExecutionBudget, ResourceGovernor
+from app.engine.models import FileCollection, Operation
+from app.engine.operation_cache import OperationCache, PlanKeyBuilder
+from app.engine.parser import OperationStreamParser, parse_next_operation
+
+logger = logging.getLogger(__name__)
+
+
+class SpeculativeExecutor:
+    """
+    流式生成操作时的预执行
+
+    Args:
+        tables: 执行前的表集合（不会被修改）
+        file_sheets: 文件和 sheet 映射 {file_id: [sheet_names]}（验证用）
+        cache: 操作结果缓存（与正式执行共用）
+        budget: 资源预算（所有预执行的操作共用；None 时不限制）
+
+    用法：
+        speculation = SpeculativeExecutor(tables, file_sheets, cache)
+        for delta in stream:
+            speculation.feed(delta)
+        if plan_is_valid:
+            speculation.finish()   # 等待已提交的操作执行完
+        else:
+            speculation.cancel()   # 丢弃尚未开始的操作
+    """
+
+    def __init__(
+        self,
+        tables: FileCollection,
+        file_sheets: Dict[str, List[str]],
+        cache: OperationCache,
+        budget: Optional[ExecutionBudget] = None,
+    ):
+        self._file_sheets = file_sheets
+        self._parser = OperationStreamParser()
+        self._keys = PlanKeyBuilder(tables)
+        self._governor = ResourceGovernor(budget)
+        self._executor = Executor(tables.fork(), max_workers=1, cache=cache, governor=self._governor)
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="speculative")
+        self._operations: List[Operation] = []
+        self._cancelled = threading.Event()
+        self._stopped = False
+        self._started = time.perf_counter()
+
+        # 统计信息
+        self.submitted = 0
+        self.executed = 0
+        self.cache_hits = 0
+        self.errors = 0
+        self.stop_reason: Optional[str] = None
+        self._execution_ms = 0.0
+
+    def feed(self, delta: str):
+        """
+        输入一段流式输出，完整的操作验证通过后提交执行
+
+        解析和验证很轻量，可以在事件循环上调用；执行在后台线程中进行。
+        """
+        if self._stopped:
+            return
+        for op_data in self._parser.feed(delta):
+            op, errors = parse_next_operation(op_data, self._operations, self._file_sheets)
+            if errors or op is None:
+                self._stop(f"操作 #{len(self._operations) + 1} 验证失败")
+                return
+            self._operations.append(op)
+            self.submitted += 1
+            self._pool.submit(self._run, op)
+        if self._parser.failed:
+            self._stop("JSON 解析失败")
+
+    def finish(self) -> Dict[str, Any]:
+        """等待已提交的操作执行完（阻塞），返回统计信息"""
+        self._stopped = True
+        self._pool.shutdown(wait=True)
+        return self.stats()
+
+    def cancel(self) -> Dict[str, Any]:
+        """丢弃尚未开始的操作（正在执行的操作在下一次检查时中止，不阻塞），返回统计信息"""
+        self._stop("已取消")
+        self._cancelled.set()
+        self._governor.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        return self.stats()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        统计信息
+
+        Returns:
+            {"submitted", "executed", "cache_hits", "errors", "execution_ms", "elapsed_ms", "stop_reason"}
+        """
+        return {
+            "submitted": self.submitted,
+            "executed": self.executed,
+            "cache_hits": self.cache_hits,
+            "errors": self.errors,
+            "execution_ms": round(self._execution_ms, 1),
+            "elapsed_ms": round((time.perf_counter() - self._started) * 1000, 1),
+            "stop_reason": self.stop_reason,
+        }
+
+    def _stop(self, reason: str):
+        if not self._stopped:
+            self._stopped = True
+            self.stop_reason = reason
+
+    def _run(self, op: Operation):
+        """在后台线程中执行一个操作（按提交顺序）"""
+        if self._cancelled.is_set():
+            return
+        try:
+            key = self._keys.add(op)
+            if key is None:
+                # 屏障操作：之后的缓存键无法确定，预执行的结果不会被用到
+                self._stop("屏障操作")
+                self._cancelled.set()
+                return
+            result = self._executor.execute([op], keys=[key])
+        except Exception as e:
+            logger.warning(f"预执行失败: {e}", exc_info=True)
+            self._stop(f"执行异常: {e}")
+            self._cancelled.set()
+            return
+        self.executed += 1
+        self.cache_hits += result.cache_hits
+        self.errors += len(result.errors)
+        self._execution_ms += result.duration_ms
+        if result.aborted is not None:
+            # 超出预算或已取消：之后的操作同样会被中止，不再执行
+            self._stop(result.aborted["message"])
+            self._cancelled.set()
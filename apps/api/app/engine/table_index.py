@@ -0,0 +1,339 @@
+"""表索引缓存 - 为跨表查找函数构建一次、多次复用的哈希索引
+
+VLOOKUP / COUNTIFS 原实现每行都会复制被引用表的列数据并线性扫描，
+两张表都较大时是 O(n²)。这里在一次执行（Executor）内缓存：
+
+- 跨表引用的列数据：按 (file_id, sheet, 列) 缓存，每行不再复制整列
+- VLOOKUP 哈希索引：按 (file_id, sheet, 键列) 构建，每行查找为 O(1)
+  - 键的匹配规则与 "=" 运算符和原实现一致（Python 相等比较：1 == 1.0，None 匹配 None，
+    NaN 不匹配任何值，文本 "1" 不匹配数值 1）
+  - 重复键保留第一次出现的位置（与 Excel 的首个匹配一致）
+- COUNTIFS 计数表：按范围引用组合聚合各取值组合的行数，每行查表为 O(1)
+  - 匹配规则同上
+
+表数据变化（新增列、更新列、新建/替换 Sheet）后由 Executor 调用 invalidate 失效。
+Executor 会并发执行互不依赖的操作，缓存的读写和失效由一把可重入锁保护。
+"""
+
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from app.engine.models import ExcelError, FileCollection, Table
+from app.engine.operators import is_null
+
+
+# 缺失值（NaN / NaT）键：不参与索引，查找时返回 #N/A
+_NULL_KEY = object()
+
+
+def normalize_key(value: Any) -> Hashable:
+    """
+    归一化查找键（匹配规则与 "=" 运算符一致，即 Python 相等比较）
+
+    - 数值、bool、文本、日期、None：原值（1 == 1.0、True == 1、None == None；
+      文本不转换为数值，"1" 与 1 不匹配，与 {"op": "=", "left": "1", "right": 1} 为 FALSE 一致）
+    - NaN / NaT 等缺失值：返回 _NULL_KEY，不与任何值匹配（NaN == NaN 为 FALSE）
+    - 不可哈希的值：按 repr 作为键
+    """
+    if value is None:
+        return None
+    try:
+        if is_null(value):
+            return _NULL_KEY
+    except (TypeError, ValueError):
+        pass
+    try:
+        hash(value)
+    except TypeError:
+        return ("repr", repr(value))
+    return value
+
+
+class TableIndexCache:
+    """
+    一次执行内共享的表索引缓存
+
+    缓存键均以 (file_id, sheet_name) 开头，便于按表失效。
+    """
+
+    def __init__(self, tables: FileCollection):
+        self.tables = tables
+        # (file_id, sheet_name, key_col) -> {归一化键: 首行位置}
+        self._lookup_indexes: Dict[Tuple[str, str, str], Dict[Hashable, int]] = {}
+        # (file_id, sheet_name, col) -> 列数据
+        self._columns: Dict[Tuple[str, str, str], List[Any]] = {}
+        # 范围引用组合 -> 取值组合计数（None 表示范围中有不可哈希的值，需线性扫描）
+        self._count_indexes: Dict[Tuple[str, ...], Optional[Counter]] = {}
+        self._lock = threading.RLock()
+
+        # 统计信息
+        self.builds = 0
+        self.probes = 0
+
+    # ==================== 缓存管理 ====================
+
+    def invalidate(self, file_id: str, sheet_name: Optional[str] = None):
+        """
+        使某张表（或某个文件的所有表）的索引失效
+
+        Args:
+            file_id: 文件 ID
+            sheet_name: Sheet 名称（None 表示该文件的所有 Sheet）
+        """
+        with self._lock:
+            for cache in (self._lookup_indexes, self._columns):
+                stale = [
+                    key for key in cache
+                    if key[0] == file_id and (sheet_name is None or key[1] == sheet_name)
+                ]
+                for key in stale:
+                    del cache[key]
+
+            stale_refs = [
+                refs for refs in self._count_indexes
+                if any(_ref_matches(ref, file_id, sheet_name) for ref in refs)
+            ]
+            for refs in stale_refs:
+                del self._count_indexes[refs]
+
+    def clear(self):
+        """清空所有缓存"""
+        with self._lock:
+            self._lookup_indexes.clear()
+            self._columns.clear()
+            self._count_indexes.clear()
+
+    def _get_table(self, table_ref: str) -> Tuple[str, str, Table]:
+        """解析 "file_id.sheet_name" 表引用"""
+        parts = table_ref.split(".")
+        if len(parts) != 2:
+            raise ValueError(
+                f"无效的表引用格式: {table_ref}，应为 'file_id.sheet_name'"
+            )
+        file_id, sheet_name = parts
+        return file_id, sheet_name, self.tables.get_table(file_id, sheet_name)
+
+    def get_column(self, file_id: str, sheet_name: str, column_name: str) -> List[Any]:
+        """获取（并缓存）表的列数据"""
+        key = (file_id, sheet_name, column_name)
+        with self._lock:
+            column = self._columns.get(key)
+            if column is None:
+                column = self.tables.get_table(file_id, sheet_name).get_column(column_name)
+                self._columns[key] = column
+            return column
+
+    def get_ref_column(self, ref: str) -> List[Any]:
+        """
+        获取跨表列引用的数据（缓存，调用方不应修改返回的列表）
+
+        Args:
+            ref: "file_id.sheet_name.column_name" 格式（三段式）
+
+        Returns:
+            列数据
+        """
+        parts = ref.split(".")
+        if len(parts) != 3:
+            raise ValueError(
+                f"无效的跨表引用格式: {ref}，应为 'file_id.sheet_name.column_name'"
+            )
+
+        file_id, sheet_name, col_name = parts
+
+        try:
+            return self.get_column(file_id, sheet_name, col_name)
+        except Exception as e:
+            raise ValueError(f"无法访问 {ref}: {e}")
+
+    def get_lookup_index(self, file_id: str, sheet_name: str, key_col: str) -> Dict[Hashable, int]:
+        """获取（并缓存）键列的哈希索引：归一化键 -> 首次出现的行位置"""
+        cache_key = (file_id, sheet_name, key_col)
+        with self._lock:
+            index = self._lookup_indexes.get(cache_key)
+            if index is None:
+                index = {}
+                for position, key in enumerate(self.get_column(file_id, sheet_name, key_col)):
+                    normalized = normalize_key(key)
+                    if normalized is not _NULL_KEY and normalized not in index:
+                        index[normalized] = position
+                self._lookup_indexes[cache_key] = index
+                self.builds += 1
+            return index
+
+    # ==================== VLOOKUP ====================
+
+    def vlookup(self, lookup_value: Any, table_ref: str, key_col: str, value_col: str) -> Any:
+        """
+        精确匹配查找
+
+        Args:
+            lookup_value: 查找值
+            table_ref: 表引用 "file_id.sheet_name"
+            key_col: 键列名
+            value_col: 值列名
+
+        Returns:
+            第一个匹配行的值列数据；未找到时返回 #N/A；查找值为错误时原样返回
+        """
+        if isinstance(lookup_value, ExcelError):
+            return lookup_value
+        return self.vlookup_many([lookup_value], table_ref, key_col, value_col)[0]
+
+    def vlookup_many(self, lookup_values: List[Any], table_ref: str, key_col: str, value_col: str) -> List[Any]:
+        """
+        批量精确匹配查找（整列求值时使用，索引和值列只解析一次）
+
+        表引用、键列或值列无效时，所有结果均为 #N/A。
+        """
+        try:
+            file_id, sheet_name, _ = self._get_table(table_ref)
+            index = self.get_lookup_index(file_id, sheet_name, key_col)
+            values = self.get_column(file_id, sheet_name, value_col)
+        except Exception:
+            return [ExcelError("#N/A")] * len(lookup_values)
+
+        self.probes += len(lookup_values)
+        not_found = ExcelError("#N/A")
+        results = []
+        for lookup_value in lookup_values:
+            if isinstance(lookup_value, ExcelError):
+                results.append(lookup_value)
+                continue
+            position = index.get(normalize_key(lookup_value))
+            results.append(not_found if position is None else values[position])
+        return results
+
+    def lookup_function(self, table_ref: str, key_col: str, value_col: str) -> Callable[[Any], Any]:
+        """
+        绑定查找表的单值查找函数（表引用和列名为常量时使用，索引只解析一次）
+
+        返回值与 vlookup(lookup_value, table_ref, key_col, value_col) 一致。
+        """
+        not_found = ExcelError("#N/A")
+        try:
+            file_id, sheet_name, _ = self._get_table(table_ref)
+            index = self.get_lookup_index(file_id, sheet_name, key_col)
+            values = self.get_column(file_id, sheet_name, value_col)
+        except Exception:
+            index = None
+
+        def lookup(lookup_value: Any) -> Any:
+            if isinstance(lookup_value, ExcelError):
+                return lookup_value
+            if index is None:
+                return not_found
+            position = index.get(normalize_key(lookup_value))
+            return not_found if position is None else values[position]
+
+        return lookup
+
+    # ==================== COUNTIFS ====================
+
+    def get_count_index(self, refs: Sequence[str]) -> Optional[Counter]:
+        """
+        获取（并缓存）多个范围的取值组合计数表
+
+        含 NaN 的行不参与计数（NaN 与任何条件都不相等）。
+
+        Args:
+            refs: 范围引用列表（"file_id.sheet_name.column_name"），各范围长度需一致
+
+        Returns:
+            {(值1, 值2, ...): 行数}；范围中存在不可哈希的值时返回 None
+        """
+        refs = tuple(refs)
+        with self._lock:
+            if refs in self._count_indexes:
+                return self._count_indexes[refs]
+
+            ranges = [self.get_ref_column(ref) for ref in refs]
+            try:
+                counts: Optional[Counter] = Counter(
+                    key for key in zip(*ranges)
+                    if not any(_is_nan(value) for value in key)
+                )
+            except TypeError:
+                counts = None
+            self._count_indexes[refs] = counts
+            self.builds += 1
+            return counts
+
+    def count_matches(self, refs: Sequence[str], criteria: Sequence[Any]) -> int:
+        """
+        统计所有范围同时等于对应条件的行数
+
+        Args:
+            refs: 范围引用列表（调用方已校验长度一致）
+            criteria: 与 refs 一一对应的条件值
+        """
+        self.probes += 1
+        counts = self.get_count_index(refs)
+        key = tuple(criteria)
+        if counts is not None:
+            try:
+                if any(_is_nan(value) for value in key):
+                    return 0
+                return counts.get(key, 0)
+            except TypeError:
+                pass
+
+        # 不可哈希的值：线性扫描
+        ranges = [self.get_ref_column(ref) for ref in refs]
+        return sum(
+            1 for row in zip(*ranges)
+            if all(value == criterion for value, criterion in zip(row, key))
+        )
+
+    def count_matches_many(self, refs: Sequence[str], criteria_columns: Sequence[Sequence[Any]]) -> List[int]:
+        """
+        批量统计（整列求值时使用）：每行的条件组合在计数表中查一次
+
+        Args:
+            refs: 范围引用列表（调用方已校验长度一致）
+            criteria_columns: 与 refs 一一对应的条件列（每列长度相同）
+        """
+        counts = self.get_count_index(refs)
+        keys = list(zip(*criteria_columns))
+        self.probes += len(keys)
+        if counts is not None:
+            try:
+                return [
+                    0 if any(_is_nan(value) for value in key) else counts.get(key, 0)
+                    for key in keys
+                ]
+            except TypeError:
+                pass
+        return [self.count_matches(refs, key) for key in keys]
+
+
+def countifs_refs(args: List) -> Optional[List[str]]:
+    """
+    提取 COUNTIFS 的范围引用列表
+
+    Returns:
+        所有范围参数都是 {"ref": "..."} 形式时返回引用列表，否则返回 None
+    """
+    refs = []
+    for range_expr in args[0::2]:
+        if not isinstance(range_expr, dict) or set(range_expr) != {"ref"}:
+            return None
+        ref = range_expr["ref"]
+        if not isinstance(ref, str):
+            return None
+        refs.append(ref)
+    return refs
+
+
+def _is_nan(value: Any) -> bool:
+    """检查是否为 NaN（NaN 与任何值都不相等，不能作为字典键匹配）"""
+    return isinstance(value, float) and value != value
+
+
+def _ref_matches(ref: str, file_id: str, sheet_name: Optional[str]) -> bool:
+    """检查三段式引用是否指向指定的文件 / Sheet"""
+    parts = ref.split(".")
+    if len(parts) != 3 or parts[0] != file_id:
+        return False
+    return sheet_name is None or parts[1] == sheet_name
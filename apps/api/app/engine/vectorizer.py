@@ -0,0 +1,816 @@
+"""向量化公式编译器 - 将 add_column / update_column 的 JSON 公式编译为整列运算
+
+FormulaEvaluator 逐行解释公式：每行构建一次行上下文字典，再递归遍历 JSON AST。
+本模块把公式编译成节点树，每个节点一次处理一批行（行号数组），结果是整列数组：
+
+- 字面量 / 变量：编译为常量，按需广播
+- 列引用：直接取列的 NumPy 数组
+- 二元运算：按元素类型分组，纯数值部分走 NumPy 运算，其余元素走 operators 的标量实现
+- IF / AND / OR：按条件拆分行集合，只在需要的行上求值分支（保留短路语义）
+- IFERROR / ISBLANK / ISNUMBER / ISERROR / ABS：整列内核
+- 其他行级函数：参数整列求值后逐元素调用 functions.py 中的实现
+- 无法向量化的子表达式（VLOOKUP、COUNTIFS、跨表引用、非法结构等）：
+  仅在这些子表达式上回退到逐行求值（行级闭包，见 app.engine.row_compiler）
+
+行级异常与逐行解释保持一致：出错行的结果为 #ERROR，并记录该行第一个异常信息。
+
+每个节点每次求值按行数计入求值次数（见 app.engine.governor），逐行回退的循环中定期检查时间和取消；
+超出预算或被取消时 ExecutionAborted 不作为行级异常记录，直接中止整列求值。
+"""
+
+from itertools import repeat
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union, TYPE_CHECKING
+
+import numpy as np
+import pandas as pd
+
+from app.engine.governor import CHECK_ROWS, ExecutionAborted
+from app.engine.models import ExcelError, Table
+from app.engine.table_index import countifs_refs
+from app.engine.operators import (
+    ARITHMETIC_OPS,
+    BINARY_OPS,
+    COMPARISON_OPS,
+    binary_op,
+)
+
+if TYPE_CHECKING:
+    from app.engine.executor import FormulaEvaluator
+
+
+# ==================== 向量表示 ====================
+
+
+class _Const:
+    """对所有行取值相同的常量（延迟广播）"""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+
+# 节点求值结果：整列数组（长度等于行号数组）或常量
+Vector = Union[np.ndarray, _Const]
+
+# 编译后的节点：接收行号数组，返回这些行的求值结果
+Node = Callable[[np.ndarray], Vector]
+
+
+# 元素类型分类（用于按类型分组处理）
+_K_NUM = 0    # int / float（排除 bool 和 NaN）
+_K_NULL = 1   # None / NaN / NaT
+_K_ERR = 2    # ExcelError
+_K_STR = 3    # str
+_K_BOOL = 4   # bool
+_K_OTHER = 5  # 日期等其他类型
+
+# 整数运算超过此范围时改用 Python 整数，避免 int64 溢出
+_INT64_SAFE = 2 ** 62
+# 整数除法超过此范围时 float64 无法精确表示
+_FLOAT_EXACT_INT = 2 ** 53
+
+
+def _kind_of(value: Any) -> int:
+    """判断单个值的类型分类"""
+    value_type = type(value)
+    if value_type is float:
+        return _K_NULL if value != value else _K_NUM
+    if value_type is int:
+        return _K_NUM
+    if value_type is str:
+        return _K_STR
+    if value is None:
+        return _K_NULL
+    if value_type is bool:
+        return _K_BOOL
+    if isinstance(value, ExcelError):
+        return _K_ERR
+    if isinstance(value, (bool, np.bool_)):
+        return _K_BOOL
+    if isinstance(value, (int, float)):
+        return _K_NULL if value != value else _K_NUM
+    if value is pd.NaT or value is pd.NA:
+        return _K_NULL
+    return _K_OTHER
+
+
+def _kinds(values: np.ndarray) -> np.ndarray:
+    """计算数组每个元素的类型分类"""
+    kind = values.dtype.kind
+    if kind in "iu":
+        return np.full(len(values), _K_NUM, dtype=np.int8)
+    if kind == "f":
+        kinds = np.full(len(values), _K_NUM, dtype=np.int8)
+        kinds[np.isnan(values)] = _K_NULL
+        return kinds
+    if kind == "b":
+        return np.full(len(values), _K_BOOL, dtype=np.int8)
+    return np.fromiter(map(_kind_of, values), dtype=np.int8, count=len(values))
+
+
+def _object_array(values, count: int) -> np.ndarray:
+    """从可迭代对象构建 object 数组（不展开序列元素）"""
+    return np.fromiter(values, dtype=object, count=count)
+
+
+def _materialize(vector: Vector, count: int) -> np.ndarray:
+    """将常量广播为数组"""
+    if not isinstance(vector, _Const):
+        return vector
+    value = vector.value
+    value_type = type(value)
+    if value_type is float or value_type is bool:
+        return np.full(count, value)
+    if value_type is int and -_INT64_SAFE < value < _INT64_SAFE:
+        return np.full(count, value, dtype=np.int64)
+    values = np.empty(count, dtype=object)
+    values.fill(value)
+    return values
+
+
+def _to_object(values: np.ndarray) -> np.ndarray:
+    """转换为 object 数组（元素为 Python 原生值）"""
+    if values.dtype == object:
+        return values
+    return values.astype(object)
+
+
+def _scatter(count: int, parts: List[Tuple[np.ndarray, Vector]]) -> np.ndarray:
+    """
+    按掩码合并多个部分结果
+
+    Args:
+        count: 结果长度
+        parts: [(掩码, 该掩码对应行的结果), ...]
+    """
+    arrays = [vector for _, vector in parts if not isinstance(vector, _Const)]
+    if len(arrays) == len(parts):
+        dtypes = {array.dtype for array in arrays}
+        if len(dtypes) == 1 and object not in dtypes:
+            # 所有部分类型一致时保留原生类型
+            out = np.empty(count, dtype=arrays[0].dtype)
+            for mask, vector in parts:
+                out[mask] = vector
+            return out
+
+    out = np.empty(count, dtype=object)
+    for mask, vector in parts:
+        if isinstance(vector, _Const):
+            out[mask] = _to_object(_materialize(vector, int(mask.sum())))
+        else:
+            out[mask] = _to_object(vector)
+    return out
+
+
+# ==================== 整列运算内核 ====================
+
+
+def _int_overflow_risk(op: str, left: np.ndarray, right: np.ndarray) -> bool:
+    """检查 int64 运算是否可能溢出或损失精度"""
+    if len(left) == 0:
+        return False
+    left_max = max(abs(int(left.min())), abs(int(left.max())))
+    right_max = max(abs(int(right.min())), abs(int(right.max())))
+    if op == "*":
+        return left_max * right_max >= _INT64_SAFE
+    if op == "/":
+        return left_max >= _FLOAT_EXACT_INT or right_max >= _FLOAT_EXACT_INT
+    return left_max + right_max >= _INT64_SAFE
+
+
+def _arithmetic(op: str, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """对全部为有效数值的两列执行算术运算（语义同 Python 运算符）"""
+    if left.dtype == object or right.dtype == object:
+        left, right = _to_object(left), _to_object(right)
+    elif left.dtype.kind in "iu" and right.dtype.kind in "iu" and _int_overflow_risk(op, left, right):
+        left, right = _to_object(left), _to_object(right)
+
+    with np.errstate(all="ignore"):
+        if op == "+":
+            return left + right
+        if op == "-":
+            return left - right
+        if op == "*":
+            return left * right
+
+        zero = right == 0
+        if not zero.any():
+            return left / right
+        out = np.empty(len(left), dtype=object)
+        out[zero] = ExcelError("#DIV/0!")
+        nonzero = ~zero
+        out[nonzero] = _to_object(left[nonzero] / right[nonzero])
+        return out
+
+
+def _propagate_errors(
+    left: np.ndarray,
+    right: np.ndarray,
+    left_kinds: np.ndarray,
+    right_kinds: np.ndarray,
+    out: np.ndarray,
+) -> np.ndarray:
+    """错误传播：左操作数错误优先，其次右操作数错误。返回未被错误占用的行掩码"""
+    left_err = left_kinds == _K_ERR
+    right_err = (right_kinds == _K_ERR) & ~left_err
+    if left_err.any():
+        out[left_err] = left[left_err]
+    if right_err.any():
+        out[right_err] = right[right_err]
+    return ~(left_err | right_err)
+
+
+def _scalar_fallback(
+    op: str,
+    left: np.ndarray,
+    right: np.ndarray,
+    rows: np.ndarray,
+    fail: Callable[[int, str], None],
+) -> np.ndarray:
+    """逐元素调用标量运算实现（异常按行记录）"""
+    out = np.empty(len(left), dtype=object)
+    for position, (a, b, row) in enumerate(zip(left.tolist(), right.tolist(), rows.tolist())):
+        try:
+            out[position] = binary_op(op, a, b)
+        except Exception as e:
+            fail(row, str(e))
+    return out
+
+
+def _binary_vector(
+    op: str,
+    left: np.ndarray,
+    right: np.ndarray,
+    rows: np.ndarray,
+    fail: Callable[[int, str], None],
+) -> np.ndarray:
+    """
+    两列之间的二元运算
+
+    Args:
+        op: 运算符
+        left: 左操作数列
+        right: 右操作数列
+        rows: 对应的行号（用于记录行级异常）
+        fail: 行级异常记录函数
+    """
+    count = len(left)
+    left_kinds = _kinds(left)
+    right_kinds = _kinds(right)
+    numeric = (left_kinds == _K_NUM) & (right_kinds == _K_NUM)
+
+    if op in ARITHMETIC_OPS:
+        if numeric.all():
+            return _arithmetic(op, left, right)
+        out = np.empty(count, dtype=object)
+        rest = _propagate_errors(left, right, left_kinds, right_kinds, out)
+        null = rest & ((left_kinds == _K_NULL) | (right_kinds == _K_NULL))
+        if null.any():
+            out[null] = ExcelError("#VALUE!")
+        if numeric.any():
+            out[numeric] = _to_object(_arithmetic(op, left[numeric], right[numeric]))
+        other = rest & ~null & ~numeric
+        if other.any():
+            out[other] = _scalar_fallback(op, left[other], right[other], rows[other], fail)
+        return out
+
+    if op in COMPARISON_OPS:
+        if numeric.all():
+            return _compare(op, left, right)
+        out = np.zeros(count, dtype=object)
+        rest = _propagate_errors(left, right, left_kinds, right_kinds, out)
+        has_errors = not rest.all()
+        result = np.zeros(count, dtype=bool)
+        if numeric.any():
+            result[numeric] = _compare(op, left[numeric], right[numeric])
+        null = (left_kinds == _K_NULL) | (right_kinds == _K_NULL)
+        other = rest & ~null & ~numeric
+        if other.any():
+            result[other] = _to_object(
+                _scalar_fallback(op, left[other], right[other], rows[other], fail)
+            ).astype(bool)
+        if not has_errors:
+            return result
+        out[rest] = _to_object(result[rest])
+        return out
+
+    if op in {"=", "<>"}:
+        out = np.empty(count, dtype=object)
+        rest = _propagate_errors(left, right, left_kinds, right_kinds, out)
+        # 数值、文本之间直接逐元素比较；空值、布尔等交给标量实现
+        plain = rest & np.isin(left_kinds, (_K_NUM, _K_STR)) & np.isin(right_kinds, (_K_NUM, _K_STR))
+        if plain.all():
+            return left == right if op == "=" else left != right
+        if plain.any():
+            a, b = _to_object(left[plain]), _to_object(right[plain])
+            out[plain] = _to_object(a == b if op == "=" else a != b)
+        other = rest & ~plain
+        if other.any():
+            out[other] = _scalar_fallback(op, left[other], right[other], rows[other], fail)
+        return out
+
+    # 文本拼接 &
+    out = np.empty(count, dtype=object)
+    rest = _propagate_errors(left, right, left_kinds, right_kinds, out)
+    if rest.any():
+        out[rest] = _to_text(left[rest], left_kinds[rest]) + _to_text(right[rest], right_kinds[rest])
+    return out
+
+
+def _compare(op: str, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """数值比较"""
+    if op == ">":
+        return np.asarray(left > right, dtype=bool)
+    if op == "<":
+        return np.asarray(left < right, dtype=bool)
+    if op == ">=":
+        return np.asarray(left >= right, dtype=bool)
+    return np.asarray(left <= right, dtype=bool)
+
+
+def _to_text(values: np.ndarray, kinds: np.ndarray) -> np.ndarray:
+    """转换为文本（空值转为空字符串），用于 & 拼接"""
+    return _object_array(
+        ("" if kind == _K_NULL else str(value) for value, kind in zip(values.tolist(), kinds.tolist())),
+        len(values),
+    )
+
+
+# ==================== 编译器 ====================
+
+
+class VectorizedFormula:
+    """
+    向量化公式 - 对整张表一次性求值 add_column / update_column 公式
+
+    用法：
+        evaluator = FormulaEvaluator(tables, ROW_FUNC_MAP, variables=variables)
+        formula = VectorizedFormula(op.formula, table, evaluator)
+        values, row_errors = formula.evaluate()
+
+    evaluate() 的返回值与逐行调用 FormulaEvaluator.evaluate 完全一致：
+    每行的计算结果，以及 "行 N: 错误信息" 格式的行级错误列表。
+    """
+
+    def __init__(self, formula: Any, table: Table, evaluator: "FormulaEvaluator"):
+        """
+        编译公式
+
+        Args:
+            formula: JSON 公式
+            table: 公式所在的表
+            evaluator: 行级求值器（提供函数表、变量，以及不可向量化子表达式的回退求值）
+        """
+        self.table = table
+        self.evaluator = evaluator
+        self.functions = evaluator.functions
+        self.variables = evaluator.variables
+
+        self._columns = table.get_columns()
+        self._column_set = set(self._columns)
+        self._arrays: Dict[str, np.ndarray] = {}
+        self._row_lists: Dict[str, List[Any]] = {}
+        self._failures: Dict[int, str] = {}
+
+        # 统计：回退到逐行解释的子表达式数量
+        self.fallback_count = 0
+
+        self._root = self._compile(formula)
+
+    def evaluate(self) -> Tuple[List[Any], List[str]]:
+        """
+        对整张表求值
+
+        Returns:
+            (每行的值, 行级错误列表)
+        """
+        row_count = self.table.row_count()
+        self._failures = {}
+        result = self._root(np.arange(row_count))
+
+        if isinstance(result, _Const):
+            values = [result.value] * row_count
+        else:
+            values = result.tolist()
+
+        row_errors = []
+        for row in sorted(self._failures):
+            values[row] = ExcelError("#ERROR")
+            row_errors.append(f"行 {row + 2}: {self._failures[row]}")
+        return values, row_errors
+
+    # ---------- 运行时辅助 ----------
+
+    def _fail(self, row: int, message: str):
+        """记录行级异常（只保留每行第一个异常，与逐行解释一致）"""
+        self._failures.setdefault(row, message)
+
+    def _column_array(self, name: str) -> np.ndarray:
+        """获取（并缓存）列数组"""
+        array = self._arrays.get(name)
+        if array is None:
+            array = self.table.get_column_array(name)
+            self._arrays[name] = array
+        return array
+
+    def _truthy(self, vector: np.ndarray, idx: np.ndarray) -> np.ndarray:
+        """计算 Python 真值（bool(value)），无法判断真值的行记录为异常"""
+        kind = vector.dtype.kind
+        if kind == "b":
+            return vector
+        if kind in "iuf":
+            return vector != 0
+
+        values = vector.tolist()
+        try:
+            return np.fromiter(map(bool, values), dtype=bool, count=len(values))
+        except Exception:
+            truth = np.zeros(len(values), dtype=bool)
+            for position, value in enumerate(values):
+                try:
+                    truth[position] = bool(value)
+                except Exception as e:
+                    self._fail(int(idx[position]), str(e))
+            return truth
+
+    # ---------- 编译 ----------
+
+    def _compile(self, expr: Any) -> Node:
+        """编译表达式，节点每次求值时按行数计入求值次数（见 ResourceGovernor.charge）"""
+        compiled = self._compile_node(expr)
+        charge = self.evaluator.governor.charge
+
+        def node(idx: np.ndarray) -> Vector:
+            charge(len(idx))
+            return compiled(idx)
+
+        return node
+
+    def _compile_node(self, expr: Any) -> Node:
+        """编译表达式（分支顺序与 FormulaEvaluator.evaluate 一致）"""
+        if not isinstance(expr, dict):
+            return self._const_node(expr)
+
+        if "value" in expr:
+            return self._const_node(expr["value"])
+
+        if "col" in expr:
+            return self._compile_col(expr)
+
+        if "var" in expr:
+            return self._compile_var(expr)
+
+        if "ref" in expr:
+            return self._fallback_node(expr)
+
+        if "func" in expr:
+            return self._compile_func(expr)
+
+        if "op" in expr:
+            return self._compile_op(expr)
+
+        return self._fallback_node(expr)
+
+    @staticmethod
+    def _const_node(value: Any) -> Node:
+        const = _Const(value)
+        return lambda idx: const
+
+    def _failure_node(self, message: str) -> Node:
+        """所有行都抛出同一异常的节点"""
+
+        def node(idx: np.ndarray) -> Vector:
+            for row in idx.tolist():
+                self._fail(row, message)
+            return _Const(None)
+
+        return node
+
+    def _compile_col(self, expr: Dict) -> Node:
+        col_name = expr["col"]
+        try:
+            exists = col_name in self._column_set
+        except TypeError:
+            return self._fallback_node(expr)
+        if not exists:
+            return self._failure_node(f"未知的列名: {col_name}")
+        return lambda idx: self._column_array(col_name)[idx]
+
+    def _compile_var(self, expr: Dict) -> Node:
+        var_name = expr["var"]
+        try:
+            exists = var_name in self.variables
+        except TypeError:
+            return self._fallback_node(expr)
+        if not exists:
+            return self._failure_node(f"未定义的变量: {var_name}")
+        return self._const_node(self.variables[var_name])
+
+    def _compile_op(self, expr: Dict) -> Node:
+        op = expr["op"]
+        if not isinstance(op, str) or op not in BINARY_OPS or "left" not in expr or "right" not in expr:
+            return self._fallback_node(expr)
+
+        left_node = self._compile(expr["left"])
+        right_node = self._compile(expr["right"])
+
+        def node(idx: np.ndarray) -> Vector:
+            left = left_node(idx)
+            right = right_node(idx)
+            count = len(idx)
+            if isinstance(left, _Const) and isinstance(right, _Const):
+                try:
+                    return _Const(binary_op(op, left.value, right.value))
+                except Exception as e:
+                    for row in idx.tolist():
+                        self._fail(row, str(e))
+                    return _Const(None)
+            return _binary_vector(
+                op, _materialize(left, count), _materialize(right, count), idx, self._fail
+            )
+
+        return node
+
+    def _compile_func(self, expr: Dict) -> Node:
+        func_name = expr["func"]
+        args = expr.get("args", [])
+        if not isinstance(func_name, str) or not isinstance(args, list):
+            return self._fallback_node(expr)
+
+        name = func_name.upper()
+
+        if name == "IF":
+            if len(args) != 3:
+                return self._fallback_node(expr)
+            return self._compile_if(args)
+
+        if name in {"AND", "OR"}:
+            return self._compile_logical(name, args)
+
+        if name == "VLOOKUP":
+            if len(args) != 4:
+                return self._fallback_node(expr)
+            return self._compile_vlookup(args)
+
+        if name == "COUNTIFS":
+            refs = countifs_refs(args) if len(args) >= 2 and len(args) % 2 == 0 else None
+            if refs is None:
+                return self._fallback_node(expr)
+            return self._compile_countifs(refs, args[1::2])
+
+        if name not in self.functions:
+            return self._fallback_node(expr)
+
+        arg_nodes = [self._compile(arg) for arg in args]
+
+        if name == "IFERROR" and len(arg_nodes) == 2:
+            return self._compile_iferror(arg_nodes)
+        if name in {"ISBLANK", "ISNUMBER", "ISERROR", "ABS"} and len(arg_nodes) == 1:
+            return self._compile_typed_unary(name, arg_nodes[0], self.functions[name])
+
+        return self._elementwise_node(self.functions[name], arg_nodes)
+
+    def _compile_if(self, args: List) -> Node:
+        cond_node = self._compile(args[0])
+        true_node = self._compile(args[1])
+        false_node = self._compile(args[2])
+
+        def node(idx: np.ndarray) -> Vector:
+            cond = cond_node(idx)
+            if isinstance(cond, _Const):
+                try:
+                    truth = bool(cond.value)
+                except Exception as e:
+                    for row in idx.tolist():
+                        self._fail(row, str(e))
+                    return _Const(None)
+                return true_node(idx) if truth else false_node(idx)
+
+            truth = self._truthy(cond, idx)
+            if truth.all():
+                return true_node(idx)
+            if not truth.any():
+                return false_node(idx)
+            falsy = ~truth
+            return _scatter(
+                len(idx),
+                [(truth, true_node(idx[truth])), (falsy, false_node(idx[falsy]))],
+            )
+
+        return node
+
+    def _compile_vlookup(self, args: List) -> Node:
+        """VLOOKUP：表引用和列名为常量时整列批量查找哈希索引，否则逐行查找"""
+        arg_nodes = [self._compile(arg) for arg in args]
+        index_cache = self.evaluator.index_cache
+
+        def node(idx: np.ndarray) -> Vector:
+            lookup, table_ref, key_col, value_col = [arg_node(idx) for arg_node in arg_nodes]
+            count = len(idx)
+
+            if all(isinstance(value, _Const) for value in (table_ref, key_col, value_col)):
+                if isinstance(lookup, _Const):
+                    return _Const(index_cache.vlookup(lookup.value, table_ref.value, key_col.value, value_col.value))
+                return _object_array(
+                    index_cache.vlookup_many(lookup.tolist(), table_ref.value, key_col.value, value_col.value),
+                    count,
+                )
+
+            columns = [
+                _materialize(value, count).tolist()
+                for value in (lookup, table_ref, key_col, value_col)
+            ]
+            return _object_array(map(index_cache.vlookup, *columns), count)
+
+        return node
+
+    def _compile_countifs(self, refs: List[str], criteria_args: List) -> Node:
+        """COUNTIFS：范围均为跨表引用时，整列条件组合在预聚合计数表中批量查找"""
+        criteria_nodes = [self._compile(arg) for arg in criteria_args]
+        index_cache = self.evaluator.index_cache
+
+        def node(idx: np.ndarray) -> Vector:
+            count = len(idx)
+            rows = idx.tolist()
+            failed = False
+            lengths = set()
+            criteria = []
+
+            # 与逐行解释顺序一致：依次求值范围和条件
+            for ref, criteria_node in zip(refs, criteria_nodes):
+                try:
+                    lengths.add(len(index_cache.get_ref_column(ref)))
+                except Exception as e:
+                    failed = True
+                    for row in rows:
+                        self._fail(row, str(e))
+                criteria.append(criteria_node(idx))
+
+            if failed:
+                return _Const(None)
+            if len(lengths) > 1:
+                for row in rows:
+                    self._fail(row, "COUNTIFS 所有范围长度必须一致")
+                return _Const(None)
+
+            if all(isinstance(value, _Const) for value in criteria):
+                return _Const(index_cache.count_matches(refs, [value.value for value in criteria]))
+
+            columns = [_materialize(value, count).tolist() for value in criteria]
+            return np.fromiter(
+                index_cache.count_matches_many(refs, columns), dtype=np.int64, count=count
+            )
+
+        return node
+
+    def _compile_logical(self, name: str, args: List) -> Node:
+        """AND / OR：逐个参数求值，已确定结果的行不再求值后续参数"""
+        arg_nodes = [self._compile(arg) for arg in args]
+        is_and = name == "AND"
+
+        def node(idx: np.ndarray) -> Vector:
+            result = np.full(len(idx), is_and, dtype=bool)
+            active = np.arange(len(idx))
+            for arg_node in arg_nodes:
+                if active.size == 0:
+                    break
+                rows = idx[active]
+                value = arg_node(rows)
+                if isinstance(value, _Const):
+                    try:
+                        truth = np.full(active.size, bool(value.value))
+                    except Exception as e:
+                        for row in rows.tolist():
+                            self._fail(row, str(e))
+                        truth = np.zeros(active.size, dtype=bool)
+                else:
+                    truth = self._truthy(value, rows)
+                if is_and:
+                    result[active[~truth]] = False
+                    active = active[truth]
+                else:
+                    result[active[truth]] = True
+                    active = active[~truth]
+            return result
+
+        return node
+
+    def _compile_iferror(self, arg_nodes: List[Node]) -> Node:
+        value_node, fallback_node = arg_nodes
+
+        def node(idx: np.ndarray) -> Vector:
+            # 与逐行解释一致：两个参数都会被求值
+            value = value_node(idx)
+            fallback = fallback_node(idx)
+            if isinstance(value, _Const):
+                return fallback if isinstance(value.value, ExcelError) else value
+            if value.dtype != object:
+                return value
+            is_error = _kinds(value) == _K_ERR
+            if not is_error.any():
+                return value
+            count = len(idx)
+            fallback = _materialize(fallback, count)
+            return _scatter(count, [(~is_error, value[~is_error]), (is_error, fallback[is_error])])
+
+        return node
+
+    def _compile_typed_unary(self, name: str, arg_node: Node, func: Callable) -> Node:
+        """对原生数值数组直接计算的单参数函数，其他情况逐元素调用"""
+        elementwise = self._elementwise_node(func, [arg_node])
+
+        def node(idx: np.ndarray) -> Vector:
+            value = arg_node(idx)
+            if isinstance(value, _Const) or value.dtype == object:
+                return elementwise(idx, [value])
+
+            kind = value.dtype.kind
+            if name == "ISERROR":
+                return np.zeros(len(value), dtype=bool)
+            if name == "ISBLANK":
+                return np.isnan(value) if kind == "f" else np.zeros(len(value), dtype=bool)
+            if name == "ISNUMBER":
+                if kind == "f":
+                    return ~np.isnan(value)
+                return np.full(len(value), kind in "iu", dtype=bool)
+            # ABS: abs(float(value))
+            if kind in "iu" and len(value) and np.abs(value).max() >= _FLOAT_EXACT_INT:
+                return elementwise(idx, [value])
+            return np.abs(value.astype(np.float64))
+
+        return node
+
+    def _elementwise_node(self, func: Callable, arg_nodes: List[Node]):
+        """参数整列求值后逐元素调用函数"""
+
+        def node(idx: np.ndarray, values: Optional[List[Vector]] = None) -> Vector:
+            if values is None:
+                values = [arg_node(idx) for arg_node in arg_nodes]
+
+            if all(isinstance(value, _Const) for value in values):
+                try:
+                    return _Const(func(*[value.value for value in values]))
+                except Exception as e:
+                    for row in idx.tolist():
+                        self._fail(row, str(e))
+                    return _Const(None)
+
+            count = len(idx)
+            columns = [
+                repeat(value.value, count) if isinstance(value, _Const) else value.tolist()
+                for value in values
+            ]
+            try:
+                return _object_array(map(func, *columns), count)
+            except Exception:
+                pass
+
+            # 存在行级异常：逐行调用并记录异常
+            columns = [
+                [value.value] * count if isinstance(value, _Const) else value.tolist()
+                for value in values
+            ]
+            out = np.empty(count, dtype=object)
+            rows = idx.tolist()
+            for position, call_args in enumerate(zip(*columns)):
+                try:
+                    out[position] = func(*call_args)
+                except Exception as e:
+                    self._fail(rows[position], str(e))
+            return out
+
+        return node
+
+    def _fallback_node(self, expr: Any) -> Node:
+        """不可向量化的子表达式：编译为行级闭包（见 app.engine.row_compiler），在这些行上逐行求值"""
+        self.fallback_count += 1
+        compiled = self.evaluator.compile(expr, self.table.get_columns())
+
+        check = self.evaluator.governor.check
+
+        def node(idx: np.ndarray) -> Vector:
+            for col_name in compiled.columns:
+                if col_name not in self._row_lists:
+                    self._row_lists[col_name] = self.table.get_column(col_name)
+            rows = idx.tolist()
+            column_data = [
+                [self._row_lists[col_name][row] for row in rows]
+                for col_name in compiled.columns
+            ]
+
+            fn = compiled.fn
+            out = np.empty(len(rows), dtype=object)
+            row_tuples = zip(*column_data) if column_data else repeat((), len(rows))
+            for position, (row, values) in enumerate(zip(rows, row_tuples)):
+                if not position % CHECK_ROWS:
+                    check()
+                try:
+                    out[position] = fn(values)
+                except ExecutionAborted:
+                    raise
+                except Exception as e:
+                    self._fail(row, str(e))
+            return out
+
+        return node
@@ -0,0 +1,382 @@
+"""解析结果磁盘缓存 - 按文件内容哈希复用已解析的工作簿
+
+每轮对话都要把 .xlsx 从 MinIO 下载下来再用 openpyxl 解析一遍，
+几十 MB 的工作簿需要几十秒，而文件内容在多轮对话间并不会变化。
+这里把解析后的每个 Sheet 按文件内容的 SHA-256（见 hash_content）存到本地磁盘：
+
+- 每个工作簿一个目录，manifest.json 记录 Sheet 顺序和各文件的布局
+- 每个 Sheet 用 pickle protocol 5 序列化：数值列的数组作为带外缓冲区
+  （按 64 字节对齐）单独写入 .buf 文件，其余部分写入 .pkl 文件
+- 读取时 .buf 文件以只读方式内存映射，数值列直接引用映射的内存（零拷贝），
+  只有 object 列（文本等）需要反序列化
+
+写入先落到临时目录再原子重命名，多进程并发写同一内容时只保留一份。
+缓存目录按总大小做 LRU 淘汰（以 manifest 的修改时间作为最近使用时间，重启后仍有效）。
+
+缓存文件用 pickle 读取，能写入缓存目录就能在服务进程中执行代码：缓存目录以 0o700 创建，
+不属于当前用户或其他用户可写时拒绝使用（见 WorkbookCache._ensure_directory）；
+默认目录在用户缓存目录下（XDG_CACHE_HOME 或 ~/.cache），不使用所有用户可写的系统临时目录。
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import pickle
+import re
+import shutil
+import stat
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 缓存格式版本（解析规则或存储格式变化时递增，旧缓存自动失效）
+FORMAT_VERSION = 1
+
+# 带外缓冲区在 .buf 文件中的对齐字节数
+_ALIGNMENT = 64
+
+_MANIFEST = "manifest.json"
+
+_SHA256_HEX = re.compile(r"^[0-9a-f]{64}$")
+
+# 已解析的工作簿：按顺序排列的 (Sheet 名称, DataFrame)
+ParsedSheets = List[Tuple[str, pd.DataFrame]]
+
+
+def hash_content(data: bytes) -> str:
+    """文件内容的 SHA-256（十六进制），解析缓存的键"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class WorkbookCache:
+    """
+    解析结果磁盘缓存（线程安全；多进程共享同一目录时各自维护索引）
+
+    Raises:
+        PermissionError: 缓存目录不属于当前用户、不是目录或无法设为仅当前用户可访问
+
+    Attributes:
+        directory: 缓存目录
+        max_bytes: 缓存占用的磁盘上限
+        hits / misses / evictions / errors: 累计统计
+    """
+
+    def __init__(self, directory: os.PathLike, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._scanned = False
+        self._verified = False
+        self._ensure_directory()
+
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+        self.load_ms = 0.0
+
+    # ==================== 读写 ====================
+
+    def get(self, content_hash: str) -> Optional[ParsedSheets]:
+        """
+        读取缓存的工作簿
+
+        Args:
+            content_hash: 文件内容的 SHA-256（见 hash_content）
+
+        Returns:
+            按顺序排列的 Sheet 列表；未命中或缓存损坏时返回 None
+        """
+        return self._read(content_hash)
+
+    def get_sheet(self, content_hash: str, sheet_name: str) -> Optional[pd.DataFrame]:
+        """
+        读取缓存的工作簿中的单个 Sheet（延迟加载时使用，不读取其他 Sheet）
+
+        Args:
+            content_hash: 文件内容的 SHA-256（见 hash_content）
+            sheet_name: Sheet 名称
+
+        Returns:
+            DataFrame；未命中、Sheet 不存在或缓存损坏时返回 None
+        """
+        sheets = self._read(content_hash, sheet_name)
+        return sheets[0][1] if sheets else None
+
+    def _read(self, content_hash: str, sheet_name: Optional[str] = None) -> Optional[ParsedSheets]:
+        """读取缓存的全部 Sheet 或指定的一个 Sheet（Sheet 不存在时按未命中处理）"""
+        key = self._key(content_hash)
+        entry_dir = self.directory / key
+        with self._lock:
+            try:
+                self._ensure_directory()
+            except PermissionError as e:
+                logger.warning(f"解析缓存目录不可用，跳过读取: {e}")
+                self.errors += 1
+                self.misses += 1
+                return None
+            self._scan()
+
+        start = time.perf_counter()
+        try:
+            manifest = json.loads((entry_dir / _MANIFEST).read_text(encoding="utf-8"))
+            sheets = [
+                (sheet["name"], _load_sheet(entry_dir, sheet))
+                for sheet in manifest["sheets"]
+                if sheet_name is None or sheet["name"] == sheet_name
+            ]
+            os.utime(entry_dir / _MANIFEST)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        except Exception as e:
+            # 缓存损坏（写入中断、其他进程正在淘汰等）：删除后按未命中处理
+            logger.warning(f"读取解析缓存失败 ({key}): {e}")
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            with self._lock:
+                self._forget(key)
+                self.errors += 1
+                self.misses += 1
+            return None
+
+        elapsed = (time.perf_counter() - start) * 1000
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = manifest.get("size", 0)
+                self._size += self._entries[key]
+            self._entries.move_to_end(key)
+            if sheet_name is not None and not sheets:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.load_ms += elapsed
+        return sheets
+
+    def put(self, content_hash: str, sheets: ParsedSheets):
+        """
+        写入解析结果（已存在时跳过；单个工作簿超过上限时不缓存）
+
+        Args:
+            content_hash: 文件内容的 SHA-256（见 hash_content）
+            sheets: 按顺序排列的 (Sheet 名称, DataFrame)
+        """
+        key = self._key(content_hash)
+        entry_dir = self.directory / key
+        if entry_dir.exists():
+            return
+
+        tmp_dir = self.directory / f".tmp-{uuid.uuid4().hex}"
+        try:
+            with self._lock:
+                self._ensure_directory()
+            tmp_dir.mkdir(mode=0o700)
+            layouts = [
+                _dump_sheet(tmp_dir, index, name, df)
+                for index, (name, df) in enumerate(sheets)
+            ]
+            size = sum(layout.pop("bytes") for layout in layouts)
+            if size > self.max_bytes:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                return
+            manifest = {"format": FORMAT_VERSION, "size": size, "sheets": layouts}
+            (tmp_dir / _MANIFEST).write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp_dir, entry_dir)
+        except Exception as e:
+            # 其他进程已写入同一内容、磁盘不可写等：不影响本次解析结果
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not entry_dir.exists():
+                logger.warning(f"写入解析缓存失败 ({key}): {e}")
+                with self._lock:
+                    self.errors += 1
+            return
+
+        with self._lock:
+            self._scan()
+            self._forget(key)
+            self._entries[key] = size
+            self._size += size
+            self._evict()
+
+    def clear(self):
+        """清空缓存目录"""
+        with self._lock:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self._entries.clear()
+            self._size = 0
+            # 下次读写时重新创建并检查目录
+            self._verified = False
+
+    def stats(self) -> Dict[str, float]:
+        """获取统计信息"""
+        with self._lock:
+            self._scan()
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "errors": self.errors,
+                "avg_load_ms": round(self.load_ms / self.hits, 2) if self.hits else 0.0,
+            }
+
+    # ==================== 索引与淘汰 ====================
+
+    def _ensure_directory(self):
+        """
+        创建缓存目录（0o700）并检查：必须是属于当前用户的目录（不能是符号链接），
+        其他用户有访问权限时收紧为 0o700（调用方持有锁，或在构造时调用）
+
+        Raises:
+            PermissionError: 目录不满足要求
+        """
+        if self._verified:
+            return
+        self.directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+        info = os.lstat(self.directory)
+        if not stat.S_ISDIR(info.st_mode):
+            raise PermissionError(f"解析缓存路径不是目录: {self.directory}")
+        if hasattr(os, "getuid") and info.st_uid != os.getuid():
+            raise PermissionError(f"解析缓存目录不属于当前用户: {self.directory}")
+        if stat.S_IMODE(info.st_mode) & 0o077:
+            os.chmod(self.directory, 0o700)
+        self._verified = True
+
+    def _key(self, content_hash: str) -> str:
+        """缓存目录名：内容哈希 + 格式版本 + pandas 版本（pickle 格式依赖 pandas 版本）"""
+        if not _SHA256_HEX.match(content_hash):
+            raise ValueError(f"解析缓存的键必须是文件内容的 SHA-256: {content_hash!r}")
+        raw = f"{content_hash}\x00{FORMAT_VERSION}\x00{pd.__version__}"
+        return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+    def _scan(self):
+        """首次使用时扫描已有的缓存目录，按最近使用时间建立 LRU 索引（调用方持有锁）"""
+        if self._scanned:
+            return
+        self._scanned = True
+        found = []
+        for manifest_path in self.directory.glob(f"*/{_MANIFEST}"):
+            try:
+                stat = manifest_path.stat()
+                size = json.loads(manifest_path.read_text(encoding="utf-8")).get("size", 0)
+            except (OSError, ValueError):
+                continue
+            found.append((stat.st_mtime, manifest_path.parent.name, size))
+        # 从新到旧依次插到队首，最终最久未使用的在最前
+        for _, key, size in sorted(found, reverse=True):
+            if key not in self._entries:
+                self._entries[key] = size
+                self._entries.move_to_end(key, last=False)
+                self._size += size
+        self._evict()
+
+    def _forget(self, key: str):
+        """从索引中移除（调用方持有锁）"""
+        size = self._entries.pop(key, None)
+        if size is not None:
+            self._size -= size
+
+    def _evict(self):
+        """超出上限时删除最久未使用的工作簿（调用方持有锁）"""
+        while self._size > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            self.evictions += 1
+            # 已映射到内存的文件在删除后仍可读取，直到映射释放
+            shutil.rmtree(self.directory / key, ignore_errors=True)
+
+
+# ==================== Sheet 序列化 ====================
+
+
+def _dump_sheet(entry_dir: Path, index: int, name: str, df: pd.DataFrame) -> Dict:
+    """写入一个 Sheet，返回其在 manifest 中的布局（含临时的 bytes 字段）"""
+    buffers: List[pickle.PickleBuffer] = []
+    payload = pickle.dumps(df, protocol=5, buffer_callback=buffers.append)
+
+    layout = []
+    offset = 0
+    with open(entry_dir / f"{index}.buf", "wb") as f:
+        for buffer in buffers:
+            raw = buffer.raw()
+            padding = -offset % _ALIGNMENT
+            if padding:
+                f.write(b"\x00" * padding)
+                offset += padding
+            f.write(raw)
+            layout.append([offset, raw.nbytes])
+            offset += raw.nbytes
+    (entry_dir / f"{index}.pkl").write_bytes(payload)
+
+    return {
+        "name": name,
+        "pickle": f"{index}.pkl",
+        "buffers": f"{index}.buf",
+        "layout": layout,
+        "bytes": len(payload) + offset,
+    }
+
+
+def _load_sheet(entry_dir: Path, sheet: Dict) -> pd.DataFrame:
+    """读取一个 Sheet（带外缓冲区通过只读内存映射零拷贝引用）"""
+    payload = (entry_dir / sheet["pickle"]).read_bytes()
+    layout = sheet["layout"]
+    if not layout:
+        return pickle.loads(payload)
+
+    with open(entry_dir / sheet["buffers"], "rb") as f:
+        # 空文件无法映射（所有缓冲区均为空数组）
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+    view = memoryview(mapped)
+    return pickle.loads(payload, buffers=[view[offset:offset + length] for offset, length in layout])
+
+
+# ==================== 共享实例 ====================
+
+_shared_cache: Optional[WorkbookCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_workbook_cache() -> Optional[WorkbookCache]:
+    """
+    获取进程内共享的解析结果缓存
+
+    目录由 WORKBOOK_CACHE_DIR 配置（为空时使用用户缓存目录下的 selgetabel/workbooks），
+    上限由 WORKBOOK_CACHE_MAX_MB 配置（为 0 时禁用缓存，返回 None）。
+    目录不属于当前用户等无法安全使用时禁用缓存并记录警告。
+    """
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_lock:
+            if _shared_cache is None:
+                from app.core.config import settings
+
+                if settings.WORKBOOK_CACHE_MAX_MB <= 0:
+                    return None
+                directory = settings.WORKBOOK_CACHE_DIR or _default_directory()
+                try:
+                    _shared_cache = WorkbookCache(directory, settings.WORKBOOK_CACHE_MAX_MB * 1024 * 1024)
+                except OSError as e:
+                    logger.warning(f"解析缓存已禁用: {e}")
+                    return None
+    return _shared_cache
+
+
+def _default_directory() -> Path:
+    """默认缓存目录：用户缓存目录（XDG_CACHE_HOME，未设置时为 ~/.cache）下的 selgetabel/workbooks"""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(Path.home(), ".cache")
+    return Path(cache_home) / "selgetabel" / "workbooks"
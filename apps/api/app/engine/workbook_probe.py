@@ -0,0 +1,298 @@
+"""工作簿探测 - 只读取元数据，不解析数据
+
+完整解析一个几 MB 的工作簿需要数秒，而很多场景只需要知道它的结构
+（上传时校验大小、加载开始时先告诉前端有哪些表和列、get_file_info）。
+这里直接从 zip 中读取：
+
+- xl/workbook.xml 及其关系文件：工作表名称和对应的 XML 路径（不含图表页）
+- 每个工作表 XML 开头的 <dimension ref="A1:R26760"/>：估算行数和列数
+- 每个工作表的第一行：表头（共享字符串只读到表头用到的最大编号为止）
+
+读到第一行即停止，不加载样式，耗时与数据量基本无关（毫秒级）。
+行数由 dimension 估算（可能包含末尾的空行），完整解析后以实际结果为准。
+"""
+
+import io
+import posixpath
+import re
+import zipfile
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple, Union
+from xml.etree.ElementTree import ParseError, fromstring, iterparse
+
+from openpyxl.cell.text import Text
+from openpyxl.utils import column_index_from_string
+
+_MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_DOC_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+_DIMENSION_TAG = f"{_MAIN_NS}dimension"
+_ROW_TAG = f"{_MAIN_NS}row"
+_VALUE_TAG = f"{_MAIN_NS}v"
+_INLINE_STRING_TAG = f"{_MAIN_NS}is"
+_SHARED_STRING_TAG = f"{_MAIN_NS}si"
+_DATA_TAG = f"{_MAIN_NS}sheetData"
+
+_CELL_REFERENCE = re.compile(r"^\$?([A-Za-z]{1,3})\$?(\d+)$")
+
+
+class ProbeError(ValueError):
+    """文件不是有效的 xlsx 工作簿"""
+
+
+@dataclass
+class SheetProbe:
+    """
+    工作表探测结果
+
+    Attributes:
+        name: 工作表名称
+        dimension: 工作表声明的数据范围（如 "A1:R26760"，未声明时为 None）
+        row_count: 估算的数据行数（不含表头；无法估算时为 None）
+        column_count: 估算的列数
+        columns: 表头（空单元格为 "Unnamed: N"，重复的名称加 ".1" 等后缀，与完整解析一致）
+    """
+
+    name: str
+    dimension: Optional[str] = None
+    row_count: Optional[int] = None
+    column_count: int = 0
+    columns: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "dimension": self.dimension,
+            "row_count": self.row_count,
+            "column_count": self.column_count,
+            "columns": self.columns,
+        }
+
+    def cell_count(self) -> int:
+        """估算的单元格数（含表头）"""
+        return ((self.row_count or 0) + 1) * self.column_count
+
+
+def probe_workbook(data: Union[bytes, io.IOBase]) -> List[SheetProbe]:
+    """
+    探测工作簿结构
+
+    Args:
+        data: 文件内容或可随机读取的文件对象
+
+    Returns:
+        按顺序排列的工作表探测结果
+
+    Raises:
+        ProbeError: 不是有效的 xlsx 文件
+    """
+    source = io.BytesIO(data) if isinstance(data, (bytes, bytearray, memoryview)) else data
+    try:
+        with zipfile.ZipFile(source) as archive:
+            sheets = _workbook_sheets(archive)
+            headers = []
+            for name, path in sheets:
+                dimension, header = _read_sheet_head(archive, path)
+                headers.append((name, dimension, header))
+
+            shared_strings = _read_shared_strings(archive, _max_shared_index(headers))
+            return [
+                _build_probe(name, dimension, header, shared_strings)
+                for name, dimension, header in headers
+            ]
+    except ProbeError:
+        raise
+    except (zipfile.BadZipFile, KeyError, ParseError, ValueError) as e:
+        raise ProbeError(f"无效的 xlsx 文件: {e}") from e
+
+
+def list_sheet_names(data: bytes) -> List[str]:
+    """读取工作表名称（与 pd.ExcelFile.sheet_names 一致，不含图表页）"""
+    try:
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            return [name for name, _ in _workbook_sheets(archive)]
+    except (zipfile.BadZipFile, KeyError, ParseError) as e:
+        raise ProbeError(f"无效的 xlsx 文件: {e}") from e
+
+
+def list_sheet_sizes(data: bytes) -> List[Tuple[str, int]]:
+    """
+    读取工作表名称及其 XML 部件解压后的大小（用于估计各个工作表的解析耗时）
+
+    Raises:
+        ProbeError: 不是有效的 xlsx 文件
+    """
+    try:
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            return [(name, archive.getinfo(path).file_size) for name, path in _workbook_sheets(archive)]
+    except (zipfile.BadZipFile, KeyError, ParseError) as e:
+        raise ProbeError(f"无效的 xlsx 文件: {e}") from e
+
+
+# ==================== 工作簿结构 ====================
+
+
+def _workbook_sheets(archive: zipfile.ZipFile) -> List[Tuple[str, str]]:
+    """工作表名称及其在 zip 中的路径（按工作簿中的顺序）"""
+    workbook = fromstring(archive.read("xl/workbook.xml"))
+    rels = fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+
+    targets = {}
+    for rel in rels.iter(f"{_PKG_REL_NS}Relationship"):
+        if rel.get("Type", "").endswith("/worksheet"):
+            target = rel.get("Target", "")
+            # 相对 xl/ 的路径或以 / 开头的包内绝对路径
+            path = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("xl", target))
+            targets[rel.get("Id")] = path
+
+    return [
+        (sheet.get("name"), targets[sheet.get(f"{_DOC_REL_NS}id")])
+        for sheet in workbook.iter(f"{_MAIN_NS}sheet")
+        if sheet.get(f"{_DOC_REL_NS}id") in targets
+    ]
+
+
+def _read_sheet_head(archive: zipfile.ZipFile, path: str) -> Tuple[Optional[str], Optional[List[Tuple[int, str, str]]]]:
+    """
+    读取工作表的 dimension 和第一行（读到第一行结束即停止）
+
+    Returns:
+        (dimension, [(列号, 类型, 原始值), ...])，工作表没有任何行时表头为 None
+    """
+    dimension = None
+    header: Optional[List[Tuple[int, str, str]]] = None
+    with archive.open(path) as source:
+        for _, element in iterparse(source):
+            tag = element.tag
+            if tag == _DIMENSION_TAG:
+                dimension = element.get("ref")
+            elif tag == _ROW_TAG:
+                # 表头是工作表的第 1 行（第 1 行缺失时没有表头）
+                header = _row_cells(element) if element.get("r", "1") == "1" else []
+                break
+            elif tag == _DATA_TAG:
+                break
+    return dimension, header
+
+
+def _row_cells(row) -> List[Tuple[int, str, str]]:
+    """一行中各单元格的 (列号, 类型, 原始值)"""
+    cells = []
+    column = 0
+    for cell in row:
+        match = _CELL_REFERENCE.match(cell.get("r", ""))
+        column = column_index_from_string(match.group(1).upper()) if match else column + 1
+        data_type = cell.get("t", "n")
+        if data_type == "inlineStr":
+            child = cell.find(_INLINE_STRING_TAG)
+            value = Text.from_tree(child).content if child is not None else ""
+        else:
+            value = cell.findtext(_VALUE_TAG) or ""
+        cells.append((column, data_type, value))
+    return cells
+
+
+def _max_shared_index(headers) -> int:
+    """表头用到的最大共享字符串编号（没有时为 -1）"""
+    indexes = [
+        int(value)
+        for _, _, header in headers
+        for _, data_type, value in header or ()
+        if data_type == "s" and value
+    ]
+    return max(indexes, default=-1)
+
+
+def _read_shared_strings(archive: zipfile.ZipFile, max_index: int) -> List[str]:
+    """读取共享字符串表的前 max_index + 1 项"""
+    if max_index < 0 or "xl/sharedStrings.xml" not in archive.namelist():
+        return []
+    strings: List[str] = []
+    with archive.open("xl/sharedStrings.xml") as source:
+        for _, element in iterparse(source):
+            if element.tag == _SHARED_STRING_TAG:
+                strings.append(Text.from_tree(element).content.replace("x005F_", ""))
+                element.clear()
+                if len(strings) > max_index:
+                    break
+    return strings
+
+
+# ==================== 探测结果 ====================
+
+
+def _build_probe(name: str, dimension: Optional[str], header, shared_strings: List[str]) -> SheetProbe:
+    """由 dimension 和表头单元格生成探测结果"""
+    if header is None:
+        # 没有任何行的工作表解析为空表（dimension 通常是默认的 "A1:A1"）
+        return SheetProbe(name=name, dimension=dimension, row_count=0)
+
+    last_row = None
+    last_column = 0
+    if dimension and ":" in dimension:
+        # 单格范围（如 "A1"）是部分写入工具的默认值，不能用来估算
+        end_match = _CELL_REFERENCE.match(dimension.split(":", 1)[1])
+        if end_match:
+            last_row = int(end_match.group(2))
+            last_column = column_index_from_string(end_match.group(1).upper())
+
+    values: Dict[int, str] = {}
+    for column, data_type, value in header:
+        text = _header_text(data_type, value, shared_strings)
+        if text != "":
+            values[column] = text
+    # 完整解析时列从 A 开始，宽度为最右侧有数据的列
+    column_count = max([last_column, *values.keys()])
+    names = [values.get(i + 1, "") for i in range(column_count)]
+    columns = [name.strip() for name in _dedupe_columns(names)]
+    row_count = max(last_row - 1, 0) if last_row is not None else None
+
+    return SheetProbe(
+        name=name,
+        dimension=dimension,
+        row_count=row_count,
+        column_count=column_count,
+        columns=columns,
+    )
+
+
+def _header_text(data_type: str, value: str, shared_strings: List[str]) -> str:
+    """表头单元格的文本（与完整解析后的列名一致）"""
+    if value == "":
+        return ""
+    if data_type == "s":
+        index = int(value)
+        return shared_strings[index] if index < len(shared_strings) else ""
+    if data_type == "b":
+        return str(bool(int(value)))
+    if data_type == "n":
+        number = float(value)
+        return str(int(number)) if number.is_integer() else str(number)
+    if data_type == "e":
+        return ""
+    return value
+
+
+def _dedupe_columns(names: List[str]) -> List[str]:
+    """
+    空表头命名为 "Unnamed: N"，重复的列名加 ".1"、".2" 等后缀
+
+    与 pandas 读取表头的规则一致：先处理有名称的列，再处理空表头；
+    后缀跳过表头中已有的名称（如已有 "名称.1" 时，第二个 "名称" 为 "名称.2"）。
+    """
+    unnamed = [i for i, name in enumerate(names) if name == ""]
+    columns = [name or f"Unnamed: {i}" for i, name in enumerate(names)]
+    order = [i for i, name in enumerate(names) if name != ""] + unnamed
+
+    counts: Dict[str, int] = {}
+    for i in order:
+        column = original = columns[i]
+        count = counts.get(column, 0)
+        while count > 0:
+            counts[original] = count + 1
+            column = f"{original}.{count}"
+            count = count + 1 if column in columns else counts.get(column, 0)
+        columns[i] = column
+        counts[column] = count + 1
+    return columns
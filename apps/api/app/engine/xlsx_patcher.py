@@ -0,0 +1,934 @@
+"""在原工作簿上修补导出 - 只写入变化的列和新增的 sheet
+
+重新生成整个工作簿（见 app.engine.xlsx_writer）会丢掉原文件的格式、公式、列宽、合并单元格等，
+并且即使只新增了一列，也要把所有 sheet 的每个单元格重新序列化一遍。从原始工作簿加载的文件
+（见 ExcelFile.set_source）导出时改为逐个条目流式复制原文件的 zip：
+
+- 未修改的 sheet、样式以外的其他部件（共享字符串、图表、主题等）直接复制压缩后的原始字节，不解压
+- 修改过的 sheet 逐行流式改写 XML：只替换更新列、追加新增列的单元格，其余单元格原样保留；
+  更新的单元格沿用原单元格的样式（日期值和非日期格式不兼容时除外）
+- 新增的 sheet 作为新的部件写入，并加入 workbook.xml、关系文件和 [Content_Types].xml
+- styles.xml 末尾追加新单元格用到的样式（加粗表头、日期格式），原有样式序号不变
+- 改写过 sheet 时去掉 calcChain.xml 并设置 fullCalcOnLoad，Excel 打开时重新计算公式
+
+DataFrame 的行列按位置对应 Sheet XML：表头为第 1 行，第 i 列为第 i 个单元格列；数据行为第 1 行之后
+有值的行（解析时去掉了全空的行）。先扫描一遍修改过的 sheet 确认有值的行数与表的行数一致，
+任何一项无法确认（表被替换、行数不一致、文件结构不标准等）时不写入任何内容，由调用方重新生成整个工作簿。
+"""
+
+import io
+import logging
+import re
+import struct
+import time
+import zipfile
+import zlib
+from dataclasses import dataclass, field
+from typing import BinaryIO, Dict, Iterator, List, Optional, Set, Tuple
+from xml.etree.ElementTree import ParseError
+from xml.sax.saxutils import unescape
+
+import numpy as np
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+from openpyxl.utils import column_index_from_string
+
+from app.core.config import settings
+from app.engine.models import ExcelFile, Table, column_index_to_letter
+from app.engine.workbook_probe import _workbook_sheets
+from app.engine.xlsx_writer import (
+    COMPRESS_LEVEL,
+    DATE_FORMAT,
+    DATETIME_FORMAT,
+    ROW_BATCH,
+    CellStyles,
+    _escape,
+    _object_cell,
+    _render_cells,
+    _unique_sheet_name,
+    _write_sheet,
+)
+
+logger = logging.getLogger(__name__)
+
+# 每次从原 Sheet XML 读取的数据大小
+READ_CHUNK_SIZE = 1024 * 1024
+
+_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_WORKSHEET_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"
+
+_WORKBOOK_PATH = "xl/workbook.xml"
+_WORKBOOK_RELS_PATH = "xl/_rels/workbook.xml.rels"
+_CONTENT_TYPES_PATH = "[Content_Types].xml"
+
+# Sheet XML（元素可能带命名空间前缀，如 <x:row>）
+_SHEET_DATA_RE = re.compile(rb"<((?:[\w.-]+:)?)sheetData\b[^>]*?(/?)>")
+# 单元格开始标签（行中只有 c 和 extLst 子元素，单元格之间的切分点）
+_CELL_START_RE = re.compile(rb"<(?:[\w.-]+:)?c[\s>/]")
+_FORMULA_RE = re.compile(rb"<((?:[\w.-]+:)?)f\b([^>]*?)(?:/>|>.*?</\1f>)", re.S)
+_VALUE_RE = re.compile(rb"<(?:[\w.-]+:)?[vt](?:\s[^>]*)?>[^<]")
+_ROW_NUMBER_RE = re.compile(rb'\sr="(\d+)"')
+_CELL_REF_RE = re.compile(rb'\sr="([A-Za-z]+)\d*"')
+_STYLE_ATTR_RE = re.compile(rb'\ss="(\d+)"')
+_SPANS_RE = re.compile(rb'\sspans="[^"]*"')
+_DIMENSION_RE = re.compile(rb'(<(?:[\w.-]+:)?dimension\b[^>]*?\bref=")([^"]*)(")')
+_REFERENCE_RE = re.compile(r"^\$?([A-Za-z]{1,3})\$?(\d+)$")
+_ATTR_RE = re.compile(r'([\w:.-]+)="([^"]*)"')
+_ATTR_BYTES_RE = re.compile(rb'([\w:.-]+)="([^"]*)"')
+
+
+class _Unpatchable(Exception):
+    """无法在原文件上修补（由调用方重新生成整个工作簿）"""
+
+
+def patch_workbook(output: BinaryIO, excel_file: ExcelFile) -> Optional[int]:
+    """
+    在原始工作簿上修补导出文件
+
+    Args:
+        output: 可写的二进制文件对象（不要求可定位，写入完成后不会关闭）
+        excel_file: 从原始工作簿加载（ExcelFile.set_source）并可能被修改过的文件
+
+    Returns:
+        写入的字节数；未启用（EXCEL_EXPORT_PATCH）或无法修补时返回 None，此时没有写入任何内容
+    """
+    if not settings.EXCEL_EXPORT_PATCH or excel_file.source is None:
+        return None
+
+    try:
+        data = excel_file.source.content()
+    except (OSError, RuntimeError) as e:
+        logger.warning(f"获取原文件失败，重新生成 ({excel_file.filename}): {e}")
+        return None
+
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(data))
+        plan = _plan_patch(archive, excel_file)
+    except _Unpatchable as e:
+        logger.info(f"无法在原文件上修补导出，重新生成 ({excel_file.filename}): {e}")
+        return None
+    except (zipfile.BadZipFile, KeyError, ParseError, ValueError, UnicodeDecodeError) as e:
+        logger.warning(f"读取原文件失败，重新生成 ({excel_file.filename}): {e}")
+        return None
+
+    with archive:
+        return _write_patched(output, data, archive, plan)
+
+
+# ==================== 修补计划 ====================
+
+
+@dataclass
+class _SheetPatch:
+    """
+    一个修改过的 sheet 需要写入的内容
+
+    Attributes:
+        table: 修改后的表
+        columns: 需要写入的列 {列号（从 1 开始）: 列名}，包括更新的原有列和新增列
+        source_width: 原有的列数（列号大于它的是新增列）
+        rows: 各数据行在 sheet 中的行号
+    """
+
+    table: Table
+    columns: Dict[int, str]
+    source_width: int
+    rows: np.ndarray
+
+    @property
+    def width(self) -> int:
+        return max([self.source_width, *self.columns])
+
+
+@dataclass
+class _StylePatch:
+    """
+    styles.xml 的修改：末尾追加的样式及原有样式中的日期格式
+
+    Attributes:
+        path: styles.xml 在 zip 中的路径
+        xml: 修改后的 styles.xml
+        cells: 新单元格使用的样式序号
+        date_styles: 数字格式为日期 / 时间的原有样式序号
+    """
+
+    path: str
+    xml: bytes
+    cells: CellStyles
+    date_styles: Set[int]
+
+
+@dataclass
+class _PatchPlan:
+    sheets: Dict[str, _SheetPatch] = field(default_factory=dict)
+    # (sheet 名称, 部件路径, 表)
+    new_sheets: List[Tuple[str, str, Table]] = field(default_factory=list)
+    styles: Optional[_StylePatch] = None
+    calc_chain: Optional[str] = None
+
+    def is_changed(self) -> bool:
+        return bool(self.sheets or self.new_sheets)
+
+
+def _plan_patch(archive: zipfile.ZipFile, excel_file: ExcelFile) -> _PatchPlan:
+    """确定需要改写的部件（发现无法修补的情况时抛出 _Unpatchable，不写入任何内容）"""
+    plan = _PatchPlan()
+    source_sheets = _workbook_sheets(archive)
+    source_names = {name for name, _ in source_sheets}
+
+    for name, path in source_sheets:
+        if not excel_file.has_sheet(name):
+            raise _Unpatchable(f"sheet '{name}' 已不存在")
+        table = excel_file.get_sheet(name)
+        patch = _plan_sheet(archive, name, path, table)
+        if patch is not None:
+            plan.sheets[path] = patch
+
+    names = [name for name, _ in source_sheets]
+    existing_parts = set(archive.namelist())
+    part_number = len(source_sheets)
+    for name in excel_file.get_sheet_names():
+        if name in source_names:
+            continue
+        unique_name = _unique_sheet_name(str(name), names)
+        names.append(unique_name)
+        part_number += 1
+        while f"xl/worksheets/sheet{part_number}.xml" in existing_parts:
+            part_number += 1
+        plan.new_sheets.append((unique_name, f"xl/worksheets/sheet{part_number}.xml", excel_file.get_sheet(name)))
+
+    if plan.is_changed():
+        targets = _workbook_targets(archive)
+        if "styles" not in targets:
+            raise _Unpatchable("工作簿没有样式部件")
+        plan.styles = _plan_styles(targets["styles"], archive.read(targets["styles"]))
+        if plan.sheets:
+            plan.calc_chain = targets.get("calcChain")
+    return plan
+
+
+def _plan_sheet(archive: zipfile.ZipFile, name: str, path: str, table: Table) -> Optional[_SheetPatch]:
+    """修改过的 sheet 的修补内容（未修改时返回 None）"""
+    source_columns = table.source_columns
+    if source_columns is None:
+        raise _Unpatchable(f"sheet '{name}' 已被替换")
+    columns = table.get_columns()
+    if columns[: len(source_columns)] != source_columns or len(set(columns)) != len(columns):
+        raise _Unpatchable(f"sheet '{name}' 的列与原文件不对应")
+
+    changed = table.get_changed_columns()
+    if not changed:
+        return None
+
+    positions = {column: i + 1 for i, column in enumerate(columns)}
+    with archive.open(path) as source:
+        header_present, rows = _scan_rows(source)
+    if not header_present:
+        raise _Unpatchable(f"sheet '{name}' 第一行不是表头")
+    if len(rows) != len(table):
+        raise _Unpatchable(f"sheet '{name}' 有值的行数 ({len(rows)}) 与表的行数 ({len(table)}) 不一致")
+
+    return _SheetPatch(
+        table=table,
+        columns={positions[column]: column for column in changed},
+        source_width=len(source_columns),
+        rows=rows,
+    )
+
+
+def _scan_rows(source: BinaryIO) -> Tuple[bool, np.ndarray]:
+    """
+    扫描 Sheet XML 中有值的行
+
+    Returns:
+        (第 1 行是否有值, 第 1 行之后有值的行的行号)
+
+    Raises:
+        _Unpatchable: 行号不是递增的
+    """
+    header_present = False
+    rows: List[int] = []
+    last = 0
+    for kind, part in _iter_sheet_parts(source):
+        if kind != _ROW:
+            continue
+        open_end = part.index(b">")
+        match = _ROW_NUMBER_RE.search(part, 0, open_end)
+        number = int(match.group(1)) if match else last + 1
+        if number <= last:
+            raise _Unpatchable("行号不是递增的")
+        last = number
+        if _VALUE_RE.search(part, open_end):
+            if number == 1:
+                header_present = True
+            else:
+                rows.append(number)
+    return header_present, np.array(rows, dtype=np.int64)
+
+
+def _workbook_targets(archive: zipfile.ZipFile) -> Dict[str, str]:
+    """工作簿关系中各类部件（按关系类型的最后一段，如 styles、calcChain）在 zip 中的路径"""
+    targets = {}
+    rels = archive.read(_WORKBOOK_RELS_PATH).decode("utf-8")
+    for tag in re.findall(r"<(?:[\w.-]+:)?Relationship\b[^>]*>", rels):
+        attrs = dict(_ATTR_RE.findall(tag))
+        target = attrs.get("Target", "")
+        if attrs.get("TargetMode") == "External" or not target:
+            continue
+        path = target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+        targets[attrs.get("Type", "").rsplit("/", 1)[-1]] = path
+    return targets
+
+
+# ==================== 样式 ====================
+
+
+def _plan_styles(path: str, xml: bytes) -> _StylePatch:
+    """在 styles.xml 末尾追加新单元格用到的字体、边框、数字格式和单元格样式"""
+    text = xml.decode("utf-8")
+    if re.search(r"<[\w.-]+:styleSheet\b", text):
+        raise _Unpatchable("styles.xml 使用了命名空间前缀")
+
+    # 原有的自定义数字格式
+    custom_formats: Dict[int, str] = {}
+    for tag in re.findall(r"<numFmt\b[^>]*>", text):
+        attrs = dict(_ATTR_RE.findall(tag))
+        if "numFmtId" in attrs:
+            custom_formats[int(attrs["numFmtId"])] = unescape(attrs.get("formatCode", ""), {"&quot;": '"'})
+    datetime_format = max([163, *custom_formats]) + 1
+    date_format = datetime_format + 1
+
+    text, font_id = _append_records(text, "fonts", "font", '<font><b/><sz val="11"/><name val="Calibri"/><family val="2"/></font>')
+    text, border_id = _append_records(
+        text,
+        "borders",
+        "border",
+        '<border><left style="thin"/><right style="thin"/><top style="thin"/><bottom style="thin"/><diagonal/></border>',
+    )
+    formats = (
+        f'<numFmt numFmtId="{datetime_format}" formatCode="{DATETIME_FORMAT}"/>'
+        f'<numFmt numFmtId="{date_format}" formatCode="{DATE_FORMAT}"/>'
+    )
+    if re.search(r"<numFmts\b", text):
+        text, _ = _append_records(text, "numFmts", "numFmt", formats)
+    else:
+        # numFmts 必须是第一个子元素
+        root = re.search(r"<styleSheet\b[^>]*>", text)
+        text = f'{text[:root.end()]}<numFmts count="2">{formats}</numFmts>{text[root.end():]}'
+
+    # 原有的单元格样式中数字格式为日期 / 时间的
+    cell_xfs = re.search(r"<cellXfs\b[^>]*>(.*?)</cellXfs>", text, re.S)
+    if cell_xfs is None:
+        raise _Unpatchable("styles.xml 中没有 cellXfs")
+    date_styles = set()
+    for index, tag in enumerate(re.findall(r"<xf\b[^>]*>", cell_xfs.group(1))):
+        format_id = int(dict(_ATTR_RE.findall(tag)).get("numFmtId", "0"))
+        format_code = custom_formats.get(format_id) or BUILTIN_FORMATS.get(format_id)
+        if format_code and is_date_format(format_code):
+            date_styles.add(index)
+
+    text, base = _append_records(
+        text,
+        "cellXfs",
+        "xf",
+        f'<xf numFmtId="0" fontId="{font_id}" fillId="0" borderId="{border_id}" xfId="0" '
+        'applyFont="1" applyBorder="1" applyAlignment="1"><alignment horizontal="center" vertical="top"/></xf>'
+        f'<xf numFmtId="{datetime_format}" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+        f'<xf numFmtId="{date_format}" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+        '<xf numFmtId="1" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>',
+    )
+    return _StylePatch(
+        path=path,
+        xml=text.encode("utf-8"),
+        cells=CellStyles(header=base, datetime=base + 1, date=base + 2, timedelta=base + 3),
+        date_styles=date_styles,
+    )
+
+
+def _append_records(text: str, container: str, record: str, xml: str) -> Tuple[str, int]:
+    """
+    在 styles.xml 的列表元素（如 <fonts>）末尾追加记录并更新 count
+
+    Returns:
+        (修改后的 styles.xml, 第一条追加的记录的序号)
+    """
+    match = re.search(rf"<{container}\b([^>]*?)(/?)>(?:(.*?)</{container}>)?", text, re.S)
+    if match is None:
+        raise _Unpatchable(f"styles.xml 中没有 {container}")
+    existing = len(re.findall(rf"<{record}\b", match.group(3) or ""))
+    added = len(re.findall(rf"<{record}\b", xml))
+    attrs = re.sub(r'\scount="\d+"', "", match.group(1))
+    replacement = f'<{container}{attrs} count="{existing + added}">{match.group(3) or ""}{xml}</{container}>'
+    return text[: match.start()] + replacement + text[match.end():], existing
+
+
+# ==================== Sheet XML ====================
+
+# Sheet XML 的各部分：sheetData 开始标签及之前、一行、行之间的内容、sheetData 结束标签及之后
+_HEAD, _ROW, _TEXT, _TAIL = range(4)
+
+
+def _iter_sheet_parts(source: BinaryIO) -> Iterator[Tuple[int, bytes]]:
+    """按顺序流式拆分 Sheet XML（拼接所有部分即为原内容）"""
+    buffer = b""
+    eof = False
+
+    def fill():
+        nonlocal buffer, eof
+        chunk = source.read(READ_CHUNK_SIZE)
+        eof = not chunk
+        buffer += chunk
+
+    while (start := _SHEET_DATA_RE.search(buffer)) is None:
+        if eof:
+            raise _Unpatchable("Sheet XML 中没有 sheetData")
+        fill()
+    yield _HEAD, buffer[: start.end()]
+    buffer = buffer[start.end():]
+
+    if not start.group(2):
+        # 按行结束标签切分（比用正则匹配整行快得多）；没有内容的空行（<row r="5"/>）归入行之间的内容
+        prefix = start.group(1)
+        row_start, row_end = b"<" + prefix + b"row", b"</" + prefix + b"row>"
+        data_end = b"</" + prefix + b"sheetData>"
+        while True:
+            end = buffer.find(data_end)
+            limit = end if end >= 0 else len(buffer)
+            position = 0
+            while (close := buffer.find(row_end, position, limit)) >= 0:
+                close += len(row_end)
+                open_ = buffer.rfind(row_start, position, close)
+                while open_ >= 0 and buffer[open_ + len(row_start): open_ + len(row_start) + 1] not in b" \t\r\n>":
+                    open_ = buffer.rfind(row_start, position, open_)
+                if open_ < 0:
+                    raise _Unpatchable("Sheet XML 中的行不完整")
+                if open_ > position:
+                    yield _TEXT, buffer[position:open_]
+                yield _ROW, buffer[open_:close]
+                position = close
+            buffer = buffer[position:]
+            if end >= 0:
+                break
+            if eof:
+                raise _Unpatchable("Sheet XML 不完整")
+            fill()
+
+    while buffer:
+        yield _TAIL, buffer
+        buffer = source.read(READ_CHUNK_SIZE)
+
+
+class _SheetRewriter:
+    """逐行改写修改过的 sheet：替换 / 追加需要写入的列的单元格"""
+
+    def __init__(self, patch: _SheetPatch, styles: _StylePatch):
+        self.patch = patch
+        self.styles = styles
+        self.columns = sorted(patch.columns)
+        self.letters = {column: column_index_to_letter(column - 1) for column in self.columns}
+        self.first_new_column = min(self.columns)
+        self.updates_existing = self.first_new_column <= patch.source_width
+        self._series = {
+            column: patch.table.get_data([name]).iloc[:, 0] for column, name in patch.columns.items()
+        }
+        self._column_cache: Dict[bytes, int] = {}
+        # 当前批次的单元格 XML {列号: object 数组}
+        self._batch: Dict[int, np.ndarray] = {}
+        self._batch_start = 0
+        self._batch_end = 0
+        self._next_row = 0
+        self._last_row = 0
+        # 被替换的共享公式的编号（引用它们的其他单元格去掉公式，只保留值）
+        self._removed_shared: Set[bytes] = set()
+
+    def rewrite(self, row: bytes) -> bytes:
+        open_end = row.index(b">")
+        match = _ROW_NUMBER_RE.search(row, 0, open_end)
+        number = int(match.group(1)) if match else self._last_row + 1
+        self._last_row = number
+
+        if number == 1:
+            return self._rewrite_header(row, open_end)
+        rows = self.patch.rows
+        if self._next_row < len(rows) and rows[self._next_row] == number:
+            index = self._next_row
+            self._next_row += 1
+            return self._rewrite_data(row, open_end, number, index)
+        if self._removed_shared:
+            return _strip_shared_formulas(row, self._removed_shared)
+        return row
+
+    def finish(self):
+        if self._next_row != len(self.patch.rows):
+            raise ValueError("Sheet XML 在扫描后发生了变化")
+
+    # ---------- 行 ----------
+
+    def _rewrite_header(self, row: bytes, open_end: int) -> bytes:
+        """表头：追加新增列的列名（样式与原有的最后一列表头相同）"""
+        cells = self._split_cells(row, open_end)
+        style = self.styles.cells.header
+        for column, cell in cells:
+            if column == self.patch.source_width:
+                match = _STYLE_ATTR_RE.search(cell, 0, cell.index(b">"))
+                if match:
+                    style = int(match.group(1))
+
+        kept = [(column, cell) for column, cell in cells if column not in self.patch.columns or column <= self.patch.source_width]
+        for column in self.columns:
+            if column > self.patch.source_width:
+                ref = f'<c r="{self.letters[column]}1" s="{style}"'
+                cell = _object_cell(ref, self.patch.columns[column], self.styles.cells) or f"{ref}/>"
+                kept.append((column, cell.encode("utf-8")))
+        return self._join(row, open_end, kept)
+
+    def _rewrite_data(self, row: bytes, open_end: int, number: int, index: int) -> bytes:
+        if index >= self._batch_end:
+            self._render_batch(index)
+        offset = index - self._batch_start
+
+        if not self.updates_existing and not self._removed_shared:
+            last_column = self._last_cell_column(row, open_end)
+            if last_column is not None and last_column < self.first_new_column:
+                # 只有新增列且原有单元格都在新增列之前：直接追加到行末
+                new_cells = "".join(self._batch[column][offset] for column in self.columns)
+                close = _row_content_end(row, open_end)
+                return _SPANS_RE.sub(b"", row[: open_end + 1], count=1) + row[open_end + 1: close] + new_cells.encode("utf-8") + row[close:]
+
+        kept = []
+        originals: Dict[int, bytes] = {}
+        for column, cell in self._split_cells(row, open_end):
+            if column in self.patch.columns:
+                originals[column] = cell
+                self._remember_shared_formula(cell)
+            else:
+                kept.append((column, cell))
+        if self._removed_shared:
+            kept = [(column, _strip_shared_formulas(cell, self._removed_shared)) for column, cell in kept]
+
+        for column in self.columns:
+            cell = self._batch[column][offset]
+            if column in originals:
+                cell = self._keep_style(cell, originals[column], f"{self.letters[column]}{number}")
+            if cell:
+                kept.append((column, cell.encode("utf-8")))
+        return self._join(row, open_end, kept)
+
+    def _render_batch(self, start: int):
+        """生成从 start 开始的一批数据行中需要写入的单元格"""
+        end = min(start + ROW_BATCH, len(self.patch.rows))
+        numbers = self.patch.rows[start:end].astype(str).astype(object)
+        self._batch = {
+            column: _render_cells(
+                self._series[column].iloc[start:end],
+                '<c r="' + self.letters[column] + numbers + '"',
+                self.styles.cells,
+            )
+            for column in self.columns
+        }
+        self._batch_start, self._batch_end = start, end
+
+    # ---------- 单元格 ----------
+
+    def _split_cells(self, row: bytes, open_end: int) -> List[Tuple[int, bytes]]:
+        """拆分行中的单元格 [(列号, 单元格 XML)]（没有坐标的单元格按顺序顺延）"""
+        content_end = _row_content_end(row, open_end)
+        starts = [match.start() for match in _CELL_START_RE.finditer(row, open_end + 1, content_end)]
+        starts.append(content_end)
+        cells = []
+        column = 0
+        for start, end in zip(starts, starts[1:]):
+            cell = row[start:end]
+            ref = _CELL_REF_RE.search(cell, 0, cell.index(b">"))
+            column = self._column_number(ref.group(1)) if ref else column + 1
+            cells.append((column, cell))
+        return cells
+
+    def _last_cell_column(self, row: bytes, open_end: int) -> Optional[int]:
+        """行中最后一个单元格的列号（无法直接确定时返回 None）"""
+        start = max(row.rfind(b"<c "), row.rfind(b":c "))
+        if start <= open_end:
+            return None
+        ref = _CELL_REF_RE.search(row, start, row.index(b">", start))
+        return self._column_number(ref.group(1)) if ref else None
+
+    def _column_number(self, letters: bytes) -> int:
+        column = self._column_cache.get(letters)
+        if column is None:
+            column = self._column_cache[letters] = column_index_from_string(letters.decode("ascii").upper())
+        return column
+
+    def _keep_style(self, cell: str, original: bytes, ref: str) -> str:
+        """
+        更新的单元格沿用原单元格的样式
+
+        日期值只沿用日期格式的样式，其他值只沿用非日期格式的样式（否则读取时类型会变）；
+        新值为空时保留只有样式的空单元格。
+        """
+        match = _STYLE_ATTR_RE.search(original, 0, original.index(b">"))
+        if match is None:
+            return cell
+        original_style = int(match.group(1))
+        original_is_date = original_style in self.styles.date_styles
+        if not cell:
+            return f'<c r="{ref}" s="{original_style}"/>'
+
+        head = f'<c r="{ref}"'
+        rest = cell[len(head):]
+        if rest.startswith(' s="'):
+            style_end = rest.index('"', 4)
+            style = int(rest[4:style_end])
+            if original_is_date and style in (self.styles.cells.datetime, self.styles.cells.date):
+                return f'{head} s="{original_style}"{rest[style_end + 1:]}'
+            return cell
+        if original_is_date:
+            return cell
+        return f'{head} s="{original_style}"{rest}'
+
+    def _remember_shared_formula(self, cell: bytes):
+        """被替换的单元格是共享公式的主单元格时记录其编号"""
+        if b"shared" not in cell:
+            return
+        for match in _FORMULA_RE.finditer(cell):
+            attrs = dict(_ATTR_BYTES_RE.findall(match.group(2)))
+            if attrs.get(b"t") == b"shared" and b"ref" in attrs and b"si" in attrs:
+                self._removed_shared.add(attrs[b"si"])
+
+    @staticmethod
+    def _join(row: bytes, open_end: int, cells: List[Tuple[int, bytes]]) -> bytes:
+        """按列号顺序重新拼接行（去掉 spans，列数变化后不再准确）"""
+        open_tag = _SPANS_RE.sub(b"", row[: open_end + 1], count=1)
+        cells.sort(key=lambda item: item[0])
+        return open_tag + b"".join(cell for _, cell in cells) + row[_row_content_end(row, open_end):]
+
+
+def _row_content_end(row: bytes, open_end: int) -> int:
+    """行中单元格之后的位置（extLst 或行结束标签的开始）"""
+    extension = row.find(b"extLst", open_end)
+    if extension >= 0:
+        return row.rindex(b"<", open_end, extension)
+    return row.rindex(b"</")
+
+
+def _strip_shared_formulas(xml: bytes, removed: Set[bytes]) -> bytes:
+    """去掉引用已被替换的共享公式的公式元素（单元格保留缓存的值）"""
+    if b"shared" not in xml:
+        return xml
+
+    def strip(match):
+        attrs = dict(_ATTR_BYTES_RE.findall(match.group(2)))
+        if attrs.get(b"t") == b"shared" and attrs.get(b"si") in removed and b"ref" not in attrs:
+            return b""
+        return match.group(0)
+
+    return _FORMULA_RE.sub(strip, xml)
+
+
+def _patch_dimension(head: bytes, width: int) -> bytes:
+    """扩展 <dimension ref="A1:D100"/> 的列范围"""
+    match = _DIMENSION_RE.search(head)
+    if match is None:
+        return head
+    ref = match.group(2).decode("ascii")
+    first, _, last = ref.partition(":")
+    end = _REFERENCE_RE.match(last or first)
+    if end is None or column_index_from_string(end.group(1).upper()) >= width:
+        return head
+    new_ref = f"{first if last else 'A1'}:{column_index_to_letter(width - 1)}{end.group(2)}"
+    return head[: match.start(2)] + new_ref.encode("ascii") + head[match.end(2):]
+
+
+def _write_patched_sheet(source: BinaryIO, stream: BinaryIO, patch: _SheetPatch, styles: _StylePatch):
+    rewriter = _SheetRewriter(patch, styles)
+    pieces: List[bytes] = []
+    size = 0
+    for kind, part in _iter_sheet_parts(source):
+        if kind == _HEAD:
+            part = _patch_dimension(part, patch.width)
+        elif kind == _ROW:
+            part = rewriter.rewrite(part)
+        pieces.append(part)
+        size += len(part)
+        if size >= READ_CHUNK_SIZE:
+            stream.write(b"".join(pieces))
+            pieces, size = [], 0
+    rewriter.finish()
+    stream.write(b"".join(pieces))
+
+
+# ==================== 工作簿 ====================
+
+
+def _write_patched(output: BinaryIO, data: bytes, archive: zipfile.ZipFile, plan: _PatchPlan) -> int:
+    """按计划写入修补后的工作簿，返回写入的字节数"""
+    writer = _ZipWriter(output)
+    changed = plan.is_changed()
+
+    new_relationships = []
+    if plan.new_sheets:
+        rels = archive.read(_WORKBOOK_RELS_PATH).decode("utf-8")
+        taken = set(re.findall(r'\bId="([^"]*)"', rels))
+        number = 0
+        for name, path, _ in plan.new_sheets:
+            number += 1
+            while f"rId{number}" in taken:
+                number += 1
+            new_relationships.append((name, path, f"rId{number}"))
+
+    for info in archive.infolist():
+        name = info.filename
+        if name in plan.sheets:
+            with archive.open(info) as source, writer.open(name) as stream:
+                _write_patched_sheet(source, stream, plan.sheets[name], plan.styles)
+        elif not changed:
+            writer.copy(data, info)
+        elif name == plan.calc_chain:
+            continue
+        elif name == plan.styles.path:
+            writer.writestr(name, plan.styles.xml)
+        elif name == _WORKBOOK_PATH:
+            xml = _patch_workbook_xml(archive.read(name).decode("utf-8"), new_relationships, bool(plan.sheets))
+            writer.writestr(name, xml.encode("utf-8"))
+        elif name == _WORKBOOK_RELS_PATH:
+            xml = _patch_workbook_rels(archive.read(name).decode("utf-8"), new_relationships, plan.calc_chain)
+            writer.writestr(name, xml.encode("utf-8"))
+        elif name == _CONTENT_TYPES_PATH:
+            xml = _patch_content_types(archive.read(name).decode("utf-8"), new_relationships, plan.calc_chain)
+            writer.writestr(name, xml.encode("utf-8"))
+        else:
+            writer.copy(data, info)
+
+    for _, path, table in plan.new_sheets:
+        with writer.open(path) as stream:
+            _write_sheet(stream, table.get_data(), plan.styles.cells)
+    return writer.close()
+
+
+def _patch_workbook_xml(xml: str, new_sheets: List[Tuple[str, str, str]], full_calc: bool) -> str:
+    """加入新增的 sheet；改写过 sheet 时设置打开时重新计算公式"""
+    sheets_end = re.search(r"</([\w.-]+:)?sheets>", xml)
+    if sheets_end is None:
+        raise ValueError("workbook.xml 中没有 sheets")
+    prefix = sheets_end.group(1) or ""
+
+    if new_sheets:
+        rel_prefix = re.search(rf'xmlns:([\w.-]+)="{re.escape(_REL_NS)}"', xml)
+        sheet_id = max([0, *(int(value) for value in re.findall(r'\bsheetId="(\d+)"', xml))])
+        elements = []
+        for name, _, rel_id in new_sheets:
+            sheet_id += 1
+            escaped = _escape(name).replace('"', "&quot;")
+            if rel_prefix:
+                rel_attr = f'{rel_prefix.group(1)}:id="{rel_id}"'
+            else:
+                rel_attr = f'r:id="{rel_id}" xmlns:r="{_REL_NS}"'
+            elements.append(f'<{prefix}sheet name="{escaped}" sheetId="{sheet_id}" {rel_attr}/>')
+        xml = xml[: sheets_end.start()] + "".join(elements) + xml[sheets_end.start():]
+
+    if full_calc:
+        calc = re.search(r"<([\w.-]+:)?calcPr\b([^>]*?)(/?)>", xml)
+        if calc is not None:
+            attrs = re.sub(r'\sfullCalcOnLoad="[^"]*"', "", calc.group(2))
+            tag = f'<{calc.group(1) or ""}calcPr{attrs} fullCalcOnLoad="1"{calc.group(3)}>'
+            xml = xml[: calc.start()] + tag + xml[calc.end():]
+        else:
+            # calcPr 位于 sheets、functionGroups、externalReferences、definedNames 之后
+            position = max(
+                match.end()
+                for match in re.finditer(
+                    r"</(?:[\w.-]+:)?(?:sheets|functionGroups|externalReferences|definedNames)>"
+                    r"|<(?:[\w.-]+:)?(?:functionGroups|externalReferences|definedNames)\b[^>]*/>",
+                    xml,
+                )
+            )
+            xml = xml[:position] + f'<{prefix}calcPr fullCalcOnLoad="1"/>' + xml[position:]
+    return xml
+
+
+def _patch_workbook_rels(xml: str, new_sheets: List[Tuple[str, str, str]], calc_chain: Optional[str]) -> str:
+    if calc_chain:
+        xml = re.sub(r'<(?:[\w.-]+:)?Relationship\b[^>]*Type="[^"]*/calcChain"[^>]*/>', "", xml)
+    relationships = "".join(
+        f'<Relationship Id="{rel_id}" Type="{_REL_NS}/worksheet" Target="{path[len("xl/"):]}"/>'
+        for _, path, rel_id in new_sheets
+    )
+    end = xml.rindex("</")
+    return xml[:end] + relationships + xml[end:]
+
+
+def _patch_content_types(xml: str, new_sheets: List[Tuple[str, str, str]], calc_chain: Optional[str]) -> str:
+    if calc_chain:
+        xml = re.sub(rf'<(?:[\w.-]+:)?Override\b[^>]*PartName="/{re.escape(calc_chain)}"[^>]*/>', "", xml)
+    overrides = "".join(
+        f'<Override PartName="/{path}" ContentType="{_WORKSHEET_CONTENT_TYPE}"/>' for _, path, _ in new_sheets
+    )
+    end = xml.rindex("</")
+    return xml[:end] + overrides + xml[end:]
+
+
+# ==================== zip ====================
+
+_LOCAL_HEADER = struct.Struct(zipfile.structFileHeader)
+_CENTRAL_HEADER = struct.Struct(zipfile.structCentralDir)
+_END_RECORD = struct.Struct(zipfile.structEndArchive)
+_DATA_DESCRIPTOR = struct.Struct("<4sLLL")
+_ZIP32_LIMIT = 0xFFFFFFFF
+_FLAG_DATA_DESCRIPTOR = 0x08
+_FLAG_UTF8 = 0x800
+
+
+@dataclass
+class _ZipEntry:
+    name: bytes
+    flags: int
+    method: int
+    dos_time: int
+    dos_date: int
+    crc: int
+    compressed_size: int
+    size: int
+    offset: int
+    external_attr: int = 0
+
+
+class _ZipWriter:
+    """
+    只写的 zip 输出（不要求可定位）
+
+    与 zipfile 不同，可以直接复制另一个 zip 中条目压缩后的原始字节（不解压、不重新压缩）。
+    新写入的条目使用数据描述符（压缩完成后才写入 CRC 和大小）。不支持 zip64（超过 4GB）。
+    """
+
+    def __init__(self, output: BinaryIO):
+        self._output = output
+        self._offset = 0
+        self._entries: List[_ZipEntry] = []
+
+    def copy(self, data: bytes, info: zipfile.ZipInfo):
+        """复制原 zip 中的条目（压缩后的原始字节）"""
+        header = _LOCAL_HEADER.unpack_from(data, info.header_offset)
+        start = info.header_offset + _LOCAL_HEADER.size + header[10] + header[11]
+        raw = memoryview(data)[start: start + info.compress_size]
+        if len(raw) != info.compress_size:
+            raise ValueError(f"zip 条目不完整: {info.filename}")
+        name, flags = self._encode_name(info.filename)
+        dos_date = (info.date_time[0] - 1980) << 9 | info.date_time[1] << 5 | info.date_time[2]
+        dos_time = info.date_time[3] << 11 | info.date_time[4] << 5 | info.date_time[5] // 2
+        entry = _ZipEntry(
+            name=name,
+            flags=flags | (info.flag_bits & 0x06),
+            method=info.compress_type,
+            dos_time=dos_time,
+            dos_date=dos_date,
+            crc=info.CRC,
+            compressed_size=info.compress_size,
+            size=info.file_size,
+            offset=self._offset,
+            external_attr=info.external_attr,
+        )
+        self._write_local_header(entry)
+        self._write(raw)
+        self._entries.append(entry)
+
+    def writestr(self, name: str, data: bytes):
+        with self.open(name) as stream:
+            stream.write(data)
+
+    def open(self, name: str) -> "_ZipEntryStream":
+        """新写入一个条目（返回可写的流，关闭后完成）"""
+        encoded, flags = self._encode_name(name)
+        now = time.localtime()
+        entry = _ZipEntry(
+            name=encoded,
+            flags=flags | _FLAG_DATA_DESCRIPTOR,
+            method=zipfile.ZIP_DEFLATED,
+            dos_time=now.tm_hour << 11 | now.tm_min << 5 | now.tm_sec // 2,
+            dos_date=(now.tm_year - 1980) << 9 | now.tm_mon << 5 | now.tm_mday,
+            crc=0,
+            compressed_size=0,
+            size=0,
+            offset=self._offset,
+            external_attr=0o600 << 16,
+        )
+        self._write_local_header(entry)
+        return _ZipEntryStream(self, entry)
+
+    def close(self) -> int:
+        """写入中央目录，返回写入的总字节数"""
+        start = self._offset
+        for entry in self._entries:
+            self._write(_CENTRAL_HEADER.pack(
+                zipfile.stringCentralDir, 20, 3, 20, 0, entry.flags, entry.method, entry.dos_time, entry.dos_date,
+                entry.crc, entry.compressed_size, entry.size, len(entry.name), 0, 0, 0, 0,
+                entry.external_attr, entry.offset,
+            ))
+            self._write(entry.name)
+        size = self._offset - start
+        self._check_limit(start)
+        self._write(_END_RECORD.pack(
+            zipfile.stringEndArchive, 0, 0, len(self._entries), len(self._entries), size, start, 0,
+        ))
+        return self._offset
+
+    def _finish_entry(self, entry: _ZipEntry):
+        self._check_limit(entry.compressed_size, entry.size)
+        self._write(_DATA_DESCRIPTOR.pack(b"PK\x07\x08", entry.crc, entry.compressed_size, entry.size))
+        self._entries.append(entry)
+
+    def _write_local_header(self, entry: _ZipEntry):
+        self._check_limit(entry.offset)
+        if entry.flags & _FLAG_DATA_DESCRIPTOR:
+            crc, compressed_size, size = 0, 0, 0
+        else:
+            crc, compressed_size, size = entry.crc, entry.compressed_size, entry.size
+        self._write(_LOCAL_HEADER.pack(
+            zipfile.stringFileHeader, 20, 0, entry.flags, entry.method, entry.dos_time, entry.dos_date,
+            crc, compressed_size, size, len(entry.name), 0,
+        ))
+        self._write(entry.name)
+
+    def _write(self, data):
+        self._output.write(data)
+        self._offset += len(data)
+
+    @staticmethod
+    def _encode_name(name: str) -> Tuple[bytes, int]:
+        try:
+            return name.encode("ascii"), 0
+        except UnicodeEncodeError:
+            return name.encode("utf-8"), _FLAG_UTF8
+
+    @staticmethod
+    def _check_limit(*values: int):
+        if any(value >= _ZIP32_LIMIT for value in values):
+            raise ValueError("导出的文件超过 4GB")
+
+
+class _ZipEntryStream:
+    """新条目的写入流（边写边压缩）"""
+
+    def __init__(self, writer: _ZipWriter, entry: _ZipEntry):
+        self._writer = writer
+        self._entry = entry
+        self._compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, -15)
+
+    def write(self, data) -> int:
+        self._entry.crc = zlib.crc32(data, self._entry.crc)
+        self._entry.size += len(data)
+        compressed = self._compressor.compress(data)
+        if compressed:
+            self._entry.compressed_size += len(compressed)
+            self._writer._write(compressed)
+        return len(data)
+
+    def close(self):
+        compressed = self._compressor.flush()
+        self._entry.compressed_size += len(compressed)
+        self._writer._write(compressed)
+        self._writer._finish_entry(self._entry)
+
+    def __enter__(self) -> "_ZipEntryStream":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
@@ -0,0 +1,328 @@
+"""流式 xlsx 读取 - 直接解析 Sheet XML，跳过 openpyxl 的逐单元格对象
+
+pd.read_excel(engine="openpyxl") 的耗时几乎全部花在 openpyxl 为每个单元格创建
+ReadOnlyCell 对象、解析坐标、再由 pandas 逐个转换上。这里的 "stream" 后端：
+
+- 工作簿级信息（共享字符串、日期格式样式、日期基准）仍由 openpyxl 只读模式加载，
+  保证与 openpyxl 的解析规则一致
+- Sheet XML 用 iterparse 逐行流式解析，每行处理完立即释放，单元格直接转换为
+  pandas 读取时使用的值（空单元格为 ""、错误值为 NaN、整数值的浮点转为 int、
+  日期格式的数值转为日期），缺失的行列按 openpyxl 只读模式的规则补齐，并去掉末尾空行
+- 读取期间暂停循环垃圾回收：行列表只增不减且没有循环引用，
+  但不断增长的容器会让每次回收都重新遍历已读入的所有行（大表上约占一半耗时）
+- 行数据交给 pandas 的 TextParser，使用与 pd.read_excel 相同的参数做表头和类型推断
+
+因此两个后端得到的 DataFrame 完全一致（见 scripts/benchmark_xlsx_reader.py）。
+
+read_sheet_columns 只把需要的列交给 TextParser（延迟加载时使用），并按完整的行
+计算哪些行不全为空，清洗后与完整解析再取这些列的结果一致。
+"""
+
+import gc
+import io
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple, Union
+from xml.etree.ElementTree import Element, iterparse
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.cell.text import Text
+from openpyxl.utils import column_index_from_string
+from openpyxl.utils.datetime import from_excel, from_ISO8601
+from openpyxl.xml.constants import SHEET_MAIN_NS
+from pandas._libs.parsers import STR_NA_VALUES
+from pandas.errors import EmptyDataError
+from pandas.io.parsers import TextParser
+
+# 可选的读取后端
+READER_BACKENDS = ("openpyxl", "stream")
+
+_ROW_TAG = f"{{{SHEET_MAIN_NS}}}row"
+_VALUE_TAG = f"{{{SHEET_MAIN_NS}}}v"
+_INLINE_STRING_TAG = f"{{{SHEET_MAIN_NS}}}is"
+
+_DIGITS = "0123456789"
+
+# 暂停垃圾回收的嵌套计数（多个线程同时读取时，最后一个结束的恢复）
+_gc_pause_count = 0
+_gc_pause_lock = threading.Lock()
+_gc_was_enabled = False
+
+
+def read_workbook(
+    data: Union[bytes, str, Path],
+    sheet_names: Optional[List[str]] = None,
+) -> List[Tuple[str, pd.DataFrame]]:
+    """
+    流式读取工作簿中的工作表
+
+    Args:
+        data: 文件内容或文件路径
+        sheet_names: 要读取的工作表（None 表示全部，按工作簿中的顺序）
+
+    Returns:
+        按顺序排列的 (Sheet 名称, DataFrame)，与 pd.read_excel(engine="openpyxl") 的结果一致
+    """
+    source = io.BytesIO(data) if isinstance(data, bytes) else data
+    workbook = load_workbook(source, read_only=True, data_only=True, keep_links=False)
+    try:
+        if sheet_names is None:
+            sheet_names = [sheet.title for sheet in workbook.worksheets]
+        return [(name, _rows_to_frame(name, read_sheet_rows(workbook, name))) for name in sheet_names]
+    finally:
+        workbook.close()
+
+
+def read_sheet_columns(
+    data: Union[bytes, str, Path],
+    sheet_name: str,
+    columns: List[str],
+) -> Tuple[pd.DataFrame, np.ndarray]:
+    """
+    流式读取一个工作表中的部分列
+
+    Args:
+        data: 文件内容或文件路径
+        sheet_name: 工作表名称
+        columns: 需要的列（清洗后的列名，即去掉首尾空格；不存在的列忽略）
+
+    Returns:
+        (DataFrame, 行掩码)：DataFrame 只含这些列（按工作表中的顺序，未清洗）；
+        行掩码标记在所有列上不全为空的数据行（即完整解析时 dropna(how="all") 保留的行）
+    """
+    source = io.BytesIO(data) if isinstance(data, bytes) else data
+    workbook = load_workbook(source, read_only=True, data_only=True, keep_links=False)
+    try:
+        rows = read_sheet_rows(workbook, sheet_name)
+    finally:
+        workbook.close()
+    if not rows:
+        return pd.DataFrame(), np.zeros(0, dtype=bool)
+
+    # 表头按完整的行命名（空表头、重复名称的规则依赖所有列），再选出需要的列
+    names = _header_names(sheet_name, rows[0])
+    wanted = set(columns)
+    indexes = [i for i, name in enumerate(names) if str(name).strip() in wanted]
+    non_empty = np.fromiter(
+        (any(not _is_missing(value) for value in row) for row in rows[1:]),
+        dtype=bool,
+        count=len(rows) - 1,
+    )
+    if not indexes:
+        return pd.DataFrame(index=pd.RangeIndex(len(rows) - 1)), non_empty
+
+    projected = [[names[i] for i in indexes]]
+    projected.extend([row[i] for i in indexes] for row in rows[1:])
+    return _rows_to_frame(sheet_name, projected), non_empty
+
+
+def read_sheet_rows(workbook, sheet_name: str) -> List[List[Any]]:
+    """
+    流式读取一个工作表的所有行（与 pandas 的 OpenpyxlReader.get_sheet_data 结果一致）
+
+    单元格转换规则与 openpyxl WorkSheetParser.parse_cell + pandas _convert_cell 一致。
+
+    Args:
+        workbook: openpyxl 只读模式加载的工作簿
+        sheet_name: 工作表名称
+
+    Returns:
+        行列表，各行补齐到相同宽度，空单元格为 ""
+    """
+    if sheet_name not in workbook.sheetnames:
+        raise ValueError(f"Worksheet named '{sheet_name}' not found")
+    sheet = workbook[sheet_name]
+    shared_strings = sheet._shared_strings
+    epoch = workbook.epoch
+    date_formats = workbook._date_formats
+    timedelta_formats = workbook._timedelta_formats
+
+    with workbook._archive.open(sheet._worksheet_path) as source, _gc_paused():
+        return _collect_rows(_iter_rows(source), shared_strings, epoch, date_formats, timedelta_formats)
+
+
+def _collect_rows(
+    row_elements: Iterator[Element],
+    shared_strings: List[str],
+    epoch,
+    date_formats,
+    timedelta_formats,
+) -> List[List[Any]]:
+    """转换所有行（逐单元格的热路径写在一个循环里，避免每个单元格的函数调用）"""
+    # 列字母 -> 列号；样式编号 -> (是否日期格式, 是否时间间隔格式)
+    column_cache: Dict[str, int] = {}
+    style_cache: Dict[str, Tuple[bool, bool]] = {}
+
+    rows: List[List[Any]] = []
+    last_row_with_data = -1
+    row_counter = 0
+    # openpyxl 只读模式的行号规则：缺失的行补空行；行号小于已输出行数的行被跳过
+    next_row = 1
+
+    for element in row_elements:
+        row_attr = element.get("r")
+        row_counter = _parse_row_number(row_attr) if row_attr else row_counter + 1
+
+        values: List[Any] = []
+        column = 0
+        for cell in element:
+            # 列号：按坐标中的列字母（缓存），没有坐标时顺延
+            coordinate = cell.get("r")
+            if coordinate:
+                letters = coordinate.rstrip(_DIGITS)
+                column = column_cache.get(letters)
+                if column is None:
+                    column = column_cache[letters] = column_index_from_string(letters)
+            else:
+                column += 1
+
+            data_type = cell.get("t")
+            if data_type is None or data_type == "n":
+                text = cell.findtext(_VALUE_TAG)
+                if not text:
+                    value = ""
+                else:
+                    if "." in text or "E" in text or "e" in text:
+                        number = float(text)
+                    else:
+                        number = int(text)
+                    style = cell.get("s")
+                    flags = None
+                    if style:
+                        flags = style_cache.get(style)
+                        if flags is None:
+                            style_id = int(style)
+                            flags = style_cache[style] = (style_id in date_formats, style_id in timedelta_formats)
+                    if flags is not None and flags[0]:
+                        try:
+                            value = from_excel(number, epoch, timedelta=flags[1])
+                        except (OverflowError, ValueError):
+                            # 超出日期范围的序列值在 openpyxl 中按错误值处理
+                            value = np.nan
+                    else:
+                        integer = int(number)
+                        value = integer if integer == number else float(number)
+            elif data_type == "s":
+                text = cell.findtext(_VALUE_TAG)
+                value = shared_strings[int(text)] if text else ""
+            else:
+                value = _convert_special(cell, data_type)
+
+            # 按列号放置（缺失的列为 ""；顺序错乱或重复的列按 openpyxl 规则覆盖）
+            width = len(values)
+            if column == width + 1:
+                values.append(value)
+            elif column > width:
+                values.extend([""] * (column - width - 1))
+                values.append(value)
+            elif column >= 1:
+                values[column - 1] = value
+
+        # 行宽为最后一个单元格的列号
+        if column < len(values):
+            del values[max(column, 0):]
+
+        while next_row < row_counter:
+            next_row += 1
+            rows.append([])
+        if next_row <= row_counter:
+            next_row += 1
+            # 去掉行尾的空单元格
+            while values and values[-1] == "":
+                values.pop()
+            if values:
+                last_row_with_data = len(rows)
+            rows.append(values)
+
+    # 去掉末尾的空行，其余行补齐到最大宽度
+    rows = rows[: last_row_with_data + 1]
+    if rows:
+        width = max(len(row) for row in rows)
+        for row in rows:
+            if len(row) < width:
+                row.extend([""] * (width - len(row)))
+    return rows
+
+
+def _iter_rows(source: IO[bytes]) -> Iterator[Element]:
+    """逐元素解析 Sheet XML，依次返回 row 元素（通用但较慢）"""
+    for _, element in iterparse(source):
+        if element.tag == _ROW_TAG:
+            yield element
+            element.clear()
+
+
+def _convert_special(cell, data_type: str) -> Any:
+    """转换数值和共享字符串以外的单元格（内联字符串、布尔、错误值、ISO 日期、公式文本结果）"""
+    if data_type == "inlineStr":
+        child = cell.find(_INLINE_STRING_TAG)
+        return Text.from_tree(child).content if child is not None else ""
+
+    text = cell.findtext(_VALUE_TAG)
+    if not text:
+        return ""
+    if data_type == "b":
+        return bool(int(text))
+    if data_type == "e":
+        return np.nan
+    if data_type == "d":
+        return from_ISO8601(text)
+    # "str"（公式的文本结果）及其他类型按原文本返回
+    return text
+
+
+@contextmanager
+def _gc_paused():
+    """读取期间暂停循环垃圾回收（嵌套、多线程安全）"""
+    global _gc_pause_count, _gc_was_enabled
+    with _gc_pause_lock:
+        if _gc_pause_count == 0:
+            _gc_was_enabled = gc.isenabled()
+            gc.disable()
+        _gc_pause_count += 1
+    try:
+        yield
+    finally:
+        with _gc_pause_lock:
+            _gc_pause_count -= 1
+            if _gc_pause_count == 0 and _gc_was_enabled:
+                gc.enable()
+
+
+def _rows_to_frame(sheet_name: str, rows: List[List[Any]]) -> pd.DataFrame:
+    """行数据转换为 DataFrame（参数与 pd.read_excel 默认参数一致）"""
+    if not rows:
+        return pd.DataFrame()
+    try:
+        return TextParser(rows, header=0, skip_blank_lines=False).read()
+    except EmptyDataError:
+        return pd.DataFrame()
+    except Exception as err:
+        err.args = (f"{err.args[0]} (sheet: {sheet_name})", *err.args[1:])
+        raise
+
+
+def _header_names(sheet_name: str, header: List[Any]) -> List[Any]:
+    """完整解析时的列名（未去空格；空表头为 "Unnamed: N"，重复名称加 ".1" 等后缀）"""
+    return list(_rows_to_frame(sheet_name, [header]).columns)
+
+
+def _is_missing(value: Any) -> bool:
+    """单元格值在 DataFrame 中是否为空值（空单元格、错误值和 pandas 默认的缺失值文本）"""
+    if isinstance(value, str):
+        return value in STR_NA_VALUES
+    return isinstance(value, float) and value != value
+
+
+def _parse_row_number(value: str) -> int:
+    """解析行号（兼容 "3.0" 这类写法）"""
+    try:
+        return int(value)
+    except ValueError:
+        number = float(value)
+        if number.is_integer():
+            return int(number)
+        raise ValueError(f"{value} is not a valid row number")
@@ -0,0 +1,421 @@
+"""流式 xlsx 写入 - 直接输出 SpreadsheetML，不创建 openpyxl 的工作簿对象
+
+pd.ExcelWriter(engine="openpyxl") 先为每个单元格创建 openpyxl 的 Cell 对象（整个工作簿都在内存中），
+保存时再序列化到 BytesIO，导出几十万行的结果需要数 GB 内存和数分钟。这里直接生成 Sheet XML：
+
+- 按行分批（ROW_BATCH），每批内按列向量化生成单元格 XML（数值、布尔、日期按 dtype 整列转换，
+  object 列逐个转换），再拼接成行写入压缩流，写完的批次立即释放
+- 字符串使用内联字符串（inlineStr），不需要在内存中保留共享字符串表
+- 输出直接写入传入的文件对象（临时文件、上传流等，不要求可定位），
+  内存占用只与批次大小有关，与行数无关
+
+单元格类型与 pd.ExcelWriter(engine="openpyxl") 的输出一致（两者读取出的 DataFrame 相同，
+见 scripts/benchmark_xlsx_writer.py）：表头加粗、细边框、居中；日期时间使用 "YYYY-MM-DD HH:MM:SS"
+格式，日期使用 "YYYY-MM-DD" 格式；时间间隔为天数；无穷大写入文本 "inf" / "-inf"；空值不写入。
+不同之处：
+
+- ExcelError 写入为真正的 Excel 错误值单元格（t="e"）
+- 浮点数按完整精度写入（openpyxl 只保留 15 位有效数字）
+- 以 "=" 开头的文本按文本写入，不会变成公式
+- 带时区的日期时间按所在时区的本地时间写入（pandas 会直接报错）
+- XML 中不允许出现的控制字符被去掉（openpyxl 会直接报错）
+"""
+
+import math
+import re
+import zipfile
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, BinaryIO, Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.engine.models import ExcelError, column_index_to_letter
+
+# 每批写入的行数
+ROW_BATCH = 5000
+
+# 压缩级别（与 openpyxl 默认的 zlib 级别一致）
+COMPRESS_LEVEL = 6
+
+# Sheet 名称的最大长度
+MAX_SHEET_NAME_LENGTH = 31
+
+# Sheet 名称中 Excel 不允许的字符（以及 XML 中无法表示的控制字符），替换为 "_"
+_INVALID_SHEET_NAME_CHARS = re.compile(r"[:\\/?*\[\]\x00-\x1f]")
+
+# 日期时间、日期的数字格式
+DATETIME_FORMAT = "YYYY-MM-DD HH:MM:SS"
+DATE_FORMAT = "YYYY-MM-DD"
+
+
+@dataclass(frozen=True)
+class CellStyles:
+    """写入的单元格使用的样式（styles.xml 中 cellXfs 的序号）"""
+
+    header: int = 1
+    datetime: int = 2
+    date: int = 3
+    timedelta: int = 4
+
+
+# 本模块生成的 styles.xml 中的样式（在已有工作簿中写入时见 app.engine.xlsx_patcher）
+DEFAULT_STYLES = CellStyles()
+
+# XML 中不允许出现的控制字符（与 openpyxl 的 ILLEGAL_CHARACTERS_RE 一致）
+_ILLEGAL_CHARACTERS_RE = re.compile(r"[\000-\010]|[\013-\014]|[\016-\037]")
+
+_EXCEL_EPOCH = datetime(1899, 12, 30)
+_ONE_DAY = np.timedelta64(1, "D")
+_SECONDS_PER_DAY = 86400
+
+_MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+_STYLES_XML = (
+    _XML_DECLARATION
+    + f'<styleSheet xmlns="{_MAIN_NS}">'
+    '<numFmts count="2">'
+    f'<numFmt numFmtId="164" formatCode="{DATETIME_FORMAT}"/>'
+    f'<numFmt numFmtId="165" formatCode="{DATE_FORMAT}"/>'
+    "</numFmts>"
+    '<fonts count="2">'
+    '<font><sz val="11"/><name val="Calibri"/><family val="2"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/><family val="2"/></font>'
+    "</fonts>"
+    '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="2">'
+    "<border><left/><right/><top/><bottom/><diagonal/></border>"
+    '<border><left style="thin"/><right style="thin"/><top style="thin"/><bottom style="thin"/><diagonal/></border>'
+    "</borders>"
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="5">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="1" xfId="0" applyFont="1" applyBorder="1" applyAlignment="1">'
+    '<alignment horizontal="center" vertical="top"/></xf>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="1" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    "</cellXfs>"
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    "</styleSheet>"
+)
+
+_ROOT_RELS_XML = (
+    _XML_DECLARATION
+    + '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    f'<Relationship Id="rId1" Type="{_REL_NS}/officeDocument" Target="xl/workbook.xml"/>'
+    "</Relationships>"
+)
+
+
+def write_workbook(output: BinaryIO, sheets: Iterable[Tuple[str, pd.DataFrame]]) -> int:
+    """
+    把多个 DataFrame 写入一个 xlsx 文件（不含索引，第一行为列名）
+
+    Args:
+        output: 可写的二进制文件对象（不要求可定位，写入完成后不会关闭）
+        sheets: (Sheet 名称, DataFrame)，按顺序写入；DataFrame 可以在迭代时才生成，
+            写完一个 Sheet 后不再引用。名称超过 31 个字符时截断，重复时加序号
+
+    Returns:
+        写入的字节数
+
+    Raises:
+        ValueError: 没有任何 Sheet
+    """
+    if _seekable(output):
+        start = output.tell()
+        _write_archive(output, sheets)
+        return output.tell() - start
+
+    # 不可定位的输出（上传流等）按写入的数据计数
+    counter = _CountingStream(output)
+    _write_archive(counter, sheets)
+    return counter.written
+
+
+def _write_archive(output: BinaryIO, sheets: Iterable[Tuple[str, pd.DataFrame]]):
+    names: List[str] = []
+    with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=COMPRESS_LEVEL) as archive:
+        for sheet_name, df in sheets:
+            name = _unique_sheet_name(str(sheet_name), names)
+            names.append(name)
+            with archive.open(f"xl/worksheets/sheet{len(names)}.xml", "w") as stream:
+                _write_sheet(stream, df)
+        if not names:
+            raise ValueError("工作簿中至少需要一个 Sheet")
+
+        archive.writestr("xl/workbook.xml", _workbook_xml(names))
+        archive.writestr("xl/_rels/workbook.xml.rels", _workbook_rels_xml(len(names)))
+        archive.writestr("xl/styles.xml", _STYLES_XML)
+        archive.writestr("_rels/.rels", _ROOT_RELS_XML)
+        archive.writestr("[Content_Types].xml", _content_types_xml(len(names)))
+
+
+# ==================== Sheet ====================
+
+
+def _write_sheet(stream: BinaryIO, df: pd.DataFrame, styles: CellStyles = DEFAULT_STYLES):
+    """写入一个 Sheet 的 XML（按 ROW_BATCH 行分批）"""
+    row_count, column_count = df.shape
+    letters = [column_index_to_letter(i) for i in range(column_count)]
+    last_cell = f"{letters[-1]}{row_count + 1}" if letters else "A1"
+
+    stream.write(
+        (
+            _XML_DECLARATION
+            + f'<worksheet xmlns="{_MAIN_NS}"><dimension ref="A1:{last_cell}"/><sheetData>'
+        ).encode("utf-8")
+    )
+    if column_count:
+        header = "".join(
+            _object_cell(f'<c r="{letter}1" s="{styles.header}"', name, styles) or f'<c r="{letter}1" s="{styles.header}"/>'
+            for letter, name in zip(letters, df.columns)
+        )
+        stream.write(f'<row r="1">{header}</row>'.encode("utf-8"))
+
+        columns = [df.iloc[:, i] for i in range(column_count)]
+        for start in range(0, row_count, ROW_BATCH):
+            end = min(start + ROW_BATCH, row_count)
+            rows = np.arange(start + 2, end + 2).astype(str).astype(object)
+            xml = '<row r="' + rows + '">'
+            for letter, column in zip(letters, columns):
+                xml = xml + _render_cells(column.iloc[start:end], '<c r="' + letter + rows + '"', styles)
+            stream.write("".join(xml + "</row>").encode("utf-8"))
+
+    stream.write(b"</sheetData></worksheet>")
+
+
+def _render_cells(values: pd.Series, refs: np.ndarray, styles: CellStyles = DEFAULT_STYLES) -> np.ndarray:
+    """
+    一批单元格的 XML（按 dtype 整列转换）
+
+    Args:
+        values: 一列中的一批值
+        refs: 各单元格的开头（'<c r="A2"'），object 数组
+        styles: 日期等单元格使用的样式
+
+    Returns:
+        object 数组，空值为 ""
+    """
+    dtype = values.dtype
+    if dtype == bool:
+        return refs + np.where(values.to_numpy(), ' t="b"><v>1</v></c>', ' t="b"><v>0</v></c>').astype(object)
+    if isinstance(dtype, np.dtype) and dtype.kind in "iu":
+        return refs + "><v>" + values.to_numpy().astype(str).astype(object) + "</v></c>"
+    if isinstance(dtype, np.dtype) and dtype.kind == "f":
+        return _render_floats(values.to_numpy(), refs)
+    if isinstance(dtype, pd.DatetimeTZDtype):
+        values = values.dt.tz_localize(None)
+        dtype = values.dtype
+    if isinstance(dtype, np.dtype) and dtype.kind == "M":
+        return _render_serials(_datetime_serials(values.to_numpy()), refs, styles.datetime)
+    if isinstance(dtype, np.dtype) and dtype.kind == "m":
+        return _render_serials(values.to_numpy() / _ONE_DAY, refs, styles.timedelta)
+
+    # object 列和扩展类型（可空整数、分类等）逐个转换
+    cells = np.array([_object_cell("", value, styles) for value in values.to_numpy(dtype=object)], dtype=object)
+    filled = cells != ""
+    cells[filled] = refs[filled] + cells[filled]
+    return cells
+
+
+def _render_floats(array: np.ndarray, refs: np.ndarray) -> np.ndarray:
+    """浮点数列：NaN 不写入，无穷大写入文本（与 pandas 的 inf_rep 一致）"""
+    array = array.astype(np.float64, copy=False)
+    cells = refs + "><v>" + array.astype(str).astype(object) + "</v></c>"
+    finite = np.isfinite(array)
+    if not finite.all():
+        cells[np.isnan(array)] = ""
+        for sign, text in ((1, "inf"), (-1, "-inf")):
+            infinite = array == sign * np.inf
+            cells[infinite] = refs[infinite] + _string_cell(text)
+    return cells
+
+
+def _render_serials(serials: np.ndarray, refs: np.ndarray, style: int) -> np.ndarray:
+    """日期 / 时间间隔列（Excel 序列值，NaT 不写入）"""
+    cells = refs + f' s="{style}"><v>' + serials.astype(str).astype(object) + "</v></c>"
+    cells[np.isnan(serials)] = ""
+    return cells
+
+
+def _datetime_serials(array: np.ndarray) -> np.ndarray:
+    """datetime64 数组转换为 Excel 序列值（NaT 为 NaN，规则与 openpyxl.utils.datetime.to_excel 一致）"""
+    # 按数组本身的精度计算，超出纳秒精度范围的日期不会溢出
+    serials = (array - np.datetime64(_EXCEL_EPOCH, "D")) / _ONE_DAY
+    # Excel 把 1900 年当作闰年：1900-03-01 之前的日期减一天
+    days = np.floor(serials)
+    serials[(days > 0) & (days <= 60)] -= 1
+    return serials
+
+
+def _datetime_serial(value: datetime) -> float:
+    """单个日期时间的 Excel 序列值（规则同上）"""
+    delta = value - _EXCEL_EPOCH
+    days = delta.days - 1 if 0 < delta.days <= 60 else delta.days
+    return days + (delta.seconds + delta.microseconds / 1_000_000) / _SECONDS_PER_DAY
+
+
+# ==================== 单元格 ====================
+
+
+def _object_cell(ref: str, value: Any, styles: CellStyles = DEFAULT_STYLES) -> str:
+    """
+    单个值的单元格 XML（object 列和表头使用）
+
+    Args:
+        ref: 单元格的开头（'<c r="A2"'，可带样式），为空时只返回开头之后的部分
+        value: 单元格值
+        styles: 日期等单元格使用的样式
+
+    Returns:
+        单元格 XML，空值返回 ""
+    """
+    if isinstance(value, str):
+        return ref + _string_cell(value)
+    if value is None or value is pd.NaT or value is pd.NA:
+        return ""
+    if isinstance(value, ExcelError):
+        return f'{ref} t="e"><v>{_escape(value.code)}</v></c>'
+    if isinstance(value, (bool, np.bool_)):
+        return f'{ref} t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, np.integer)):
+        return f"{ref}><v>{int(value)}</v></c>"
+    if isinstance(value, (float, np.floating, Decimal)):
+        number = float(value)
+        if math.isnan(number):
+            return ""
+        if math.isinf(number):
+            return ref + _string_cell("inf" if number > 0 else "-inf")
+        return f"{ref}><v>{number!r}</v></c>"
+    if isinstance(value, np.datetime64):
+        if np.isnat(value):
+            return ""
+        serial = float(_datetime_serials(np.array([value]))[0])
+        return f'{ref} s="{styles.datetime}"><v>{serial!r}</v></c>'
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.replace(tzinfo=None)
+        return f'{ref} s="{styles.datetime}"><v>{_datetime_serial(value)!r}</v></c>'
+    if isinstance(value, date):
+        serial = _datetime_serial(datetime.combine(value, datetime.min.time()))
+        return f'{ref} s="{styles.date}"><v>{serial!r}</v></c>'
+    if isinstance(value, (timedelta, np.timedelta64)):
+        delta = pd.Timedelta(value)
+        if delta is pd.NaT:
+            return ""
+        return f'{ref} s="{styles.timedelta}"><v>{delta.total_seconds() / _SECONDS_PER_DAY!r}</v></c>'
+    # time 和其他类型按文本写入（与 pandas 一致）
+    return ref + _string_cell(str(value))
+
+
+def _string_cell(text: str) -> str:
+    """内联字符串单元格（开头之后的部分）"""
+    return f' t="inlineStr"><is><t xml:space="preserve">{_escape(text)}</t></is></c>'
+
+
+def _escape(text: str) -> str:
+    """转义 XML 文本，去掉不允许出现的控制字符"""
+    if "&" in text:
+        text = text.replace("&", "&amp;")
+    if "<" in text:
+        text = text.replace("<", "&lt;")
+    if ">" in text:
+        text = text.replace(">", "&gt;")
+    if _ILLEGAL_CHARACTERS_RE.search(text):
+        text = _ILLEGAL_CHARACTERS_RE.sub("", text)
+    return text
+
+
+# ==================== 工作簿 ====================
+
+
+def _seekable(output: BinaryIO) -> bool:
+    try:
+        return output.seekable()
+    except (AttributeError, ValueError):
+        return False
+
+
+class _CountingStream:
+    """只写的输出流包装，记录写入的字节数（zipfile 按不可定位的流写入）"""
+
+    def __init__(self, output: BinaryIO):
+        self._output = output
+        self.written = 0
+
+    def write(self, data) -> int:
+        self._output.write(data)
+        self.written += len(data)
+        return len(data)
+
+    def flush(self):
+        if hasattr(self._output, "flush"):
+            self._output.flush()
+
+
+def _unique_sheet_name(name: str, existing: List[str]) -> str:
+    """
+    转为 Excel 允许的 Sheet 名称
+
+    不允许的字符（: \\ / ? * [ ]）替换为 "_"，去掉首尾的单引号，空名称和保留名称 History 改名，
+    截断到 31 个字符，与已有名称重复（不区分大小写）时加序号。
+    """
+    name = _INVALID_SHEET_NAME_CHARS.sub("_", name).strip("'")
+    if not name:
+        name = "Sheet"
+    elif name.lower() == "history":
+        name += "_"
+    name = name[:MAX_SHEET_NAME_LENGTH].rstrip("'") or "Sheet"
+    taken = {item.lower() for item in existing}
+    candidate = name
+    index = 1
+    while candidate.lower() in taken:
+        suffix = str(index)
+        candidate = name[:MAX_SHEET_NAME_LENGTH - len(suffix)] + suffix
+        index += 1
+    return candidate
+
+
+def _workbook_xml(names: List[str]) -> str:
+    sheets = "".join(
+        f'<sheet name="{_escape(name).replace(chr(34), "&quot;")}" sheetId="{i}" r:id="rId{i}"/>'
+        for i, name in enumerate(names, start=1)
+    )
+    return _XML_DECLARATION + f'<workbook xmlns="{_MAIN_NS}" xmlns:r="{_REL_NS}"><sheets>{sheets}</sheets></workbook>'
+
+
+def _workbook_rels_xml(sheet_count: int) -> str:
+    relationships = "".join(
+        f'<Relationship Id="rId{i}" Type="{_REL_NS}/worksheet" Target="worksheets/sheet{i}.xml"/>'
+        for i in range(1, sheet_count + 1)
+    )
+    relationships += f'<Relationship Id="rId{sheet_count + 1}" Type="{_REL_NS}/styles" Target="styles.xml"/>'
+    return (
+        _XML_DECLARATION
+        + f'<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">{relationships}</Relationships>'
+    )
+
+
+def _content_types_xml(sheet_count: int) -> str:
+    overrides = "".join(
+        f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        for i in range(1, sheet_count + 1)
+    )
+    return (
+        _XML_DECLARATION
+        + '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        f"{overrides}</Types>"
+    )
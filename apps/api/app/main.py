@@ -2,16 +2,21 @@
 
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, Request, HTTPException
+from fastapi import Depends, FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, RedirectResponse
 from dotenv import load_dotenv
 
+from app.api.deps import check_permission
 from app.api.main import api_router
 from app.schemas.response import ApiResponse
 from app.core.database import get_db
 from app.core.init_permissions import init_permissions
+from app.core.permissions import Permissions
 from app.core.version_check import verify_versions_on_startup
+from app.engine.excel_parser import shutdown_parse_pool
+from app.engine.llm_pool import close_llm_pool, get_llm_pool
+from app.engine.models import enable_copy_on_write
 
 # 导入版本信息
 try:
@@ -23,6 +28,10 @@ except ImportError:
 
 load_dotenv()
 
+# pandas Copy-on-Write 是进程级的全局设置，在服务入口启用一次（引擎导入时不修改全局设置，
+# 复制表数据时才读取该设置）：表的快照和副本只在修改时按列复制，见 enable_copy_on_write
+enable_copy_on_write()
+
 
 OPENAPI_DESCRIPTION = """
 
@@ -60,6 +69,8 @@ async def lifespan(app: FastAPI):
 
     # 关闭时清理
     print("👋 应用正在关闭...")
+    shutdown_parse_pool()
+    await close_llm_pool()
 
 
 app = FastAPI(
@@ -127,6 +138,16 @@ async def health_check():
     }
 
 
+@app.get(
+    "/health/llm",
+    include_in_schema=False,
+    dependencies=[Depends(check_permission(Permissions.SYSTEM_SETTINGS))],
+)
+async def llm_pool_stats():
+    """LLM 连接池统计（请求数、进行中的请求数、峰值、连接数；包含服务地址，仅限管理员）"""
+    return {"pools": get_llm_pool().stats()}
+
+
 @app.get("/version", include_in_schema=False)
 async def get_version():
     """获取应用版本信息"""
@@ -3,7 +3,7 @@
 from app.models.user import User, Account
 from app.models.role import Role, Permission, UserRole, RolePermission
 from app.models.auth import RefreshToken
-from app.models.file import File
+from app.models.file import File, FileProfile
 from app.models.thread import Thread, ThreadTurn, TurnFile
 from app.models.btrack import BTrack
 
@@ -16,6 +16,7 @@ __all__ = [
     "RolePermission",
     "RefreshToken",
     "File",
+    "FileProfile",
     "Thread",
     "ThreadTurn",
     "TurnFile",
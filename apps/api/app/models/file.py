@@ -4,9 +4,9 @@ from datetime import datetime, timezone
 from typing import List, Optional, TYPE_CHECKING
 from uuid import UUID, uuid4
 
-from sqlalchemy import String, Integer, ForeignKey, DateTime
+from sqlalchemy import String, Integer, ForeignKey, DateTime, Text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy.dialects.postgresql import UUID as PGUUID
+from sqlalchemy.dialects.postgresql import UUID as PGUUID, JSONB
 
 from app.core.base import Base
 
@@ -34,6 +34,8 @@ class File(Base):
     file_path: Mapped[str] = mapped_column(String(512), nullable=False)
     file_size: Mapped[int] = mapped_column(Integer, nullable=False)
     md5: Mapped[str] = mapped_column(String(32), nullable=False, index=True)
+    # 文件内容的 SHA-256（解析缓存的键，见 app.engine.workbook_cache；早期上传的文件为空）
+    sha256: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
     mime_type: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
     uploaded_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
@@ -60,3 +62,51 @@ class File(Base):
         secondary="turn_files",
         back_populates="files",
     )
+
+
+class FileProfile(Base):
+    """
+    文件解析画像 - 上传后由后台任务解析生成
+
+    status: pending（等待解析）| processing（解析中）| ready（可用）| failed（解析失败）
+
+    sheets 格式:
+        [
+            {
+                "name": "Sheet1",
+                "row_count": 100,
+                "columns": [{"name": "列1", "type": "number", "dtype": "int64", "samples": [1, 2, 3]}, ...]
+            },
+            ...
+        ]
+
+    probe 格式（上传时只读取元数据得到，解析完成前用于预览，见 app.engine.workbook_probe）:
+        [{"name": "Sheet1", "dimension": "A1:C101", "row_count": 100, "column_count": 3, "columns": ["列1", ...]}, ...]
+    """
+
+    __tablename__ = "file_profiles"
+
+    file_id: Mapped[UUID] = mapped_column(
+        PGUUID(as_uuid=True),
+        ForeignKey("files.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    status: Mapped[str] = mapped_column(String(20), default="pending", nullable=False, index=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    md5: Mapped[str] = mapped_column(String(32), nullable=False)
+    sheets: Mapped[Optional[list]] = mapped_column(JSONB, nullable=True)
+    probe: Mapped[Optional[list]] = mapped_column(JSONB, nullable=True)
+    sample_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    parse_ms: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
@@ -5,7 +5,7 @@ from datetime import datetime, timezone
 from typing import Any, List, Optional
 from uuid import UUID, uuid4
 
-from sqlalchemy import select, func
+from sqlalchemy import select, func, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm.attributes import flag_modified
 
@@ -96,6 +96,18 @@ class TurnRepository:
         await self.db.flush()
         return thread
 
+    async def update_thread_title(self, thread_id: UUID, title: str) -> None:
+        """
+        更新线程标题
+
+        Args:
+            thread_id: 线程 ID
+            title: 新标题
+        """
+        await self.db.execute(
+            update(Thread).where(Thread.id == thread_id).values(title=title)
+        )
+
     async def get_next_turn_number(self, thread_id: UUID) -> int:
         """
         获取下一个 turn 序号
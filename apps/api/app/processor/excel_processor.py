@@ -1,7 +1,11 @@
 """Excel 处理器"""
 
+import asyncio
+import dataclasses
 import logging
-from typing import Generator, List, Optional, Tuple, TYPE_CHECKING
+import threading
+from contextlib import aclosing
+from typing import AsyncGenerator, Generator, List, Optional, Tuple, TYPE_CHECKING
 
 from .types import (
     ProcessStage,
@@ -10,8 +14,9 @@ from .types import (
     ProcessConfig,
     ProcessResult,
 )
-from .stages import GenerateValidateStage, ExecuteStage
+from .stages import GenerateValidateStage, ExecuteStage, StageOutput
 from .stages.analyze import StageError
+from .stages.execute import ExecutionAbortedError
 
 if TYPE_CHECKING:
     from app.engine.models import FileCollection
@@ -30,6 +35,8 @@ class ExcelProcessor:
     3. 可观察：通过生成器 yield 处理事件
     4. 可测试：所有输入输出都是普通 Python 对象
     5. 线性阶段：stages 保持线性结构，复杂逻辑封装在复合阶段内部
+    6. 资源受控：执行超出资源预算时恢复表并带错误信息重新生成（最多 config.max_budget_retries 次），
+       处理结束或提前关闭（客户端断开）时取消仍在进行的执行
 
     用法示例：
 
@@ -40,9 +47,14 @@ class ExcelProcessor:
         # 方式 2：收集所有事件
         events, result = processor.process_with_events(tables, query)
 
-        # 方式 3：迭代处理事件（用于 SSE 推送）
+        # 方式 3：迭代处理事件
         for event in processor.process(tables, query, config):
             yield convert_to_sse(event)
+
+        # 方式 4：异步迭代处理事件（用于 SSE 推送，LLM 流式响应在事件循环上读取）
+        result = ProcessResult()
+        async for event in processor.process_async(tables, query, config, result):
+            yield convert_to_sse(event)
     """
 
     def __init__(self, llm_client: "LLMClient"):
@@ -88,61 +100,81 @@ class ExcelProcessor:
             except StopIteration as e:
                 result = e.value
         """
-        config = config or ProcessConfig()
-        result = ProcessResult()
-        context = {}  # 阶段间共享上下文
+        run = _StageLoop(self._stages, tables, config, ProcessResult())
+        try:
+            while (stage := run.next_stage()) is not None:
+                try:
+                    # 运行阶段并收集输出
+                    stage_gen = stage.run(tables, query, run.config, run.context)
+                    stage_output = None
+                    try:
+                        while True:
+                            event = next(stage_gen)
+                            yield event
+                            if run.stops_at(event):
+                                return run.result
+                    except StopIteration as e:
+                        stage_output = e.value
+
+                    run.stage_done(stage, stage_output)
+                    self._update_result(run.result, stage.stage, stage_output, tables)
+
+                except Exception as e:
+                    event, proceed = run.stage_failed(stage, e)
+                    yield event
+                    if not proceed:
+                        return run.result
+        finally:
+            run.close()
+
+        return run.result
+
+    async def process_async(
+        self,
+        tables: "FileCollection",
+        query: str,
+        config: Optional[ProcessConfig] = None,
+        result: Optional[ProcessResult] = None,
+    ) -> AsyncGenerator[ProcessEvent, None]:
+        """
+        处理 Excel 数据（异步生成器模式）
 
-        for stage in self._stages:
-            try:
-                # 运行阶段
-                stage_gen = stage.run(tables, query, config, context)
+        事件与 process() 相同。LLM 调用直接在事件循环上进行（每个流式增量不再经过线程），
+        验证、执行等 CPU 密集的部分在线程中运行。
 
-                # 收集阶段输出
-                stage_output = None
+        Args:
+            tables: 已加载的表集合
+            query: 用户查询
+            config: 处理配置
+            result: 处理结果（处理过程中填充，迭代结束后即为最终结果）
+
+        Yields:
+            ProcessEvent: 处理事件
+        """
+        run = _StageLoop(self._stages, tables, config, result if result is not None else ProcessResult())
+        try:
+            while (stage := run.next_stage()) is not None:
                 try:
-                    while True:
-                        event = next(stage_gen)
-                        yield event
-
-                        # 检查是否有错误
-                        if event.event_type == EventType.STAGE_ERROR:
-                            result.errors.append(event.error)
-                            return result
-
-                except StopIteration as e:
-                    stage_output = e.value
-
-                # 保存阶段输出到上下文
-                if stage_output is not None:
-                    context[stage.stage.value] = stage_output
-
-                # 更新结果
-                self._update_result(result, stage.stage, stage_output, tables)
-
-            except StageError as e:
-                # 阶段抛出错误，yield error 事件并终止处理
-                error_msg = str(e)
-                result.errors.append(error_msg)
-                yield ProcessEvent(
-                    stage=stage.stage,
-                    event_type=EventType.STAGE_ERROR,
-                    error=error_msg,
-                )
-                return result
-
-            except Exception as e:
-                # 未预期的错误，yield error 事件并终止处理
-                logger.exception(f"Stage {stage.stage.value} failed: {e}")
-                error_msg = f"{stage.stage.value} 阶段异常: {e}"
-                result.errors.append(error_msg)
-                yield ProcessEvent(
-                    stage=stage.stage,
-                    event_type=EventType.STAGE_ERROR,
-                    error=error_msg,
-                )
-                return result
-
-        return result
+                    # 运行阶段并收集输出（提前结束时关闭阶段，释放 LLM 连接）
+                    stage_output = StageOutput()
+                    async with aclosing(stage.run_async(tables, query, run.config, run.context, stage_output)) as events:
+                        async for event in events:
+                            yield event
+                            if run.stops_at(event):
+                                return
+
+                    run.stage_done(stage, stage_output.value)
+                    # 更新结果（可能把新列应用到表上）
+                    await asyncio.to_thread(self._update_result, run.result, stage.stage, stage_output.value, tables)
+
+                except Exception as e:
+                    event, proceed = run.stage_failed(stage, e)
+                    yield event
+                    if not proceed:
+                        return
+        finally:
+            # 处理结束或被关闭（客户端断开）：取消仍在线程中进行的执行
+            run.close()
 
     def process_sync(
         self,
@@ -250,3 +282,150 @@ class ExcelProcessor:
             if raw_new_columns or raw_updated_columns or raw_new_sheets:
                 tables.apply_changes(raw_new_columns, raw_updated_columns, raw_new_sheets)
                 result.modified_tables = tables
+
+
+class _StageLoop:
+    """
+    process() 和 process_async() 共用的阶段状态机
+
+    负责阶段顺序、阶段间共享的上下文、错误处理，以及超出资源预算时的快照、恢复和重新生成；
+    调用方只负责（同步或异步地）运行阶段、转发事件和更新结果。
+
+    用法：
+        run = _StageLoop(stages, tables, config, result)
+        try:
+            while (stage := run.next_stage()) is not None:
+                try:
+                    ...  # 运行阶段，每个事件 yield 后 run.stops_at(event) 为 True 时结束
+                    run.stage_done(stage, output)
+                except Exception as e:
+                    event, proceed = run.stage_failed(stage, e)
+                    ...  # yield event，proceed 为 False 时结束
+        finally:
+            run.close()
+    """
+
+    def __init__(
+        self,
+        stages: list,
+        tables: "FileCollection",
+        config: Optional[ProcessConfig],
+        result: ProcessResult,
+    ):
+        self.stages = stages
+        self.tables = tables
+        self.config, self._cancelled = self._with_cancel_event(config or ProcessConfig())
+        self.result = result
+        self.context = {}  # 阶段间共享上下文
+        self._index = 0
+        self._budget_retries = 0
+        self._snapshot: Optional["FileCollection"] = None
+
+    def next_stage(self):
+        """下一个要运行的阶段（全部完成时返回 None）"""
+        if self._index >= len(self.stages):
+            return None
+        stage = self.stages[self._index]
+        self._snapshot = self._snapshot_for_retry(stage)
+        return stage
+
+    def stops_at(self, event: ProcessEvent) -> bool:
+        """阶段产生的事件是否终止处理（错误事件，记录错误信息）"""
+        if event.event_type == EventType.STAGE_ERROR:
+            self.result.errors.append(event.error)
+            return True
+        return False
+
+    def stage_done(self, stage, output: Optional[dict]):
+        """阶段正常结束：保存输出到上下文，进入下一阶段"""
+        if output is not None:
+            self.context[stage.stage.value] = output
+        self._index += 1
+
+    def stage_failed(self, stage, error: Exception) -> Tuple[ProcessEvent, bool]:
+        """
+        阶段抛出异常（在 except 块中调用）
+
+        执行超出资源预算且还可以重试时，恢复执行前的表，带错误信息从生成阶段重新开始；
+        否则记录错误并终止处理。
+
+        Returns:
+            (要发送的事件, 是否继续处理)
+        """
+        if isinstance(error, ExecutionAbortedError) and self._snapshot is not None and error.budget_exceeded:
+            self._budget_retries += 1
+            event = self._budget_retry_event(error)
+            self.context = self._prepare_budget_retry(error, self._snapshot, self.context)
+            self._snapshot = None
+            self._index = 0
+            return event, True
+
+        stage_id = None
+        if isinstance(error, StageError):
+            # 阶段抛出的错误（包括执行被中止）
+            error_msg = str(error)
+            if isinstance(error, ExecutionAbortedError):
+                stage_id = error.stage_id
+        else:
+            # 未预期的错误
+            logger.exception(f"Stage {stage.stage.value} failed: {error}")
+            error_msg = f"{stage.stage.value} 阶段异常: {error}"
+        self.result.errors.append(error_msg)
+        return ProcessEvent(
+            stage=stage.stage,
+            event_type=EventType.STAGE_ERROR,
+            stage_id=stage_id,
+            error=error_msg,
+        ), False
+
+    def close(self):
+        """处理结束或生成器被关闭：取消仍在进行的执行"""
+        if self._cancelled is not None:
+            self._cancelled.set()
+
+    @staticmethod
+    def _with_cancel_event(config: ProcessConfig) -> Tuple[ProcessConfig, Optional[threading.Event]]:
+        """
+        为本次处理创建取消信号（调用方已提供时使用调用方的，由调用方负责设置）
+
+        Returns:
+            (config, 本次处理创建的取消信号或 None)
+        """
+        if config.cancel_event is not None:
+            return config, None
+        cancelled = threading.Event()
+        return dataclasses.replace(config, cancel_event=cancelled), cancelled
+
+    def _snapshot_for_retry(self, stage) -> Optional["FileCollection"]:
+        """执行阶段开始前保存表的快照（写时复制），超出资源预算重试时恢复；不会重试时返回 None"""
+        if stage.stage != ProcessStage.EXECUTE or self._budget_retries >= self.config.max_budget_retries:
+            return None
+        return self.tables.fork()
+
+    @staticmethod
+    def _budget_retry_event(error: ExecutionAbortedError) -> ProcessEvent:
+        """执行超出资源预算、即将重新生成时的执行完成事件（与验证失败重试时的验证完成事件对应）"""
+        return ProcessEvent(
+            stage=ProcessStage.EXECUTE,
+            event_type=EventType.STAGE_DONE,
+            stage_id=error.stage_id,
+            output={"aborted": error.detail, "retrying": True},
+        )
+
+    def _prepare_budget_retry(
+        self,
+        error: ExecutionAbortedError,
+        snapshot: "FileCollection",
+        context: dict,
+    ) -> dict:
+        """
+        恢复执行前的表，返回重新生成时的上下文（上一次的计划和中止原因，见 GenerateValidateStage）
+        """
+        logger.info(f"执行超出资源预算，重新生成计划: {error.detail}")
+        self.tables.restore(snapshot)
+        return {
+            "execution_feedback": {
+                "previous_errors": [str(error)],
+                "previous_json": context.get(ProcessStage.GENERATE.value, {}).get("operations_json", ""),
+            }
+        }
@@ -1,5 +1,6 @@
 """处理阶段实现"""
 
+from .base import Stage, StageOutput
 from .analyze import AnalyzeStage
 from .generate import GenerateStage
 from .validate import ValidateStage
@@ -7,6 +8,8 @@ from .generate_validate import GenerateValidateStage
 from .execute import ExecuteStage
 
 __all__ = [
+    "Stage",
+    "StageOutput",
     "AnalyzeStage",
     "GenerateStage",
     "ValidateStage",
@@ -1,9 +1,11 @@
 """需求分析阶段"""
 
-from typing import Any, Generator, TYPE_CHECKING
+import asyncio
+from contextlib import aclosing
+from typing import Any, AsyncGenerator, Generator, TYPE_CHECKING
 
 from ..types import ProcessStage, ProcessEvent, ProcessConfig
-from .base import Stage
+from .base import Stage, StageOutput
 
 if TYPE_CHECKING:
     from app.engine.models import FileCollection
@@ -72,3 +74,40 @@ class AnalyzeStage(Stage):
             error_msg = f"分析失败: {e}"
             yield self._event_error(error_msg, stage_id)
             raise StageError(error_msg) from e
+
+    async def run_async(
+        self,
+        tables: "FileCollection",
+        query: str,
+        config: ProcessConfig,
+        context: dict,
+        output: StageOutput,
+    ) -> AsyncGenerator[ProcessEvent, None]:
+        """执行需求分析（异步版本）"""
+        # 生成此阶段的唯一 ID
+        stage_id = self._generate_stage_id()
+
+        yield self._event_start(stage_id)
+
+        # 使用增强的 schema（包含类型和样本数据）
+        schemas = await asyncio.to_thread(tables.get_schemas_with_samples, sample_count=3)
+
+        try:
+            if config.stream_llm:
+                # 流式调用 - LLM 返回 (delta, full_content)
+                analysis = ""
+                async with aclosing(self.llm_client.analyze_requirement_stream_async(query, schemas)) as stream:
+                    async for delta, full_content in stream:
+                        analysis = full_content
+                        yield self._event_stream(delta, stage_id)
+            else:
+                # 非流式调用
+                analysis = await self.llm_client.analyze_requirement_async(query, schemas)
+
+            output.value = {"content": analysis}
+            yield self._event_done(output.value, stage_id)
+
+        except Exception as e:
+            error_msg = f"分析失败: {e}"
+            yield self._event_error(error_msg, stage_id)
+            raise StageError(error_msg) from e
@@ -1,8 +1,10 @@
 """阶段基类"""
 
+import asyncio
 import uuid
 from abc import ABC, abstractmethod
-from typing import Any, Generator, Optional, TYPE_CHECKING
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, Generator, Optional, TYPE_CHECKING
 
 from ..types import ProcessStage, EventType, ProcessEvent, ProcessConfig
 
@@ -10,6 +12,17 @@ if TYPE_CHECKING:
     from app.engine.models import FileCollection
 
 
+@dataclass
+class StageOutput:
+    """
+    异步阶段的输出
+
+    异步生成器不能 return 值，run_async 把阶段输出写入 value（对应 run 的返回值）。
+    """
+
+    value: Any = None
+
+
 class Stage(ABC):
     """
     处理阶段基类
@@ -21,6 +34,8 @@ class Stage(ABC):
     2. 实现 run() 方法，yield 事件，return 输出
     3. 如需流式输出，在 run() 中检查 config.stream_llm
     4. 使用 _generate_stage_id() 生成唯一标识
+    5. 调用 LLM 的阶段覆盖 run_async()，在事件循环上读取流式响应；
+       其余阶段使用默认实现（在线程中推进 run()）
     """
 
     stage: ProcessStage
@@ -50,6 +65,45 @@ class Stage(ABC):
         """
         pass
 
+    async def run_async(
+        self,
+        tables: "FileCollection",
+        query: str,
+        config: ProcessConfig,
+        context: dict,
+        output: StageOutput,
+    ) -> AsyncGenerator[ProcessEvent, None]:
+        """
+        执行阶段处理（异步版本）
+
+        默认实现在线程中推进 run()，适用于只有少量事件的 CPU 密集阶段。
+
+        Args:
+            tables: 表集合
+            query: 用户查询
+            config: 处理配置
+            context: 上下文字典（用于传递前序阶段的输出）
+            output: 阶段输出（写入 output.value，将存入 context[stage.value]）
+
+        Yields:
+            ProcessEvent: 处理事件
+        """
+        gen = self.run(tables, query, config, context)
+        done = object()
+
+        def next_event():
+            try:
+                return next(gen)
+            except StopIteration as e:
+                output.value = e.value
+                return done
+
+        while True:
+            event = await asyncio.to_thread(next_event)
+            if event is done:
+                return
+            yield event
+
     @staticmethod
     def _generate_stage_id() -> str:
         """生成唯一的 stage_id"""
@@ -1,7 +1,7 @@
 """执行操作阶段"""
 
 import logging
-from typing import Any, Dict, Generator, List, TYPE_CHECKING
+from typing import Any, Dict, Generator, List, Optional, TYPE_CHECKING
 
 from ..types import ProcessStage, ProcessEvent, ProcessConfig
 from .base import Stage
@@ -13,6 +13,28 @@ if TYPE_CHECKING:
 logger = logging.getLogger(__name__)
 
 
+class ExecutionAbortedError(StageError):
+    """
+    执行被中止（超出资源预算或被取消，见 app.engine.governor）
+
+    阶段不发送错误事件，由 ExcelProcessor 决定重新生成计划还是报告错误。
+
+    Attributes:
+        detail: 结构化的中止原因（code / message / resource / limit / used / operation）
+        stage_id: 执行阶段的 ID
+    """
+
+    def __init__(self, detail: Dict[str, Any], stage_id: Optional[str] = None):
+        super().__init__(f"执行中止（操作 #{detail.get('operation')}）: {detail['message']}")
+        self.detail = detail
+        self.stage_id = stage_id
+
+    @property
+    def budget_exceeded(self) -> bool:
+        """是否因超出资源预算而中止（可以换用更高效的计划重试）"""
+        return self.detail.get("code") == "budget_exceeded"
+
+
 class ExecuteStage(Stage):
     """
     执行操作阶段
@@ -23,6 +45,9 @@ class ExecuteStage(Stage):
         - tables: 表集合
         - context["generate"]: GenerateValidateStage 的输出（包含已解析的操作）
 
+    执行受资源预算限制（config.budget，见 app.engine.governor）并响应 config.cancel_event；
+    超出预算或被取消时抛出 ExecutionAbortedError。
+
     输出:
         {
             "strategy": "思路解读",
@@ -31,6 +56,9 @@ class ExecuteStage(Stage):
             "new_columns": {...},
             "updated_columns": {...},
             "errors": [...],
+            "cache": {"hits": 0, "misses": 0},  # 操作结果缓存命中统计
+            "resources": {...},  # 资源用量（耗时、求值次数、内存增长峰值）
+            "optimizations": [...],  # 公式改写报告（常量折叠、外提、公共子表达式）
             "raw_new_columns": {...},  # 内部使用，完整数据
             "raw_updated_columns": {...},  # 内部使用，完整数据
         }
@@ -64,13 +92,27 @@ class ExecuteStage(Stage):
         raw_new_columns: Dict = {}
         raw_updated_columns: Dict = {}
         raw_new_sheets: Dict = {}  # 新创建的 Sheet 完整数据
+        cache_stats = {"hits": 0, "misses": 0}
+        optimizations: List[str] = []
+        resources: Dict[str, Any] = {}
 
         try:
             # 执行操作（仅当验证通过时）
             if operations and not validation_errors:
                 from app.engine.executor import execute_operations
+                from app.engine.governor import ExecutionBudget, ResourceGovernor
+                from app.engine.operation_cache import get_operation_cache
 
-                exec_result = execute_operations(operations, tables)
+                governor = ResourceGovernor(config.budget or ExecutionBudget.from_settings(), config.cancel_event)
+                exec_result = execute_operations(
+                    operations, tables, cache=get_operation_cache(), governor=governor
+                )
+                if exec_result.aborted is not None:
+                    logger.warning(f"执行中止: {exec_result.aborted}, 资源用量: {exec_result.resource_usage}")
+                    raise ExecutionAbortedError(exec_result.aborted, stage_id)
+                cache_stats = {"hits": exec_result.cache_hits, "misses": exec_result.cache_misses}
+                optimizations = exec_result.optimizations
+                resources = exec_result.resource_usage
 
                 # 处理变量
                 variables = self._make_serializable(exec_result.variables)
@@ -144,6 +186,9 @@ class ExecuteStage(Stage):
                 "updated_columns": updated_columns if updated_columns else None,
                 "new_sheets": new_sheets if new_sheets else None,
                 "errors": errors if errors else None,
+                "cache": cache_stats,
+                "optimizations": optimizations if optimizations else None,
+                "resources": resources if resources else None,
                 "raw_new_columns": raw_new_columns,  # 内部使用
                 "raw_updated_columns": raw_updated_columns,  # 内部使用
                 "raw_new_sheets": raw_new_sheets,  # 内部使用
@@ -154,11 +199,16 @@ class ExecuteStage(Stage):
                     "strategy": strategy,
                     "manual_steps": manual_steps,
                     "errors": errors if errors else None,
+                    "cache": cache_stats,
+                    "resources": resources if resources else None,
                 },
                 stage_id,
             )
             return output
 
+        except ExecutionAbortedError:
+            raise
+
         except Exception as e:
             error_msg = f"执行失败: {e}"
             logger.exception(error_msg)
@@ -169,9 +219,12 @@ class ExecuteStage(Stage):
         """将对象转换为可序列化格式"""
         import math
         from datetime import datetime, date
+        import pandas as pd
         from app.engine.models import ExcelError
 
-        if isinstance(obj, ExcelError):
+        if obj is None or obj is pd.NA or obj is pd.NaT:
+            return None
+        elif isinstance(obj, ExcelError):
             return str(obj)
         elif isinstance(obj, (datetime, date)):
             return obj.isoformat()
@@ -1,16 +1,19 @@
 """生成+验证复合阶段"""
 
+import asyncio
 import json
 import logging
-from typing import Any, Dict, Generator, List, TYPE_CHECKING
+from contextlib import aclosing
+from typing import Any, AsyncGenerator, Dict, Generator, List, Optional, Tuple, TYPE_CHECKING
 
 from ..types import ProcessStage, EventType, ProcessEvent, ProcessConfig
-from .base import Stage
+from .base import Stage, StageOutput
 from .analyze import StageError
 
 if TYPE_CHECKING:
     from app.engine.models import FileCollection
     from app.engine.llm_client import LLMClient
+    from app.engine.speculative import SpeculativeExecutor
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +30,12 @@ class GenerateValidateStage(Stage):
     2. 解析验证操作 (yield validate 事件)
     3. 如果验证失败且未超过重试次数，带错误信息重新生成
 
+    异步版本（run_async）在事件循环上读取 LLM 流式响应，只把解析验证放到线程中。
+
+    流式生成时预执行（config.speculative_execution）：operations 中的每个操作输出完整后
+    立即验证并在表的副本上执行，结果写入操作结果缓存，执行阶段直接命中缓存；
+    验证失败重新生成时丢弃副本（见 app.engine.speculative）。
+
     输入:
         - tables: 表集合
         - query: 用户查询
@@ -38,6 +47,7 @@ class GenerateValidateStage(Stage):
             "operations_json": "...",  # 原始 JSON 字符串
             "parsed_operations": [...], # 解析后的 Operation 对象列表
             "validation_errors": [...], # 验证错误（如果有）
+            "speculation": {...},       # 预执行统计（未预执行时为 None）
         }
     """
 
@@ -64,81 +74,231 @@ class GenerateValidateStage(Stage):
         retry_count = 0
         max_retries = config.max_validation_retries
 
-        # 用于重试时传递错误信息
-        previous_errors: List[str] = None
-        previous_json: str = None
+        # 用于重试时传递错误信息（执行超出资源预算后重新生成时，带上执行阶段的错误）
+        previous_errors, previous_json = self._execution_feedback(context)
 
         # 最终输出
         operations_dict = {}
         operations_json = ""
         parsed_operations = []
         validation_errors = []
+        speculation_stats = None
 
         while True:
-            # ========== 1. 生成阶段 ==========
+            speculation = self._start_speculation(tables, file_sheets, config)
             try:
-                operations_json, operations_dict = yield from self._run_generate(
-                    query, analysis, schemas, config,
-                    previous_errors=previous_errors,
-                    previous_json=previous_json,
-                )
-            except StageError:
+                # ========== 1. 生成阶段 ==========
+                try:
+                    operations_json, operations_dict = yield from self._run_generate(
+                        query, analysis, schemas, config,
+                        previous_errors=previous_errors,
+                        previous_json=previous_json,
+                        speculation=speculation,
+                    )
+                except StageError:
+                    raise
+                except Exception as e:
+                    # 防御性编程：捕获未预期的异常
+                    error_msg = f"生成操作失败: {e}"
+                    yield self._create_event(
+                        ProcessStage.GENERATE, EventType.STAGE_ERROR,
+                        stage_id=self._generate_stage_id(), error=error_msg
+                    )
+                    raise StageError(error_msg) from e
+
+                # ========== 2. 验证阶段 ==========
+                try:
+                    parsed_operations, validation_errors = yield from self._run_validate(
+                        operations_json, file_sheets
+                    )
+                except StageError:
+                    raise
+                except Exception as e:
+                    # 防御性编程：捕获未预期的异常
+                    error_msg = f"验证失败: {e}"
+                    yield self._create_event(
+                        ProcessStage.VALIDATE, EventType.STAGE_ERROR,
+                        stage_id=self._generate_stage_id(), error=error_msg
+                    )
+                    raise StageError(error_msg) from e
+            except BaseException:
+                if speculation is not None:
+                    self._end_speculation(speculation, keep=False)
                 raise
-            except Exception as e:
-                # 防御性编程：捕获未预期的异常
-                error_msg = f"生成操作失败: {e}"
-                yield self._create_event(
-                    ProcessStage.GENERATE, EventType.STAGE_ERROR,
-                    stage_id=self._generate_stage_id(), error=error_msg
-                )
-                raise StageError(error_msg) from e
+            if speculation is not None:
+                speculation_stats = self._end_speculation(speculation, keep=not validation_errors)
+
+            # ========== 3. 检查是否需要重试 ==========
+            retry_count += 1
+            if not self._should_retry(validation_errors, retry_count, max_retries):
+                break
+            previous_errors = validation_errors
+            previous_json = operations_json
 
-            # ========== 2. 验证阶段 ==========
+        # 返回最终输出
+        return self._build_output(
+            operations_dict, operations_json, parsed_operations, validation_errors, speculation_stats
+        )
+
+    async def run_async(
+        self,
+        tables: "FileCollection",
+        query: str,
+        config: ProcessConfig,
+        context: dict,
+        output: StageOutput,
+    ) -> AsyncGenerator[ProcessEvent, None]:
+        """执行生成+验证流程（异步版本）"""
+
+        # 使用增强的 schema（包含类型和样本数据）
+        schemas = await asyncio.to_thread(tables.get_schemas_with_samples, sample_count=3)
+        analysis = context.get("analyze", {}).get("content", "")
+        file_sheets = self._build_file_sheets(tables)
+
+        retry_count = 0
+        max_retries = config.max_validation_retries
+
+        # 用于重试时传递错误信息（执行超出资源预算后重新生成时，带上执行阶段的错误）
+        previous_errors, previous_json = self._execution_feedback(context)
+        speculation_stats = None
+
+        while True:
+            speculation = self._start_speculation(tables, file_sheets, config)
             try:
-                parsed_operations, validation_errors = yield from self._run_validate(
-                    operations_json, file_sheets
-                )
-            except StageError:
+                # ========== 1. 生成阶段 ==========
+                generated = StageOutput()
+                try:
+                    async with aclosing(self._run_generate_async(
+                        query, analysis, schemas, config, generated,
+                        previous_errors=previous_errors,
+                        previous_json=previous_json,
+                        speculation=speculation,
+                    )) as events:
+                        async for event in events:
+                            yield event
+                except StageError:
+                    raise
+                except Exception as e:
+                    # 防御性编程：捕获未预期的异常
+                    error_msg = f"生成操作失败: {e}"
+                    yield self._create_event(
+                        ProcessStage.GENERATE, EventType.STAGE_ERROR,
+                        stage_id=self._generate_stage_id(), error=error_msg
+                    )
+                    raise StageError(error_msg) from e
+                operations_json, operations_dict = generated.value
+
+                # ========== 2. 验证阶段 ==========
+                validated = StageOutput()
+                try:
+                    async with aclosing(self._run_validate_async(operations_json, file_sheets, validated)) as events:
+                        async for event in events:
+                            yield event
+                except StageError:
+                    raise
+                except Exception as e:
+                    # 防御性编程：捕获未预期的异常
+                    error_msg = f"验证失败: {e}"
+                    yield self._create_event(
+                        ProcessStage.VALIDATE, EventType.STAGE_ERROR,
+                        stage_id=self._generate_stage_id(), error=error_msg
+                    )
+                    raise StageError(error_msg) from e
+                parsed_operations, validation_errors = validated.value
+            except BaseException:
+                if speculation is not None:
+                    self._end_speculation(speculation, keep=False)
                 raise
-            except Exception as e:
-                # 防御性编程：捕获未预期的异常
-                error_msg = f"验证失败: {e}"
-                yield self._create_event(
-                    ProcessStage.VALIDATE, EventType.STAGE_ERROR,
-                    stage_id=self._generate_stage_id(), error=error_msg
+            if speculation is not None:
+                # 等待已提交的操作执行完（在线程中等待，不阻塞事件循环）
+                speculation_stats = await asyncio.to_thread(
+                    self._end_speculation, speculation, not validation_errors
                 )
-                raise StageError(error_msg) from e
 
             # ========== 3. 检查是否需要重试 ==========
-            if not validation_errors:
-                # 验证通过，跳出循环
+            retry_count += 1
+            if not self._should_retry(validation_errors, retry_count, max_retries):
                 break
+            previous_errors = validation_errors
+            previous_json = operations_json
 
-            retry_count += 1
+        output.value = self._build_output(
+            operations_dict, operations_json, parsed_operations, validation_errors, speculation_stats
+        )
 
-            if retry_count > max_retries:
-                # 超过最大重试次数
-                logger.warning(
-                    f"验证失败，已达到最大重试次数 ({max_retries})，继续执行"
-                )
-                break
+    def _start_speculation(
+        self,
+        tables: "FileCollection",
+        file_sheets: Dict[str, List[str]],
+        config: ProcessConfig,
+    ) -> Optional["SpeculativeExecutor"]:
+        """流式生成且操作结果缓存可用时开始预执行（预执行的结果通过缓存交给执行阶段）"""
+        if not (config.stream_llm and config.speculative_execution):
+            return None
+        from app.engine.governor import ExecutionBudget
+        from app.engine.operation_cache import get_operation_cache
+        from app.engine.speculative import SpeculativeExecutor
+
+        cache = get_operation_cache()
+        if cache.max_bytes <= 0:
+            return None
+        return SpeculativeExecutor(tables, file_sheets, cache, config.budget or ExecutionBudget.from_settings())
+
+    def _end_speculation(self, speculation: "SpeculativeExecutor", keep: bool) -> dict:
+        """计划有效时等待预执行完成（阻塞），否则丢弃尚未开始的操作；返回统计信息"""
+        stats = speculation.finish() if keep else speculation.cancel()
+        logger.info(f"预执行{'完成' if keep else '已丢弃'}: {stats}")
+        return stats
+
+    @staticmethod
+    def _execution_feedback(context: dict) -> Tuple[Optional[List[str]], Optional[str]]:
+        """
+        上一次计划执行被中止时的反馈（见 ExcelProcessor：执行超出资源预算后重新生成）
 
-            # 准备重试
-            logger.info(
-                f"验证失败，准备重试 ({retry_count}/{max_retries})，"
-                f"错误: {validation_errors}"
+        Returns:
+            (previous_errors, previous_json)，没有反馈时均为 None
+        """
+        feedback = context.get("execution_feedback")
+        if not feedback:
+            return None, None
+        return feedback["previous_errors"], feedback["previous_json"]
+
+    def _should_retry(self, validation_errors: List[str], retry_count: int, max_retries: int) -> bool:
+        """验证失败且未超过最大重试次数时重新生成"""
+        if not validation_errors:
+            # 验证通过
+            return False
+
+        if retry_count > max_retries:
+            # 超过最大重试次数
+            logger.warning(
+                f"验证失败，已达到最大重试次数 ({max_retries})，继续执行"
             )
-            previous_errors = validation_errors
-            previous_json = operations_json
+            return False
 
-        # 返回最终输出
-        output = {
+        # 准备重试
+        logger.info(
+            f"验证失败，准备重试 ({retry_count}/{max_retries})，"
+            f"错误: {validation_errors}"
+        )
+        return True
+
+    def _build_output(
+        self,
+        operations_dict: dict,
+        operations_json: str,
+        parsed_operations: list,
+        validation_errors: List[str],
+        speculation: Optional[dict] = None,
+    ) -> dict:
+        """阶段输出"""
+        return {
             "operations": operations_dict,
             "operations_json": operations_json,
             "parsed_operations": parsed_operations,
             "validation_errors": validation_errors,
+            "speculation": speculation,
         }
-        return output
 
     def _run_generate(
         self,
@@ -148,9 +308,10 @@ class GenerateValidateStage(Stage):
         config: ProcessConfig,
         previous_errors: List[str] = None,
         previous_json: str = None,
+        speculation: Optional["SpeculativeExecutor"] = None,
     ) -> Generator[ProcessEvent, None, tuple]:
         """
-        运行生成子阶段
+        运行生成子阶段（流式输出同时交给预执行）
 
         Returns:
             (operations_json, operations_dict)
@@ -170,6 +331,8 @@ class GenerateValidateStage(Stage):
                     previous_json=previous_json,
                 ):
                     operations_json = full_content
+                    if speculation is not None:
+                        speculation.feed(delta)
                     yield self._create_event(
                         ProcessStage.GENERATE, EventType.STAGE_STREAM,
                         stage_id=stage_id, delta=delta
@@ -183,11 +346,7 @@ class GenerateValidateStage(Stage):
                     previous_json=previous_json,
                 )
 
-            # 解析 JSON
-            try:
-                operations_dict = json.loads(operations_json)
-            except json.JSONDecodeError as e:
-                raise StageError(f"JSON 解析失败: {e}") from e
+            operations_dict = self._parse_operations_json(operations_json)
 
             yield self._create_event(
                 ProcessStage.GENERATE, EventType.STAGE_DONE,
@@ -248,6 +407,121 @@ class GenerateValidateStage(Stage):
             )
             raise StageError(error_msg) from e
 
+    async def _run_generate_async(
+        self,
+        query: str,
+        analysis: str,
+        schemas: dict,
+        config: ProcessConfig,
+        output: StageOutput,
+        previous_errors: List[str] = None,
+        previous_json: str = None,
+        speculation: Optional["SpeculativeExecutor"] = None,
+    ) -> AsyncGenerator[ProcessEvent, None]:
+        """
+        运行生成子阶段（异步版本，流式输出同时交给预执行）
+
+        output.value: (operations_json, operations_dict)
+        """
+        # 为此次生成子阶段生成唯一 ID
+        stage_id = self._generate_stage_id()
+
+        yield self._create_event(ProcessStage.GENERATE, EventType.STAGE_START, stage_id=stage_id)
+
+        try:
+            if config.stream_llm:
+                # 流式调用
+                operations_json = ""
+                async with aclosing(self.llm_client.generate_operations_stream_async(
+                    query, analysis, schemas,
+                    previous_errors=previous_errors,
+                    previous_json=previous_json,
+                )) as stream:
+                    async for delta, full_content in stream:
+                        operations_json = full_content
+                        if speculation is not None:
+                            speculation.feed(delta)
+                        yield self._create_event(
+                            ProcessStage.GENERATE, EventType.STAGE_STREAM,
+                            stage_id=stage_id, delta=delta
+                        )
+                operations_json = self._clean_json_response(operations_json)
+            else:
+                # 非流式调用
+                operations_json = await self.llm_client.generate_operations_async(
+                    query, analysis, schemas,
+                    previous_errors=previous_errors,
+                    previous_json=previous_json,
+                )
+
+            operations_dict = self._parse_operations_json(operations_json)
+
+            yield self._create_event(
+                ProcessStage.GENERATE, EventType.STAGE_DONE,
+                stage_id=stage_id, output=operations_dict
+            )
+
+            output.value = (operations_json, operations_dict)
+
+        except StageError:
+            raise
+        except Exception as e:
+            error_msg = f"生成操作失败: {e}"
+            yield self._create_event(
+                ProcessStage.GENERATE, EventType.STAGE_ERROR,
+                stage_id=stage_id, error=error_msg
+            )
+            raise StageError(error_msg) from e
+
+    async def _run_validate_async(
+        self,
+        operations_json: str,
+        file_sheets: Dict[str, List[str]],
+        output: StageOutput,
+    ) -> AsyncGenerator[ProcessEvent, None]:
+        """
+        运行验证子阶段（异步版本，解析验证在线程中进行）
+
+        output.value: (parsed_operations, errors)
+        """
+        # 为此次验证子阶段生成唯一 ID
+        stage_id = self._generate_stage_id()
+
+        yield self._create_event(ProcessStage.VALIDATE, EventType.STAGE_START, stage_id=stage_id)
+
+        try:
+            from app.engine.parser import parse_and_validate
+
+            parsed_operations, errors = await asyncio.to_thread(parse_and_validate, operations_json, file_sheets)
+
+            yield self._create_event(
+                ProcessStage.VALIDATE, EventType.STAGE_DONE,
+                stage_id=stage_id,
+                output={
+                    "valid": len(errors) == 0,
+                    "operation_count": len(parsed_operations),
+                    "errors": errors if errors else None,
+                }
+            )
+
+            output.value = (parsed_operations, errors)
+
+        except Exception as e:
+            error_msg = f"验证失败: {e}"
+            logger.exception(error_msg)
+            yield self._create_event(
+                ProcessStage.VALIDATE, EventType.STAGE_ERROR,
+                stage_id=stage_id, error=error_msg
+            )
+            raise StageError(error_msg) from e
+
+    def _parse_operations_json(self, operations_json: str) -> dict:
+        """解析生成的 JSON"""
+        try:
+            return json.loads(operations_json)
+        except json.JSONDecodeError as e:
+            raise StageError(f"JSON 解析失败: {e}") from e
+
     def _create_event(
         self,
         stage: ProcessStage,
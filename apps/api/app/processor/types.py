@@ -5,6 +5,9 @@ from enum import Enum
 from typing import Any, Dict, List, Optional, TYPE_CHECKING
 
 if TYPE_CHECKING:
+    import threading
+
+    from app.engine.governor import ExecutionBudget
     from app.engine.models import FileCollection
 
 
@@ -89,10 +92,18 @@ class ProcessConfig:
     Attributes:
         stream_llm: LLM 调用是否使用流式模式
         max_validation_retries: 验证失败后最大重试次数（重新生成操作）
+        speculative_execution: 流式生成时是否预执行已完整输出的操作（见 app.engine.speculative）
+        budget: 执行的资源预算（None 时按配置，见 ExecutionBudget.from_settings）
+        max_budget_retries: 执行超出资源预算后带错误信息重新生成的最大次数
+        cancel_event: 取消信号（设置后正在进行的执行尽快中止；由 ExcelProcessor 在处理结束或客户端断开时设置）
     """
 
     stream_llm: bool = False
     max_validation_retries: int = 2
+    speculative_execution: bool = True
+    budget: Optional["ExecutionBudget"] = None
+    max_budget_retries: int = 1
+    cancel_event: Optional["threading.Event"] = None
 
 
 @dataclass
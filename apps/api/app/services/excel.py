@@ -3,7 +3,7 @@ import uuid
 import hashlib
 from pathlib import Path
 from datetime import datetime, timezone
-from typing import List, Optional
+from typing import Dict, List, Optional
 from dataclasses import dataclass
 from uuid import UUID
 
@@ -11,9 +11,12 @@ from fastapi import UploadFile, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
+from app.core.config import settings
 from app.engine.models import FileCollection
 from app.engine.excel_parser import ExcelParser
-from app.models.file import File
+from app.engine.workbook_cache import hash_content
+from app.models.file import File, FileProfile
+from app.services.file_profile import apply_file_profiles
 
 
 @dataclass
@@ -28,23 +31,47 @@ class ProcessResult:
     errors: list
 
 
-def load_tables_from_files(files: List[File]) -> FileCollection:
-    """从文件记录加载表（内部通过 ExcelParser 使用 MinIO 解析）"""
-    # 将数据库记录转换为 (file_id, file_path, filename) 形式，传给解析器
+def load_tables_from_files(
+    files: List[File],
+    profiles: Optional[Dict[UUID, FileProfile]] = None,
+) -> FileCollection:
+    """
+    从文件记录加载表（内部通过 ExcelParser 使用 MinIO 解析）
+
+    Args:
+        files: 文件记录
+        profiles: 上传时后台解析生成的画像（可选，用于直接回答表结构和样本查询；
+            启用 EXCEL_LAZY_LOAD 时有画像的文件延迟加载，只解析执行时用到的 sheet 和列）
+    """
+    # 将数据库记录转换为 (file_id, file_path, filename, sha256[, sheets]) 形式，传给解析器
+    # sha256 用作解析缓存的键（为空时解析器下载文件后计算）
     # 使用文件名（不含扩展名）作为 file_id，这样 LLM 提示词中使用的是用户熟悉的文件名
     file_records = []
     for f in files:
         filename = f.filename or Path(f.file_path).name
         # 去掉扩展名作为 file_id
         file_id = Path(filename).stem
-        file_records.append((
+        record = (
             file_id,  # file_id 使用文件名（不含扩展名）
             f.file_path,  # MinIO 公共路径
-            filename  # 原始文件名
-        ))
+            filename,  # 原始文件名
+            f.sha256 or None,  # 文件内容 SHA-256
+        )
+        profile = (profiles or {}).get(f.id)
+        if (
+            settings.EXCEL_LAZY_LOAD
+            and f.sha256
+            and f.md5
+            and profile is not None
+            and profile.status == "ready"
+            and profile.md5 == f.md5
+            and profile.sheets
+        ):
+            record += (profile.sheets,)  # Sheet 画像（延迟加载）
+        file_records.append(record)
 
     try:
-        return ExcelParser.load_tables_from_minio_paths(file_records)
+        collection = ExcelParser.load_tables_from_minio_paths(file_records)
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except ValueError as e:
@@ -52,6 +79,10 @@ def load_tables_from_files(files: List[File]) -> FileCollection:
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"解析文件失败: {e}")
 
+    if profiles:
+        apply_file_profiles(collection, files, [record[0] for record in file_records], profiles)
+    return collection
+
 
 
 
@@ -78,6 +109,7 @@ async def save_file_to_database(
     await file.seek(0)  # 重置文件指针，以便后续使用
 
     md5_hash = hashlib.md5(content).hexdigest()
+    sha256_hash = hash_content(content)
     file_size = len(content)
     mime_type = file.content_type or "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
 
@@ -115,6 +147,7 @@ async def save_file_to_database(
         file_path=file_path_str,
         file_size=file_size,
         md5=md5_hash,
+        sha256=sha256_hash,
         mime_type=mime_type,
         uploaded_at=datetime.now(timezone.utc),
     )
@@ -0,0 +1,266 @@
+"""文件解析画像服务 - 上传后在后台解析工作簿
+
+上传接口只负责存储文件；解析放在后台任务中进行，不占用首次对话的时间：
+- 解析所有 sheet，写入解析结果磁盘缓存（见 app.engine.workbook_cache）
+- 计算每个 sheet 的画像（行数、列名、类型、样本数据）保存到 file_profiles 表
+
+对话加载文件时：
+- 等待仍在进行的解析任务（比重新解析更快）
+- 按文件内容的 SHA-256 命中解析缓存，不再下载和解析
+- 使用保存的画像回答 get_schemas_with_samples，不再逐列计算
+"""
+
+import asyncio
+import logging
+import math
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+from uuid import UUID
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.engine.excel_parser import ExcelParser
+from app.engine.workbook_probe import ProbeError, probe_workbook
+from app.engine.models import FileCollection, Table, column_index_to_letter
+from app.engine.workbook_cache import ParsedSheets, get_workbook_cache, hash_content
+from app.models.file import File, FileProfile
+
+logger = logging.getLogger(__name__)
+
+# 画像中每列保存的样本数（需不少于分析阶段使用的样本数）
+PROFILE_SAMPLE_COUNT = 5
+
+# 同时进行的后台解析任务数（解析占用 CPU 和内存）
+MAX_CONCURRENT_JOBS = 2
+
+# 对话加载时等待进行中的解析任务的最长时间（秒）
+JOB_WAIT_TIMEOUT = 120
+
+# 可以解析的文件扩展名
+PARSEABLE_EXTENSIONS = (".xlsx", ".xlsm")
+
+# 进行中的解析任务（file_id -> 完成事件），对话加载时等待
+_running_jobs: Dict[UUID, asyncio.Event] = {}
+_job_semaphore: Optional[asyncio.Semaphore] = None
+
+
+# ==================== 画像 ====================
+
+
+def _json_safe(value: Any) -> Any:
+    """样本值转换为 JSONB 可存储的值（NaN / Infinity 转为文本）"""
+    if isinstance(value, float) and not math.isfinite(value):
+        return str(value)
+    return value
+
+
+def build_sheet_profiles(sheets: ParsedSheets, sample_count: int = PROFILE_SAMPLE_COUNT) -> List[Dict[str, Any]]:
+    """
+    计算每个 sheet 的画像
+
+    Returns:
+        [{"name": "Sheet1", "row_count": 100, "columns": [{"name", "type", "dtype", "samples"}, ...]}, ...]
+    """
+    profiles = []
+    for sheet_name, df in sheets:
+        table = Table(name=sheet_name, data=df)
+        columns = table.get_profile(sample_count)
+        for column in columns:
+            column["dtype"] = str(df[column["name"]].dtype)
+            column["samples"] = [_json_safe(v) for v in column["samples"]]
+        profiles.append({
+            "name": sheet_name,
+            "row_count": table.row_count(),
+            "columns": columns,
+        })
+    return profiles
+
+
+def parse_and_profile(data: bytes) -> List[Dict[str, Any]]:
+    """解析文件内容（写入解析缓存）并计算画像；缓存已有同一内容时直接使用"""
+    cache = get_workbook_cache()
+    key = hash_content(data)
+    sheets = cache.get(key) if cache is not None else None
+    if sheets is None:
+        sheets = ExcelParser.parse_workbook_bytes(data)
+        if cache is not None:
+            cache.put(key, sheets)
+    return build_sheet_profiles(sheets)
+
+
+def is_parseable(filename: Optional[str]) -> bool:
+    """是否为可以解析的表格文件"""
+    return bool(filename) and filename.lower().endswith(PARSEABLE_EXTENSIONS)
+
+
+def probe_upload(filename: str, data: bytes) -> List[Dict[str, Any]]:
+    """
+    上传时校验表格文件（只读取元数据，不解析数据）
+
+    Returns:
+        各 sheet 的探测结果（保存到 file_profiles.probe，解析完成前用于预览）
+
+    Raises:
+        ValueError: 文件无法打开，或估算的单元格数超过 EXCEL_UPLOAD_MAX_CELLS
+    """
+    try:
+        probes = probe_workbook(data)
+    except ProbeError as e:
+        raise ValueError(f"文件无法解析 ({filename}): {e}") from e
+
+    cells = sum(probe.cell_count() for probe in probes)
+    if settings.EXCEL_UPLOAD_MAX_CELLS > 0 and cells > settings.EXCEL_UPLOAD_MAX_CELLS:
+        raise ValueError(
+            f"文件过大 ({filename}): 约 {cells} 个单元格，超过上限 {settings.EXCEL_UPLOAD_MAX_CELLS}"
+        )
+    return [probe.to_dict() for probe in probes]
+
+
+# ==================== 后台任务 ====================
+
+
+def register_profile_job(file_id: UUID):
+    """登记即将开始的解析任务（在上传请求中调用，保证对话加载时能等到它）"""
+    _running_jobs[file_id] = asyncio.Event()
+
+
+async def run_profile_job(file_id: UUID, data: bytes):
+    """
+    后台任务：解析文件并保存画像（使用独立的数据库会话）
+
+    Args:
+        file_id: 文件 ID（file_profiles 中已有 pending 记录）
+        data: 文件内容
+    """
+    global _job_semaphore
+    if _job_semaphore is None:
+        _job_semaphore = asyncio.Semaphore(MAX_CONCURRENT_JOBS)
+    done = _running_jobs.setdefault(file_id, asyncio.Event())
+
+    try:
+        async with _job_semaphore:
+            # 数据库会话只在读写状态时打开：解析可能持续很久，期间不占用连接池中的连接
+            async with AsyncSessionLocal() as db:
+                profile = await db.get(FileProfile, file_id)
+                if profile is None:
+                    logger.warning(f"解析任务找不到画像记录: {file_id}")
+                    return
+                profile.status = "processing"
+                await db.commit()
+
+            start = time.perf_counter()
+            try:
+                sheets = await asyncio.to_thread(parse_and_profile, data)
+            except Exception as e:
+                logger.warning(f"后台解析文件失败 ({file_id}): {e}")
+                values = {"status": "failed", "error": str(e)}
+            else:
+                values = {"status": "ready", "error": None, "sheets": sheets, "sample_count": PROFILE_SAMPLE_COUNT}
+            values["parse_ms"] = int((time.perf_counter() - start) * 1000)
+
+            async with AsyncSessionLocal() as db:
+                await db.execute(update(FileProfile).where(FileProfile.file_id == file_id).values(**values))
+                await db.commit()
+    except Exception as e:
+        logger.exception(f"后台解析任务异常 ({file_id}): {e}")
+    finally:
+        done.set()
+        _running_jobs.pop(file_id, None)
+
+
+async def wait_for_profile_jobs(file_ids: Sequence[UUID], timeout: Optional[float] = JOB_WAIT_TIMEOUT):
+    """等待这些文件仍在进行的解析任务完成（超时后不再等待，由加载流程自行解析）"""
+    events = [_running_jobs[file_id].wait() for file_id in file_ids if file_id in _running_jobs]
+    if not events:
+        return
+    try:
+        await asyncio.wait_for(asyncio.gather(*events), timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.info("等待后台解析任务超时，改为直接解析")
+
+
+# ==================== 查询与使用 ====================
+
+
+async def get_file_profiles(db: AsyncSession, file_ids: Sequence[UUID]) -> Dict[UUID, FileProfile]:
+    """获取文件的解析画像"""
+    if not file_ids:
+        return {}
+    result = await db.execute(select(FileProfile).where(FileProfile.file_id.in_(file_ids)))
+    return {profile.file_id: profile for profile in result.scalars()}
+
+
+def apply_file_profiles(collection: FileCollection, files: List[File], file_ids: List[str], profiles: Dict[UUID, FileProfile]):
+    """
+    将已完成的画像应用到加载的表上（文件内容与画像一致时）
+
+    Args:
+        collection: 加载的表集合
+        files: 文件记录
+        file_ids: 每个文件在表集合中的 file_id（与 files 一一对应）
+        profiles: 文件 ID -> 画像
+    """
+    for file_record, file_id in zip(files, file_ids):
+        profile = profiles.get(file_record.id)
+        if profile is None or profile.status != "ready" or not profile.sheets:
+            continue
+        if file_record.md5 and profile.md5 != file_record.md5:
+            continue
+        excel_file = collection.get_file(file_id)
+        for sheet in profile.sheets:
+            if excel_file.has_sheet(sheet["name"]):
+                excel_file.get_sheet(sheet["name"]).set_profile(sheet["columns"], profile.sample_count)
+
+
+def build_preview_info(files: List[File], profiles: Dict[UUID, FileProfile]) -> List[Dict[str, Any]]:
+    """
+    加载完成前的文件预览（格式同 build_file_collection_info，用于尽早通知前端）
+
+    解析已完成的文件使用画像（行数准确，含列类型）；其余使用上传时读取的元数据
+    （行数为估算值，approximate 为 True）。没有画像的文件不包含在内。
+    """
+    files_info = []
+    for file_record in files:
+        profile = profiles.get(file_record.id)
+        if profile is None:
+            continue
+        filename = file_record.filename or Path(file_record.file_path).name
+        if profile.status == "ready" and profile.sheets:
+            sheets = [
+                {
+                    "name": sheet["name"],
+                    "row_count": sheet["row_count"],
+                    "columns": [
+                        {"name": column["name"], "letter": column_index_to_letter(i), "type": column["type"]}
+                        for i, column in enumerate(sheet["columns"])
+                    ],
+                }
+                for sheet in profile.sheets
+            ]
+            approximate = False
+        elif profile.probe:
+            sheets = [
+                {
+                    "name": sheet["name"],
+                    "row_count": sheet["row_count"],
+                    "columns": [
+                        {"name": name, "letter": column_index_to_letter(i)}
+                        for i, name in enumerate(sheet["columns"])
+                    ],
+                }
+                for sheet in profile.probe
+            ]
+            approximate = True
+        else:
+            continue
+        files_info.append({
+            "file_id": Path(filename).stem,
+            "filename": filename,
+            "sheets": sheets,
+            "approximate": approximate,
+        })
+    return files_info
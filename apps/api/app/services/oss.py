@@ -1,6 +1,14 @@
-"""OSS (MinIO) 存储服务"""
+"""OSS (MinIO) 存储服务
+
+MinIO 客户端在进程内共享（连接在请求之间保持），存储桶只在第一次上传时检查。
+大文件按 OSS_UPLOAD_PART_SIZE_MB 分片上传，各分片从文件对象中依次读取，不需要在内存中保留整个文件。
+上传是阻塞的网络 IO，在异步代码中使用 *_async 版本（在线程中执行，不阻塞事件循环）。
+"""
+import asyncio
 import io
-from typing import Union, BinaryIO
+import os
+import threading
+from typing import Optional, Set, Union, BinaryIO
 from uuid import uuid4
 
 from minio import Minio
@@ -14,23 +22,62 @@ class OSSError(Exception):
     pass
 
 
+# MinIO 要求的最小分片大小
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+# ==================== 客户端 ====================
+
+_client: Optional[Minio] = None
+_client_lock = threading.Lock()
+
+# 已确认存在的存储桶
+_ready_buckets: Set[str] = set()
+
+
 def get_minio_client() -> Minio:
-    """获取 MinIO 客户端"""
-    return Minio(
-        endpoint=settings.MINIO_ENDPOINT,
-        access_key=settings.MINIO_ACCESS_KEY,
-        secret_key=settings.MINIO_SECRET_KEY,
-        secure=False,
-    )
+    """获取 MinIO 客户端（进程内共享，线程安全）"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = Minio(
+                    endpoint=settings.MINIO_ENDPOINT,
+                    access_key=settings.MINIO_ACCESS_KEY,
+                    secret_key=settings.MINIO_SECRET_KEY,
+                    secure=False,
+                )
+    return _client
 
 
 def ensure_bucket_exists(client: Minio, bucket_name: str) -> None:
-    """确保存储桶存在，不存在则创建"""
+    """确保存储桶存在，不存在则创建（确认存在后不再检查）"""
+    if bucket_name in _ready_buckets:
+        return
     try:
         if not client.bucket_exists(bucket_name):
             client.make_bucket(bucket_name)
     except S3Error as e:
         raise OSSError(f"初始化 MinIO 存储桶失败: {e}")
+    _ready_buckets.add(bucket_name)
+
+
+def _part_size() -> int:
+    """分片大小（不小于 MinIO 的最小分片大小）"""
+    return max(MIN_PART_SIZE, settings.OSS_UPLOAD_PART_SIZE_MB * 1024 * 1024)
+
+
+def _stream_size(data: BinaryIO) -> Optional[int]:
+    """可定位的文件对象从当前位置到末尾的大小（不可定位时返回 None）"""
+    try:
+        if not data.seekable():
+            return None
+        position = data.tell()
+        end = data.seek(0, os.SEEK_END)
+        data.seek(position)
+    except (AttributeError, OSError, ValueError):
+        return None
+    return end - position
 
 
 def generate_object_name(
@@ -79,11 +126,15 @@ def upload_file(
     """
     上传文件到 OSS
 
+    超过分片大小的文件分片上传（OSS_UPLOAD_PART_SIZE_MB，同时上传 OSS_UPLOAD_PARALLEL_PARTS 个分片），
+    分片从 data 中依次读取。
+
     Args:
-        data: 文件内容（bytes 或文件对象）
+        data: 文件内容（bytes 或文件对象，文件对象从当前位置读取到末尾）
         object_name: 对象名称（完整路径）
         content_type: 内容类型
-        size: 文件大小（如果 data 是 bytes 可自动计算）
+        size: 文件大小（data 是 bytes 或可定位的文件对象时可自动计算，
+            都不满足时按未知大小流式分片上传）
 
     Returns:
         公共访问 URL
@@ -102,21 +153,40 @@ def upload_file(
         size = len(data)
         data = io.BytesIO(data)
     elif size is None:
-        raise OSSError("当 data 不是 bytes 时，必须提供 size 参数")
+        size = _stream_size(data)
 
     try:
         client.put_object(
             bucket_name=bucket_name,
             object_name=object_name,
             data=data,
-            length=size,
+            length=size if size is not None else -1,
             content_type=content_type,
+            part_size=_part_size(),
+            num_parallel_uploads=max(1, settings.OSS_UPLOAD_PARALLEL_PARTS),
         )
         return generate_public_url(bucket_name, object_name)
     except S3Error as e:
         raise OSSError(f"上传文件到 MinIO 失败: {e}")
 
 
+async def upload_file_async(
+    data: Union[bytes, BinaryIO],
+    object_name: str,
+    content_type: str = "application/octet-stream",
+    size: int | None = None,
+) -> str:
+    """
+    上传文件到 OSS（异步版本，在线程中上传，不阻塞事件循环）
+
+    参数和返回值见 upload_file。
+
+    Raises:
+        OSSError: 上传失败时抛出
+    """
+    return await asyncio.to_thread(upload_file, data, object_name, content_type, size)
+
+
 def upload_user_file(
     data: Union[bytes, BinaryIO],
     user_id: str,
@@ -155,3 +225,22 @@ def upload_user_file(
     public_url = upload_file(data, object_name, content_type, size)
 
     return file_id, object_name, public_url
+
+
+async def upload_user_file_async(
+    data: Union[bytes, BinaryIO],
+    user_id: str,
+    filename: str,
+    content_type: str = "application/octet-stream",
+    size: int | None = None,
+    prefix: str = "uploads",
+) -> tuple[str, str, str]:
+    """
+    上传用户文件到 OSS（异步版本，在线程中上传，不阻塞事件循环）
+
+    参数和返回值见 upload_user_file。
+
+    Raises:
+        OSSError: 上传失败时抛出
+    """
+    return await asyncio.to_thread(upload_user_file, data, user_id, filename, content_type, size, prefix)
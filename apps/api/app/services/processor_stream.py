@@ -5,7 +5,10 @@
 
 import asyncio
 import logging
+import tempfile
+import time
 import uuid
+from contextlib import aclosing
 from dataclasses import dataclass
 from datetime import datetime
 from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, List, Optional
@@ -13,6 +16,7 @@ from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, List, Optiona
 from sse_starlette.sse import ServerSentEvent
 
 from app.api.deps import get_llm_client
+from app.core.config import settings
 from app.core.sse import (
     sse_step_running,
     sse_step_streaming,
@@ -20,8 +24,9 @@ from app.core.sse import (
     sse_step_error,
 )
 from app.engine.models import FileCollection, column_index_to_letter
-from app.processor import ExcelProcessor, ProcessConfig, EventType
-from app.services.oss import upload_file
+from app.processor import ExcelProcessor, ProcessConfig, ProcessResult, EventType
+from app.services.oss import upload_file_async
+from app.services.result_store import get_result_store
 
 logger = logging.getLogger(__name__)
 
@@ -102,12 +107,11 @@ def build_file_collection_info(tables: FileCollection) -> List[Dict[str, Any]]:
 
         for sheet_name in excel_file.get_sheet_names():
             table = excel_file.get_sheet(sheet_name)
-            df = table.get_data()
 
             columns_info = []
             for idx, col_name in enumerate(table.get_columns()):
                 col_letter = column_index_to_letter(idx)
-                dtype = str(df[col_name].dtype)
+                dtype = table.get_column_dtype(col_name)
                 friendly_type = _dtype_to_friendly(dtype)
 
                 columns_info.append(
@@ -126,51 +130,131 @@ def build_file_collection_info(tables: FileCollection) -> List[Dict[str, Any]]:
     return files_info
 
 
+def _format_preview(files_info: List[Dict[str, Any]]) -> str:
+    """加载预览的文字描述（流式输出到 load 步骤）"""
+    lines = []
+    for file_info in files_info:
+        prefix = "约 " if file_info.get("approximate") else ""
+        for sheet in file_info["sheets"]:
+            rows = f"{prefix}{sheet['row_count']} 行" if sheet["row_count"] is not None else "行数未知"
+            lines.append(f"{file_info['filename']} · {sheet['name']}：{rows}，{len(sheet['columns'])} 列\n")
+    return "".join(lines)
+
+
+# 导出文件在内存中保留的最大大小，超过后写入临时文件
+EXPORT_SPOOL_MAX_BYTES = 32 * 1024 * 1024
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+async def _export_one_file(
+    tables: FileCollection,
+    file_id: str,
+    object_name_prefix: str,
+) -> Dict[str, Any]:
+    """
+    导出单个文件并上传到 OSS（导出和上传都不阻塞事件循环）
+
+    导出写入临时文件（较小时在内存中），上传时从临时文件中分片读取。
+
+    Returns:
+        {file_id, filename, url, size, export_ms, upload_ms}
+    """
+    filename = tables.get_file_info(file_id)["filename"]
+
+    with tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_BYTES) as buffer:
+        # 导出单个文件
+        start = time.perf_counter()
+        size = await asyncio.to_thread(tables.export_file, file_id, buffer)
+        export_ms = (time.perf_counter() - start) * 1000
+
+        # 上传到 OSS
+        buffer.seek(0)
+        start = time.perf_counter()
+        public_url = await upload_file_async(
+            data=buffer,
+            object_name=f"{object_name_prefix}/{filename}",
+            content_type=XLSX_CONTENT_TYPE,
+            size=size,
+        )
+        upload_ms = (time.perf_counter() - start) * 1000
+
+    return {
+        "file_id": file_id,
+        "filename": filename,
+        "url": public_url,
+        "size": size,
+        "export_ms": round(export_ms, 1),
+        "upload_ms": round(upload_ms, 1),
+    }
+
+
 async def _export_modified_files(
     tables: FileCollection,
     modified_file_ids: List[str],
     path_prefix: str,
-) -> List[Dict[str, str]]:
+) -> List[Dict[str, Any]]:
     """
     导出被修改的文件到 OSS
 
+    多个文件同时导出和上传（最多 EXCEL_EXPORT_CONCURRENCY 个），一个文件上传的同时可以导出下一个文件。
+
     Args:
         tables: 文件集合
         modified_file_ids: 被修改的文件 ID 列表
         path_prefix: OSS 路径前缀
 
     Returns:
-        导出文件列表：[{file_id, filename, url}, ...]
+        导出文件列表（按 modified_file_ids 的顺序，失败的文件不包含在内）：
+        [{file_id, filename, url, size, export_ms, upload_ms}, ...]
     """
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_files = []
+    semaphore = asyncio.Semaphore(max(1, settings.EXCEL_EXPORT_CONCURRENCY))
 
-    for file_id in modified_file_ids:
-        try:
-            file_info = tables.get_file_info(file_id)
-            filename = file_info["filename"]
+    async def export(file_id: str) -> Optional[Dict[str, Any]]:
+        async with semaphore:
+            try:
+                return await _export_one_file(tables, file_id, f"{path_prefix}/{timestamp}")
+            except Exception as e:
+                logger.warning(f"Export file {file_id} failed: {e}")
+                # 继续处理其他文件，不中断
+                return None
 
-            # 导出单个文件到字节流
-            excel_bytes = await asyncio.to_thread(tables.export_file_to_bytes, file_id)
+    results = await asyncio.gather(*(export(file_id) for file_id in modified_file_ids))
+    return [item for item in results if item is not None]
 
-            # 生成对象名称
-            object_name = f"{path_prefix}/{timestamp}/{filename}"
 
-            # 上传到 OSS
-            public_url = upload_file(
-                data=excel_bytes,
-                object_name=object_name,
-                content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            )
+async def _store_modified_files(
+    tables: FileCollection,
+    modified_file_ids: List[str],
+    path_prefix: str,
+    result_id: Optional[str],
+    owner_id: Optional[str],
+) -> List[Dict[str, Any]]:
+    """
+    暂存被修改的文件（下载时直接流式生成），并按 EXCEL_EXPORT_UPLOAD 上传到 OSS
 
-            output_files.append(
-                {"file_id": file_id, "filename": filename, "url": public_url}
-            )
+    暂存成功时每个文件带有 download_path（相对 API 根路径）；未上传时 url 为 None。
+    结果超过暂存上限（或暂存已禁用）时总是上传。
 
-        except Exception as e:
-            logger.warning(f"Export file {file_id} failed: {e}")
-            # 继续处理其他文件，不中断
+    Returns:
+        [{file_id, filename, url, download_path?, size?, export_ms?, upload_ms?}, ...]
+    """
+    stored_id = await asyncio.to_thread(
+        get_result_store().put, tables, modified_file_ids, owner_id=owner_id, result_id=result_id
+    )
+
+    if settings.EXCEL_EXPORT_UPLOAD or stored_id is None:
+        output_files = await _export_modified_files(tables, modified_file_ids, path_prefix)
+    else:
+        output_files = [
+            {"file_id": file_id, "filename": tables.get_file_info(file_id)["filename"], "url": None}
+            for file_id in modified_file_ids
+        ]
 
+    if stored_id is not None:
+        for item in output_files:
+            item["download_path"] = f"/results/{stored_id}/files/{item['file_id']}"
     return output_files
 
 
@@ -182,9 +266,12 @@ async def stream_excel_processing(
     query: str,
     stream_llm: bool = True,
     export_path_prefix: Optional[str] = None,
+    result_id: Optional[str] = None,
+    owner_id: Optional[str] = None,
     on_event: Optional[StageCallback] = None,
     on_failure: Optional[FailureCallback] = None,
     on_load_tables: Optional[Callable[[FileCollection], Awaitable[None]]] = None,
+    preview_tables_fn: Optional[Callable[[], Awaitable[Optional[List[Dict[str, Any]]]]]] = None,
 ) -> AsyncGenerator[ServerSentEvent, None]:
     """
     完整的 Excel 处理流式输出
@@ -196,9 +283,13 @@ async def stream_excel_processing(
         query: 用户查询
         stream_llm: 是否使用流式 LLM
         export_path_prefix: OSS 导出路径前缀，不传则跳过导出
+        result_id: 暂存结果的 ID（下载地址 /results/{result_id}/files/{file_id}），不传则自动生成
+        owner_id: 暂存结果所属用户 ID（只有该用户可以下载），不传则不限制
         on_event: 事件回调（用于持久化等副作用）
         on_failure: 整体流程失败回调（用于埋点等副作用）
         on_load_tables: 加载表格后回调（可用于缓存等副作用）
+        preview_tables_fn: 可选，加载前获取文件预览（只读元数据，格式同 build_file_collection_info），
+            结果作为 load 步骤的流式输出先行发送
 
     Yields:
         ServerSentEvent 事件
@@ -209,6 +300,8 @@ async def stream_excel_processing(
             load_tables_fn=lambda: load_from_db(db, file_ids, user_id),
             query=params.query,
             export_path_prefix=f"users/{user_id}/outputs",
+            result_id=str(turn_id),
+            owner_id=str(user_id),
             on_event=on_event,
         ):
             yield sse
@@ -231,6 +324,17 @@ async def stream_excel_processing(
         )
     yield sse_step_running("load", load_stage_id)
 
+    if preview_tables_fn:
+        try:
+            preview = await preview_tables_fn()
+            if preview:
+                yield sse_step_streaming(
+                    "load", _format_preview(preview), load_stage_id, output={"files": preview}
+                )
+        except Exception as e:
+            # 预览失败不影响加载
+            logger.warning(f"Preview files error: {e}")
+
     try:
         tables = await load_tables_fn()
         files_info = build_file_collection_info(tables)
@@ -262,76 +366,59 @@ async def stream_excel_processing(
     processor = ExcelProcessor(llm_client)
     config = ProcessConfig(stream_llm=stream_llm)
 
-    gen = processor.process(tables, query, config)
-    _GENERATOR_DONE = object()
-
-    def get_next_event():
-        try:
-            return next(gen)
-        except StopIteration as e:
-            return _GENERATOR_DONE, e.value
-
-    result = None
-    has_error = False
-
-    while True:
-        event_or_done = await asyncio.to_thread(get_next_event)
-
-        if isinstance(event_or_done, tuple) and event_or_done[0] is _GENERATOR_DONE:
-            result = event_or_done[1]
-            break
-
-        event = event_or_done
-        step_name = event.stage.value
-        stage_id = event.stage_id
-
-        # execute 阶段：如果 output 中有 errors，转换为 error 事件
-        event_type = event.event_type
-        error_msg = getattr(event, "error", None)
-
-        if (
-            step_name == "execute"
-            and event_type == EventType.STAGE_DONE
-        ):
-            output = event.output or {}
-            errors = output.get("errors", [])
-            if errors:
-                event_type = EventType.STAGE_ERROR
-                error_msg = "; ".join(errors) if isinstance(errors, list) else str(errors)
-
-        # 构建上下文并调用回调
-        ctx = StageContext(
-            step=step_name,
-            stage_id=stage_id,
-            event_type=event_type,
-            output=getattr(event, "output", None),
-            error=error_msg,
-            delta=getattr(event, "delta", None),
-        )
+    # LLM 流式响应直接在事件循环上读取，验证和执行在线程中运行
+    result = ProcessResult()
+    async with aclosing(processor.process_async(tables, query, config, result)) as events:
+        async for event in events:
+            step_name = event.stage.value
+            stage_id = event.stage_id
+
+            # execute 阶段：如果 output 中有 errors，转换为 error 事件
+            event_type = event.event_type
+            error_msg = getattr(event, "error", None)
+
+            if (
+                step_name == "execute"
+                and event_type == EventType.STAGE_DONE
+            ):
+                output = event.output or {}
+                errors = output.get("errors", [])
+                if errors:
+                    event_type = EventType.STAGE_ERROR
+                    error_msg = "; ".join(errors) if isinstance(errors, list) else str(errors)
+
+            # 构建上下文并调用回调
+            ctx = StageContext(
+                step=step_name,
+                stage_id=stage_id,
+                event_type=event_type,
+                output=getattr(event, "output", None),
+                error=error_msg,
+                delta=getattr(event, "delta", None),
+            )
 
-        if on_event:
-            await on_event(ctx)
+            if on_event:
+                await on_event(ctx)
 
-        # 生成 SSE 事件
-        if event_type == EventType.STAGE_START:
-            yield sse_step_running(step_name, stage_id)
+            # 生成 SSE 事件
+            if event_type == EventType.STAGE_START:
+                yield sse_step_running(step_name, stage_id)
 
-        elif event_type == EventType.STAGE_STREAM:
-            yield sse_step_streaming(step_name, event.delta, stage_id)
+            elif event_type == EventType.STAGE_STREAM:
+                yield sse_step_streaming(step_name, event.delta, stage_id)
 
-        elif event_type == EventType.STAGE_DONE:
-            yield sse_step_done(step_name, event.output, stage_id)
+            elif event_type == EventType.STAGE_DONE:
+                yield sse_step_done(step_name, event.output, stage_id)
 
-        elif event_type == EventType.STAGE_ERROR:
-            yield sse_step_error(step_name, error_msg, stage_id)
-            has_error = True
-            # 错误后发送 complete 并终止
-            yield sse_step_done(
-                "complete", {"success": False, "errors": [error_msg]}
-            )
-            if on_failure:
-                await on_failure([error_msg])
-            return
+            elif event_type == EventType.STAGE_ERROR:
+                yield sse_step_error(step_name, error_msg, stage_id)
+                # 错误后发送 complete 并终止
+                yield sse_step_done(
+                    "complete", {"success": False, "errors": [error_msg]}
+                )
+                if on_failure:
+                    await on_failure([error_msg])
+                return
 
     # === 3. export:result ===
     output_files = None
@@ -353,10 +440,14 @@ async def stream_excel_processing(
         yield sse_step_running("export", export_stage_id)
 
         try:
-            output_files = await _export_modified_files(
-                result.modified_tables, modified_file_ids, export_path_prefix
+            export_start = time.perf_counter()
+            output_files = await _store_modified_files(
+                result.modified_tables, modified_file_ids, export_path_prefix, result_id, owner_id
             )
-            export_output = {"output_files": output_files}
+            export_output = {
+                "output_files": output_files,
+                "duration_ms": round((time.perf_counter() - export_start) * 1000, 1),
+            }
 
             if on_event:
                 await on_event(
@@ -0,0 +1,270 @@
+"""处理结果暂存 - 处理完成的表保留在内存中，下载时直接流式生成工作簿
+
+导出的文件原本都要先序列化、上传到 MinIO，浏览器再通过公共地址下载一遍。
+交互式的下载直接从这里生成：
+
+- 处理完成后被修改的文件（写时复制的副本，不复制数据）按结果 ID 暂存，
+  按估算的内存占用做 LRU 淘汰，超过 RESULT_STORE_TTL_SECONDS 后过期
+- 下载时用流式写入（见 app.engine.xlsx_writer）边生成边发送，不在内存中保留整个文件
+- 每个文件的 ETag 由表内容哈希计算（相同的结果 ETag 相同），客户端重复下载时直接返回 304；
+  从原始工作簿加载的表只计算变化的列（与导出时修补的内容一致，见 app.engine.xlsx_patcher），不需要加载其余列
+"""
+
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional
+
+from app.core.config import settings
+from app.engine.models import FileCollection
+from app.engine.operation_cache import _digest, table_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# 下载时每次发送的数据大小
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# 生成线程最多领先发送的块数（客户端较慢时生成线程等待）
+DOWNLOAD_QUEUE_CHUNKS = 16
+
+# 工作簿格式版本（写入方式变化时修改，使客户端缓存的旧文件失效）
+WORKBOOK_FORMAT_VERSION = "xlsx-patch-1"
+
+
+@dataclass
+class StoredResult:
+    """暂存的处理结果"""
+
+    result_id: str
+    owner_id: Optional[str]
+    tables: FileCollection
+    size: int
+    expires_at: float
+    _etags: Dict[str, str] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def has_file(self, file_id: str) -> bool:
+        return self.tables.has_file(file_id)
+
+    def filename(self, file_id: str) -> str:
+        return self.tables.get_file_info(file_id)["filename"]
+
+    def etag(self, file_id: str) -> str:
+        """
+        文件的 ETag（按表内容计算，第一次调用时计算并缓存；较慢，在线程中调用）
+
+        生成的 xlsx 中包含写入时间，字节不一定完全相同，因此是弱 ETag。
+        """
+        with self._lock:
+            if file_id not in self._etags:
+                excel_file = self.tables.get_file(file_id)
+                source_hash = getattr(excel_file.source, "content_hash", None)
+                parts = [WORKBOOK_FORMAT_VERSION, excel_file.filename, source_hash or ""]
+                for sheet_name in excel_file.get_sheet_names():
+                    table = excel_file.get_sheet(sheet_name)
+                    if source_hash and table.source_columns is not None:
+                        # 原有的列由原文件的内容哈希确定
+                        data = table.get_data(table.get_changed_columns())
+                    else:
+                        data = table.get_data()
+                    parts += [sheet_name, table_fingerprint(data)]
+                self._etags[file_id] = f'W/"{_digest(*parts)}"'
+            return self._etags[file_id]
+
+
+class ResultStore:
+    """
+    处理结果暂存（线程安全，进程内共享）
+
+    Args:
+        max_bytes: 暂存结果的估算内存上限（按 LRU 淘汰）
+        ttl: 结果的保留时间（秒）
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, StoredResult]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def put(
+        self,
+        tables: FileCollection,
+        file_ids: List[str],
+        owner_id: Optional[str] = None,
+        result_id: Optional[str] = None,
+    ) -> Optional[str]:
+        """
+        暂存处理结果中的文件（估算内存占用需要遍历数据，在线程中调用）
+
+        Args:
+            tables: 处理后的文件集合
+            file_ids: 需要暂存的文件（被修改的文件）
+            owner_id: 所属用户 ID（None 表示不限制）
+            result_id: 结果 ID（None 时自动生成），相同 ID 的结果会被替换
+
+        Returns:
+            结果 ID；超过内存上限或暂存已禁用时返回 None
+        """
+        if self.max_bytes <= 0 or not file_ids:
+            return None
+
+        stored = FileCollection()
+        size = 0
+        for file_id in file_ids:
+            excel_file = tables.get_file(file_id).fork()
+            stored.add_file(excel_file)
+            for sheet_name in excel_file.get_sheet_names():
+                size += excel_file.get_sheet(sheet_name).memory_usage()
+            if excel_file.source is not None:
+                # 导出时修补用到的原文件内容
+                size += excel_file.source.loaded_size()
+        if size > self.max_bytes:
+            return None
+
+        entry = StoredResult(
+            result_id=result_id or uuid.uuid4().hex,
+            owner_id=owner_id,
+            tables=stored,
+            size=size,
+            expires_at=time.monotonic() + self.ttl,
+        )
+        with self._lock:
+            self._remove(entry.result_id)
+            self._entries[entry.result_id] = entry
+            self._size += size
+            self._evict()
+        return entry.result_id
+
+    def get(self, result_id: str) -> Optional[StoredResult]:
+        """查找结果（已过期时返回 None）"""
+        with self._lock:
+            entry = self._entries.get(result_id)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.monotonic():
+                self._remove(result_id)
+                return None
+            self._entries.move_to_end(result_id)
+            return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._size, "max_bytes": self.max_bytes}
+
+    def _remove(self, result_id: str):
+        entry = self._entries.pop(result_id, None)
+        if entry is not None:
+            self._size -= entry.size
+
+    def _evict(self):
+        now = time.monotonic()
+        for result_id in [key for key, entry in self._entries.items() if entry.expires_at <= now]:
+            self._remove(result_id)
+        while self._size > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+
+
+# ==================== 流式下载 ====================
+
+
+class _DownloadCancelled(Exception):
+    """客户端已断开，停止生成"""
+
+
+class _QueueWriter:
+    """生成线程的输出：按 DOWNLOAD_CHUNK_SIZE 分块放入事件循环上的队列（队列满时等待）"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue, cancelled: threading.Event):
+        self._loop = loop
+        self._queue = queue
+        self._cancelled = cancelled
+        self._buffer = bytearray()
+
+    def write(self, data) -> int:
+        self._buffer += data
+        if len(self._buffer) >= DOWNLOAD_CHUNK_SIZE:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if self._buffer:
+            self._put(bytes(self._buffer))
+            self._buffer.clear()
+
+    def _put(self, item):
+        if self._cancelled.is_set():
+            raise _DownloadCancelled()
+        asyncio.run_coroutine_threadsafe(self._queue.put(item), self._loop).result()
+
+
+async def stream_workbook(tables: FileCollection, file_id: str) -> AsyncIterator[bytes]:
+    """
+    边生成边输出文件的工作簿（生成在线程中进行，不阻塞事件循环）
+
+    客户端断开（生成器被关闭）时生成线程在下一次写入时停止。
+
+    Yields:
+        xlsx 文件内容的数据块
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=DOWNLOAD_QUEUE_CHUNKS)
+    cancelled = threading.Event()
+    writer = _QueueWriter(loop, queue, cancelled)
+    done = object()
+
+    def produce():
+        try:
+            tables.export_file(file_id, writer)
+            writer.flush()
+        finally:
+            if not cancelled.is_set():
+                asyncio.run_coroutine_threadsafe(queue.put(done), loop).result()
+
+    task = asyncio.ensure_future(asyncio.to_thread(produce))
+    try:
+        while True:
+            chunk = await queue.get()
+            if chunk is done:
+                break
+            yield chunk
+        await task
+    finally:
+        if not task.done():
+            cancelled.set()
+            # 取出队列中的数据，让等待放入的生成线程继续并在下一次写入时停止
+            while not task.done():
+                while not queue.empty():
+                    queue.get_nowait()
+                await asyncio.sleep(0.01)
+        if not task.cancelled() and task.exception() is not None and not isinstance(task.exception(), _DownloadCancelled):
+            logger.warning(f"生成下载文件失败: {task.exception()}")
+
+
+# ==================== 共享实例 ====================
+
+_shared_store: Optional[ResultStore] = None
+_shared_lock = threading.Lock()
+
+
+def get_result_store() -> ResultStore:
+    """获取进程内共享的结果暂存（内存上限和保留时间由 RESULT_STORE_MAX_MB / RESULT_STORE_TTL_SECONDS 配置）"""
+    global _shared_store
+    if _shared_store is None:
+        with _shared_lock:
+            if _shared_store is None:
+                _shared_store = ResultStore(
+                    max_bytes=settings.RESULT_STORE_MAX_MB * 1024 * 1024,
+                    ttl=settings.RESULT_STORE_TTL_SECONDS,
+                )
+    return _shared_store
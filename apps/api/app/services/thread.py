@@ -1,7 +1,101 @@
-"""线程相关服务"""
+"""线程相关服务
 
+新线程先使用由查询截取的临时标题创建，LLM 生成的标题在处理流程进行的同时生成，
+完成后更新到数据库并推送给前端。相同查询生成的标题在进程内缓存，再次出现时直接使用。
+"""
+
+import logging
+import re
+import threading
+from collections import OrderedDict
 from typing import Optional
+from uuid import UUID
+
+from app.core.database import AsyncSessionLocal
 from app.engine.llm_client import LLMClient
+from app.persistence import TurnRepository
+
+logger = logging.getLogger(__name__)
+
+# 临时标题的最大长度（与生成标题的提示词一致）
+PROVISIONAL_TITLE_LENGTH = 20
+
+# 生成的标题的最大长度
+MAX_TITLE_LENGTH = 30
+
+# 缓存的标题数（按查询内容）
+TITLE_CACHE_SIZE = 1024
+
+# 系统提示词：要求生成简洁的标题
+TITLE_SYSTEM_PROMPT = """你是一个专业的标题生成助手。根据用户的查询内容，生成一个简洁、准确的标题。
+
+要求：
+1. 标题应该简洁明了，不超过20个字符
+2. 标题应该准确反映用户查询的核心内容
+3. 只返回标题文本，不要包含任何其他说明或标记
+4. 如果查询内容过于简短或无法理解，可以返回查询内容的前20个字符
+
+示例：
+- 查询："计算所有订单的总金额" -> 标题："计算订单总金额"
+- 查询："统计每个产品的销售数量" -> 标题："统计产品销售数量"
+- 查询："筛选出价格大于100的商品" -> 标题："筛选高价商品"
+"""
+
+
+# ==================== 标题缓存 ====================
+
+_title_cache: "OrderedDict[str, str]" = OrderedDict()
+_title_cache_lock = threading.Lock()
+
+
+def _cache_key(query: str) -> str:
+    """查询内容归一化（合并空白）"""
+    return re.sub(r"\s+", " ", query).strip()
+
+
+def get_cached_thread_title(query: str) -> Optional[str]:
+    """相同查询之前生成的标题（没有时返回 None）"""
+    key = _cache_key(query)
+    with _title_cache_lock:
+        title = _title_cache.get(key)
+        if title is not None:
+            _title_cache.move_to_end(key)
+        return title
+
+
+def _cache_title(query: str, title: str):
+    with _title_cache_lock:
+        _title_cache[_cache_key(query)] = title
+        _title_cache.move_to_end(_cache_key(query))
+        while len(_title_cache) > TITLE_CACHE_SIZE:
+            _title_cache.popitem(last=False)
+
+
+# ==================== 标题生成 ====================
+
+
+def provisional_thread_title(query: str) -> str:
+    """
+    临时标题：查询内容（合并空白）的前 PROVISIONAL_TITLE_LENGTH 个字符
+
+    Args:
+        query: 用户查询内容
+
+    Returns:
+        临时标题，截断时以省略号结尾
+    """
+    text = _cache_key(query)
+    if len(text) <= PROVISIONAL_TITLE_LENGTH:
+        return text
+    return text[:PROVISIONAL_TITLE_LENGTH] + "…"
+
+
+def _clean_title(title: str, query: str) -> str:
+    """清理标题：去除可能的引号、换行等，并限制长度"""
+    title = title.strip().strip('"').strip("'").strip()
+    if len(title) > MAX_TITLE_LENGTH:
+        title = title[:MAX_TITLE_LENGTH]
+    return title if title else query
 
 
 def generate_thread_title(query: str, llm_client: LLMClient) -> Optional[str]:
@@ -18,34 +112,71 @@ def generate_thread_title(query: str, llm_client: LLMClient) -> Optional[str]:
     if not query or not query.strip():
         return None
 
-    # 系统提示词：要求生成简洁的标题
-    system_prompt = """你是一个专业的标题生成助手。根据用户的查询内容，生成一个简洁、准确的标题。
+    cached = get_cached_thread_title(query)
+    if cached is not None:
+        return cached
 
-要求：
-1. 标题应该简洁明了，不超过20个字符
-2. 标题应该准确反映用户查询的核心内容
-3. 只返回标题文本，不要包含任何其他说明或标记
-4. 如果查询内容过于简短或无法理解，可以返回查询内容的前20个字符
+    try:
+        title = _clean_title(llm_client._call_llm(TITLE_SYSTEM_PROMPT, query), query)
+    except Exception as e:
+        # 如果 LLM 调用失败，返回查询内容，不影响主流程
+        logger.warning(f"生成线程标题失败: {e}")
+        return query
 
-示例：
-- 查询："计算所有订单的总金额" -> 标题："计算订单总金额"
-- 查询："统计每个产品的销售数量" -> 标题："统计产品销售数量"
-- 查询："筛选出价格大于100的商品" -> 标题："筛选高价商品"
-"""
+    _cache_title(query, title)
+    return title
+
+
+async def generate_thread_title_async(query: str, llm_client: LLMClient) -> Optional[str]:
+    """
+    根据用户查询内容生成线程标题（异步版本）
+
+    Args:
+        query: 用户查询内容
+        llm_client: LLM 客户端实例
+
+    Returns:
+        生成的标题，查询为空或生成失败时返回 None
+    """
+    if not query or not query.strip():
+        return None
+
+    cached = get_cached_thread_title(query)
+    if cached is not None:
+        return cached
 
     try:
-        # 调用 LLM 生成标题
-        title = llm_client._call_llm(system_prompt, query)
+        title = _clean_title(await llm_client._call_llm_async(TITLE_SYSTEM_PROMPT, query), query)
+    except Exception as e:
+        logger.warning(f"生成线程标题失败: {e}")
+        return None
+
+    _cache_title(query, title)
+    return title
+
+
+async def update_thread_title(thread_id: UUID, query: str, llm_client: LLMClient) -> Optional[str]:
+    """
+    生成标题并更新到数据库（使用独立的数据库会话，可与处理流程同时进行）
 
-        # 清理标题：去除可能的引号、换行等
-        title = title.strip().strip('"').strip("'").strip()
+    Args:
+        thread_id: 线程 ID
+        query: 用户查询内容
+        llm_client: LLM 客户端实例
 
-        # 限制长度
-        if len(title) > 30:
-            title = title[:30]
+    Returns:
+        新的标题，生成失败时返回 None（保留临时标题）
+    """
+    title = await generate_thread_title_async(query, llm_client)
+    if not title:
+        return None
 
-        return title if title else query
+    try:
+        async with AsyncSessionLocal() as db:
+            repo = TurnRepository(db)
+            await repo.update_thread_title(thread_id, title)
+            await repo.commit()
     except Exception as e:
-        # 如果 LLM 调用失败，返回 None，不影响主流程
-        print(e)
-        return query
+        logger.warning(f"更新线程标题失败: {e}")
+        return None
+    return title
@@ -0,0 +1,202 @@
+"""
+处理流程流式输出基准（模拟 LLM 服务）
+
+在子进程中启动一个兼容 OpenAI 流式接口的模拟 LLM 服务（等待首 token 延迟后按固定间隔逐个输出 token，
+内容是一份可以通过验证的操作 JSON），然后以不同的并发数同时运行多个处理流程，比较：
+- thread: 同步 ExcelProcessor.process，每个事件用一次 asyncio.to_thread 推进（原来的方式）
+- async: ExcelProcessor.process_async，LLM 流式响应在事件循环上读取（现在的方式）
+
+每个 token 的延迟 = 处理流程收到该增量的时间 - LLM 客户端从 SDK 读到该增量的时间。
+同时输出所有流程完成的总耗时（thread 方式等待 LLM 响应时占用线程，并发数超过线程池大小后
+总耗时随并发数增长），并检查两种方式的事件序列和结果一致。
+
+用法：
+    cd apps/api
+    python scripts/benchmark_async_stream.py [--concurrency 1,10,50] [--tokens N] [--interval-ms X]
+        [--first-token-ms X] [--min-speedup X]
+
+存在不一致、async 的 token 延迟中位数高于 thread，或最大并发下总耗时加速比低于 --min-speedup（默认 2.0）
+时以非零状态码退出。
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from stub_llm_server import StubLLMServer  # noqa: E402
+from app.core.sse import sse_step_streaming  # noqa: E402
+from app.engine.llm_client import LLMClient  # noqa: E402
+from app.engine.llm_pool import get_llm_pool  # noqa: E402
+from app.engine.models import ExcelFile, FileCollection, Table, enable_copy_on_write  # noqa: E402
+from app.processor import EventType, ExcelProcessor, ProcessConfig, ProcessResult  # noqa: E402
+
+OPERATIONS = {
+    "operations": [
+        {"type": "aggregate", "function": "SUM", "file_id": "orders", "table": "Sheet1", "column": "金额", "as": "total"}
+    ]
+}
+
+
+# ==================== 处理流程 ====================
+
+
+class TimedLLMClient(LLMClient):
+    """记录每个流式增量从 SDK 读出的时间"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.produced = []
+
+    def _call_llm_stream(self, *args, **kwargs):
+        for item in super()._call_llm_stream(*args, **kwargs):
+            self.produced.append(time.perf_counter())
+            yield item
+
+    async def _call_llm_stream_async(self, *args, **kwargs):
+        async for item in super()._call_llm_stream_async(*args, **kwargs):
+            self.produced.append(time.perf_counter())
+            yield item
+
+
+def build_tables() -> FileCollection:
+    tables = FileCollection()
+    excel_file = ExcelFile(file_id="orders", filename="orders.xlsx")
+    excel_file.add_sheet(Table(name="Sheet1", data=pd.DataFrame({"金额": range(100)})))
+    tables.add_file(excel_file)
+    return tables
+
+
+async def run_thread(processor: ExcelProcessor, tables, config, result: ProcessResult):
+    """原来的方式：每个事件一次 to_thread"""
+    gen = processor.process(tables, "求金额总和", config)
+    done = object()
+
+    def get_next_event():
+        try:
+            return next(gen)
+        except StopIteration as e:
+            return done, e.value
+
+    while True:
+        event = await asyncio.to_thread(get_next_event)
+        if isinstance(event, tuple) and event[0] is done:
+            vars(result).update(vars(event[1]))
+            return
+        yield event
+
+
+async def run_async(processor: ExcelProcessor, tables, config, result: ProcessResult):
+    async for event in processor.process_async(tables, "求金额总和", config, result):
+        yield event
+
+
+async def run_one(mode: str, client: TimedLLMClient):
+    """运行一个处理流程，返回 (事件序列, 结果变量, 每个 token 的延迟)"""
+    processor = ExcelProcessor(client)
+    config = ProcessConfig(stream_llm=True)
+    tables = build_tables()
+    result = ProcessResult()
+
+    received = []
+    sequence = []
+    runner = run_thread if mode == "thread" else run_async
+    events = runner(processor, tables, config, result)
+    async for event in events:
+        if event.event_type == EventType.STAGE_STREAM:
+            received.append(time.perf_counter())
+            sse_step_streaming(event.stage.value, event.delta, event.stage_id)
+        sequence.append((event.stage.value, event.event_type.value))
+
+    latencies = [r - p for p, r in zip(client.produced, received)]
+    return sequence, result.variables, latencies
+
+
+async def run_level(mode: str, base_url: str, concurrency: int):
+    """同时运行 concurrency 个处理流程"""
+    clients = [TimedLLMClient(api_key="stub", base_url=base_url, model="stub") for _ in range(concurrency)]
+
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(*(run_one(mode, client) for client in clients))
+    elapsed = time.perf_counter() - start
+
+    await get_llm_pool().aclose()
+    latencies = [latency for _, _, values in outcomes for latency in values]
+    return outcomes, elapsed, latencies
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+def main():
+    enable_copy_on_write()
+    arg_parser = argparse.ArgumentParser(description="处理流程流式输出基准")
+    arg_parser.add_argument("--concurrency", default="1,10,50", help="并发数列表（逗号分隔）")
+    arg_parser.add_argument("--tokens", type=int, default=100, help="每次 LLM 响应的 token 数")
+    arg_parser.add_argument("--interval-ms", type=float, default=10.0, help="模拟服务输出 token 的间隔（毫秒）")
+    arg_parser.add_argument("--first-token-ms", type=float, default=500.0, help="模拟服务输出首 token 前的等待（毫秒）")
+    arg_parser.add_argument("--min-speedup", type=float, default=2.0, help="最大并发下要求的最低总耗时加速比")
+    args = arg_parser.parse_args()
+    logging.disable(logging.INFO)
+    levels = [int(n) for n in args.concurrency.split(",")]
+
+    server = StubLLMServer(
+        json.dumps(OPERATIONS, ensure_ascii=False),
+        tokens=args.tokens,
+        interval=args.interval_ms / 1000,
+        first_token=args.first_token_ms / 1000,
+    )
+    base_url = server.start()
+    ideal = (args.first_token_ms + args.tokens * args.interval_ms) / 1000
+    failed = 0
+
+    print(
+        f"每次响应首 token 等待 {args.first_token_ms}ms，{args.tokens} 个 token，间隔 {args.interval_ms}ms"
+        f"（单个流程至少 {ideal:.2f}s）"
+    )
+    print(f"{'并发':<6}{'方式':<8}{'总耗时':>10}{'延迟 p50':>12}{'延迟 p95':>12}{'延迟 max':>12}")
+    try:
+        speedup = 0.0
+        for level in levels:
+            measured = {}
+            for mode in ("thread", "async"):
+                outcomes, elapsed, latencies = asyncio.run(run_level(mode, base_url, level))
+                measured[mode] = (outcomes, elapsed, latencies)
+                print(
+                    f"{level:<6}{mode:<8}{elapsed:>9.2f}s{percentile(latencies, 0.5) * 1000:>10.2f}ms"
+                    f"{percentile(latencies, 0.95) * 1000:>10.2f}ms{max(latencies) * 1000:>10.2f}ms"
+                )
+
+            expected = measured["thread"][0][0]
+            for sequence, variables, latencies in measured["thread"][0] + measured["async"][0]:
+                if sequence != expected[0] or variables != expected[1] or len(latencies) != args.tokens:
+                    print(f"  ❌ 事件序列或结果不一致: {variables}")
+                    failed += 1
+                    break
+            if percentile(measured["async"][2], 0.5) > percentile(measured["thread"][2], 0.5):
+                print("  ❌ async 的 token 延迟中位数高于 thread")
+                failed += 1
+            speedup = measured["thread"][1] / measured["async"][1]
+    finally:
+        server.stop()
+
+    print(f"\n最大并发下总耗时加速 {speedup:.1f}x")
+    if speedup < args.min_speedup:
+        print(f"❌ 加速比低于 {args.min_speedup}x")
+        failed += 1
+    if failed:
+        sys.exit(1)
+    print("✅ 通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+列存储类型基准
+
+对比两种加载方式在 fixtures/ 数据集上的内存占用和执行耗时：
+
+- before: 旧的清洗方式 df.where(pd.notna(df), None)（空值写成 None，
+  依赖 pandas 版本，可能把数值 / 日期列提升为 object）
+- after: 当前 ExcelParser._clean_dataframe（原生类型 + 可空 Int64 / boolean）
+
+执行耗时为一组典型操作（筛选、排序、分组聚合、新增列、读取全部列）的总耗时。
+
+并检查可空类型列（Int64）和 object 列中的空值：contains 和字符串比较筛选不匹配空值
+（不按 "<NA>" / "None" 匹配），混合类型列回退到按字符串排序时原值不变、空值排在最后。
+
+用法：
+    cd apps/api
+    python scripts/benchmark_column_storage.py [--repeat N]
+
+空值检查失败时以非零状态码退出。
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.engine.excel_parser import ExcelParser  # noqa: E402
+from app.engine.executor import Executor  # noqa: E402
+from app.engine.models import (  # noqa: E402
+    AddColumnOperation,
+    ExcelFile,
+    FileCollection,
+    FilterOperation,
+    GroupByOperation,
+    Operation,
+    SortOperation,
+    Table,
+    enable_copy_on_write,
+)
+
+FIXTURES_DIR = Path(__file__).resolve().parents[3] / "fixtures"
+
+
+def legacy_clean(df: pd.DataFrame) -> pd.DataFrame:
+    """旧的清洗方式"""
+    df.columns = [str(col).strip() for col in df.columns]
+    df = df.dropna(how="all").reset_index(drop=True)
+    return df.where(pd.notna(df), None)
+
+
+def build_operations(table: Table) -> List[Operation]:
+    """按列类型构建一组典型操作"""
+    numeric, text = [], []
+    for col in table.get_columns():
+        values = [v for v in table.get_column(col)[:200] if v is not None]
+        if values and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+            numeric.append(col)
+        elif values and all(isinstance(v, str) for v in values):
+            text.append(col)
+
+    operations: List[Operation] = []
+    if numeric:
+        num = numeric[0]
+        operations += [
+            FilterOperation(
+                file_id="f", table=table.name,
+                conditions=[{"column": num, "op": ">", "value": 0}],
+                output={"type": "new_sheet", "name": "_filtered"},
+            ),
+            SortOperation(
+                file_id="f", table=table.name,
+                by=[{"column": num, "order": "desc"}],
+                output={"type": "new_sheet", "name": "_sorted"},
+            ),
+            AddColumnOperation(
+                file_id="f", table=table.name, name="_calc",
+                formula={"op": "*", "left": {"col": num}, "right": {"value": 2}},
+            ),
+        ]
+        if text:
+            operations.append(
+                GroupByOperation(
+                    file_id="f", table=table.name,
+                    group_columns=[text[0]],
+                    aggregations=[{"column": num, "function": "sum", "as": "_total"}],
+                    output={"type": "new_sheet", "name": "_grouped"},
+                )
+            )
+    return operations
+
+
+def run(df: pd.DataFrame, sheet_name: str, repeat: int) -> float:
+    """在给定 DataFrame 上执行典型操作，返回平均耗时"""
+    elapsed = 0.0
+    for _ in range(repeat):
+        table = Table(name=sheet_name, data=df.copy())
+        excel_file = ExcelFile(file_id="f", filename="bench.xlsx")
+        excel_file.add_sheet(table)
+        collection = FileCollection()
+        collection.add_file(excel_file)
+        operations = build_operations(table)
+
+        start = time.perf_counter()
+        result = Executor(collection).execute(operations)
+        for col in table.get_columns():
+            table.get_column(col)
+        elapsed += time.perf_counter() - start
+        if result.errors:
+            print(f"  ⚠️ {sheet_name}: {result.errors[:2]}")
+    return elapsed / repeat
+
+
+def check_blanks() -> int:
+    """contains / 字符串比较不匹配空值，回退到字符串排序时原值不变"""
+    df = pd.DataFrame({
+        "数量": pd.array([1, None, 3], dtype="Int64"),
+        "名称": ["甲", None, "None 乙"],
+        "混合": [2, "b", None],
+    })
+
+    def execute(operation: Operation) -> dict:
+        excel_file = ExcelFile(file_id="f", filename="blanks.xlsx")
+        excel_file.add_sheet(Table(name="t", data=df.copy()))
+        collection = FileCollection()
+        collection.add_file(excel_file)
+        result = Executor(collection).execute([operation])
+        if result.errors:
+            raise AssertionError(result.errors)
+        return collection.get_table("f", "t").get_data().to_dict("list")
+
+    def filtered(column: str, op: str, value) -> list:
+        return execute(FilterOperation(
+            file_id="f", table="t", conditions=[{"column": column, "op": op, "value": value}],
+            output={"type": "in_place"},
+        ))[column]
+
+    checks = {
+        "Int64 空值不匹配 contains '<NA>'": filtered("数量", "contains", "NA") == [],
+        "object 空值不匹配 contains 'None'": filtered("名称", "contains", "None") == ["None 乙"],
+        "object 空值不参与字符串比较": filtered("名称", ">", "M") == ["甲", "None 乙"],
+        "Int64 空值不参与字符串比较": filtered("数量", "<", "9") == [1, 3],
+        "回退到字符串排序时原值不变": execute(SortOperation(
+            file_id="f", table="t", by=[{"column": "混合", "order": "asc"}], output={"type": "in_place"},
+        ))["混合"] == [2, "b", None],
+    }
+    failed = [name for name, ok in checks.items() if not ok]
+    if failed:
+        print(f"  ❌ 空值处理不正确: {failed}")
+        return 1
+    print("空值不参与 contains / 字符串比较，字符串排序时原值不变")
+    return 0
+
+
+def main():
+    enable_copy_on_write()
+    arg_parser = argparse.ArgumentParser(description="列存储类型基准")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="每个数据集重复执行次数")
+    args = arg_parser.parse_args()
+
+    totals = {"before_mem": 0, "after_mem": 0, "before_time": 0.0, "after_time": 0.0}
+    print(f"{'数据集':<40}{'内存 before':>14}{'内存 after':>14}{'耗时 before':>14}{'耗时 after':>14}")
+
+    for path in sorted(FIXTURES_DIR.glob("*/datasets/*.xlsx")):
+        for sheet_name, raw in pd.read_excel(path, sheet_name=None, engine="openpyxl").items():
+            before = legacy_clean(raw.copy())
+            after = ExcelParser._clean_dataframe(raw.copy())
+
+            before_mem = int(before.memory_usage(deep=True).sum())
+            after_mem = int(after.memory_usage(deep=True).sum())
+            before_time = run(before, sheet_name, args.repeat)
+            after_time = run(after, sheet_name, args.repeat)
+
+            totals["before_mem"] += before_mem
+            totals["after_mem"] += after_mem
+            totals["before_time"] += before_time
+            totals["after_time"] += after_time
+            print(
+                f"{(path.name + '/' + sheet_name)[:38]:<40}"
+                f"{before_mem / 1024:>12.0f}KB{after_mem / 1024:>12.0f}KB"
+                f"{before_time * 1000:>12.1f}ms{after_time * 1000:>12.1f}ms"
+            )
+
+    print(
+        f"\n合计: 内存 {totals['before_mem'] / 1024 ** 2:.1f}MB -> {totals['after_mem'] / 1024 ** 2:.1f}MB, "
+        f"耗时 {totals['before_time'] * 1000:.0f}ms -> {totals['after_time'] * 1000:.0f}ms "
+        f"(pandas {pd.__version__})"
+    )
+
+    if check_blanks():
+        sys.exit(1)
+    print("✅ 通过")
+
+
+if __name__ == "__main__":
+    main()
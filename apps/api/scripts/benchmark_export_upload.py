@@ -0,0 +1,309 @@
+"""
+导出上传基准（模拟 OSS 服务）
+
+在本地启动一个兼容 S3 的模拟存储服务（按固定延迟和带宽模拟网络，支持分片上传），
+使用真实的 MinIO 客户端上传，比较处理完成后导出被修改文件的两种方式：
+- sequential: 逐个文件在线程中导出，然后在事件循环上同步上传（之前的实现）
+- concurrent: _export_modified_files（导出和上传都不阻塞事件循环，多个文件同时进行）
+
+导出期间运行一个每 10ms 唤醒一次的心跳任务，记录事件循环的最大阻塞时间
+（同一 worker 中其他 SSE 流会被阻塞的时间）。检查：
+- 上传的文件与导出的内容一致，输出中包含各文件的大小和耗时
+- 超过分片大小的内容（bytes、可定位的文件对象、未知大小的流）按分片上传且内容一致
+
+用法：
+    cd apps/api
+    python scripts/benchmark_export_upload.py [--files N] [--rows N] [--latency-ms X] [--bandwidth-mb X]
+
+内容不一致、事件循环最大阻塞时间没有低于之前的一半或总耗时没有缩短时以非零状态码退出。
+"""
+
+import argparse
+import asyncio
+import hashlib
+import io
+import logging
+import sys
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.config import settings  # noqa: E402
+from app.engine.models import ExcelFile, FileCollection, Table, enable_copy_on_write  # noqa: E402
+from app.services import oss  # noqa: E402
+from app.services.processor_stream import XLSX_CONTENT_TYPE, _export_modified_files  # noqa: E402
+
+BUCKET = "bench"
+
+
+class StubOSSServer:
+    """
+    兼容 S3 的模拟存储服务（只实现上传用到的接口，不校验签名）
+
+    每个请求等待 latency 秒，请求体按 bandwidth 字节/秒 的速度读取。
+    objects 记录上传完成的对象 {object_name: bytes}，parts 记录分片上传的分片数。
+    """
+
+    def __init__(self, latency: float, bandwidth: float):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.objects = {}
+        self.parts = {}
+        self._uploads = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def start(self) -> str:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status=200, body=b"", headers=None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _read_body(self) -> bytes:
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length)
+                time.sleep(stub.latency + length / stub.bandwidth)
+                return body
+
+            def _target(self):
+                url = urlparse(self.path)
+                parts = unquote(url.path).lstrip("/").split("/", 1)
+                return parts[1] if len(parts) > 1 else "", parse_qs(url.query, keep_blank_values=True)
+
+            def do_HEAD(self):
+                time.sleep(stub.latency)
+                self._reply()
+
+            def do_GET(self):
+                time.sleep(stub.latency)
+                self._reply(body=(
+                    b'<?xml version="1.0" encoding="UTF-8"?>'
+                    b'<LocationConstraint xmlns="http://s3.amazonaws.com/doc/2006-03-01/">us-east-1</LocationConstraint>'
+                ), headers={"Content-Type": "application/xml"})
+
+            def do_PUT(self):
+                name, query = self._target()
+                body = self._read_body()
+                etag = hashlib.md5(body).hexdigest()
+                with stub._lock:
+                    if "uploadId" in query:
+                        stub._uploads[query["uploadId"][0]][int(query["partNumber"][0])] = body
+                    else:
+                        stub.objects[name] = body
+                        stub.parts[name] = 1
+                self._reply(headers={"ETag": f'"{etag}"'})
+
+            def do_POST(self):
+                name, query = self._target()
+                self._read_body()
+                if "uploads" in query:
+                    upload_id = f"upload-{len(stub._uploads)}"
+                    with stub._lock:
+                        stub._uploads[upload_id] = {}
+                    body = (
+                        '<?xml version="1.0" encoding="UTF-8"?><InitiateMultipartUploadResult>'
+                        f"<Bucket>{BUCKET}</Bucket><Key>{name}</Key><UploadId>{upload_id}</UploadId>"
+                        "</InitiateMultipartUploadResult>"
+                    )
+                else:
+                    with stub._lock:
+                        parts = stub._uploads.pop(query["uploadId"][0])
+                        stub.objects[name] = b"".join(parts[number] for number in sorted(parts))
+                        stub.parts[name] = len(parts)
+                    body = (
+                        '<?xml version="1.0" encoding="UTF-8"?><CompleteMultipartUploadResult>'
+                        f'<Bucket>{BUCKET}</Bucket><Key>{name}</Key><ETag>"stub"</ETag>'
+                        "</CompleteMultipartUploadResult>"
+                    )
+                self._reply(body=body.encode(), headers={"Content-Type": "application/xml"})
+
+            def do_DELETE(self):
+                _, query = self._target()
+                with stub._lock:
+                    stub._uploads.pop(query.get("uploadId", [""])[0], None)
+                self._reply(status=204)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"127.0.0.1:{self._server.server_address[1]}"
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def build_tables(files: int, rows: int) -> FileCollection:
+    rng = np.random.default_rng(0)
+    tables = FileCollection()
+    for i in range(files):
+        excel_file = ExcelFile(file_id=f"file{i}", filename=f"报表{i}.xlsx")
+        excel_file.add_sheet(Table(name="Sheet1", data=pd.DataFrame({
+            "编号": np.arange(rows),
+            "金额": rng.random(rows).round(2),
+            "数量": rng.integers(1, 100, rows),
+            "类别": rng.choice(["甲", "乙", "丙"], rows),
+        })))
+        tables.add_file(excel_file)
+    return tables
+
+
+async def export_sequential(tables: FileCollection, file_ids, path_prefix: str):
+    """之前的实现：逐个文件导出，在事件循环上同步上传"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_files = []
+    for file_id in file_ids:
+        filename = tables.get_file_info(file_id)["filename"]
+        excel_bytes = await asyncio.to_thread(tables.export_file_to_bytes, file_id)
+        url = oss.upload_file(
+            data=excel_bytes, object_name=f"{path_prefix}/{timestamp}/{filename}", content_type=XLSX_CONTENT_TYPE
+        )
+        output_files.append({"file_id": file_id, "filename": filename, "url": url})
+    return output_files
+
+
+async def measure(export_fn, tables: FileCollection, file_ids, path_prefix: str) -> dict:
+    """运行一次导出，同时记录事件循环的最大阻塞时间"""
+    stalls = []
+    done = asyncio.Event()
+
+    async def heartbeat():
+        last = time.perf_counter()
+        while not done.is_set():
+            await asyncio.sleep(0.01)
+            now = time.perf_counter()
+            stalls.append(now - last - 0.01)
+            last = now
+
+    task = asyncio.create_task(heartbeat())
+    start = time.perf_counter()
+    output_files = await export_fn(tables, file_ids, path_prefix)
+    total = time.perf_counter() - start
+    done.set()
+    await task
+    return {"total": total, "max_stall": max(stalls, default=0.0), "output_files": output_files}
+
+
+def check_multipart(server: StubOSSServer) -> int:
+    """超过分片大小的 bytes、可定位的文件对象和未知大小的流按分片上传，内容一致"""
+    failed = 0
+    data = np.random.default_rng(1).bytes(12 * 1024 * 1024)
+
+    class Unsized(io.RawIOBase):
+        """不可定位的流（大小未知）"""
+
+        def __init__(self, content: bytes):
+            self._inner = io.BytesIO(content)
+
+        def readable(self):
+            return True
+
+        def readinto(self, buffer):
+            chunk = self._inner.read(len(buffer))
+            buffer[:len(chunk)] = chunk
+            return len(chunk)
+
+    for label, payload in (("bytes", data), ("file", io.BytesIO(data)), ("stream", Unsized(data))):
+        name = f"multipart/{label}.bin"
+        asyncio.run(oss.upload_file_async(payload, name))
+        if server.objects.get(name) != data or server.parts.get(name, 0) < 2:
+            print(f"  ❌ 分片上传 ({label}) 内容不一致或没有分片: {server.parts.get(name)} 个分片")
+            failed += 1
+        else:
+            print(f"分片上传 ({label}): {server.parts[name]} 个分片，内容一致")
+    return failed
+
+
+def main():
+    enable_copy_on_write()
+    arg_parser = argparse.ArgumentParser(description="导出上传基准")
+    arg_parser.add_argument("--files", type=int, default=4, help="被修改的文件数")
+    arg_parser.add_argument("--rows", type=int, default=5_000, help="每个文件的行数")
+    arg_parser.add_argument("--latency-ms", type=float, default=50.0, help="模拟存储服务每个请求的延迟（毫秒）")
+    arg_parser.add_argument("--bandwidth-mb", type=float, default=0.25, help="模拟存储服务的上传带宽（MB/s）")
+    args = arg_parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    server = StubOSSServer(args.latency_ms / 1000, args.bandwidth_mb * 1024 * 1024)
+    settings.MINIO_ENDPOINT = server.start()
+    settings.MINIO_ACCESS_KEY = settings.MINIO_SECRET_KEY = "stub"
+    settings.MINIO_BUCKET = BUCKET
+    settings.MINIO_PUBLIC_BASE = "storage"
+    settings.OSS_UPLOAD_PART_SIZE_MB = 5
+
+    tables = build_tables(args.files, args.rows)
+    file_ids = [f"file{i}" for i in range(args.files)]
+    expected = {file_id: tables.export_file_to_bytes(file_id) for file_id in file_ids}
+    failed = 0
+
+    print(f"{args.files} 个文件，每个 {args.rows} 行（{len(expected['file0']) / 1024:.0f} KB），"
+          f"延迟 {args.latency_ms:.0f}ms，带宽 {args.bandwidth_mb} MB/s")
+    print(f"{'方式':<14}{'总耗时':>10}{'事件循环最大阻塞':>18}")
+    try:
+        measured = {}
+        for mode, export_fn in (("sequential", export_sequential), ("concurrent", _export_modified_files)):
+            outcome = asyncio.run(measure(export_fn, tables, file_ids, f"outputs/{mode}"))
+            measured[mode] = outcome
+            print(f"{mode:<14}{outcome['total']:>9.2f}s{outcome['max_stall'] * 1000:>16.0f}ms")
+
+            for item in outcome["output_files"]:
+                name = item["url"].removeprefix(f"/storage/{BUCKET}/")
+                # xlsx 中包含写入时间，比较读取出的内容
+                uploaded = server.objects.get(name)
+                if uploaded is None or not pd.read_excel(
+                    io.BytesIO(uploaded)
+                ).equals(pd.read_excel(io.BytesIO(expected[item["file_id"]]))):
+                    print(f"  ❌ {mode} 上传的 {item['filename']} 与导出的文件不一致")
+                    failed += 1
+            if len(outcome["output_files"]) != args.files:
+                print(f"  ❌ {mode} 只导出了 {len(outcome['output_files'])} / {args.files} 个文件")
+                failed += 1
+
+        for item in measured["concurrent"]["output_files"]:
+            name = item["url"].removeprefix(f"/storage/{BUCKET}/")
+            if item.get("size") != len(server.objects[name]) or "export_ms" not in item or "upload_ms" not in item:
+                print(f"  ❌ 输出中缺少 {item['filename']} 的大小或耗时: {item}")
+                failed += 1
+            else:
+                print(f"  {item['filename']}: {item['size'] / 1024:.0f} KB，"
+                      f"导出 {item['export_ms']:.0f}ms，上传 {item['upload_ms']:.0f}ms")
+
+        failed += check_multipart(server)
+    finally:
+        server.stop()
+
+    sequential, concurrent = measured["sequential"], measured["concurrent"]
+    print(f"\n总耗时加速 {sequential['total'] / concurrent['total']:.1f}x，"
+          f"事件循环最大阻塞 {sequential['max_stall'] * 1000:.0f}ms -> {concurrent['max_stall'] * 1000:.0f}ms")
+    if concurrent["max_stall"] > sequential["max_stall"] / 2:
+        print("❌ 事件循环最大阻塞时间没有低于之前的一半")
+        failed += 1
+    if concurrent["total"] >= sequential["total"]:
+        print("❌ 总耗时没有缩短")
+        failed += 1
+    if failed:
+        sys.exit(1)
+    print("✅ 通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+延迟加载基准
+
+1. 列投影一致性：对 fixtures 中的每个 sheet（以及一个包含空表头、空行、缺失值文本的生成工作簿），
+   只解析部分列的结果必须与完整解析后再取这些列完全一致
+2. 延迟加载 vs 完整加载：生成一个多 sheet 的宽表工作簿，执行只用到其中一个 sheet 几列的操作，比较
+   - eager: 加载时完整解析所有 sheet（原来的加载路径）
+   - lazy: 加载时只使用画像，执行时只解析用到的 sheet 和列
+   的加载 + 执行耗时和内存峰值（tracemalloc），并检查执行结果、修改后所有 sheet 的数据完全一致
+
+用法：
+    cd apps/api
+    python scripts/benchmark_lazy_load.py [--sheets N] [--columns N] [--rows N] [--min-speedup X]
+
+存在不一致、延迟加载的内存峰值不低于完整加载或加速比低于 --min-speedup（默认 1.5）时以非零状态码退出。
+"""
+
+import argparse
+import io
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import pandas as pd
+from openpyxl import Workbook
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.config import settings  # noqa: E402
+from app.engine.excel_parser import ExcelParser, WorkbookSource, _parse_sheet  # noqa: E402
+from app.engine.executor import execute_operations  # noqa: E402
+from app.engine.models import (  # noqa: E402
+    AddColumnOperation,
+    AggregateOperation,
+    ExcelFile,
+    FileCollection,
+    Table,
+    enable_copy_on_write,
+)
+from app.engine.workbook_cache import hash_content  # noqa: E402
+from app.services.file_profile import build_sheet_profiles  # noqa: E402
+
+FIXTURES_DIR = Path(__file__).resolve().parents[3] / "fixtures"
+
+
+def irregular_workbook() -> bytes:
+    """生成一个表头和数据不规则的工作簿（空表头、重复表头、空行、只有缺失值文本的行）"""
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = "不规则"
+    sheet.append(["名称", None, "名称", " 金额 ", "备注"])
+    for i in range(30):
+        if i % 7 == 3:
+            sheet.append([None, None, None, None, "NA"])
+        elif i % 7 == 5:
+            sheet.append([None, None, None, None, "只有备注"])
+        elif i % 11 == 4:
+            sheet.append([])
+        else:
+            sheet.append([f"a{i}", i, None if i % 3 else "x", i * 1.5, None])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def wide_workbook(sheet_count: int, column_count: int, row_count: int) -> bytes:
+    """生成多 sheet 宽表工作簿（整数、小数、文本混合）"""
+    rng = random.Random(0)
+    workbook = Workbook(write_only=True)
+    for s in range(sheet_count):
+        sheet = workbook.create_sheet(f"表{s + 1}")
+        sheet.append(["编号", "类别", *(f"指标{c}" for c in range(column_count - 2))])
+        for r in range(row_count):
+            row = [r + 1, rng.choice(["甲", "乙", "丙", "丁"])]
+            for c in range(column_count - 2):
+                kind = c % 3
+                if kind == 0:
+                    row.append(rng.randint(0, 1000))
+                elif kind == 1:
+                    row.append(round(rng.random() * 100, 2))
+                else:
+                    row.append(f"文本{rng.randint(0, 50)}")
+            sheet.append(row)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def check_projection(name: str, data: bytes) -> bool:
+    """比较只解析部分列与完整解析后再取这些列的结果"""
+    rng = random.Random(name)
+    ok = True
+    for sheet_name, full in ExcelParser.parse_workbook_bytes(data, parallel=False):
+        columns = list(full.columns)
+        subsets = [columns[:1], columns[-1:], rng.sample(columns, max(1, len(columns) // 2)), ["不存在的列"]]
+        for subset in subsets:
+            expected = full.loc[:, full.columns.isin(subset)]
+            actual = _parse_sheet(data, sheet_name, "stream", subset)
+            try:
+                pd.testing.assert_frame_equal(actual, expected, check_exact=True)
+            except AssertionError as e:
+                print(f"  ❌ {name} · {sheet_name} 列 {subset[:3]}...: {e}")
+                ok = False
+    return ok
+
+
+def build_collection(data: bytes, lazy: bool, profiles) -> FileCollection:
+    """加载工作簿（lazy 时只使用画像，不解析）"""
+    collection = FileCollection()
+    if lazy:
+        source = WorkbookSource("wide.xlsx", hash_content(data), fetch=lambda: data)
+        collection.add_file(ExcelParser.build_lazy_file("wide", "wide.xlsx", profiles, source))
+    else:
+        excel_file = ExcelFile(file_id="wide", filename="wide.xlsx")
+        for sheet_name, df in ExcelParser.parse_workbook_bytes(data, parallel=False):
+            excel_file.add_sheet(Table(name=sheet_name, data=df))
+        collection.add_file(excel_file)
+    return collection
+
+
+def plan():
+    """只用到 表2 的三列"""
+    return [
+        AggregateOperation(function="SUM", file_id="wide", table="表2", column="指标0", as_var="total"),
+        AggregateOperation(
+            function="COUNTIF", file_id="wide", table="表2", condition_column="类别", condition="甲", as_var="count"
+        ),
+        AddColumnOperation(
+            file_id="wide",
+            table="表2",
+            name="占比",
+            formula={"op": "/", "left": {"col": "指标0"}, "right": {"var": "total"}},
+        ),
+        AddColumnOperation(
+            file_id="wide",
+            table="表2",
+            name="加权",
+            formula={"op": "*", "left": {"col": "指标1"}, "right": {"col": "占比"}},
+        ),
+    ]
+
+
+def run(data: bytes, lazy: bool, profiles):
+    """加载并执行，返回 (表集合, 执行结果, 耗时, 内存峰值, 执行后已加载的原有列数)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    tables = build_collection(data, lazy, profiles)
+    result = execute_operations(plan(), tables, cache=None)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    excel_file = tables.get_file("wide")
+    loaded = sum(
+        len(sheet["columns"]) - len(excel_file.get_sheet(sheet["name"])._pending)
+        for sheet in profiles
+    )
+    return tables, result, elapsed, peak, loaded
+
+
+def main():
+    enable_copy_on_write()
+    arg_parser = argparse.ArgumentParser(description="延迟加载基准")
+    arg_parser.add_argument("--sheets", type=int, default=4, help="生成工作簿的 sheet 数")
+    arg_parser.add_argument("--columns", type=int, default=30, help="每个 sheet 的列数")
+    arg_parser.add_argument("--rows", type=int, default=3000, help="每个 sheet 的行数")
+    arg_parser.add_argument("--min-speedup", type=float, default=1.5, help="要求的最低加速比")
+    args = arg_parser.parse_args()
+
+    # 测量当前进程内的解析（内存峰值只统计当前进程），不使用解析缓存
+    settings.EXCEL_PARSE_PROCESSES = 0
+    settings.WORKBOOK_CACHE_MAX_MB = 0
+    failed = 0
+
+    print("列投影一致性")
+    cases = [("(生成) 不规则.xlsx", irregular_workbook())]
+    cases += [(path.name, path.read_bytes()) for path in sorted(FIXTURES_DIR.glob("*/datasets/*.xlsx"))]
+    for name, data in cases:
+        if not check_projection(name, data):
+            failed += 1
+    print(f"  {len(cases)} 个文件, {failed} 个不一致")
+
+    data = wide_workbook(args.sheets, args.columns, args.rows)
+    profiles = build_sheet_profiles(ExcelParser.parse_workbook_bytes(data, parallel=False))
+    total_columns = args.sheets * args.columns
+
+    eager_tables, eager_result, eager_time, eager_peak, eager_loaded = run(data, False, profiles)
+    lazy_tables, lazy_result, lazy_time, lazy_peak, lazy_loaded = run(data, True, profiles)
+
+    print(f"\n{args.sheets} 个 sheet × {args.columns} 列 × {args.rows} 行，操作只用到 表2 的 3 列")
+    print(f"{'':<8}{'耗时':>10}{'内存峰值':>12}{'已加载列':>10}")
+    print(f"{'eager':<8}{eager_time:>9.2f}s{eager_peak / 1e6:>10.1f}MB{eager_loaded:>7}/{total_columns}")
+    print(f"{'lazy':<8}{lazy_time:>9.2f}s{lazy_peak / 1e6:>10.1f}MB{lazy_loaded:>7}/{total_columns}")
+
+    if eager_result.errors or lazy_result.errors:
+        print(f"  ❌ 执行错误: {eager_result.errors or lazy_result.errors}")
+        failed += 1
+    if (eager_result.variables, eager_result.new_columns) != (lazy_result.variables, lazy_result.new_columns):
+        print("  ❌ 执行结果不一致")
+        failed += 1
+
+    # 修改后导出的数据（包括未用到的 sheet）必须一致
+    for sheet_name in eager_tables.get_file("wide").get_sheet_names():
+        try:
+            pd.testing.assert_frame_equal(
+                lazy_tables.get_table("wide", sheet_name).get_data(),
+                eager_tables.get_table("wide", sheet_name).get_data(),
+                check_exact=True,
+            )
+        except AssertionError as e:
+            print(f"  ❌ {sheet_name} 数据不一致: {e}")
+            failed += 1
+
+    speedup = eager_time / lazy_time if lazy_time else 0.0
+    print(f"\n加速 {speedup:.1f}x, 内存峰值 {lazy_peak / eager_peak:.0%}")
+    if lazy_peak >= eager_peak:
+        print("❌ 延迟加载的内存峰值没有降低")
+        failed += 1
+    if speedup < args.min_speedup:
+        print(f"❌ 加速比低于 {args.min_speedup}x")
+        failed += 1
+    if failed:
+        sys.exit(1)
+    print("✅ 通过")
+
+
+if __name__ == "__main__":
+    main()
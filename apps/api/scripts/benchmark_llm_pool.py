@@ -0,0 +1,156 @@
+"""
+LLM 连接池基准（模拟 LLM 服务）
+
+对模拟 LLM 服务（见 stub_llm_server.py）发起请求，比较：
+- per-request: 每个请求新建 OpenAI 客户端（原来的方式，每次都创建 SSL 上下文并重新建立连接）
+- pooled: 使用进程内共享的连接池（get_llm_pool）
+
+两种场景：
+- sync: 逐个发起非流式请求（标题生成等同步调用）
+- async: 同时发起多个流式请求（对话处理流程）
+
+输出每种方式的总耗时、平均每个请求的耗时和模拟服务接受的连接数，
+并检查连接池的统计（请求数一致、结束后没有进行中的请求）。
+
+用法：
+    cd apps/api
+    python scripts/benchmark_llm_pool.py [--requests N] [--concurrency N] [--min-speedup X]
+
+存在不一致、连接池没有复用连接，或 sync 场景加速比低于 --min-speedup（默认 1.5）时以非零状态码退出。
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+import time
+from pathlib import Path
+
+from openai import AsyncOpenAI, OpenAI
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from stub_llm_server import StubLLMServer  # noqa: E402
+from app.engine.llm_client import LLMClient  # noqa: E402
+from app.engine.llm_pool import get_llm_pool  # noqa: E402
+
+CONTENT = "订单金额汇总"
+
+
+class PerRequestLLMClient(LLMClient):
+    """原来的方式：每个 LLMClient 新建自己的 OpenAI 客户端"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._sync = None
+        self._async = None
+
+    @property
+    def client(self) -> OpenAI:
+        if self._sync is None:
+            self._sync = OpenAI(api_key=self.api_key, base_url=self.base_url)
+        return self._sync
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        if self._async is None:
+            self._async = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url)
+        return self._async
+
+
+def new_client(mode: str, base_url: str) -> LLMClient:
+    """每个请求新建 LLMClient（与 get_llm_client 一致）"""
+    cls = PerRequestLLMClient if mode == "per-request" else LLMClient
+    return cls(api_key="stub", base_url=base_url, model="stub")
+
+
+def run_sync(mode: str, base_url: str, count: int) -> bool:
+    """逐个发起非流式请求"""
+    ok = True
+    for _ in range(count):
+        ok &= new_client(mode, base_url)._call_llm("system", "user") == CONTENT
+    return ok
+
+
+async def run_async(mode: str, base_url: str, count: int) -> bool:
+    """同时发起 count 个流式请求"""
+
+    async def one() -> bool:
+        client = new_client(mode, base_url)
+        content = ""
+        async for _, content in client._call_llm_stream_async("system", "user"):
+            pass
+        return content.strip() == CONTENT
+
+    results = await asyncio.gather(*(one() for _ in range(count)))
+    if mode == "pooled":
+        await get_llm_pool().aclose()
+    return all(results)
+
+
+def measure(server: StubLLMServer, run) -> tuple:
+    """运行一次，返回 (结果是否正确, 耗时, 新建的连接数)"""
+    before = server.stats()
+    start = time.perf_counter()
+    ok = run()
+    elapsed = time.perf_counter() - start
+    after = server.stats()
+    return ok, elapsed, after["connections"] - before["connections"]
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="LLM 连接池基准")
+    arg_parser.add_argument("--requests", type=int, default=30, help="sync 场景的请求数")
+    arg_parser.add_argument("--concurrency", type=int, default=30, help="async 场景同时进行的请求数")
+    arg_parser.add_argument("--min-speedup", type=float, default=1.5, help="sync 场景要求的最低加速比")
+    args = arg_parser.parse_args()
+    logging.disable(logging.INFO)
+
+    server = StubLLMServer(CONTENT, tokens=20, interval=0.001)
+    base_url = server.start()
+    failed = 0
+
+    print(f"{'场景':<8}{'方式':<14}{'总耗时':>10}{'平均每个请求':>14}{'新建连接':>10}")
+    try:
+        results = {}
+        for scenario, count in (("sync", args.requests), ("async", args.concurrency)):
+            for mode in ("per-request", "pooled"):
+                if scenario == "sync":
+                    run = lambda: run_sync(mode, base_url, count)  # noqa: E731
+                else:
+                    run = lambda: asyncio.run(run_async(mode, base_url, count))  # noqa: E731
+                ok, elapsed, connections = measure(server, run)
+                results[(scenario, mode)] = (elapsed, connections)
+                if (scenario, mode) == ("sync", "pooled"):
+                    sync_stats = get_llm_pool().stats()
+                print(f"{scenario:<8}{mode:<14}{elapsed:>9.2f}s{elapsed / count * 1000:>12.1f}ms{connections:>10}")
+                if not ok:
+                    print("  ❌ 响应内容不一致")
+                    failed += 1
+
+        print(f"\nsync 场景连接池统计: {sync_stats}")
+        if [item["requests"] for item in sync_stats] != [args.requests] or any(item["active"] for item in sync_stats):
+            print("  ❌ 连接池统计不正确")
+            failed += 1
+        if results[("sync", "pooled")][1] > 1:
+            print("  ❌ sync 场景没有复用连接")
+            failed += 1
+        if results[("async", "pooled")][1] > args.concurrency:
+            print("  ❌ async 场景新建的连接多于并发数")
+            failed += 1
+    finally:
+        get_llm_pool().close()
+        server.stop()
+
+    speedup = results[("sync", "per-request")][0] / results[("sync", "pooled")][0]
+    print(f"\nsync 场景加速 {speedup:.1f}x")
+    if speedup < args.min_speedup:
+        print(f"❌ 加速比低于 {args.min_speedup}x")
+        failed += 1
+    if failed:
+        sys.exit(1)
+    print("✅ 通过")
+
+
+if __name__ == "__main__":
+    main()
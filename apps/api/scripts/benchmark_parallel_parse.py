@@ -0,0 +1,150 @@
+"""
+多文件并行解析基准
+
+把 fixtures 中的工作簿分成若干组（模拟一次对话加载多个文件），每组比较：
+- sequential: 逐个文件、逐个 sheet 在当前进程内解析（原来的加载路径）
+- parallel: 各文件在加载线程中同时处理，sheet 按大小分批提交到解析进程池（现在的加载路径，
+  文件内容只写入一次临时文件，解析进程按路径读取）
+
+检查两种方式的解析结果完全一致、list_sheet_names 与 pandas 读取的 sheet 名称一致；
+延迟加载（WorkbookSource.load_sheet）在解析进程中逐个解析 sheet 的结果与完整解析一致，
+所有 sheet 共用一个临时文件，来源被回收后临时文件被删除。
+输出每组的耗时、组内最大单文件耗时和加速比。并行解析的耗时应接近最大单文件耗时，
+而不是所有文件耗时之和（需要多个 CPU 核心）。
+
+用法：
+    cd apps/api
+    python scripts/benchmark_parallel_parse.py [--limit-files N] [--group-size N] [--processes N] [--min-speedup X]
+
+存在不一致或总加速比低于 --min-speedup（默认不检查）时以非零状态码退出。
+"""
+
+import argparse
+import gc
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.config import settings  # noqa: E402
+from app.engine import excel_parser  # noqa: E402
+from app.engine.excel_parser import ExcelParser, WorkbookSource  # noqa: E402
+from app.engine.workbook_probe import list_sheet_names  # noqa: E402
+
+FIXTURES_DIR = Path(__file__).resolve().parents[3] / "fixtures"
+
+
+def same_sheets(expected, actual) -> bool:
+    """逐个 sheet 比较名称、列、类型和数据"""
+    if [name for name, _ in expected] != [name for name, _ in actual]:
+        return False
+    for (_, a), (_, b) in zip(expected, actual):
+        try:
+            pd.testing.assert_frame_equal(a, b, check_exact=True)
+        except AssertionError as e:
+            print(f"     {e}")
+            return False
+    return True
+
+
+def check_lazy_sheets(name: str, data: bytes, expected) -> int:
+    """逐个 sheet 延迟加载（全部列和第一列），与完整解析的结果比较"""
+    source = WorkbookSource(name, None, fetch=lambda: data)
+    failed = 0
+    for sheet_name, df in expected:
+        for columns in (None, list(df.columns[:1])):
+            actual = source.load_sheet(sheet_name, columns)
+            try:
+                pd.testing.assert_frame_equal(actual, df if columns is None else df.loc[:, columns], check_exact=True)
+            except AssertionError as e:
+                print(f"  ❌ 延迟加载结果不一致: {name} / {sheet_name}: {e}")
+                failed += 1
+
+    path = source.spill_path()
+    del source
+    gc.collect()
+    if os.path.exists(path):
+        print(f"  ❌ 临时文件没有删除: {path}")
+        failed += 1
+    return failed
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="多文件并行解析基准")
+    arg_parser.add_argument("--limit-files", type=int, default=None, help="最多测试的文件数")
+    arg_parser.add_argument("--group-size", type=int, default=3, help="每次加载的文件数")
+    arg_parser.add_argument("--processes", type=int, default=None, help="解析进程数（默认使用配置）")
+    arg_parser.add_argument("--min-speedup", type=float, default=0.0, help="要求的最低总加速比")
+    args = arg_parser.parse_args()
+
+    if args.processes is not None:
+        settings.EXCEL_PARSE_PROCESSES = args.processes
+    files = sorted(FIXTURES_DIR.glob("*/datasets/*.xlsx"))[: args.limit_files]
+    contents = {path.name: path.read_bytes() for path in files}
+    groups = [files[i:i + args.group_size] for i in range(0, len(files), args.group_size)]
+    failed = 0
+
+    for path in files:
+        expected = pd.ExcelFile(io.BytesIO(contents[path.name]), engine="openpyxl").sheet_names
+        if list_sheet_names(contents[path.name]) != expected:
+            failed += 1
+            print(f"  ❌ sheet 名称不一致: {path.name}")
+
+    # 预先启动解析进程，不把进程启动时间算进第一组
+    pool = excel_parser.get_parse_pool()
+    if pool is not None:
+        list(pool.map(abs, range(settings.EXCEL_PARSE_PROCESSES)))
+
+    print(f"CPU 核心: {os.cpu_count()}, 解析进程: {settings.EXCEL_PARSE_PROCESSES}")
+    print(f"{'组':<6}{'文件数':>6}{'逐个':>10}{'最大单文件':>12}{'并行':>10}{'加速':>8}")
+    total_sequential = total_parallel = 0.0
+    try:
+        for index, group in enumerate(groups):
+            expected = {}
+            file_times = []
+            start = time.perf_counter()
+            for path in group:
+                file_start = time.perf_counter()
+                expected[path.name] = ExcelParser.parse_workbook_bytes(contents[path.name], parallel=False)
+                file_times.append(time.perf_counter() - file_start)
+            sequential_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=len(group)) as executor:
+                actual = dict(zip(
+                    [path.name for path in group],
+                    executor.map(ExcelParser.parse_workbook_bytes, [contents[path.name] for path in group]),
+                ))
+            parallel_time = time.perf_counter() - start
+
+            total_sequential += sequential_time
+            total_parallel += parallel_time
+            print(
+                f"{index:<6}{len(group):>6}{sequential_time:>9.2f}s{max(file_times):>11.2f}s"
+                f"{parallel_time:>9.2f}s{sequential_time / parallel_time:>7.1f}x"
+            )
+            for path in group:
+                if not same_sheets(expected[path.name], actual[path.name]):
+                    failed += 1
+                    print(f"  ❌ 并行解析结果不一致: {path.name}")
+                failed += check_lazy_sheets(path.name, contents[path.name], expected[path.name])
+    finally:
+        excel_parser.shutdown_parse_pool()
+
+    speedup = total_sequential / total_parallel if total_parallel else 0.0
+    print(f"\n{len(files)} 个文件: 逐个 {total_sequential:.2f}s, 并行 {total_parallel:.2f}s ({speedup:.1f}x)")
+    if failed or speedup < args.min_speedup:
+        if speedup < args.min_speedup:
+            print(f"❌ 加速比低于 {args.min_speedup}x")
+        sys.exit(1)
+    print("✅ 通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+处理结果下载基准
+
+比较处理完成后拿到文件的两种方式：
+- export: 先完整导出文件（之前上传 OSS 前的步骤），导出完成后才能开始发送
+- stream: 从暂存结果边生成边发送（stream_workbook），首个数据块的等待时间与文件大小基本无关
+
+检查：
+- /results/{result_id}/files/{file_id} 返回的文件可以读取且与暂存的表一致，响应带 ETag
+- 带 If-None-Match 再次请求返回 304（不生成文件），内容变化后 ETag 不同
+- 其他用户的结果和不存在的结果返回 404
+- 下载中途断开时生成线程及时停止
+- 暂存按内存上限淘汰最早的结果
+
+用法：
+    cd apps/api
+    python scripts/benchmark_result_download.py [--rows N] [--max-first-chunk-ratio X]
+
+检查失败或首个数据块的等待时间超过完整导出耗时的 --max-first-chunk-ratio（默认 0.2）时以非零状态码退出。
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from uuid import uuid4
+
+import numpy as np
+import pandas as pd
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.api.deps import get_current_user  # noqa: E402
+from app.api.routes import result  # noqa: E402
+from app.core.database import get_db  # noqa: E402
+from app.engine.models import ExcelFile, FileCollection, Table, enable_copy_on_write  # noqa: E402
+from app.engine.xlsx_reader import read_workbook  # noqa: E402
+from app.services.result_store import ResultStore, get_result_store, stream_workbook  # noqa: E402
+
+
+def build_tables(rows: int, seed: int = 0) -> FileCollection:
+    rng = np.random.default_rng(seed)
+    excel_file = ExcelFile("file-1", "销售数据.xlsx")
+    excel_file.add_sheet(Table("明细", pd.DataFrame({
+        "编号": np.arange(rows),
+        "金额": rng.random(rows) * 1000,
+        "类别": rng.choice(["甲", "乙", "丙"], rows).astype(object),
+        "日期": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 10 ** 8, rows), unit="s"),
+    })))
+    tables = FileCollection()
+    tables.add_file(excel_file)
+    return tables
+
+
+async def measure_stream(tables: FileCollection):
+    """stream_workbook 首个数据块的等待时间、总耗时和内容"""
+    start = time.perf_counter()
+    first_chunk = None
+    chunks = []
+    async for chunk in stream_workbook(tables, "file-1"):
+        if first_chunk is None:
+            first_chunk = time.perf_counter() - start
+        chunks.append(chunk)
+    return first_chunk, time.perf_counter() - start, b"".join(chunks)
+
+
+async def check_disconnect(tables: FileCollection) -> int:
+    """读取一个数据块后关闭生成器（客户端断开），生成线程应及时停止"""
+    stream = stream_workbook(tables, "file-1")
+    await stream.__anext__()
+    start = time.perf_counter()
+    await stream.aclose()
+    elapsed = time.perf_counter() - start
+    print(f"中途断开后 {elapsed * 1000:.0f}ms 停止生成")
+    if elapsed > 1.0:
+        print("  ❌ 断开后生成线程没有及时停止")
+        return 1
+    return 0
+
+
+def check_endpoint(tables: FileCollection) -> int:
+    """下载接口：内容、ETag、304、权限"""
+    owner = SimpleNamespace(id=uuid4())
+    current = {"user": owner}
+    app = FastAPI()
+    app.include_router(result.router)
+    app.dependency_overrides[get_current_user] = lambda: current["user"]
+    app.dependency_overrides[get_db] = lambda: None
+
+    store = get_result_store()
+    result_id = store.put(tables, ["file-1"], owner_id=str(owner.id), result_id="result-1")
+    client = TestClient(app)
+    failed = 0
+
+    response = client.get(f"/results/{result_id}/files/file-1")
+    etag = response.headers.get("etag")
+    (_, df), = read_workbook(response.content)
+    expected = tables.get_file("file-1").get_sheet("明细").get_data()
+    if response.status_code != 200 or not etag or not df.equals(expected):
+        print(f"  ❌ 下载结果不正确: {response.status_code} {etag}")
+        failed += 1
+    if "filename*=UTF-8''" not in response.headers.get("content-disposition", ""):
+        print("  ❌ 缺少文件名")
+        failed += 1
+
+    start = time.perf_counter()
+    response = client.get(f"/results/{result_id}/files/file-1", headers={"If-None-Match": etag})
+    not_modified = time.perf_counter() - start
+    if response.status_code != 304 or response.content:
+        print(f"  ❌ If-None-Match 匹配时应返回 304: {response.status_code}")
+        failed += 1
+    print(f"ETag {etag}，重复下载返回 304（{not_modified * 1000:.0f}ms）")
+
+    changed = build_tables(expected.shape[0], seed=1)
+    store.put(changed, ["file-1"], owner_id=str(owner.id), result_id="result-2")
+    response = client.get("/results/result-2/files/file-1", headers={"If-None-Match": etag})
+    if response.status_code != 200 or response.headers.get("etag") == etag:
+        print("  ❌ 内容变化后 ETag 应不同")
+        failed += 1
+
+    current["user"] = SimpleNamespace(id=uuid4())
+    for path in (f"/results/{result_id}/files/file-1", "/results/missing/files/file-1"):
+        if client.get(path).status_code != 404:
+            print(f"  ❌ {path} 应返回 404")
+            failed += 1
+    return failed
+
+
+def check_eviction(tables: FileCollection) -> int:
+    """超过内存上限时淘汰最早的结果"""
+    store = ResultStore(max_bytes=1, ttl=60)
+    if store.put(tables, ["file-1"]) is not None:
+        print("  ❌ 超过上限的结果不应暂存")
+        return 1
+    size = int(tables.get_file("file-1").get_sheet("明细").get_data().memory_usage(index=True, deep=True).sum())
+    store = ResultStore(max_bytes=size * 2, ttl=60)
+    ids = [store.put(tables, ["file-1"]) for _ in range(3)]
+    if store.get(ids[0]) is not None or store.get(ids[1]) is None or store.get(ids[2]) is None:
+        print(f"  ❌ 淘汰结果不正确: {store.stats()}")
+        return 1
+    return 0
+
+
+def main():
+    enable_copy_on_write()
+    arg_parser = argparse.ArgumentParser(description="处理结果下载基准")
+    arg_parser.add_argument("--rows", type=int, default=200_000, help="表的行数")
+    arg_parser.add_argument("--max-first-chunk-ratio", type=float, default=0.2, help="首个数据块等待时间与完整导出耗时之比的上限")
+    args = arg_parser.parse_args()
+    failed = 0
+
+    tables = build_tables(args.rows)
+
+    start = time.perf_counter()
+    exported = tables.export_file_to_bytes("file-1")
+    export_time = time.perf_counter() - start
+
+    first_chunk, stream_time, streamed = asyncio.run(measure_stream(tables))
+    print(
+        f"{args.rows} 行（{len(exported) / 1024 ** 2:.1f}MB）: export 完成后才能发送 {export_time:.2f}s；"
+        f"stream 首个数据块 {first_chunk * 1000:.0f}ms，全部发送 {stream_time:.2f}s"
+    )
+    (_, df), = read_workbook(streamed)
+    if not df.equals(tables.get_file("file-1").get_sheet("明细").get_data()):
+        print("  ❌ 流式生成的文件内容不一致")
+        failed += 1
+    if first_chunk > export_time * args.max_first_chunk_ratio:
+        print(f"  ❌ 首个数据块等待时间超过完整导出耗时的 {args.max_first_chunk_ratio}")
+        failed += 1
+
+    failed += asyncio.run(check_disconnect(tables))
+    failed += check_endpoint(build_tables(2000))
+    failed += check_eviction(build_tables(2000))
+
+    if failed:
+        sys.exit(1)
+    print("✅ 通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+行级公式编译器基准
+
+构造一张宽表，对一组典型的行级公式（算术、比较、IF 嵌套、文本拼接、
+函数调用、VLOOKUP、COUNTIFS）分别用两种方式逐行求值：
+
+- interpret: FormulaEvaluator.evaluate 递归解释（每行构建包含所有列的行上下文，见 formula_reference）
+- compiled: 公式编译为闭包树后逐行调用（Executor._evaluate_formula_rows）
+
+逐行比较两种方式的结果（含类型）和行级错误信息，并输出耗时和加速比。
+
+用法：
+    cd apps/api
+    python scripts/benchmark_row_compiler.py [--rows N] [--columns N] [--min-speedup X]
+
+存在不一致或总加速比低于 --min-speedup 时以非零状态码退出。
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from formula_reference import interpret_rows, same_value  # noqa: E402
+from app.engine.executor import Executor, FormulaEvaluator  # noqa: E402
+from app.engine.functions import ROW_FUNC_MAP  # noqa: E402
+from app.engine.models import ExcelFile, FileCollection, Table, enable_copy_on_write  # noqa: E402
+
+VARIABLES = {"threshold": 50, "rate": 0.1}
+
+
+def build_collection(rows: int, columns: int) -> Tuple[FileCollection, Table]:
+    """构造测试数据：数值列 + 文本列 + 含空值的列，外加一张查找表"""
+    rng = np.random.default_rng(0)
+    data: Dict[str, Any] = {f"n{i}": rng.random(rows) * 100 for i in range(columns)}
+    data["qty"] = rng.integers(0, 20, rows)
+    data["name"] = rng.choice(["alpha", "beta", "gamma", "delta"], rows)
+    data["city"] = rng.choice(["北京", "上海", "广州"], rows)
+    data["maybe"] = [None if i % 7 == 0 else float(i % 13) for i in range(rows)]
+
+    table = Table(name="data", data=pd.DataFrame(data))
+    lookup = Table(name="lookup", data=pd.DataFrame({
+        "name": ["alpha", "beta", "gamma", "delta"],
+        "discount": [0.1, 0.2, 0.3, 0.4],
+    }))
+    excel_file = ExcelFile(file_id="f", filename="bench.xlsx")
+    excel_file.add_sheet(table)
+    excel_file.add_sheet(lookup)
+    collection = FileCollection()
+    collection.add_file(excel_file)
+    return collection, table
+
+
+def build_formulas() -> Dict[str, Dict]:
+    """典型的行级公式"""
+    col = lambda name: {"col": name}  # noqa: E731
+    val = lambda value: {"value": value}  # noqa: E731
+    return {
+        "算术": {"op": "*", "left": {"op": "+", "left": col("n0"), "right": col("n1")}, "right": {"var": "rate"}},
+        "比较": {"op": ">=", "left": col("n2"), "right": {"var": "threshold"}},
+        "IF 嵌套": {
+            "func": "IF",
+            "args": [
+                {"op": ">", "left": col("n0"), "right": val(80)},
+                val("高"),
+                {"func": "IF", "args": [{"op": ">", "left": col("n0"), "right": val(40)}, val("中"), val("低")]},
+            ],
+        },
+        "空值 / 除零": {
+            "func": "IFERROR",
+            "args": [{"op": "/", "left": col("n3"), "right": col("maybe")}, val(0)],
+        },
+        "文本拼接": {"op": "&", "left": {"op": "&", "left": col("city"), "right": val("-")}, "right": col("name")},
+        "函数调用": {"func": "ROUND", "args": [{"op": "*", "left": col("n4"), "right": col("qty")}, val(2)]},
+        "AND / OR": {
+            "func": "OR",
+            "args": [
+                {"func": "AND", "args": [{"op": ">", "left": col("n5"), "right": val(50)}, {"op": "=", "left": col("name"), "right": val("beta")}]},
+                {"func": "ISBLANK", "args": [col("maybe")]},
+            ],
+        },
+        "VLOOKUP": {
+            "op": "*",
+            "left": col("n6"),
+            "right": {"func": "VLOOKUP", "args": [col("name"), val("f.lookup"), val("name"), val("discount")]},
+        },
+        "COUNTIFS": {"func": "COUNTIFS", "args": [{"ref": "f.data.name"}, col("name"), {"ref": "f.data.city"}, col("city")]},
+        "未知列": {"op": "+", "left": col("n0"), "right": col("__missing__")},
+    }
+
+
+def main():
+    enable_copy_on_write()
+    arg_parser = argparse.ArgumentParser(description="行级公式编译器基准")
+    arg_parser.add_argument("--rows", type=int, default=50_000, help="测试表行数")
+    arg_parser.add_argument("--columns", type=int, default=20, help="数值列数量（影响行上下文构建开销）")
+    arg_parser.add_argument("--min-speedup", type=float, default=5.0, help="要求的最低总加速比")
+    args = arg_parser.parse_args()
+
+    collection, table = build_collection(args.rows, args.columns)
+    executor = Executor(collection)
+    executor.variables = dict(VARIABLES)
+    total_interpret = total_compiled = 0.0
+    failed = 0
+
+    print(f"{'公式':<14}{'解释':>10}{'编译':>10}{'加速':>8}")
+    for name, formula in build_formulas().items():
+        evaluator = FormulaEvaluator(collection, ROW_FUNC_MAP, variables=executor.variables, index_cache=executor.index_cache)
+        start = time.perf_counter()
+        expected, expected_errors = interpret_rows(table, formula, evaluator)
+        interpret_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual, actual_errors = executor._evaluate_formula_rows(table, formula, evaluator)
+        compiled_time = time.perf_counter() - start
+
+        total_interpret += interpret_time
+        total_compiled += compiled_time
+        print(
+            f"{name:<14}{interpret_time * 1000:>8.0f}ms{compiled_time * 1000:>8.0f}ms"
+            f"{interpret_time / compiled_time:>7.1f}x"
+        )
+
+        bad_rows = [i for i, (a, b) in enumerate(zip(expected, actual)) if not same_value(a, b)]
+        if len(expected) != len(actual) or bad_rows or expected_errors != actual_errors:
+            failed += 1
+            print(f"  ❌ 结果不一致: {formula}")
+            for i in bad_rows[:3]:
+                print(f"     行 {i + 2}: 解释={expected[i]!r} 编译={actual[i]!r}")
+
+    speedup = total_interpret / total_compiled
+    print(
+        f"\n{args.rows} 行: 解释 {total_interpret:.2f}s, 编译 {total_compiled:.2f}s ({speedup:.1f}x), "
+        f"{failed} 个公式不一致"
+    )
+    if failed or speedup < args.min_speedup:
+        if speedup < args.min_speedup:
+            print(f"❌ 加速比低于 {args.min_speedup}x")
+        sys.exit(1)
+    print("✅ 通过")
+
+
+if __name__ == "__main__":
+    main()
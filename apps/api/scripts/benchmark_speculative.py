@@ -0,0 +1,205 @@
+"""
+预执行基准（模拟 LLM 服务）
+
+模拟 LLM 服务按固定间隔流式输出一个长计划（多个整列计算的 add_column 和聚合），
+运行完整的处理流程（ExcelProcessor.process_async），比较：
+- sequential: 生成完整个 JSON 后再验证、执行（speculative_execution=False）
+- speculative: 每个操作输出完整后立即在表的副本上预执行，执行阶段直接命中缓存
+
+输出生成耗时、执行阶段耗时、生成结束后到流程完成的耗时和总耗时，检查两种方式的执行结果、
+修改后的表完全一致，执行阶段的缓存命中数等于操作数，并检查验证失败时预执行的结果被丢弃
+（原始表不受影响）。
+
+用法：
+    cd apps/api
+    python scripts/benchmark_speculative.py [--operations N] [--rows N] [--interval-ms X] [--min-speedup X]
+
+存在不一致或生成结束后耗时的加速比低于 --min-speedup（默认 2.0）时以非零状态码退出。
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from stub_llm_server import StubLLMServer  # noqa: E402
+from app.engine.llm_client import LLMClient  # noqa: E402
+from app.engine.llm_pool import get_llm_pool  # noqa: E402
+from app.engine.models import ExcelFile, FileCollection, Table, enable_copy_on_write  # noqa: E402
+from app.engine.operation_cache import get_operation_cache  # noqa: E402
+from app.processor import EventType, ExcelProcessor, ProcessConfig, ProcessResult, ProcessStage  # noqa: E402
+
+
+def build_plan(count: int) -> dict:
+    """长计划：逐个依赖前一列的行级计算，每隔几个操作做一次聚合"""
+    operations = []
+    previous = "金额"
+    for i in range(count):
+        if i % 5 == 4:
+            operations.append({
+                "type": "aggregate", "function": "SUM", "file_id": "orders", "table": "Sheet1",
+                "column": previous, "as": f"total_{i}", "description": f"第 {i + 1} 步汇总",
+            })
+            continue
+        name = f"列{i}"
+        operations.append({
+            "type": "add_column", "file_id": "orders", "table": "Sheet1", "name": name,
+            "formula": {
+                "func": "IF",
+                "args": [
+                    {"op": ">", "left": {"col": previous}, "right": {"value": 50}},
+                    {"func": "ROUND", "args": [{"op": "*", "left": {"col": previous}, "right": {"value": 1.1}}, {"value": 2}]},
+                    {"op": "+", "left": {"col": previous}, "right": {"col": "数量"}},
+                ],
+            },
+            "description": f"第 {i + 1} 步计算",
+        })
+        previous = name
+    return {"operations": operations}
+
+
+def build_tables(rows: int) -> FileCollection:
+    rng = np.random.default_rng(0)
+    tables = FileCollection()
+    excel_file = ExcelFile(file_id="orders", filename="orders.xlsx")
+    excel_file.add_sheet(Table(name="Sheet1", data=pd.DataFrame({
+        "金额": rng.integers(0, 100, rows),
+        "数量": rng.integers(1, 10, rows),
+    })))
+    tables.add_file(excel_file)
+    return tables
+
+
+async def run(base_url: str, tables: FileCollection, speculative: bool) -> dict:
+    """运行一次处理流程，返回各阶段耗时和结果"""
+    get_operation_cache().clear()
+    processor = ExcelProcessor(LLMClient(api_key="stub", base_url=base_url, model="stub"))
+    config = ProcessConfig(stream_llm=True, speculative_execution=speculative)
+    result = ProcessResult()
+
+    marks = {}
+    execute_output = None
+    start = time.perf_counter()
+    async for event in processor.process_async(tables, "逐步计算", config, result):
+        marks[(event.stage, event.event_type)] = time.perf_counter() - start
+        if event.stage == ProcessStage.EXECUTE and event.event_type == EventType.STAGE_DONE:
+            execute_output = event.output
+    total = time.perf_counter() - start
+    await get_llm_pool().aclose()
+
+    return {
+        "generate": marks[(ProcessStage.GENERATE, EventType.STAGE_DONE)],
+        "execute": marks[(ProcessStage.EXECUTE, EventType.STAGE_DONE)] - marks[(ProcessStage.EXECUTE, EventType.STAGE_START)],
+        "total": total,
+        "result": result,
+        "cache": execute_output["cache"],
+    }
+
+
+def check_discarded(server_content: str, rows: int) -> bool:
+    """验证失败（引用不存在的 Sheet）时：预执行停止，原始表不受影响"""
+    plan = json.loads(server_content)
+    plan["operations"].append({
+        "type": "aggregate", "function": "SUM", "file_id": "orders", "table": "不存在", "column": "金额", "as": "x",
+    })
+    server = StubLLMServer(json.dumps(plan, ensure_ascii=False), tokens=0, interval=0.0)
+    base_url = server.start()
+    try:
+        tables = build_tables(rows)
+        columns = tables.get_table("orders", "Sheet1").get_columns()
+        config = ProcessConfig(stream_llm=True, max_validation_retries=0)
+        processor = ExcelProcessor(LLMClient(api_key="stub", base_url=base_url, model="stub"))
+
+        async def main():
+            result = ProcessResult()
+            async for _ in processor.process_async(tables, "逐步计算", config, result):
+                pass
+            await get_llm_pool().aclose()
+            return result
+
+        result = asyncio.run(main())
+    finally:
+        server.stop()
+    return bool(result.errors) and tables.get_table("orders", "Sheet1").get_columns() == columns
+
+
+def main():
+    enable_copy_on_write()
+    arg_parser = argparse.ArgumentParser(description="预执行基准")
+    arg_parser.add_argument("--operations", type=int, default=20, help="计划中的操作数")
+    arg_parser.add_argument("--rows", type=int, default=100_000, help="表的行数")
+    arg_parser.add_argument("--interval-ms", type=float, default=3.0, help="模拟服务输出 token 的间隔（毫秒）")
+    arg_parser.add_argument("--min-speedup", type=float, default=2.0, help="生成结束后耗时要求的最低加速比")
+    args = arg_parser.parse_args()
+    logging.disable(logging.INFO)
+
+    content = json.dumps(build_plan(args.operations), ensure_ascii=False)
+    server = StubLLMServer(content, tokens=0, interval=args.interval_ms / 1000)
+    base_url = server.start()
+    failed = 0
+
+    print(f"{args.operations} 个操作，{args.rows} 行，计划 {len(content)} 字符")
+    print(f"{'方式':<14}{'生成':>10}{'执行阶段':>12}{'生成结束后':>12}{'总耗时':>10}{'缓存命中':>10}")
+    try:
+        measured = {}
+        for mode in ("sequential", "speculative"):
+            tables = build_tables(args.rows)
+            outcome = asyncio.run(run(base_url, tables, mode == "speculative"))
+            outcome["tables"] = tables
+            measured[mode] = outcome
+            print(
+                f"{mode:<14}{outcome['generate']:>9.2f}s{outcome['execute']:>11.2f}s"
+                f"{outcome['total'] - outcome['generate']:>11.2f}s{outcome['total']:>9.2f}s{outcome['cache']['hits']:>10}"
+            )
+    finally:
+        server.stop()
+
+    sequential, speculative = measured["sequential"], measured["speculative"]
+    for mode, outcome in measured.items():
+        if outcome["result"].errors:
+            print(f"  ❌ {mode} 执行错误: {outcome['result'].errors}")
+            failed += 1
+    if (sequential["result"].variables, sequential["result"].new_columns) != (
+        speculative["result"].variables, speculative["result"].new_columns
+    ):
+        print("  ❌ 执行结果不一致")
+        failed += 1
+    try:
+        pd.testing.assert_frame_equal(
+            speculative["tables"].get_table("orders", "Sheet1").get_data(),
+            sequential["tables"].get_table("orders", "Sheet1").get_data(),
+            check_exact=True,
+        )
+    except AssertionError as e:
+        print(f"  ❌ 修改后的表不一致: {e}")
+        failed += 1
+    if speculative["cache"]["hits"] != args.operations:
+        print(f"  ❌ 执行阶段缓存命中 {speculative['cache']['hits']} / {args.operations}")
+        failed += 1
+
+    if check_discarded(content, 1000):
+        print("验证失败时预执行被丢弃，原始表不受影响")
+    else:
+        print("  ❌ 验证失败时原始表被修改")
+        failed += 1
+
+    speedup = (sequential["total"] - sequential["generate"]) / (speculative["total"] - speculative["generate"])
+    print(f"\n生成结束后耗时加速 {speedup:.1f}x，总耗时加速 {sequential['total'] / speculative['total']:.1f}x")
+    if speedup < args.min_speedup:
+        print(f"❌ 加速比低于 {args.min_speedup}x")
+        failed += 1
+    if failed:
+        sys.exit(1)
+    print("✅ 通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+解析结果磁盘缓存基准
+
+对 fixtures 中的每个工作簿：
+- parse: openpyxl 解析所有 sheet（缓存未命中时的路径）
+- cache: 从解析结果磁盘缓存读取（命中时的路径，数值列内存映射）
+
+检查读取结果与解析结果完全一致（列名、类型、数据），输出耗时和加速比；
+最后用很小的上限写入多个工作簿，检查 LRU 淘汰和统计信息；并检查缓存目录的安全要求：
+以 0o700 创建、其他用户可访问时收紧权限、符号链接和不属于当前用户的目录（需 root 运行）被拒绝、
+键必须是文件内容的 SHA-256。
+
+用法：
+    cd apps/api
+    python scripts/benchmark_workbook_cache.py [--limit-files N] [--min-speedup X]
+
+存在不一致、淘汰不符合预期或总加速比低于 --min-speedup 时以非零状态码退出。
+"""
+
+import argparse
+import os
+import stat
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.engine.excel_parser import ExcelParser  # noqa: E402
+from app.engine.workbook_cache import WorkbookCache, hash_content  # noqa: E402
+
+FIXTURES_DIR = Path(__file__).resolve().parents[3] / "fixtures"
+
+
+def same_sheets(expected, actual) -> bool:
+    """逐个 sheet 比较名称、列、类型和数据"""
+    if [name for name, _ in expected] != [name for name, _ in actual]:
+        return False
+    for (_, a), (_, b) in zip(expected, actual):
+        try:
+            pd.testing.assert_frame_equal(a, b, check_exact=True)
+        except AssertionError as e:
+            print(f"     {e}")
+            return False
+    return True
+
+
+def check_directory_security() -> int:
+    """缓存目录以 0o700 创建并检查所有者，键必须是 SHA-256"""
+    checks = {}
+    with tempfile.TemporaryDirectory() as root:
+        created = Path(root) / "new" / "cache"
+        WorkbookCache(created, max_bytes=1024)
+        checks["以 0o700 创建"] = stat.S_IMODE(os.stat(created).st_mode) == 0o700
+
+        loose = Path(root) / "loose"
+        loose.mkdir()
+        os.chmod(loose, 0o777)
+        WorkbookCache(loose, max_bytes=1024)
+        checks["收紧为 0o700"] = stat.S_IMODE(os.stat(loose).st_mode) == 0o700
+
+        link = Path(root) / "link"
+        link.symlink_to(created)
+        checks["拒绝符号链接"] = _refused(link)
+
+        if hasattr(os, "getuid") and os.getuid() == 0:
+            foreign = Path(root) / "foreign"
+            foreign.mkdir(mode=0o700)
+            os.chown(foreign, 65534, 65534)
+            checks["拒绝其他用户的目录"] = _refused(foreign)
+
+        try:
+            WorkbookCache(created, max_bytes=1024).get("d41d8cd98f00b204e9800998ecf8427e")
+            checks["拒绝 MD5 作为键"] = False
+        except ValueError:
+            checks["拒绝 MD5 作为键"] = True
+
+    failed = [name for name, ok in checks.items() if not ok]
+    print(f"缓存目录检查: {', '.join(checks)}")
+    if failed:
+        print(f"  ❌ 缓存目录检查失败: {failed}")
+        return 1
+    return 0
+
+
+def _refused(directory: Path) -> bool:
+    try:
+        WorkbookCache(directory, max_bytes=1024)
+    except PermissionError:
+        return True
+    return False
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="解析结果磁盘缓存基准")
+    arg_parser.add_argument("--limit-files", type=int, default=None, help="最多测试的文件数")
+    arg_parser.add_argument("--min-speedup", type=float, default=20.0, help="要求的最低总加速比")
+    args = arg_parser.parse_args()
+
+    files = sorted(FIXTURES_DIR.glob("*/datasets/*.xlsx"))[: args.limit_files]
+    failed = 0
+    total_parse = total_load = 0.0
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = WorkbookCache(directory, max_bytes=4 * 1024 ** 3)
+        print(f"{'文件':<28}{'大小':>8}{'解析':>10}{'缓存':>10}{'加速':>8}")
+        for path in files:
+            data = path.read_bytes()
+
+            start = time.perf_counter()
+            sheets = ExcelParser.parse_workbook_bytes(data)
+            parse_time = time.perf_counter() - start
+
+            key = hash_content(data)
+            cache.put(key, sheets)
+            start = time.perf_counter()
+            cached = cache.get(key)
+            load_time = time.perf_counter() - start
+
+            total_parse += parse_time
+            total_load += load_time
+            print(
+                f"{path.name:<28}{len(data) / 1024 ** 2:>6.1f}MB{parse_time * 1000:>8.0f}ms"
+                f"{load_time * 1000:>8.1f}ms{parse_time / load_time:>7.0f}x"
+            )
+            if cached is None or not same_sheets(sheets, cached):
+                failed += 1
+                print(f"  ❌ 缓存读取结果与解析结果不一致: {path.name}")
+
+        print(f"缓存统计: {cache.stats()}")
+
+    # LRU 淘汰：上限只能容纳一个工作簿时，写入第二个后第一个被淘汰
+    if len(files) >= 2:
+        with tempfile.TemporaryDirectory() as directory:
+            first_data, second_data = files[0].read_bytes(), files[1].read_bytes()
+            first_key, second_key = hash_content(first_data), hash_content(second_data)
+            probe = WorkbookCache(directory, max_bytes=4 * 1024 ** 3)
+            probe.put(first_key, ExcelParser.parse_workbook_bytes(first_data))
+            probe.put(second_key, ExcelParser.parse_workbook_bytes(second_data))
+            sizes = probe.stats()["bytes"]
+
+            cache = WorkbookCache(directory, max_bytes=sizes - 1)
+            evicted_ok = cache.get(first_key) is None and cache.get(second_key) is not None
+            stats = cache.stats()
+            print(f"淘汰检查: {stats}")
+            if not evicted_ok or stats["evictions"] != 1:
+                failed += 1
+                print("  ❌ LRU 淘汰不符合预期")
+
+    failed += check_directory_security()
+
+    speedup = total_parse / total_load if total_load else 0.0
+    print(f"\n{len(files)} 个文件: 解析 {total_parse:.2f}s, 缓存 {total_load:.3f}s ({speedup:.0f}x)")
+    if failed or speedup < args.min_speedup:
+        if speedup < args.min_speedup:
+            print(f"❌ 加速比低于 {args.min_speedup}x")
+        sys.exit(1)
+    print("✅ 通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""
+修补导出基准
+
+比较修改过的文件的两种导出方式：
+- write: 重新生成整个工作簿（见 app.engine.xlsx_writer，原来的导出路径）
+- patch: 在原工作簿上修补（见 app.engine.xlsx_patcher），未修改的 sheet 原样复制，只改写修改过的 sheet
+
+检查：
+- fixtures 中的每个工作簿新增列（数值、日期）、更新列、新增 sheet 后修补导出，
+  重新解析的结果与修改后的表一致，openpyxl 可以读取
+- 未修改的部件（其他 sheet、共享字符串、主题等）与原文件逐字节相同，原有单元格的样式不变
+- 原文件中的公式、列宽、其他 sheet 的格式保留
+- 新增 sheet 的名称含 Excel 不允许的字符（: \\ / ? * [ ]）时改名后修补，openpyxl 可以读取
+- 无法修补（sheet 被替换）时不写入任何内容，导出时回退到重新生成
+
+并输出只修改其中一个 sheet 时两种方式的耗时和加速比。
+
+用法：
+    cd apps/api
+    python scripts/benchmark_xlsx_patcher.py [--rows N] [--sheets N] [--limit-files N] [--min-speedup X]
+
+存在不一致或加速比低于 --min-speedup（默认 3.0）时以非零状态码退出。
+"""
+
+import argparse
+import io
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+from openpyxl.styles import Font, PatternFill
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.engine.excel_parser import ExcelParser  # noqa: E402
+from app.engine.models import FileCollection, Table, enable_copy_on_write  # noqa: E402
+from app.engine.xlsx_patcher import patch_workbook  # noqa: E402
+from app.engine.xlsx_writer import write_workbook  # noqa: E402
+
+FIXTURES_DIR = Path(__file__).resolve().parents[3] / "fixtures"
+
+# 修补时会改写的部件（其余部件应与原文件逐字节相同）
+REWRITTEN_PARTS = {"[Content_Types].xml", "xl/workbook.xml", "xl/_rels/workbook.xml.rels", "xl/styles.xml"}
+
+
+def load(path: Path) -> FileCollection:
+    return ExcelParser.parse_file_all_sheets(path, file_id="file-1")
+
+
+def modify(tables: FileCollection) -> str:
+    """修改第一个 sheet：新增数值列和日期列、更新第二列，并新增一个 sheet；返回修改的 sheet 名称"""
+    excel_file = tables.get_file("file-1")
+    sheet_name = excel_file.get_sheet_names()[0]
+    table = excel_file.get_sheet(sheet_name)
+    rows = len(table)
+    table.add_column("新增数值", list(np.arange(rows) * 1.5))
+    table.add_column("新增日期", list(pd.Timestamp("2024-01-01") + pd.to_timedelta(np.arange(rows), unit="D")))
+    if len(table.get_columns()) > 3:
+        table.update_column(table.get_columns()[1], [f"更新 <{i}>" for i in range(rows)])
+    excel_file.add_sheet(Table("汇总", pd.DataFrame({"类别": ["甲", "乙"], "数量": [1, 2]})))
+    return sheet_name
+
+
+def patch(tables: FileCollection) -> bytes:
+    output = io.BytesIO()
+    if patch_workbook(output, tables.get_file("file-1")) is None:
+        raise AssertionError("没有在原文件上修补")
+    return output.getvalue()
+
+
+def cell_styles(data: bytes, sheet_name: str, columns: int, rows: int = 20):
+    sheet = load_workbook(io.BytesIO(data))[sheet_name]
+    return [
+        (repr(cell.font), repr(cell.fill), repr(cell.border), cell.number_format)
+        for row in sheet.iter_rows(min_row=1, max_row=rows, max_col=columns)
+        for cell in row
+    ]
+
+
+def check_roundtrip(path: Path) -> int:
+    """修补导出后重新解析的结果与修改后的表一致，未修改的部件和样式不变"""
+    original = path.read_bytes()
+    tables = load(path)
+    sheet_name = modify(tables)
+    excel_file = tables.get_file("file-1")
+    try:
+        patched = patch(tables)
+    except AssertionError as e:
+        print(f"  ❌ {path.name}: {e}")
+        return 1
+
+    actual = dict(ExcelParser.parse_workbook_bytes(patched, parallel=False))
+    if list(actual) != excel_file.get_sheet_names():
+        print(f"  ❌ {path.name} sheet 名称不一致: {list(actual)}")
+        return 1
+    for name in excel_file.get_sheet_names():
+        try:
+            pd.testing.assert_frame_equal(actual[name], excel_file.get_sheet(name).get_data())
+        except AssertionError as e:
+            print(f"  ❌ {path.name} sheet {name} 不一致: {e}")
+            return 1
+
+    source_archive, patched_archive = zipfile.ZipFile(io.BytesIO(original)), zipfile.ZipFile(io.BytesIO(patched))
+    modified = {info.filename for info in source_archive.infolist() if info.filename.startswith("xl/worksheets/sheet1")}
+    for info in source_archive.infolist():
+        name = info.filename
+        if name in REWRITTEN_PARTS or name in modified or name.endswith("calcChain.xml"):
+            continue
+        if source_archive.read(name) != patched_archive.read(name):
+            print(f"  ❌ {path.name} 未修改的部件 {name} 内容不同")
+            return 1
+
+    if cell_styles(original, sheet_name, 1) != cell_styles(patched, sheet_name, 1):
+        print(f"  ❌ {path.name} 原有单元格的样式变化")
+        return 1
+    return 0
+
+
+def build_formatted_workbook() -> bytes:
+    """带格式、公式和列宽的工作簿"""
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = "数据"
+    sheet.append(["编号", "金额", "类别"])
+    for i in range(200):
+        sheet.append([i, i * 2.5, "甲" if i % 2 else "乙"])
+    sheet["A1"].font = Font(bold=True, color="FF0000")
+    sheet["B2"].fill = PatternFill("solid", fgColor="FFFF00")
+    sheet.column_dimensions["C"].width = 30
+
+    summary = workbook.create_sheet("公式")
+    summary.append(["合计"])
+    summary.append(["=SUM(数据!B2:B201)"])
+    output = io.BytesIO()
+    workbook.save(output)
+    return output.getvalue()
+
+
+def check_formatted() -> int:
+    """修补后保留公式、列宽和原有格式"""
+    data = build_formatted_workbook()
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "formatted.xlsx"
+        path.write_bytes(data)
+        tables = load(path)
+        table = tables.get_file("file-1").get_sheet("数据")
+        table.add_column("税额", list(table.get_column_array("金额") * 0.1))
+        patched = patch(tables)
+
+    workbook = load_workbook(io.BytesIO(patched))
+    sheet = workbook["数据"]
+    checks = {
+        "公式": workbook["公式"]["A2"].value == "=SUM(数据!B2:B201)",
+        "列宽": sheet.column_dimensions["C"].width == 30,
+        "表头格式": sheet["A1"].font.b and sheet["A1"].font.color.rgb == "00FF0000",
+        "填充": sheet["B2"].fill.fgColor.rgb == "00FFFF00",
+        "新增列": sheet["D1"].value == "税额" and abs(sheet["D3"].value - 0.25) < 1e-12,
+        "重新计算": 'fullCalcOnLoad="1"' in zipfile.ZipFile(io.BytesIO(patched)).read("xl/workbook.xml").decode(),
+    }
+    failed = [name for name, ok in checks.items() if not ok]
+    if failed:
+        print(f"  ❌ 修补后没有保留: {failed}")
+        return 1
+    print("公式、列宽、原有格式保留")
+    return 0
+
+
+def check_sheet_names() -> int:
+    """新增 sheet 的名称含 Excel 不允许的字符时改名后修补，openpyxl 可以读取"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "formatted.xlsx"
+        path.write_bytes(build_formatted_workbook())
+        tables = load(path)
+        excel_file = tables.get_file("file-1")
+        excel_file.add_sheet(Table("大于1/汇总", pd.DataFrame({"数量": [1, 2]})))
+        excel_file.add_sheet(Table("'[明细]'", pd.DataFrame({"数量": [3]})))
+        patched = patch(tables)
+
+    try:
+        actual = load_workbook(io.BytesIO(patched)).sheetnames
+    except Exception as e:
+        print(f"  ❌ 新增 sheet 的名称不允许，修补后无法读取: {e}")
+        return 1
+    expected = ["数据", "公式", "大于1_汇总", "_明细_"]
+    if actual != expected:
+        print(f"  ❌ 修补后 sheet 名称不正确: {actual}")
+        return 1
+    print(f"新增 sheet 的名称改名后修补: {actual[2:]}")
+    return 0
+
+
+def check_fallback(path: Path) -> int:
+    """sheet 被替换时不修补，导出时重新生成"""
+    tables = load(path)
+    excel_file = tables.get_file("file-1")
+    sheet_name = excel_file.get_sheet_names()[0]
+    excel_file.add_sheet(Table(sheet_name, pd.DataFrame({"a": [1, 2, 3]})))
+    output = io.BytesIO()
+    if patch_workbook(output, excel_file) is not None or output.getvalue():
+        print("  ❌ sheet 被替换时不应修补")
+        return 1
+    (_, df), = ExcelParser.parse_workbook_bytes(tables.export_file_to_bytes("file-1"), parallel=False)
+    if not df.equals(excel_file.get_sheet(sheet_name).get_data()):
+        print("  ❌ 回退到重新生成的结果不正确")
+        return 1
+    print("sheet 被替换时回退到重新生成")
+    return 0
+
+
+def build_source(rows: int, sheets: int) -> bytes:
+    """多个 sheet 的原始工作簿"""
+    rng = np.random.default_rng(0)
+    output = io.BytesIO()
+    write_workbook(output, [
+        (f"Sheet{i + 1}", pd.DataFrame({
+            "编号": np.arange(rows),
+            "金额": rng.random(rows) * 1000,
+            "类别": rng.choice(["甲", "乙", "丙"], rows).astype(object),
+            "日期": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 10 ** 8, rows), unit="s"),
+        }))
+        for i in range(sheets)
+    ])
+    return output.getvalue()
+
+
+def elapsed(export) -> float:
+    with tempfile.TemporaryFile() as output:
+        start = time.perf_counter()
+        export(output)
+        return time.perf_counter() - start
+
+
+def check_speed(rows: int, sheets: int, min_speedup: float) -> int:
+    """只修改其中一个 sheet（新增一列）时两种方式的耗时"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "multi.xlsx"
+        path.write_bytes(build_source(rows, sheets))
+        tables = load(path)
+        excel_file = tables.get_file("file-1")
+        table = excel_file.get_sheet("Sheet1")
+        table.add_column("税额", list(table.get_column_array("金额") * 0.1))
+        excel_file.source.content()
+
+        write_time = elapsed(lambda output: write_workbook(
+            output, [(name, excel_file.get_sheet(name).get_data()) for name in excel_file.get_sheet_names()]
+        ))
+        patch_time = elapsed(lambda output: patch_workbook(output, excel_file))
+    speedup = write_time / patch_time
+    print(f"{sheets} 个 sheet × {rows} 行，修改 1 个 sheet: write {write_time:.2f}s, patch {patch_time:.2f}s ({speedup:.1f}x)")
+    if speedup < min_speedup:
+        print(f"❌ 加速比低于 {min_speedup}x")
+        return 1
+    return 0
+
+
+def main():
+    enable_copy_on_write()
+    arg_parser = argparse.ArgumentParser(description="修补导出基准")
+    arg_parser.add_argument("--rows", type=int, default=50_000, help="比较耗时的每个 sheet 的行数")
+    arg_parser.add_argument("--sheets", type=int, default=8, help="比较耗时的工作簿的 sheet 数")
+    arg_parser.add_argument("--limit-files", type=int, default=None, help="最多测试的 fixtures 文件数")
+    arg_parser.add_argument("--min-speedup", type=float, default=3.0, help="要求的最低加速比")
+    args = arg_parser.parse_args()
+    failed = 0
+
+    files = sorted(FIXTURES_DIR.glob("*/datasets/*.xlsx"))[: args.limit_files]
+    for path in files:
+        failed += check_roundtrip(path)
+    if not failed:
+        print(f"{len(files)} 个 fixtures 文件修补导出后结果一致，未修改的部件逐字节相同")
+
+    failed += check_formatted()
+    failed += check_sheet_names()
+    if files:
+        failed += check_fallback(files[0])
+    failed += check_speed(args.rows, args.sheets, args.min_speedup)
+
+    if failed:
+        sys.exit(1)
+    print("✅ 通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Excel 读取后端基准
+
+对 fixtures 中的每个工作簿，分别用两个读取后端解析所有 sheet（单进程，不使用解析进程池）：
+- openpyxl: pd.read_excel(engine="openpyxl")（原来的解析路径）
+- stream: 流式解析 Sheet XML（见 app.engine.xlsx_reader）
+
+检查两个后端得到的 DataFrame 完全一致（清洗前后都比较），输出耗时、
+Python 内存峰值（tracemalloc）和加速比。
+
+用法：
+    cd apps/api
+    python scripts/benchmark_xlsx_reader.py [--limit-files N] [--no-memory] [--min-speedup X]
+
+存在不一致或总加速比低于 --min-speedup 时以非零状态码退出。
+"""
+
+import argparse
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.engine import excel_parser  # noqa: E402
+from app.engine.excel_parser import ExcelParser  # noqa: E402
+
+FIXTURES_DIR = Path(__file__).resolve().parents[3] / "fixtures"
+
+
+def same_sheets(expected, actual) -> bool:
+    """逐个 sheet 比较名称、列、类型和数据"""
+    if [name for name, _ in expected] != [name for name, _ in actual]:
+        return False
+    for (_, a), (_, b) in zip(expected, actual):
+        try:
+            pd.testing.assert_frame_equal(a, b, check_exact=True)
+        except AssertionError as e:
+            print(f"     {e}")
+            return False
+    return True
+
+
+def peak_memory(data: bytes, reader: str) -> float:
+    """解析过程中 Python 分配内存的峰值（MB）"""
+    tracemalloc.start()
+    try:
+        excel_parser._read_sheets(data, None, reader)
+        return tracemalloc.get_traced_memory()[1] / 1024 ** 2
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Excel 读取后端基准")
+    arg_parser.add_argument("--limit-files", type=int, default=None, help="最多测试的文件数")
+    arg_parser.add_argument("--no-memory", action="store_true", help="不统计内存峰值（更快）")
+    arg_parser.add_argument("--min-speedup", type=float, default=2.0, help="要求的最低总加速比")
+    args = arg_parser.parse_args()
+
+    files = sorted(FIXTURES_DIR.glob("*/datasets/*.xlsx"))[: args.limit_files]
+    failed = 0
+    total_openpyxl = total_stream = 0.0
+
+    print(f"{'文件':<28}{'大小':>8}{'openpyxl':>10}{'stream':>10}{'加速':>8}{'内存(openpyxl/stream)':>24}")
+    for path in files:
+        data = path.read_bytes()
+
+        start = time.perf_counter()
+        raw_expected = excel_parser._read_sheets(data, None, "openpyxl")
+        openpyxl_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        raw_actual = excel_parser._read_sheets(data, None, "stream")
+        stream_time = time.perf_counter() - start
+
+        total_openpyxl += openpyxl_time
+        total_stream += stream_time
+        memory = ""
+        if not args.no_memory:
+            memory = f"{peak_memory(data, 'openpyxl'):.0f}MB / {peak_memory(data, 'stream'):.0f}MB"
+        print(
+            f"{path.name:<28}{len(data) / 1024 ** 2:>6.1f}MB{openpyxl_time * 1000:>8.0f}ms"
+            f"{stream_time * 1000:>8.0f}ms{openpyxl_time / stream_time:>7.1f}x{memory:>24}"
+        )
+
+        if not same_sheets(raw_expected, raw_actual):
+            failed += 1
+            print(f"  ❌ 读取结果不一致: {path.name}")
+            continue
+        cleaned_expected = ExcelParser.parse_workbook_bytes(data, parallel=False, reader="openpyxl")
+        cleaned_actual = ExcelParser.parse_workbook_bytes(data, parallel=False, reader="stream")
+        if not same_sheets(cleaned_expected, cleaned_actual):
+            failed += 1
+            print(f"  ❌ 清洗后结果不一致: {path.name}")
+
+    speedup = total_openpyxl / total_stream if total_stream else 0.0
+    print(f"\n{len(files)} 个文件: openpyxl {total_openpyxl:.2f}s, stream {total_stream:.2f}s ({speedup:.1f}x)")
+    if failed or speedup < args.min_speedup:
+        if speedup < args.min_speedup:
+            print(f"❌ 加速比低于 {args.min_speedup}x")
+        sys.exit(1)
+    print("✅ 通过")
+
+
+if __name__ == "__main__":
+    main()
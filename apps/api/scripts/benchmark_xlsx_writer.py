@@ -0,0 +1,197 @@
+"""
+Excel 写入基准
+
+比较两种导出方式：
+- openpyxl: pd.ExcelWriter(engine="openpyxl")（原来的导出路径）
+- stream: 流式写入 SpreadsheetML（见 app.engine.xlsx_writer）
+
+检查：
+- fixtures 中的每个工作簿解析后分别用两种方式导出，再用两个读取后端读取，结果一致
+  （openpyxl 写入的浮点数只保留 15 位有效数字，浮点数按相对误差 1e-14 比较）
+- 包含各种类型（整数、浮点、NaN、无穷大、布尔、日期、时间间隔、文本、ExcelError）的表，两种方式读取结果一致，
+  ExcelError 写入为错误值单元格
+- Excel 不允许的 Sheet 名称（含 : \\ / ? * [ ]、首尾单引号）改名后写入，openpyxl 可以读取
+- 写入 --rows 行和 4 倍行数时 stream 的 Python 内存峰值（tracemalloc）基本不变（增长不超过 --max-growth 倍）
+
+并输出 --timing-rows 行时两种方式的耗时和加速比。
+
+用法：
+    cd apps/api
+    python scripts/benchmark_xlsx_writer.py [--rows N] [--timing-rows N] [--limit-files N] [--min-speedup X]
+
+存在不一致、内存随行数增长或加速比低于 --min-speedup（默认 3.0）时以非零状态码退出。
+"""
+
+import argparse
+import io
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.engine.excel_parser import ExcelParser  # noqa: E402
+from app.engine.models import DIV0, NA, VALUE  # noqa: E402
+from app.engine.xlsx_reader import read_workbook  # noqa: E402
+from app.engine.xlsx_writer import write_workbook  # noqa: E402
+
+FIXTURES_DIR = Path(__file__).resolve().parents[3] / "fixtures"
+
+
+def write_openpyxl(output, sheets):
+    """原来的导出方式"""
+    with pd.ExcelWriter(output, engine="openpyxl") as writer:
+        for sheet_name, df in sheets:
+            df.to_excel(writer, sheet_name=sheet_name[:31], index=False)
+
+
+def build_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    """包含各种类型的表"""
+    rng = np.random.default_rng(seed)
+    amounts = rng.random(rows) * 1000
+    amounts[rng.random(rows) < 0.05] = np.nan
+    mixed = rng.choice(np.array(["文本 <&>", "  两端空格  ", 12, 3.5, True, None], dtype=object), rows)
+    mixed[rng.random(rows) < 0.02] = DIV0
+    return pd.DataFrame({
+        "编号": np.arange(rows),
+        "金额": amounts,
+        "比率": np.where(rng.random(rows) < 0.01, np.inf, rng.random(rows)),
+        "数量": rng.integers(-100, 100, rows),
+        "类别": rng.choice(["甲", "乙", "丙"], rows).astype(object),
+        "日期": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 10 ** 8, rows), unit="s"),
+        "时长": pd.to_timedelta(rng.integers(0, 10 ** 6, rows), unit="s"),
+        "标记": rng.random(rows) > 0.5,
+        "混合": mixed,
+        2024: rng.integers(0, 10, rows),
+    })
+
+
+def read_back(data: bytes):
+    """用两个读取后端读取所有 sheet"""
+    return {
+        "openpyxl": list(pd.read_excel(io.BytesIO(data), sheet_name=None, engine="openpyxl").items()),
+        "stream": read_workbook(data),
+    }
+
+
+def compare(label: str, sheets) -> int:
+    """两种方式导出后读取的结果一致"""
+    expected_bytes, actual_bytes = io.BytesIO(), io.BytesIO()
+    write_openpyxl(expected_bytes, sheets)
+    write_workbook(actual_bytes, sheets)
+    expected, actual = read_back(expected_bytes.getvalue()), read_back(actual_bytes.getvalue())
+    for reader in expected:
+        if [name for name, _ in expected[reader]] != [name for name, _ in actual[reader]]:
+            print(f"  ❌ {label} ({reader}) sheet 名称不一致")
+            return 1
+        for (name, a), (_, b) in zip(expected[reader], actual[reader]):
+            try:
+                # openpyxl 写入的浮点数只保留 15 位有效数字，stream 按完整精度写入
+                pd.testing.assert_frame_equal(a, b, check_exact=False, rtol=1e-14)
+            except AssertionError as e:
+                print(f"  ❌ {label} ({reader}) sheet {name} 不一致: {e}")
+                return 1
+    return 0
+
+
+def check_error_cells() -> int:
+    """ExcelError 写入为错误值单元格"""
+    output = io.BytesIO()
+    write_workbook(output, [("Sheet1", pd.DataFrame({"结果": [DIV0, NA, VALUE, 1]}))])
+    cells = [(cell.value, cell.data_type) for (cell,) in load_workbook(output).active.iter_rows(min_row=2)]
+    if cells != [("#DIV/0!", "e"), ("#N/A", "e"), ("#VALUE!", "e"), (1, "n")]:
+        print(f"  ❌ 错误值单元格不正确: {cells}")
+        return 1
+    print("ExcelError 写入为错误值单元格")
+    return 0
+
+
+def check_sheet_names() -> int:
+    """Excel 不允许的 Sheet 名称（含 : \\ / ? * [ ]、首尾单引号）改名后写入，openpyxl 可以读取"""
+    names = ["大于1/汇总", "a:b\\c?d*e[f]", "'引号'", "大于1?汇总"]
+    output = io.BytesIO()
+    write_workbook(output, [(name, pd.DataFrame({"值": [i]})) for i, name in enumerate(names)])
+    try:
+        actual = load_workbook(output).sheetnames
+    except Exception as e:
+        print(f"  ❌ 不允许的 Sheet 名称写入后无法读取: {e}")
+        return 1
+    expected = ["大于1_汇总", "a_b_c_d_e_f_", "引号", "大于1_汇总1"]
+    if actual != expected:
+        print(f"  ❌ Sheet 名称不正确: {actual}")
+        return 1
+    print(f"不允许的 Sheet 名称改名后写入: {actual}")
+    return 0
+
+
+def peak_memory(write, df: pd.DataFrame) -> float:
+    """写入临时文件过程中 Python 分配内存的峰值（MB）"""
+    with tempfile.TemporaryFile() as output:
+        tracemalloc.start()
+        try:
+            write(output, [("Sheet1", df)])
+            return tracemalloc.get_traced_memory()[1] / 1024 ** 2
+        finally:
+            tracemalloc.stop()
+
+
+def elapsed(write, df: pd.DataFrame) -> float:
+    with tempfile.TemporaryFile() as output:
+        start = time.perf_counter()
+        write(output, [("Sheet1", df)])
+        return time.perf_counter() - start
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Excel 写入基准")
+    arg_parser.add_argument("--rows", type=int, default=20_000, help="统计内存峰值的行数（另测 4 倍行数）")
+    arg_parser.add_argument("--timing-rows", type=int, default=100_000, help="比较耗时的行数")
+    arg_parser.add_argument("--limit-files", type=int, default=None, help="最多测试的 fixtures 文件数")
+    arg_parser.add_argument("--max-growth", type=float, default=1.5, help="4 倍行数时内存峰值允许增长的倍数")
+    arg_parser.add_argument("--min-speedup", type=float, default=3.0, help="要求的最低加速比")
+    args = arg_parser.parse_args()
+    failed = 0
+
+    files = sorted(FIXTURES_DIR.glob("*/datasets/*.xlsx"))[: args.limit_files]
+    for path in files:
+        sheets = ExcelParser.parse_workbook_bytes(path.read_bytes(), parallel=False)
+        failed += compare(path.name, sheets)
+    if not failed:
+        print(f"{len(files)} 个 fixtures 文件导出后读取结果一致")
+
+    failed += compare("各种类型", [("Sheet1", build_frame(2000)), ("很长的 sheet 名称" * 3, build_frame(100, seed=1))])
+    failed += check_error_cells()
+    failed += check_sheet_names()
+
+    small, large = build_frame(args.rows), build_frame(args.rows * 4)
+    openpyxl_memory = peak_memory(write_openpyxl, small)
+    stream_small, stream_large = peak_memory(write_workbook, small), peak_memory(write_workbook, large)
+    print(
+        f"\n内存峰值: openpyxl {args.rows} 行 {openpyxl_memory:.0f}MB；"
+        f"stream {args.rows} 行 {stream_small:.1f}MB，{args.rows * 4} 行 {stream_large:.1f}MB"
+    )
+    if stream_large > stream_small * args.max_growth:
+        print(f"  ❌ 行数增加 4 倍时内存峰值增长超过 {args.max_growth} 倍")
+        failed += 1
+
+    df = build_frame(args.timing_rows)
+    openpyxl_time, stream_time = elapsed(write_openpyxl, df), elapsed(write_workbook, df)
+    speedup = openpyxl_time / stream_time
+    print(f"{args.timing_rows} 行: openpyxl {openpyxl_time:.2f}s, stream {stream_time:.2f}s ({speedup:.1f}x)")
+    if speedup < args.min_speedup:
+        print(f"❌ 加速比低于 {args.min_speedup}x")
+        failed += 1
+
+    if failed:
+        sys.exit(1)
+    print("✅ 通过")
+
+
+if __name__ == "__main__":
+    main()
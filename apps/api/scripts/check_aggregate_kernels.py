@@ -0,0 +1,234 @@
+"""
+向量化聚合函数一致性检查（基于随机生成的性质测试）
+
+functions.py 中的聚合函数有两套实现：
+- 标量实现（SUM / COUNTIF / ...）：参数为 Table.get_column() 的 Python 值列表，作为参照实现
+- 向量化实现（vector_sum / vector_countif / ...）：参数为 Table.get_column_masked() 的列数组
+
+按固定种子随机生成各种类型的列（int / float 含 NaN / 可空 Int64 / 可空布尔 /
+混合类型 object 等）和各种条件（数值、比较字符串、文本、从列中取出的值等），
+逐个比较两套实现的结果（含类型、错误值和抛出的异常），最后在大表上比较耗时。
+
+用法：
+    cd apps/api
+    python scripts/check_aggregate_kernels.py [--cases N] [--seed S] [--rows N] [--min-speedup X]
+
+存在不一致或加速比低于 --min-speedup 时以非零状态码退出。
+"""
+
+import argparse
+import math
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.engine.functions import AGGREGATE_FUNC_MAP, VECTOR_AGGREGATE_FUNC_MAP  # noqa: E402
+from app.engine.models import ExcelError, column_to_list, column_to_masked_array  # noqa: E402
+
+SINGLE_COLUMN_FUNCS = ["SUM", "COUNT", "COUNTA", "AVERAGE", "MIN", "MAX", "MEDIAN"]
+# 浮点求和的累加顺序不同，只要求近似相等
+APPROX_FUNCS = {"SUM", "AVERAGE", "SUMIF", "AVERAGEIF"}
+
+FIXED_CRITERIA = [
+    0, 3, -3, True, False, 2.5, 0.0, -0.0, float("nan"), float("inf"), 2 ** 60,
+    ">=0", "<=2.5", ">3", "<-1", " >= 1 ", ">x", "<", "<>0", "<>abc", "<>", "<> 3", "<>None", "<>nan",
+    "abc", "3", "3.0", "0.0", "-0.0", "True", "False", "None", "nan", "", "1e1", "=3",
+    None, [1],
+]
+
+OBJECT_POOL = [
+    0, 1, 3, -3, 2 ** 60, 2.5, 3.0, 0.0, -0.0, float("nan"), float("inf"),
+    True, False, None, "", "abc", "3", "3.0", "True", "None", "nan", " 3",
+    pd.Timestamp("2024-01-01"), ExcelError("#N/A"),
+]
+
+
+# ==================== 随机数据 ====================
+
+
+def random_series(rng: np.random.Generator, n: int) -> pd.Series:
+    """随机生成一列（覆盖执行引擎中会出现的各种列类型）"""
+    kind = rng.integers(0, 8)
+    nulls = rng.random(n) < 0.2
+    if kind == 0:
+        return pd.Series(rng.integers(-5, 6, n), dtype="int64")
+    if kind == 1:
+        return pd.Series(rng.choice([-(2 ** 60), 2 ** 60, 3, 0], n), dtype="int64")
+    if kind == 2:
+        values = rng.choice([0.0, -0.0, 2.5, 3.0, -1.5, float("inf"), 1e15 + 0.5], n)
+        values[nulls] = np.nan
+        return pd.Series(values, dtype="float64")
+    if kind == 3:
+        return pd.Series(
+            [None if null else int(v) for v, null in zip(rng.integers(-5, 6, n), nulls)], dtype="Int64"
+        )
+    if kind == 4:
+        return pd.Series(
+            [None if null else bool(v) for v, null in zip(rng.integers(0, 2, n), nulls)], dtype="boolean"
+        )
+    if kind == 5:
+        return pd.Series(rng.integers(0, 2, n).astype(bool))
+    if kind == 6:
+        return pd.Series(rng.choice(["abc", "3", "", "True", "x"], n).tolist(), dtype=object)
+    return pd.Series([OBJECT_POOL[i] for i in rng.integers(0, len(OBJECT_POOL), n)], dtype=object)
+
+
+def random_criteria(rng: np.random.Generator, series: pd.Series) -> Any:
+    """随机条件：固定条件池，或取列中某个值（及其文本 / 比较形式）"""
+    values = column_to_list(series)
+    if values and rng.random() < 0.4:
+        value = values[rng.integers(0, len(values))]
+        form = rng.integers(0, 3)
+        if form == 0 and isinstance(value, (int, float, str)):
+            return value
+        if form == 1:
+            return str(value)
+        return f"{rng.choice(['>=', '<=', '<>', '>', '<'])}{value}"
+    return FIXED_CRITERIA[rng.integers(0, len(FIXED_CRITERIA))]
+
+
+# ==================== 比较 ====================
+
+
+def outcome(func: Callable, *args: Any) -> Tuple[str, Any]:
+    """调用函数，返回 ("ok", 结果) 或 ("raise", 异常类型和信息)"""
+    try:
+        return "ok", func(*args)
+    except Exception as e:
+        return "raise", (type(e).__name__, str(e))
+
+
+def same_result(expected: Tuple[str, Any], actual: Tuple[str, Any], approx: bool) -> bool:
+    """按类型和值比较（NaN 视为相等，求和类允许浮点累加误差）"""
+    if expected[0] != actual[0]:
+        return False
+    a, b = expected[1], actual[1]
+    if expected[0] == "raise":
+        return a == b
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, ExcelError):
+        return a.code == b.code
+    if isinstance(a, float):
+        if math.isnan(a) or math.isnan(b):
+            return math.isnan(a) and math.isnan(b)
+        if approx:
+            return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9)
+    return a == b
+
+
+def check_case(name: str, series: List[pd.Series], criteria: Any = None) -> bool:
+    """对一组输入比较标量实现和向量化实现"""
+    scalar_args: List[Any] = [column_to_list(s) for s in series]
+    vector_args: List[Any] = [column_to_masked_array(s) for s in series]
+    if criteria is not None or name in {"SUMIF", "COUNTIF", "AVERAGEIF"}:
+        scalar_args.append(criteria)
+        vector_args.append(criteria)
+
+    expected = outcome(AGGREGATE_FUNC_MAP[name], *scalar_args)
+    actual = outcome(VECTOR_AGGREGATE_FUNC_MAP[name], *vector_args)
+    if same_result(expected, actual, name in APPROX_FUNCS):
+        return True
+
+    print(f"  ❌ {name} 条件={criteria!r}")
+    for s in series:
+        print(f"     列 {s.dtype}: {column_to_list(s)[:12]}")
+    print(f"     标量={expected!r}")
+    print(f"     向量化={actual!r}")
+    return False
+
+
+def run_properties(cases: int, seed: int) -> Tuple[int, int]:
+    """随机性质测试，返回 (检查次数, 不一致次数)"""
+    rng = np.random.default_rng(seed)
+    checked = failed = 0
+    for _ in range(cases):
+        n = int(rng.integers(0, 40))
+        first = random_series(rng, n)
+        # 少量用例使用不同长度的列，检查长度校验
+        second = random_series(rng, n if rng.random() < 0.95 else n + 1)
+
+        for name in SINGLE_COLUMN_FUNCS:
+            checked += 1
+            failed += not check_case(name, [first])
+
+        criteria = random_criteria(rng, second)
+        for name, columns in (("SUMIF", [first, second]), ("COUNTIF", [second]), ("AVERAGEIF", [first, second])):
+            checked += 1
+            failed += not check_case(name, columns, criteria)
+    return checked, failed
+
+
+# ==================== 耗时 ====================
+
+
+def benchmark(rows: int) -> float:
+    """大表上比较两套实现的耗时（含取列），返回加速比"""
+    rng = np.random.default_rng(0)
+    amount = rng.random(rows) * 100
+    amount[rng.random(rows) < 0.1] = np.nan
+    df = pd.DataFrame({
+        "amount": amount,
+        "qty": pd.array([None if i % 11 == 0 else int(v) for i, v in enumerate(rng.integers(0, 50, rows))], dtype="Int64"),
+    })
+    workload = [
+        ("SUM", ["amount"], None),
+        ("AVERAGE", ["qty"], None),
+        ("MEDIAN", ["amount"], None),
+        ("SUMIF", ["amount", "qty"], ">=25"),
+        ("COUNTIF", ["qty"], "<>10"),
+        ("AVERAGEIF", ["amount", "amount"], "<50"),
+    ]
+
+    total_scalar = total_vector = 0.0
+    print(f"\n{'函数':<12}{'标量':>10}{'向量化':>10}{'加速':>8}")
+    for name, columns, criteria in workload:
+        extra = [criteria] if criteria is not None else []
+
+        start = time.perf_counter()
+        AGGREGATE_FUNC_MAP[name](*[column_to_list(df[c]) for c in columns], *extra)
+        scalar_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        VECTOR_AGGREGATE_FUNC_MAP[name](*[column_to_masked_array(df[c]) for c in columns], *extra)
+        vector_time = time.perf_counter() - start
+
+        total_scalar += scalar_time
+        total_vector += vector_time
+        print(
+            f"{name:<12}{scalar_time * 1000:>8.0f}ms{vector_time * 1000:>8.1f}ms"
+            f"{scalar_time / vector_time:>7.0f}x"
+        )
+
+    speedup = total_scalar / total_vector
+    print(f"{rows} 行: 标量 {total_scalar:.2f}s, 向量化 {total_vector:.3f}s ({speedup:.0f}x)")
+    return speedup
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="向量化聚合函数一致性检查")
+    arg_parser.add_argument("--cases", type=int, default=3000, help="随机用例数")
+    arg_parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    arg_parser.add_argument("--rows", type=int, default=1_000_000, help="耗时对比的表行数")
+    arg_parser.add_argument("--min-speedup", type=float, default=10.0, help="要求的最低总加速比")
+    args = arg_parser.parse_args()
+
+    checked, failed = run_properties(args.cases, args.seed)
+    print(f"共 {checked} 次比较, {failed} 次不一致")
+
+    speedup = benchmark(args.rows)
+    if failed or speedup < args.min_speedup:
+        if speedup < args.min_speedup:
+            print(f"❌ 加速比低于 {args.min_speedup}x")
+        sys.exit(1)
+    print("✅ 通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""
+执行资源预算检查
+
+低效的计划（如逐行对整张表做线性扫描的 COUNTIFS）会让执行线程持续计算很久。
+ResourceGovernor（见 app.engine.governor）为一次执行设置时间、内存和求值次数预算并响应取消。
+
+检查：
+- 逐行线性扫描的 COUNTIFS 超出求值次数预算后很快中止，返回结构化的 budget_exceeded 错误，
+  之后的操作不再执行，中止的操作结果不应用到表上
+- 超出时间预算、另一线程取消时同样很快中止
+- 内存预算按本次执行创建的列和 Sheet 计算：超出时中止且该操作结果不应用到表上；
+  同一进程中其他请求占用的内存不计入本次执行
+- 不限制预算时资源检查的额外开销很小
+- 处理流程中执行超出预算时恢复表，带错误信息重新生成，新计划正常执行（process_async 和 process）
+- 处理中途关闭（客户端断开）时执行线程很快停止
+
+用法：
+    cd apps/api
+    python scripts/check_execution_budget.py [--rows N] [--overhead-rows N] [--max-overhead X]
+
+检查失败或不限制预算时的额外开销超过 --max-overhead（默认 0.1）时以非零状态码退出。
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.engine.executor import Executor  # noqa: E402
+from app.engine.governor import ExecutionBudget, ResourceGovernor  # noqa: E402
+from app.engine.models import (  # noqa: E402
+    AddColumnOperation,
+    AggregateOperation,
+    ExcelFile,
+    FileCollection,
+    Operation,
+    Table,
+    enable_copy_on_write,
+)
+from app.engine.operation_cache import get_operation_cache  # noqa: E402
+from app.processor import EventType, ExcelProcessor, ProcessConfig, ProcessResult, ProcessStage  # noqa: E402
+
+# 范围不是纯粹的跨表引用（带多余的键），只能逐行线性扫描
+SLOW_COUNTIFS = {
+    "func": "COUNTIFS",
+    "args": [{"ref": "f.data.key", "note": "线性扫描"}, {"col": "key"}],
+}
+
+
+def build_tables(rows: int) -> FileCollection:
+    rng = np.random.default_rng(0)
+    excel_file = ExcelFile(file_id="f", filename="data.xlsx")
+    excel_file.add_sheet(Table(name="data", data=pd.DataFrame({
+        "key": rng.integers(0, 1000, rows),
+        "amount": rng.random(rows) * 100,
+    })))
+    tables = FileCollection()
+    tables.add_file(excel_file)
+    return tables
+
+
+def slow_plan() -> List[Operation]:
+    return [
+        AddColumnOperation(file_id="f", table="data", name="count", formula=SLOW_COUNTIFS),
+        AggregateOperation(function="SUM", file_id="f", table="data", column="amount", as_var="total"),
+    ]
+
+
+def run_aborted(rows: int, governor: ResourceGovernor, expected: dict, cancel_after: Optional[float] = None) -> int:
+    """执行逐行线性扫描的计划，应在 2 秒内按 expected 中止"""
+    tables = build_tables(rows)
+    if cancel_after is not None:
+        threading.Timer(cancel_after, governor.cancel).start()
+    start = time.perf_counter()
+    result = Executor(tables, governor=governor).execute(slow_plan())
+    elapsed = time.perf_counter() - start
+
+    aborted = result.aborted or {}
+    failed = [key for key, value in expected.items() if aborted.get(key) != value]
+    name = expected.get("resource", expected["code"])
+    print(f"{name}: {elapsed * 1000:.0f}ms 后中止，{result.resource_usage}")
+    if failed:
+        print(f"  ❌ 中止原因不正确: {aborted}")
+        return 1
+    if elapsed > 2.0:
+        print("  ❌ 没有及时中止")
+        return 1
+    second = result.operation_results[1]
+    if second.error_detail is None or "total" in result.variables:
+        print(f"  ❌ 中止后的操作仍被执行: {second}")
+        return 1
+    if "count" in tables.get_table("f", "data").get_columns():
+        print("  ❌ 中止的操作结果被应用到表上")
+        return 1
+    return 0
+
+
+def text_plan() -> List[Operation]:
+    """三个文本新增列（每列约 rows × 70 字节）"""
+    formula = {"op": "&", "left": {"col": "key"}, "right": {"op": "&", "left": {"value": "-"}, "right": {"col": "amount"}}}
+    return [AddColumnOperation(file_id="f", table="data", name=f"label{i}", formula=formula) for i in range(3)]
+
+
+def check_memory(rows: int) -> int:
+    """内存预算只计入本次执行创建的数据"""
+    failed = 0
+
+    # 预算只够两个文本列：第三个新增列应用前中止
+    tables = build_tables(rows)
+    probe = Executor(build_tables(rows)).execute(text_plan()[:1])
+    column_bytes = probe.resource_usage["memory_mb"] * 1024 ** 2
+    governor = ResourceGovernor(ExecutionBudget(max_memory_bytes=int(column_bytes * 2.5)))
+    result = Executor(tables, max_workers=1, governor=governor).execute(text_plan())
+    aborted = result.aborted or {}
+    print(f"memory: 每列约 {column_bytes / 1024 ** 2:.1f}MB，{result.resource_usage}")
+    if (aborted.get("resource"), aborted.get("operation")) != ("memory", 3):
+        print(f"  ❌ 中止原因不正确: {aborted}")
+        failed += 1
+    if tables.get_table("f", "data").get_columns() != ["key", "amount", "label0", "label1"]:
+        print("  ❌ 超出内存预算的操作结果被应用到表上")
+        failed += 1
+
+    # 执行期间同一进程中另外占用的内存（如并发的请求）不计入
+    tables = build_tables(rows)
+    governor = ResourceGovernor(ExecutionBudget(max_memory_bytes=int(column_bytes * 4)))
+    governor.start()
+    ballast = np.ones(256 * 1024 ** 2 // 8)
+    result = Executor(tables, governor=governor).execute(text_plan())
+    del ballast
+    print(f"执行期间另外占用 256MB: {result.resource_usage}")
+    if result.aborted is not None or result.errors:
+        print(f"  ❌ 其他内存被计入本次执行: {result.aborted or result.errors}")
+        failed += 1
+    return failed
+
+
+class _UnlimitedGovernor(ResourceGovernor):
+    """对照：不做任何计数和检查"""
+
+    def charge(self, evaluations: int):
+        pass
+
+    def check(self):
+        pass
+
+    def charge_memory(self, nbytes: int):
+        pass
+
+
+def check_overhead(rows: int, max_overhead: float) -> int:
+    """不限制预算时，向量化公式计划的额外开销"""
+    formula = {
+        "func": "IF",
+        "args": [
+            {"op": ">", "left": {"col": "amount"}, "right": {"value": 50}},
+            {"func": "ROUND", "args": [{"op": "*", "left": {"col": "amount"}, "right": {"value": 1.1}}, {"value": 2}]},
+            {"op": "-", "left": {"col": "amount"}, "right": {"col": "key"}},
+        ],
+    }
+    plan = [
+        AddColumnOperation(file_id="f", table="data", name=f"c{i}", formula=formula)
+        for i in range(5)
+    ]
+
+    def best(governor_type) -> float:
+        times = []
+        for _ in range(3):
+            tables = build_tables(rows)
+            start = time.perf_counter()
+            Executor(tables, max_workers=1, optimize=False, governor=governor_type()).execute(plan)
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    baseline = best(_UnlimitedGovernor)
+    governed = best(ResourceGovernor)
+    overhead = governed / baseline - 1
+    print(f"{rows} 行 × 5 个公式: 无检查 {baseline * 1000:.0f}ms，资源检查 {governed * 1000:.0f}ms（{overhead:+.1%}）")
+    if overhead > max_overhead:
+        print(f"  ❌ 额外开销超过 {max_overhead:.0%}")
+        return 1
+    return 0
+
+
+class ScriptedLLM:
+    """按顺序返回预先写好的计划，记录每次收到的错误信息"""
+
+    def __init__(self, plans: List[dict]):
+        self.plans = plans
+        self.previous_errors: List[Optional[List[str]]] = []
+
+    def generate_operations(self, user_requirement, analysis_result, table_schemas=None,
+                            previous_errors=None, previous_json=None) -> str:
+        self.previous_errors.append(previous_errors)
+        return json.dumps(self.plans[min(len(self.previous_errors), len(self.plans)) - 1], ensure_ascii=False)
+
+    async def generate_operations_async(self, *args, **kwargs) -> str:
+        return self.generate_operations(*args, **kwargs)
+
+
+def check_retry(rows: int, use_async: bool) -> int:
+    """执行超出预算时恢复表并带错误信息重新生成（process_async 和同步的 process 共用同一个状态机）"""
+    get_operation_cache().clear()
+    wasteful = {"operations": [
+        {"type": "add_column", "file_id": "f", "table": "data", "name": "double",
+         "formula": {"op": "*", "left": {"col": "amount"}, "right": {"value": 2}}},
+        {"type": "add_column", "file_id": "f", "table": "data", "name": "count", "formula": SLOW_COUNTIFS},
+    ]}
+    efficient = {"operations": [
+        {"type": "group_by", "file_id": "f", "table": "data", "group_columns": ["key"],
+         "aggregations": [{"column": "amount", "function": "count", "as": "count"}],
+         "output": {"type": "new_sheet", "name": "按键计数"}},
+    ]}
+    llm = ScriptedLLM([wasteful, efficient])
+    tables = build_tables(rows)
+    config = ProcessConfig(budget=ExecutionBudget(max_row_evaluations=rows * 20), speculative_execution=False)
+
+    async def run() -> tuple:
+        result = ProcessResult()
+        events = []
+        async for event in ExcelProcessor(llm).process_async(tables, "按键计数", config, result):
+            events.append(event)
+        return result, events
+
+    start = time.perf_counter()
+    if use_async:
+        result, events = asyncio.run(run())
+    else:
+        events, result = ExcelProcessor(llm).process_with_events(tables, "按键计数", config)
+    elapsed = time.perf_counter() - start
+    excel_file = tables.get_file("f")
+    retried = [
+        event for event in events
+        if event.stage == ProcessStage.EXECUTE and event.event_type == EventType.STAGE_DONE
+        and (event.output or {}).get("retrying")
+    ]
+    checks = {
+        "重新生成一次": len(llm.previous_errors) == 2 and llm.previous_errors[0] is None,
+        "错误信息反馈给 LLM": bool(llm.previous_errors[-1]) and "计算量超限" in llm.previous_errors[-1][0],
+        "重试事件": len(retried) == 1 and retried[0].output["aborted"]["operation"] == 2,
+        "新计划执行成功": not result.errors and excel_file.has_sheet("按键计数"),
+        "恢复执行前的表": excel_file.get_sheet("data").get_columns() == ["key", "amount"],
+    }
+    failed = [name for name, ok in checks.items() if not ok]
+    mode = "process_async" if use_async else "process"
+    print(f"超出预算后重新生成（{mode}）: {elapsed * 1000:.0f}ms，{len(llm.previous_errors)} 次生成")
+    if failed:
+        print(f"  ❌ {failed}: {result.errors}")
+        return 1
+    return 0
+
+
+def check_disconnect(rows: int) -> int:
+    """处理中途关闭（客户端断开）后执行线程很快停止"""
+    get_operation_cache().clear()
+    llm = ScriptedLLM([{"operations": [
+        {"type": "add_column", "file_id": "f", "table": "data", "name": "count", "formula": SLOW_COUNTIFS},
+    ]}])
+    tables = build_tables(rows)
+    config = ProcessConfig(budget=ExecutionBudget(), speculative_execution=False)
+
+    async def run() -> float:
+        events = ExcelProcessor(llm).process_async(tables, "计数", config)
+        async for event in events:
+            if event.stage == ProcessStage.EXECUTE and event.event_type == EventType.STAGE_START:
+                break
+        await asyncio.sleep(0.2)
+        await events.aclose()
+        start = time.perf_counter()
+        # 等待线程池中的执行结束
+        await asyncio.get_running_loop().shutdown_default_executor()
+        return time.perf_counter() - start
+
+    elapsed = asyncio.run(run())
+    print(f"处理中途关闭后 {elapsed * 1000:.0f}ms 执行线程停止")
+    if elapsed > 1.0:
+        print("  ❌ 断开后执行线程没有及时停止")
+        return 1
+    return 0
+
+
+def main():
+    enable_copy_on_write()
+    arg_parser = argparse.ArgumentParser(description="执行资源预算检查")
+    arg_parser.add_argument("--rows", type=int, default=20_000, help="逐行线性扫描的表的行数")
+    arg_parser.add_argument("--overhead-rows", type=int, default=1_000_000, help="比较额外开销的表的行数")
+    arg_parser.add_argument("--max-overhead", type=float, default=0.1, help="不限制预算时允许的额外开销")
+    args = arg_parser.parse_args()
+    failed = 0
+
+    rows = args.rows
+    failed += run_aborted(
+        rows,
+        ResourceGovernor(ExecutionBudget(max_row_evaluations=rows * 50)),
+        {"code": "budget_exceeded", "resource": "row_evaluations", "operation": 1},
+    )
+    failed += run_aborted(
+        rows,
+        ResourceGovernor(ExecutionBudget(max_seconds=0.5)),
+        {"code": "budget_exceeded", "resource": "time", "operation": 1},
+    )
+    failed += run_aborted(rows, ResourceGovernor(), {"code": "cancelled", "operation": 1}, cancel_after=0.3)
+    failed += check_memory(rows)
+    failed += check_overhead(args.overhead_rows, args.max_overhead)
+    failed += check_retry(rows, use_async=True)
+    failed += check_retry(rows, use_async=False)
+    failed += check_disconnect(rows)
+
+    if failed:
+        sys.exit(1)
+    print("✅ 通过")
+
+
+if __name__ == "__main__":
+    main()
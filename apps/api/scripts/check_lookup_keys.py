@@ -0,0 +1,78 @@
+"""
+查找键匹配规则检查
+
+VLOOKUP 哈希索引和 COUNTIFS 计数表的键匹配必须与 "=" 运算符一致：
+用一组容易混淆的取值（1 / 1.0 / "1" / " 1" / "1_000" / "1e3" / True / None / NaN / 日期等）
+构造查找表，对每个查找值检查
+
+- VLOOKUP 返回第一个 "=" 为 TRUE 的行，没有时返回 #N/A
+- COUNTIFS 的计数等于 "=" 为 TRUE 的行数
+
+用法：
+    cd apps/api
+    python scripts/check_lookup_keys.py
+
+存在不一致时以非零状态码退出。
+"""
+
+import sys
+from pathlib import Path
+from typing import Any, Dict
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.engine.executor import FormulaEvaluator  # noqa: E402
+from app.engine.functions import ROW_FUNC_MAP  # noqa: E402
+from app.engine.models import ExcelError, ExcelFile, FileCollection, Table  # noqa: E402
+
+KEYS = [
+    1, 1.0, "1", " 1", "1_000", 1000, "1e3", "1000", True, False, 0, -0.0, "0", "",
+    None, float("nan"), "NaN", "abc", "ABC", 2.5, "2.5",
+    pd.Timestamp("2024-01-01"), "2024-01-01",
+]
+
+
+def val(value: Any) -> Dict:
+    return {"value": value}
+
+
+def main():
+    collection = FileCollection()
+    excel_file = ExcelFile(file_id="lookup", filename="lookup.xlsx")
+    data = pd.DataFrame({
+        "键": pd.Series(KEYS, dtype=object),
+        "行": range(len(KEYS)),
+    })
+    excel_file.add_sheet(Table(name="表", data=data))
+    collection.add_file(excel_file)
+
+    evaluator = FormulaEvaluator(collection, ROW_FUNC_MAP)
+    keys = collection.get_table("lookup", "表").get_column("键")
+    failed = 0
+    for lookup in KEYS:
+        matches = [
+            row for row, key in enumerate(keys)
+            if evaluator.evaluate({"op": "=", "left": val(key), "right": val(lookup)}) is True
+        ]
+        expected_row = matches[0] if matches else "#N/A"
+        found = evaluator.evaluate({"func": "VLOOKUP", "args": [val(lookup), val("lookup.表"), val("键"), val("行")]})
+        found = str(found) if isinstance(found, ExcelError) else found
+        count = evaluator.evaluate({"func": "COUNTIFS", "args": [{"ref": "lookup.表.键"}, val(lookup)]})
+
+        if found != expected_row or count != len(matches):
+            failed += 1
+            print(
+                f"  ❌ {lookup!r}: VLOOKUP {found!r}（应为 {expected_row!r}），"
+                f"COUNTIFS {count}（应为 {len(matches)}）"
+            )
+
+    print(f"{len(KEYS)} 个查找值, {failed} 个与 \"=\" 不一致")
+    if failed:
+        sys.exit(1)
+    print("✅ 通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+多操作执行的内存峰值检查
+
+构造一张较大的表，执行一个包含 10 个操作的典型计划（聚合、新增列、更新列、
+筛选、排序、取行、选择列、删除列、分组、复制 Sheet），用 tracemalloc 记录
+执行期间的内存峰值（相对表本身大小的倍数）。
+
+--compare 时额外以“每次 get_data() 深拷贝”的旧行为执行一次作为对照。
+
+用法：
+    cd apps/api
+    python scripts/check_memory_high_water.py [--rows N] [--max-ratio R] [--compare]
+
+峰值超过 --max-ratio 倍表大小时以非零状态码退出。
+"""
+
+import argparse
+import sys
+import tracemalloc
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.engine.executor import Executor  # noqa: E402
+from app.engine.models import (  # noqa: E402
+    AddColumnOperation,
+    AggregateOperation,
+    CreateSheetOperation,
+    DropColumnsOperation,
+    ExcelFile,
+    FileCollection,
+    FilterOperation,
+    GroupByOperation,
+    Operation,
+    SelectColumnsOperation,
+    SortOperation,
+    Table,
+    TakeOperation,
+    UpdateColumnOperation,
+    enable_copy_on_write,
+)
+
+
+def build_collection(rows: int) -> FileCollection:
+    """构造测试数据：以数值列为主，外加一个低基数文本列"""
+    rng = np.random.default_rng(0)
+    data = {f"n{i}": rng.random(rows) * 100 for i in range(12)}
+    data["id"] = np.arange(rows)
+    data["group"] = rng.choice(["a", "b", "c", "d"], rows)
+    excel_file = ExcelFile(file_id="f", filename="big.xlsx")
+    excel_file.add_sheet(Table(name="data", data=pd.DataFrame(data)))
+    collection = FileCollection()
+    collection.add_file(excel_file)
+    return collection
+
+
+def build_plan() -> List[Operation]:
+    """10 个操作的典型计划（读多写少）"""
+    new_sheet = lambda name: {"type": "new_sheet", "name": name}  # noqa: E731
+    return [
+        AggregateOperation(function="SUM", file_id="f", table="data", column="n0", as_var="total"),
+        AddColumnOperation(
+            file_id="f", table="data", name="ratio",
+            formula={"op": "/", "left": {"col": "n1"}, "right": {"var": "total"}},
+        ),
+        UpdateColumnOperation(
+            file_id="f", table="data", column="n2",
+            formula={"func": "ROUND", "args": [{"col": "n2"}, {"value": 1}]},
+        ),
+        FilterOperation(
+            file_id="f", table="data",
+            conditions=[{"column": "n3", "op": ">", "value": 99}],
+            output=new_sheet("filtered"),
+        ),
+        SortOperation(
+            file_id="f", table="data", by=[{"column": "n4", "order": "desc"}],
+            output=new_sheet("sorted"),
+        ),
+        TakeOperation(file_id="f", table="data", rows=100, output=new_sheet("top")),
+        SelectColumnsOperation(file_id="f", table="data", columns=["id", "n5"], output=new_sheet("selected")),
+        DropColumnsOperation(file_id="f", table="data", columns=["n6", "n7"], output=new_sheet("dropped")),
+        GroupByOperation(
+            file_id="f", table="data", group_columns=["group"],
+            aggregations=[{"column": "n8", "function": "sum", "as": "n8_sum"}],
+            output=new_sheet("grouped"),
+        ),
+        CreateSheetOperation(file_id="f", name="copied", source={"type": "copy", "table": "data"}),
+    ]
+
+
+def measure(rows: int) -> Tuple[float, int]:
+    """执行计划，返回 (内存峰值相对表大小的倍数, 表大小)"""
+    collection = build_collection(rows)
+    table_bytes = collection.get_table("f", "data").get_data().memory_usage(deep=True).sum()
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline, _ = tracemalloc.get_traced_memory()
+    result = Executor(collection).execute(build_plan())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    if result.errors:
+        print(f"⚠️ 执行错误: {result.errors}")
+    return (peak - baseline) / table_bytes, table_bytes
+
+
+def main():
+    enable_copy_on_write()
+    arg_parser = argparse.ArgumentParser(description="多操作执行的内存峰值检查")
+    arg_parser.add_argument("--rows", type=int, default=200_000, help="测试表行数")
+    arg_parser.add_argument("--max-ratio", type=float, default=2.5, help="允许的峰值 / 表大小倍数")
+    arg_parser.add_argument("--compare", action="store_true", help="对照旧的深拷贝行为")
+    args = arg_parser.parse_args()
+
+    ratio, table_bytes = measure(args.rows)
+    print(f"表大小 {table_bytes / 1024 ** 2:.1f}MB, 执行峰值 {ratio:.2f}x (Copy-on-Write 快照)")
+
+    if args.compare:
+        cow_get_data = Table.get_data
+        Table.get_data = lambda self: self._data.copy(deep=True)
+        try:
+            legacy_ratio, _ = measure(args.rows)
+        finally:
+            Table.get_data = cow_get_data
+        print(f"对照: 执行峰值 {legacy_ratio:.2f}x (每次 get_data() 深拷贝)")
+
+    if ratio > args.max_ratio:
+        print(f"❌ 峰值超过 {args.max_ratio}x")
+        sys.exit(1)
+    print("✅ 通过")
+
+
+if __name__ == "__main__":
+    main()
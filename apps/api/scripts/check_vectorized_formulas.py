@@ -0,0 +1,205 @@
+"""
+向量化公式一致性检查
+
+对 fixtures/ 下的所有数据集，按列类型生成一组 add_column 公式，
+分别用逐行解释（FormulaEvaluator.evaluate，不经过行级编译器，见 formula_reference）和
+向量化编译器（VectorizedFormula）求值，逐行比较结果值（含类型）和行级错误信息，并输出两种方式的耗时。
+
+用法：
+    cd apps/api
+    python scripts/check_vectorized_formulas.py [--limit-files N]
+
+存在不一致时以非零状态码退出。
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from formula_reference import interpret_rows, same_value  # noqa: E402
+from app.engine.excel_parser import ExcelParser  # noqa: E402
+from app.engine.executor import FormulaEvaluator  # noqa: E402
+from app.engine.functions import ROW_FUNC_MAP  # noqa: E402
+from app.engine.models import FileCollection, Table, enable_copy_on_write  # noqa: E402
+from app.engine.vectorizer import VectorizedFormula  # noqa: E402
+
+FIXTURES_DIR = Path(__file__).resolve().parents[3] / "fixtures"
+
+VARIABLES = {"threshold": 10, "label": "x"}
+
+
+def col(name: str) -> Dict:
+    return {"col": name}
+
+
+def val(value: Any) -> Dict:
+    return {"value": value}
+
+
+def op(operator: str, left: Dict, right: Dict) -> Dict:
+    return {"op": operator, "left": left, "right": right}
+
+
+def func(name: str, *args: Dict) -> Dict:
+    return {"func": name, "args": list(args)}
+
+
+def classify_columns(table: Table) -> Tuple[List[str], List[str]]:
+    """按样本值把列分为数值列和文本列"""
+    numeric, text = [], []
+    for name in table.get_columns():
+        values = [v for v in table.get_column(name)[:200] if v is not None]
+        if not values:
+            continue
+        if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+            numeric.append(name)
+        elif any(isinstance(v, str) for v in values):
+            text.append(name)
+    return numeric, text
+
+
+def build_formulas(file_id: str, table: Table) -> List[Dict]:
+    """根据表结构生成测试公式"""
+    numeric, text = classify_columns(table)
+    columns = table.get_columns()
+    any_col = columns[0]
+    formulas: List[Dict] = [
+        # 未知列 / 变量、常量
+        col("__missing__"),
+        op("+", col(any_col), {"var": "__missing__"}),
+        op("*", {"var": "threshold"}, val(2)),
+        func("IF", val(True), col(any_col), col("__missing__")),
+    ]
+
+    for a in columns[:6]:
+        formulas += [
+            op("+", col(a), val(1)),
+            op("=", col(a), val("")),
+            op("<>", col(a), val(0)),
+            op(">", col(a), val("M")),
+            op("&", col(a), {"var": "label"}),
+            func("ISBLANK", col(a)),
+            func("ISNUMBER", col(a)),
+            func("IFERROR", op("/", val(100), col(a)), val(-1)),
+        ]
+
+    for a, b in zip(numeric, numeric[1:] + numeric[:1]):
+        formulas += [
+            op("+", col(a), col(b)),
+            op("-", col(a), col(b)),
+            op("*", col(a), val(1.5)),
+            op("/", col(a), col(b)),
+            op("/", col(a), val(0)),
+            op(">=", col(a), col(b)),
+            op("<", col(a), {"var": "threshold"}),
+            func("IF", op(">", col(a), {"var": "threshold"}), val("high"), val("low")),
+            func("IF", func("ISBLANK", col(a)), val(0), col(a)),
+            func("IF", col(a), op("*", col(a), val(2)), op("-", col(b), val(1))),
+            func("ROUND", op("/", col(a), val(3)), val(2)),
+            func("ABS", op("-", col(a), val(10))),
+            func("IFERROR", op("/", col(a), col(b)), val(0)),
+            func("AND", op(">", col(a), val(0)), op("<", col(b), val(100))),
+            func("OR", func("ISBLANK", col(a)), op("=", col(b), val(1))),
+            func("MAX", col(a), col(b)),
+            func("ROUND", col(a), val(0)),
+        ]
+
+    for t in text:
+        formulas += [
+            func("LEFT", col(t), val(3)),
+            func("LEN", col(t)),
+            func("UPPER", col(t)),
+            op("&", op("&", col(t), val("-")), col(columns[-1])),
+            func("IF", op("=", col(t), val("male")), val(1), val(0)),
+            op("+", col(t), val(1)),
+            op("<=", col(t), val(50)),
+        ]
+
+    sheet_ref = f"{file_id}.{table.name}"
+    for key in (text[:1] + numeric[:1]):
+        formulas += [
+            func("VLOOKUP", col(key), val(sheet_ref), val(key), val(columns[-1])),
+            func("VLOOKUP", op("&", col(key), val("")), val(sheet_ref), val(key), val(columns[0])),
+            func("VLOOKUP", col(key), val(sheet_ref), val("__missing__"), val(columns[0])),
+            func("COUNTIFS", {"ref": f"{sheet_ref}.{key}"}, col(key)),
+            func("COUNTIFS", {"ref": f"{sheet_ref}.{key}"}, col(key), {"ref": f"{sheet_ref}.{columns[-1]}"}, col(columns[-1])),
+            func("COUNTIFS", {"ref": f"{sheet_ref}.{key}"}, val(1)),
+            func("COUNTIFS", {"ref": f"{sheet_ref}.__missing__"}, col(key)),
+            op(">", func("COUNTIFS", {"ref": f"{sheet_ref}.{key}"}, col(key)), val(1)),
+        ]
+
+    return formulas
+
+
+def check_table(collection: FileCollection, file_id: str, table: Table) -> Tuple[int, int, float, float]:
+    """检查一张表，返回 (公式数, 不一致数, 逐行耗时, 向量化耗时)"""
+    variables = dict(VARIABLES)
+    mismatches = 0
+    row_time = vector_time = 0.0
+    formulas = build_formulas(file_id, table)
+
+    for formula in formulas:
+        evaluator = FormulaEvaluator(collection, ROW_FUNC_MAP, variables=variables)
+        start = time.perf_counter()
+        expected, expected_errors = interpret_rows(table, formula, evaluator)
+        row_time += time.perf_counter() - start
+
+        evaluator = FormulaEvaluator(collection, ROW_FUNC_MAP, variables=variables)
+        start = time.perf_counter()
+        actual, actual_errors = VectorizedFormula(formula, table, evaluator).evaluate()
+        vector_time += time.perf_counter() - start
+
+        bad_rows = [
+            i for i, (a, b) in enumerate(zip(expected, actual)) if not same_value(a, b)
+        ]
+        if len(expected) != len(actual) or bad_rows or expected_errors != actual_errors:
+            mismatches += 1
+            print(f"  ❌ {table.name}: {formula}")
+            for i in bad_rows[:3]:
+                print(f"     行 {i + 2}: 逐行={expected[i]!r} 向量化={actual[i]!r}")
+            if expected_errors != actual_errors:
+                print(f"     错误信息不一致: {expected_errors[:2]} vs {actual_errors[:2]}")
+
+    return len(formulas), mismatches, row_time, vector_time
+
+
+def main():
+    enable_copy_on_write()
+    arg_parser = argparse.ArgumentParser(description="向量化公式一致性检查")
+    arg_parser.add_argument("--limit-files", type=int, default=None, help="最多检查的文件数")
+    args = arg_parser.parse_args()
+
+    files = sorted(FIXTURES_DIR.glob("*/datasets/*.xlsx"))[: args.limit_files]
+    total = failed = 0
+    total_row_time = total_vector_time = 0.0
+
+    for index, path in enumerate(files):
+        file_id = f"file{index}"
+        collection = ExcelParser.parse_file_all_sheets(path, file_id=file_id)
+        excel_file = collection.get_file(file_id)
+        for sheet_name in excel_file.get_sheet_names():
+            table = excel_file.get_sheet(sheet_name)
+            count, mismatches, row_time, vector_time = check_table(collection, file_id, table)
+            total += count
+            failed += mismatches
+            total_row_time += row_time
+            total_vector_time += vector_time
+            print(
+                f"{path.name} / {table.name}: {table.row_count()} 行, {count} 个公式, "
+                f"逐行 {row_time:.2f}s, 向量化 {vector_time:.2f}s"
+            )
+
+    speedup = total_row_time / total_vector_time if total_vector_time else float("inf")
+    print(
+        f"\n共 {total} 个公式, {failed} 个不一致; "
+        f"逐行 {total_row_time:.2f}s, 向量化 {total_vector_time:.2f}s ({speedup:.1f}x)"
+    )
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+工作簿探测一致性检查
+
+对 fixtures 中的每个工作簿（以及一个包含空表头、重复表头、数字表头和空 sheet 的生成工作簿），
+比较 probe_workbook 只读元数据得到的结果与完整解析（ExcelParser.parse_workbook_bytes）的结果：
+- sheet 名称和顺序、列数、列名必须一致
+- 估算行数不能少于实际行数（dimension 可能包含末尾的空行）
+
+输出每个文件的探测耗时和完整解析耗时。
+
+用法：
+    cd apps/api
+    python scripts/check_workbook_probe.py [--limit-files N] [--max-ms X]
+
+存在不一致或单个文件探测耗时超过 --max-ms 时以非零状态码退出。
+"""
+
+import argparse
+import io
+import sys
+import time
+from pathlib import Path
+
+from openpyxl import Workbook
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.engine.excel_parser import ExcelParser  # noqa: E402
+from app.engine.workbook_probe import probe_workbook  # noqa: E402
+
+FIXTURES_DIR = Path(__file__).resolve().parents[3] / "fixtures"
+
+
+def generated_workbook() -> bytes:
+    """生成一个表头不规则的工作簿"""
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = "不规则表头"
+    sheet.append(["名称", None, "名称", 2024, " 金额 ", "名称.1", True])
+    for i in range(50):
+        sheet.append([f"a{i}", i, i * 2, i * 1.5, None, "x", False])
+    workbook.create_sheet("空表")
+    other = workbook.create_sheet("数据")
+    other.append(["日期", "值"])
+    other.append(["2024-01-01", 1])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def check(name: str, data: bytes, max_ms: float) -> bool:
+    """比较一个工作簿的探测结果和完整解析结果"""
+    start = time.perf_counter()
+    probes = probe_workbook(data)
+    probe_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    sheets = ExcelParser.parse_workbook_bytes(data, parallel=False)
+    parse_ms = (time.perf_counter() - start) * 1000
+    print(f"{name:<28}{probe_ms:>8.1f}ms{parse_ms:>10.0f}ms")
+
+    ok = True
+    if [probe.name for probe in probes] != [sheet_name for sheet_name, _ in sheets]:
+        print(f"  ❌ sheet 不一致: {[p.name for p in probes]} != {[n for n, _ in sheets]}")
+        return False
+    for probe, (sheet_name, df) in zip(probes, sheets):
+        columns = [str(c) for c in df.columns]
+        if probe.columns != columns or probe.column_count != len(columns):
+            print(f"  ❌ {sheet_name} 列不一致: {probe.columns} != {columns}")
+            ok = False
+        if probe.row_count is not None and probe.row_count < len(df):
+            print(f"  ❌ {sheet_name} 估算行数 {probe.row_count} 少于实际行数 {len(df)}")
+            ok = False
+    if probe_ms > max_ms:
+        print(f"  ❌ 探测耗时超过 {max_ms}ms")
+        ok = False
+    return ok
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="工作簿探测一致性检查")
+    arg_parser.add_argument("--limit-files", type=int, default=None, help="最多测试的文件数")
+    arg_parser.add_argument("--max-ms", type=float, default=1000.0, help="单个文件探测耗时上限（毫秒）")
+    args = arg_parser.parse_args()
+
+    cases = [("(生成) 不规则表头.xlsx", generated_workbook())]
+    cases += [(path.name, path.read_bytes()) for path in sorted(FIXTURES_DIR.glob("*/datasets/*.xlsx"))[: args.limit_files]]
+
+    print(f"{'文件':<28}{'探测':>10}{'完整解析':>12}")
+    failed = sum(not check(name, data, args.max_ms) for name, data in cases)
+
+    print(f"\n{len(cases)} 个文件, {failed} 个不一致")
+    if failed:
+        sys.exit(1)
+    print("✅ 通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+公式求值的参照实现（供一致性检查和基准脚本使用）
+
+- interpret_rows: 逐行调用 FormulaEvaluator.evaluate 递归解释（每行构建包含所有列的行上下文），
+  不经过行级编译器和向量化编译器，作为两者的参照
+- same_value: 按值和类型比较两个求值结果
+
+用法（在脚本中）：
+    from formula_reference import interpret_rows, same_value
+    expected, expected_errors = interpret_rows(table, formula, evaluator)
+"""
+
+import math
+from typing import Any, List, Tuple
+
+from app.engine.executor import FormulaEvaluator
+from app.engine.models import ExcelError, Table
+
+
+def interpret_rows(table: Table, formula: Any, evaluator: FormulaEvaluator) -> Tuple[List[Any], List[str]]:
+    """逐行解释求值，返回 (每行的值, 行级错误信息)；错误格式与 Executor 一致"""
+    columns = table.get_columns()
+    column_cache = {col_name: table.get_column(col_name) for col_name in columns}
+    values, errors = [], []
+    for row_idx in range(table.row_count()):
+        evaluator.set_row_context({col_name: column_cache[col_name][row_idx] for col_name in columns})
+        try:
+            values.append(evaluator.evaluate(formula))
+        except Exception as e:
+            values.append(ExcelError("#ERROR"))
+            errors.append(f"行 {row_idx + 2}: {str(e)}")
+    return values, errors
+
+
+def same_value(a: Any, b: Any) -> bool:
+    """按值和类型比较（NaN 视为相等）"""
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, float) and math.isnan(a) and math.isnan(b):
+        return True
+    if isinstance(a, ExcelError):
+        return a.code == b.code
+    return a == b
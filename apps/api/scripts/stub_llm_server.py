@@ -0,0 +1,160 @@
+"""
+模拟 LLM 服务（供基准脚本使用）
+
+在子进程中运行，兼容 OpenAI POST /v1/chat/completions：
+- stream=true：等待 first_token 秒后按 interval 间隔逐个输出 token（SSE，chunked 编码）
+- stream=false：等待 first_token 秒后返回完整内容
+支持 HTTP keep-alive；GET /stats 返回处理过模型请求的连接数和已处理的请求数（不含 /stats 本身）。
+
+用法（在基准脚本中）：
+    server = StubLLMServer(content, tokens=100, interval=0.01, first_token=0.5)
+    base_url = server.start()
+    ...
+    server.stats()  # {"connections": 3, "requests": 50}
+    server.stop()
+"""
+
+import asyncio
+import json
+import multiprocessing
+import urllib.request
+from typing import Dict, List
+
+
+def split_tokens(content: str, count: int, size: int = 4) -> List[str]:
+    """内容切分成 token，不足 count 个时在前面补换行"""
+    pieces = [content[i:i + size] for i in range(0, len(content), size)]
+    return ["\n"] * max(count - len(pieces), 0) + pieces
+
+
+def _chunk(content, finish_reason=None) -> bytes:
+    """一个流式响应块（SSE）"""
+    delta = {"content": content} if content is not None else {}
+    payload = {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": "stub",
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode()
+
+
+def _completion(content: str) -> bytes:
+    """非流式响应"""
+    return json.dumps({
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "stub",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }, ensure_ascii=False).encode()
+
+
+async def _serve(connection, content: str, tokens: int, interval: float, first_token: float):
+    stream = split_tokens(content, tokens)
+    counts = {"connections": 0, "requests": 0}
+
+    async def respond(writer, body: bytes, content_type: str = "application/json"):
+        writer.write(
+            f"HTTP/1.1 200 OK\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n\r\n".encode()
+            + body
+        )
+        await writer.drain()
+
+    async def send_chunk(writer, data: bytes):
+        writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        await writer.drain()
+
+    async def handle(reader, writer):
+        counted = False
+        try:
+            while True:
+                try:
+                    header = await reader.readuntil(b"\r\n\r\n")
+                except asyncio.IncompleteReadError:
+                    break
+                lines = header.decode("latin-1").split("\r\n")
+                method, path = lines[0].split(" ")[:2]
+                headers = {
+                    name.strip().lower(): value.strip()
+                    for name, _, value in (line.partition(":") for line in lines[1:] if line)
+                }
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                if method == "GET" and path == "/stats":
+                    await respond(writer, json.dumps(counts).encode())
+                    continue
+
+                if not counted:
+                    counted = True
+                    counts["connections"] += 1
+                counts["requests"] += 1
+                request = json.loads(body or b"{}")
+                await asyncio.sleep(first_token)
+                if request.get("stream"):
+                    writer.write(
+                        b"HTTP/1.1 200 OK\r\n"
+                        b"Content-Type: text/event-stream\r\n"
+                        b"Transfer-Encoding: chunked\r\n\r\n"
+                    )
+                    for token in stream:
+                        await send_chunk(writer, _chunk(token))
+                        await asyncio.sleep(interval)
+                    await send_chunk(writer, _chunk(None, "stop") + b"data: [DONE]\n\n")
+                    writer.write(b"0\r\n\r\n")
+                    await writer.drain()
+                else:
+                    await respond(writer, _completion(content))
+
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0, backlog=1024)
+    connection.send(server.sockets[0].getsockname()[1])
+    async with server:
+        await server.serve_forever()
+
+
+def _run(connection, content: str, tokens: int, interval: float, first_token: float):
+    asyncio.run(_serve(connection, content, tokens, interval, first_token))
+
+
+class StubLLMServer:
+    """
+    在子进程中运行的模拟 LLM 服务
+
+    Args:
+        content: 响应内容
+        tokens: 流式响应的 token 数（内容切分后不足时在前面补换行）
+        interval: 流式响应相邻 token 的间隔（秒）
+        first_token: 开始响应前的等待（秒）
+    """
+
+    def __init__(self, content: str, tokens: int = 100, interval: float = 0.01, first_token: float = 0.0):
+        self._args = (content, tokens, interval, first_token)
+        self._process = None
+        self._port = None
+
+    def start(self) -> str:
+        """启动服务，返回 base_url"""
+        parent, child = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(target=_run, args=(child, *self._args), daemon=True)
+        self._process.start()
+        self._port = parent.recv()
+        return f"http://127.0.0.1:{self._port}/v1"
+
+    def stats(self) -> Dict[str, int]:
+        """处理过模型请求的连接数和已处理的请求数"""
+        with urllib.request.urlopen(f"http://127.0.0.1:{self._port}/stats") as response:
+            return json.loads(response.read())
+
+    def stop(self):
+        if self._process is not None:
+            self._process.terminate()
+            self._process = None
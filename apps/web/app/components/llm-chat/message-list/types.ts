@@ -81,12 +81,23 @@ export interface ExecuteStepOutput {
 export interface OutputFileInfo {
   file_id: string;
   filename: string;
-  url: string;
+  /** OSS 上的文件地址（未上传时为 null） */
+  url: string | null;
+  /** 直接下载的接口路径（相对 API_BASE，处理结果暂存期内有效） */
+  download_path?: string;
+  /** 文件大小（字节） */
+  size?: number;
+  /** 导出耗时（毫秒） */
+  export_ms?: number;
+  /** 上传耗时（毫秒） */
+  upload_ms?: number;
 }
 
 /** export 步骤输出 */
 export interface ExportStepOutput {
   output_files: OutputFileInfo[];
+  /** 导出和上传的总耗时（毫秒） */
+  duration_ms?: number;
 }
 
 /** 步骤 Output 类型映射 */
@@ -148,6 +159,12 @@ export interface SessionEventData {
   is_new_thread: boolean;
 }
 
+/** Session 更新事件数据（新线程的 LLM 生成标题）*/
+export interface SessionUpdateEventData {
+  thread_id: string;
+  title: string;
+}
+
 /** 步骤事件数据（默认 message 事件）*/
 export interface StepEventData {
   step: StepName | "complete";
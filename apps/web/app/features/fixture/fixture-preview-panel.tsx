@@ -1,7 +1,7 @@
 import { useState, useEffect, useMemo } from 'react'
 import { FileSpreadsheet, Loader2, ArrowRight } from 'lucide-react'
 
-import { cn } from '~/lib/utils'
+import { cn, getOutputFileUrl } from '~/lib/utils'
 import ExcelPreview from '~/components/excel-preview'
 import ExcelIcon from '~/assets/iconify/vscode-icons/file-type-excel.svg?react'
 
@@ -13,7 +13,8 @@ export type PreviewTab = 'input' | 'output'
 export interface OutputFileInfo {
   file_id: string
   filename: string
-  url: string
+  url: string | null
+  download_path?: string
 }
 
 export interface FixturePreviewPanelProps {
@@ -269,7 +270,7 @@ const FixturePreviewPanel = ({
             {currentOutputFile ? (
               <ExcelPreview
                 className="w-full h-full"
-                fileUrl={currentOutputFile.url}
+                fileUrl={getOutputFileUrl(currentOutputFile)}
               />
             ) : (
               <EmptyState
@@ -12,7 +12,7 @@ import ExcelPreview from '~/components/excel-preview'
 import InsightCard from '~/components/insight-card'
 import ExcelIcon from '~/assets/iconify/vscode-icons/file-type-excel.svg?react'
 
-import { cn } from '~/lib/utils'
+import { cn, getOutputFileUrl } from '~/lib/utils'
 
 import type { FileItem } from '~/components/file-item-badge'
 import type { UseFileUploadReturn } from '~/hooks/use-file-upload'
@@ -380,7 +380,7 @@ const TurnRenderer = ({
                       asChild
                       className="bg-brand hover:bg-brand-dark text-white"
                     >
-                      <a href={file.url} download={file.filename}>
+                      <a href={getOutputFileUrl(file)} download={file.filename}>
                         <Download className="w-4 h-4" />
                       </a>
                     </Button>
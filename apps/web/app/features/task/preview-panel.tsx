@@ -1,7 +1,7 @@
 import { useState, useEffect, useMemo } from 'react'
 import { FileSpreadsheet, ArrowRight, Loader2 } from 'lucide-react'
 
-import { cn } from '~/lib/utils'
+import { cn, getOutputFileUrl } from '~/lib/utils'
 import ExcelPreview from '~/components/excel-preview'
 import ExcelIcon from '~/assets/iconify/vscode-icons/file-type-excel.svg?react'
 
@@ -237,7 +237,7 @@ const PreviewPanel = ({
             {currentOutputFile ? (
               <ExcelPreview
                 className="w-full h-full"
-                fileUrl={currentOutputFile.url}
+                fileUrl={getOutputFileUrl(currentOutputFile)}
               />
             ) : (
               <EmptyState
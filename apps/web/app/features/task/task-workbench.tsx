@@ -70,6 +70,9 @@ const TaskWorkbench = ({ threadId }: TaskWorkbenchProps) => {
       navigate(`/threads/${thread_id}`)
       queryClient.invalidateQueries({ queryKey: ['threads'] })
     },
+    onSessionUpdated: () => {
+      queryClient.invalidateQueries({ queryKey: ['threads'] })
+    },
     onExportSuccess: (files) => {
       setOutputFiles(files)
       setTaskState('done')
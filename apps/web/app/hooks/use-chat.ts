@@ -11,6 +11,7 @@ import type {
   UserMessageAttachment,
   StepName,
   SessionEventData,
+  SessionUpdateEventData,
   StepEventData,
   ErrorEventData,
   StreamingStepRecord,
@@ -43,11 +44,13 @@ interface UseChatOptions {
   onStart?: () => void;
   initialMessages?: ChatMessage[];
   onSessionCreated?: (data: SessionEventData) => void;
+  /** 新线程的标题生成完成时的回调 */
+  onSessionUpdated?: (data: SessionUpdateEventData) => void;
   /** export 步骤完成时的回调，返回输出文件列表 */
   onExportSuccess?: (outputFiles: OutputFileInfo[]) => void;
 }
 
-export const useChat = ({ onStart, initialMessages, onSessionCreated, onExportSuccess }: UseChatOptions) => {
+export const useChat = ({ onStart, initialMessages, onSessionCreated, onSessionUpdated, onExportSuccess }: UseChatOptions) => {
   const [messages, updateMessages] = useImmer<ChatMessage[]>(initialMessages || []);
   const [isProcessing, setIsProcessing] = useState(false);
 
@@ -116,6 +119,12 @@ export const useChat = ({ onStart, initialMessages, onSessionCreated, onExportSu
             return;
           }
 
+          // 处理 session_update 事件 - 标题生成完成
+          if (event === "session_update") {
+            onSessionUpdated?.(data as SessionUpdateEventData);
+            return;
+          }
+
           // 处理 error 事件 - 会话级/系统级错误
           if (event === "error") {
             const errorData = data as ErrorEventData;
@@ -1,6 +1,8 @@
 import { clsx, type ClassValue } from "clsx"
 import { twMerge } from "tailwind-merge"
 
+import { API_BASE } from "~/lib/config"
+
 export function cn(...inputs: ClassValue[]) {
   return twMerge(clsx(inputs))
 }
@@ -23,3 +25,9 @@ export function formatRelativeTime(date: string): string {
   const day = target.getDate();
   return `${month}月${day}日`;
 }
+
+// 输出文件的下载地址：暂存期内从接口直接下载（边生成边下载），否则使用 OSS 上的地址
+export function getOutputFileUrl(file: { url?: string | null; download_path?: string }): string {
+  if (file.download_path) return `${API_BASE}${file.download_path}`;
+  return file.url ?? "";
+}